@@ -0,0 +1,21 @@
+-- Notify the running instances about changes in the parameters, so they
+-- can update only the changed values instead of reloading all of them
+
+CREATE OR REPLACE FUNCTION notify_parameter_data_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('parameter_data', OLD.field_name);
+        RETURN OLD;
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.field_name <> NEW.field_name THEN
+        PERFORM pg_notify('parameter_data', OLD.field_name);
+    END IF;
+    PERFORM pg_notify('parameter_data', NEW.field_name);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER parameter_data_notify_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON parameter_data
+    FOR EACH ROW EXECUTE PROCEDURE notify_parameter_data_changed();
@@ -0,0 +1,96 @@
+-- Create GIN indexes for the text columns filtered by the searches, so
+-- the LIKE comparisons done by them don't need to scan the whole tables.
+-- The columns are the ones in stoqlib.database.searchindex.SEARCH_COLUMNS
+-- when this patch was written, and the names of the indexes the ones given
+-- by get_index_name, which is how the missing indexes are found later
+
+CREATE INDEX bank_account_bank_account_search_trgm_idx
+    ON bank_account USING gin (stoq_normalize_string(bank_account) gin_trgm_ops);
+CREATE INDEX branch_acronym_search_trgm_idx
+    ON branch USING gin (stoq_normalize_string(acronym) gin_trgm_ops);
+CREATE INDEX branch_name_search_trgm_idx
+    ON branch USING gin (stoq_normalize_string(name) gin_trgm_ops);
+CREATE INDEX branch_station_name_search_trgm_idx
+    ON branch_station USING gin (stoq_normalize_string(name) gin_trgm_ops);
+CREATE INDEX calls_description_search_trgm_idx
+    ON calls USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX calls_message_search_fts_idx
+    ON calls USING gin (to_tsvector('simple', stoq_normalize_string(message)));
+CREATE INDEX cfop_data_code_search_trgm_idx
+    ON cfop_data USING gin (stoq_normalize_string(code) gin_trgm_ops);
+CREATE INDEX cfop_data_description_search_trgm_idx
+    ON cfop_data USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX client_category_name_search_trgm_idx
+    ON client_category USING gin (stoq_normalize_string(name) gin_trgm_ops);
+CREATE INDEX company_cnpj_search_trgm_idx
+    ON company USING gin (stoq_normalize_string(cnpj) gin_trgm_ops);
+CREATE INDEX company_fancy_name_search_trgm_idx
+    ON company USING gin (stoq_normalize_string(fancy_name) gin_trgm_ops);
+CREATE INDEX cost_center_description_search_trgm_idx
+    ON cost_center USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX cost_center_name_search_trgm_idx
+    ON cost_center USING gin (stoq_normalize_string(name) gin_trgm_ops);
+CREATE INDEX credit_check_history_identifier_search_trgm_idx
+    ON credit_check_history USING gin (stoq_normalize_string(identifier) gin_trgm_ops);
+CREATE INDEX delivery_tracking_code_search_trgm_idx
+    ON delivery USING gin (stoq_normalize_string(tracking_code) gin_trgm_ops);
+CREATE INDEX employee_registry_number_search_trgm_idx
+    ON employee USING gin (stoq_normalize_string(registry_number) gin_trgm_ops);
+CREATE INDEX employee_role_name_search_trgm_idx
+    ON employee_role USING gin (stoq_normalize_string(name) gin_trgm_ops);
+CREATE INDEX event_description_search_trgm_idx
+    ON event USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX grid_attribute_description_search_trgm_idx
+    ON grid_attribute USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX grid_group_description_search_trgm_idx
+    ON grid_group USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX individual_cpf_search_trgm_idx
+    ON individual USING gin (stoq_normalize_string(cpf) gin_trgm_ops);
+CREATE INDEX individual_rg_number_search_trgm_idx
+    ON individual USING gin (stoq_normalize_string(rg_number) gin_trgm_ops);
+CREATE INDEX loan_removed_by_search_trgm_idx
+    ON loan USING gin (stoq_normalize_string(removed_by) gin_trgm_ops);
+CREATE INDEX login_user_username_search_trgm_idx
+    ON login_user USING gin (stoq_normalize_string(username) gin_trgm_ops);
+CREATE INDEX message_content_search_trgm_idx
+    ON message USING gin (stoq_normalize_string(content) gin_trgm_ops);
+CREATE INDEX payment_description_search_trgm_idx
+    ON payment USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX payment_payment_number_search_trgm_idx
+    ON payment USING gin (stoq_normalize_string(payment_number) gin_trgm_ops);
+CREATE INDEX person_email_search_trgm_idx
+    ON person USING gin (stoq_normalize_string(email) gin_trgm_ops);
+CREATE INDEX person_mobile_number_search_trgm_idx
+    ON person USING gin (stoq_normalize_string(mobile_number) gin_trgm_ops);
+CREATE INDEX person_name_search_trgm_idx
+    ON person USING gin (stoq_normalize_string(name) gin_trgm_ops);
+CREATE INDEX person_phone_number_search_trgm_idx
+    ON person USING gin (stoq_normalize_string(phone_number) gin_trgm_ops);
+CREATE INDEX product_manufacturer_name_search_trgm_idx
+    ON product_manufacturer USING gin (stoq_normalize_string(name) gin_trgm_ops);
+CREATE INDEX product_tax_template_name_search_trgm_idx
+    ON product_tax_template USING gin (stoq_normalize_string(name) gin_trgm_ops);
+CREATE INDEX production_order_description_search_trgm_idx
+    ON production_order USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX sale_token_code_search_trgm_idx
+    ON sale_token USING gin (stoq_normalize_string(code) gin_trgm_ops);
+CREATE INDEX sale_token_name_search_trgm_idx
+    ON sale_token USING gin (stoq_normalize_string(name) gin_trgm_ops);
+CREATE INDEX sellable_barcode_search_trgm_idx
+    ON sellable USING gin (stoq_normalize_string(barcode) gin_trgm_ops);
+CREATE INDEX sellable_code_search_trgm_idx
+    ON sellable USING gin (stoq_normalize_string(code) gin_trgm_ops);
+CREATE INDEX sellable_description_search_trgm_idx
+    ON sellable USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX sellable_category_description_search_trgm_idx
+    ON sellable_category USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX sellable_unit_description_search_trgm_idx
+    ON sellable_unit USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX stock_decrease_reason_search_trgm_idx
+    ON stock_decrease USING gin (stoq_normalize_string(reason) gin_trgm_ops);
+CREATE INDEX till_entry_description_search_trgm_idx
+    ON till_entry USING gin (stoq_normalize_string(description) gin_trgm_ops);
+CREATE INDEX user_profile_name_search_trgm_idx
+    ON user_profile USING gin (stoq_normalize_string(name) gin_trgm_ops);
+CREATE INDEX work_order_description_search_trgm_idx
+    ON work_order USING gin (stoq_normalize_string(description) gin_trgm_ops);
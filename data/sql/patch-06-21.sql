@@ -0,0 +1,30 @@
+-- Indexes for the date columns filtered by the searches. The date filters
+-- compare the columns directly (col >= start AND col < end + 1 day) instead
+-- of using DATE(col), so those indexes can be used by them
+
+CREATE INDEX IF NOT EXISTS calls_date_idx ON calls (date);
+CREATE INDEX IF NOT EXISTS loan_open_date_idx ON loan (open_date);
+CREATE INDEX IF NOT EXISTS loan_expire_date_idx ON loan (expire_date);
+CREATE INDEX IF NOT EXISTS payment_open_date_idx ON payment (open_date);
+CREATE INDEX IF NOT EXISTS payment_due_date_idx ON payment (due_date);
+CREATE INDEX IF NOT EXISTS payment_paid_date_idx ON payment (paid_date);
+CREATE INDEX IF NOT EXISTS payment_cancel_date_idx ON payment (cancel_date);
+CREATE INDEX IF NOT EXISTS purchase_order_open_date_idx
+    ON purchase_order (open_date);
+CREATE INDEX IF NOT EXISTS purchase_order_expected_receival_date_idx
+    ON purchase_order (expected_receival_date);
+CREATE INDEX IF NOT EXISTS receiving_order_receival_date_idx
+    ON receiving_order (receival_date);
+CREATE INDEX IF NOT EXISTS returned_sale_return_date_idx
+    ON returned_sale (return_date);
+CREATE INDEX IF NOT EXISTS sale_open_date_idx ON sale (open_date);
+CREATE INDEX IF NOT EXISTS sale_confirm_date_idx ON sale (confirm_date);
+CREATE INDEX IF NOT EXISTS stock_decrease_confirm_date_idx
+    ON stock_decrease (confirm_date);
+CREATE INDEX IF NOT EXISTS till_opening_date_idx ON till (opening_date);
+CREATE INDEX IF NOT EXISTS till_entry_date_idx ON till_entry (date);
+CREATE INDEX IF NOT EXISTS transfer_order_open_date_idx
+    ON transfer_order (open_date);
+CREATE INDEX IF NOT EXISTS transfer_order_receival_date_idx
+    ON transfer_order (receival_date);
+CREATE INDEX IF NOT EXISTS work_order_open_date_idx ON work_order (open_date);
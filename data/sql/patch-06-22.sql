@@ -0,0 +1,150 @@
+-- Keep the stock of the storables summarized, so the product views don't
+-- need to aggregate product_stock_item (or to cross join storable with
+-- branch) on every query.
+--
+-- product_stock_branch_summary has a row for every (storable, branch) pair
+-- and product_stock_summary one for every storable. The rows are created
+-- with the storables and branches and updated with the changes on
+-- product_stock_item, which is changed by inserting rows on
+-- stock_transaction_history.
+
+CREATE TABLE product_stock_branch_summary (
+    storable_id uuid NOT NULL REFERENCES storable(id)
+        ON UPDATE CASCADE ON DELETE CASCADE,
+    branch_id uuid NOT NULL REFERENCES branch(id)
+        ON UPDATE CASCADE ON DELETE CASCADE,
+    stock numeric(20, 3) NOT NULL DEFAULT 0,
+    total_stock_cost numeric NOT NULL DEFAULT 0,
+    PRIMARY KEY (storable_id, branch_id)
+);
+CREATE INDEX product_stock_branch_summary_branch_id_idx
+    ON product_stock_branch_summary (branch_id);
+
+CREATE TABLE product_stock_summary (
+    storable_id uuid PRIMARY KEY REFERENCES storable(id)
+        ON UPDATE CASCADE ON DELETE CASCADE,
+    stock numeric(20, 3) NOT NULL DEFAULT 0,
+    total_stock_cost numeric NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION add_to_stock_summary(
+    storable_id_ uuid, branch_id_ uuid,
+    stock_ numeric, total_stock_cost_ numeric) RETURNS void AS $$
+BEGIN
+    IF storable_id_ IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO product_stock_branch_summary AS s
+            (storable_id, branch_id, stock, total_stock_cost)
+        VALUES (storable_id_, branch_id_, stock_, total_stock_cost_)
+        ON CONFLICT (storable_id, branch_id) DO UPDATE SET
+            stock = s.stock + EXCLUDED.stock,
+            total_stock_cost = s.total_stock_cost + EXCLUDED.total_stock_cost;
+
+    INSERT INTO product_stock_summary AS s
+            (storable_id, stock, total_stock_cost)
+        VALUES (storable_id_, stock_, total_stock_cost_)
+        ON CONFLICT (storable_id) DO UPDATE SET
+            stock = s.stock + EXCLUDED.stock,
+            total_stock_cost = s.total_stock_cost + EXCLUDED.total_stock_cost;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_stock_summary() RETURNS trigger AS $$
+BEGIN
+    IF (TG_OP = 'UPDATE' AND
+        NEW.storable_id IS NOT DISTINCT FROM OLD.storable_id AND
+        NEW.branch_id = OLD.branch_id AND
+        NEW.quantity = OLD.quantity AND
+        NEW.stock_cost IS NOT DISTINCT FROM OLD.stock_cost) THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM add_to_stock_summary(
+            OLD.storable_id, OLD.branch_id, -OLD.quantity,
+            -(OLD.quantity * COALESCE(OLD.stock_cost, 0)));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM add_to_stock_summary(
+            NEW.storable_id, NEW.branch_id, NEW.quantity,
+            NEW.quantity * COALESCE(NEW.stock_cost, 0));
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER update_stock_summary_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON product_stock_item
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_stock_summary();
+
+CREATE OR REPLACE FUNCTION create_storable_stock_summary() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO product_stock_summary (storable_id)
+        VALUES (NEW.id)
+        ON CONFLICT DO NOTHING;
+    INSERT INTO product_stock_branch_summary (storable_id, branch_id)
+        SELECT NEW.id, branch.id FROM branch
+        ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER create_storable_stock_summary_trigger
+    AFTER INSERT ON storable
+    FOR EACH ROW
+    EXECUTE PROCEDURE create_storable_stock_summary();
+
+CREATE OR REPLACE FUNCTION create_branch_stock_summary() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO product_stock_branch_summary (storable_id, branch_id)
+        SELECT storable.id, NEW.id FROM storable
+        ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER create_branch_stock_summary_trigger
+    AFTER INSERT ON branch
+    FOR EACH ROW
+    EXECUTE PROCEDURE create_branch_stock_summary();
+
+-- Recreates the summaries from product_stock_item. The stock cannot
+-- change while this is running
+CREATE OR REPLACE FUNCTION rebuild_stock_summary() RETURNS void AS $$
+BEGIN
+    LOCK TABLE product_stock_item IN SHARE MODE;
+
+    DELETE FROM product_stock_branch_summary;
+    DELETE FROM product_stock_summary;
+
+    INSERT INTO product_stock_branch_summary
+            (storable_id, branch_id, stock, total_stock_cost)
+        SELECT storable.id, branch.id,
+               COALESCE(SUM(product_stock_item.quantity), 0),
+               COALESCE(SUM(product_stock_item.quantity *
+                            COALESCE(product_stock_item.stock_cost, 0)), 0)
+        FROM storable
+        CROSS JOIN branch
+        LEFT JOIN product_stock_item
+            ON product_stock_item.storable_id = storable.id AND
+               product_stock_item.branch_id = branch.id
+        GROUP BY storable.id, branch.id;
+
+    INSERT INTO product_stock_summary
+            (storable_id, stock, total_stock_cost)
+        SELECT storable.id,
+               COALESCE(SUM(product_stock_item.quantity), 0),
+               COALESCE(SUM(product_stock_item.quantity *
+                            COALESCE(product_stock_item.stock_cost, 0)), 0)
+        FROM storable
+        LEFT JOIN product_stock_item
+            ON product_stock_item.storable_id = storable.id
+        GROUP BY storable.id;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_stock_summary();
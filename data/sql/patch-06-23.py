@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+# Track the changes on the domain tables so they can be read incrementally
+# (see stoqlib.database.changefeed):
+#
+# * transaction_entry.txid is the id of the last transaction that created
+#   or changed the row of the entry. The entries are read ordered by
+#   (txid, id) and only up to the oldest transaction still running, so no
+#   change can appear behind a cursor that was already read.
+# * Deleting a row from a domain table creates a tombstone, with the table
+#   and the id of the row, since its transaction entry is deleted too.
+# * change_feed_consumer stores the position of each consumer of the feed.
+#
+# Note that the tables created after this patch need the delete_te trigger,
+# which StoqlibSchemaMigration.ensure_te_rules creates.
+#
+# Adding transaction_entry.txid with a default would rewrite the whole table
+# before PostgreSQL 11, keeping it locked meanwhile. So the column is added
+# empty, the existing entries are filled in batches, committing after each
+# one, and only then the column is made NOT NULL.
+
+# How many transaction entries are filled with a txid at a time
+BATCH_SIZE = 10000
+
+txid_query = """
+ALTER TABLE transaction_entry ADD COLUMN txid bigint;
+ALTER TABLE transaction_entry ALTER COLUMN txid SET DEFAULT txid_current();
+"""
+
+backfill_query = """
+UPDATE transaction_entry SET txid = 0
+    WHERE id >= {start} AND id < {end} AND txid IS NULL;
+"""
+
+query = """
+DROP TRIGGER IF EXISTS delete_te_trigger ON {table};
+CREATE TRIGGER delete_te_trigger AFTER DELETE ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE delete_te();
+"""
+
+functions_query = """
+ALTER TABLE transaction_entry ALTER COLUMN txid SET NOT NULL;
+CREATE INDEX transaction_entry_txid_id_idx ON transaction_entry (txid, id);
+
+CREATE TABLE change_feed_tombstone (
+    te_id bigint NOT NULL PRIMARY KEY,
+    te_time timestamp NOT NULL,
+    txid bigint NOT NULL,
+    table_name text NOT NULL,
+    row_id text NOT NULL
+);
+CREATE INDEX change_feed_tombstone_txid_te_id_idx
+    ON change_feed_tombstone (txid, te_id);
+
+-- Updates the transaction entry for the given id
+CREATE OR REPLACE FUNCTION update_te(te_id bigint, table_name text DEFAULT '') RETURNS void AS $$
+BEGIN
+    UPDATE transaction_entry SET te_time = STATEMENT_TIMESTAMP(), sync_status = DEFAULT,
+                                 txid = txid_current()
+        WHERE id = $1;
+    PERFORM pg_notify('update_te', te_id::text || ',' || table_name);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Creates a tombstone for the deleted row
+CREATE OR REPLACE FUNCTION delete_te() RETURNS trigger AS $$
+BEGIN
+    IF OLD.te_id IS NOT NULL THEN
+        INSERT INTO change_feed_tombstone (te_id, te_time, txid, table_name, row_id)
+            VALUES (OLD.te_id, STATEMENT_TIMESTAMP(), txid_current(), TG_TABLE_NAME,
+                    OLD.id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE change_feed_consumer (
+    id serial NOT NULL PRIMARY KEY,
+    name text NOT NULL UNIQUE,
+    txid bigint NOT NULL DEFAULT 0,
+    te_id bigint NOT NULL DEFAULT 0,
+    updated timestamp
+);
+"""
+
+tables_query = """
+SELECT DISTINCT
+    src_pg_class.relname AS srctable
+FROM pg_constraint
+JOIN pg_class AS src_pg_class
+    ON src_pg_class.oid = pg_constraint.conrelid
+JOIN pg_class AS ref_pg_class
+    ON ref_pg_class.oid = pg_constraint.confrelid
+JOIN pg_attribute AS src_pg_attribute
+    ON src_pg_class.oid = src_pg_attribute.attrelid
+JOIN pg_attribute AS ref_pg_attribute
+    ON ref_pg_class.oid = ref_pg_attribute.attrelid, generate_series(0,10) pos(n)
+WHERE
+    contype = 'f'
+    AND ref_pg_class.relname = 'transaction_entry'
+    AND ref_pg_attribute.attname = 'id'
+    AND src_pg_attribute.attnum = pg_constraint.conkey[n]
+    AND ref_pg_attribute.attnum = pg_constraint.confkey[n]
+    AND NOT src_pg_attribute.attisdropped
+    AND NOT ref_pg_attribute.attisdropped
+"""
+
+
+def apply_patch(store):
+    # The batches are committed, so this may be running again after
+    # failing in the middle of them
+    res = store.execute(
+        "SELECT COUNT(column_name) FROM information_schema.columns WHERE "
+        "table_name = 'transaction_entry' AND column_name = 'txid'")
+    if not res.get_one()[0]:
+        store.execute(txid_query)
+        store.commit()
+
+    # The entries created from now on get the default, so only the ones
+    # up to the current last id need to be filled
+    min_id, max_id = store.execute(
+        "SELECT MIN(id), MAX(id) FROM transaction_entry").get_one()
+    if min_id is not None:
+        for start in range(min_id, max_id + 1, BATCH_SIZE):
+            store.execute(backfill_query.format(start=start,
+                                                end=start + BATCH_SIZE))
+            store.commit()
+
+    store.execute(functions_query)
+    tables = store.execute(tables_query).get_all()
+
+    for (table,) in tables:
+        store.execute(query.format(table=table))
@@ -0,0 +1,26 @@
+-- An alternative to the update_te rules, which update the transaction entry
+-- once for each updated row, on every statement. This is used by a statement
+-- level trigger instead, which updates the entries of all the rows changed
+-- by the statement at once, skipping the ones already updated on the
+-- current transaction. See StoqlibSchemaMigration.set_te_update_mode
+--
+-- The trigger needs the transition tables (REFERENCING OLD TABLE) added on
+-- PostgreSQL 10, so that mode can't be enabled on older servers. Creating
+-- this function is fine on them, since it is only used by the trigger
+
+CREATE OR REPLACE FUNCTION update_te_statement() RETURNS trigger AS $$
+    DECLARE entry_id bigint;
+BEGIN
+    FOR entry_id IN
+        UPDATE transaction_entry SET te_time = STATEMENT_TIMESTAMP(), sync_status = DEFAULT,
+                                     txid = txid_current()
+            FROM old_rows
+            WHERE transaction_entry.id = old_rows.te_id AND
+                  transaction_entry.txid <> txid_current()
+            RETURNING transaction_entry.id
+    LOOP
+        PERFORM pg_notify('update_te', entry_id::text || ',' || TG_TABLE_NAME);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,201 @@
+-- Keep a ledger with the credit of each payer, so the credit of a client
+-- can be checked when selling without going through all of its payments.
+--
+-- client_credit_ledger has a row for every person that is (or was) the
+-- payer of a payment, with:
+--
+-- * store_credit_debit: the value of the store credit payments it did not
+--   pay yet (pending or confirmed).
+-- * credit_balance: the balance of its credit account, the paid out
+--   credit payments minus the paid in ones.
+-- * oldest_pending_due_date: the due date of its oldest pending payment.
+--
+-- The rows are updated by triggers when the payments or the payers of
+-- their groups change.
+
+CREATE INDEX IF NOT EXISTS payment_group_id_idx ON payment (group_id);
+CREATE INDEX IF NOT EXISTS payment_group_payer_id_idx ON payment_group (payer_id);
+
+CREATE TABLE client_credit_ledger (
+    person_id uuid PRIMARY KEY REFERENCES person(id)
+        ON UPDATE CASCADE ON DELETE CASCADE,
+    store_credit_debit numeric(20, 2) NOT NULL DEFAULT 0,
+    credit_balance numeric(20, 2) NOT NULL DEFAULT 0,
+    oldest_pending_due_date timestamp
+);
+
+-- What the ledger should have, computed from the payments
+CREATE OR REPLACE FUNCTION compute_credit_ledger() RETURNS TABLE (
+    person_id uuid, store_credit_debit numeric, credit_balance numeric,
+    oldest_pending_due_date timestamp) AS $$
+    SELECT payment_group.payer_id,
+           COALESCE(SUM(payment.value) FILTER (
+               WHERE payment_method.method_name = 'store_credit' AND
+                     payment.payment_type = 'in' AND
+                     payment.status IN ('pending', 'confirmed')), 0),
+           COALESCE(SUM(CASE WHEN payment.payment_type = 'out'
+                             THEN payment.paid_value
+                             ELSE -payment.paid_value END) FILTER (
+               WHERE payment_method.method_name = 'credit' AND
+                     payment.status = 'paid'), 0),
+           MIN(payment.due_date) FILTER (
+               WHERE payment.payment_type = 'in' AND
+                     payment.status = 'pending')
+    FROM payment
+    JOIN payment_group ON payment_group.id = payment.group_id
+    LEFT JOIN payment_method ON payment_method.id = payment.method_id
+    WHERE payment_group.payer_id IS NOT NULL
+    GROUP BY payment_group.payer_id;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION add_to_credit_ledger(
+    person_id_ uuid, store_credit_debit_ numeric,
+    credit_balance_ numeric) RETURNS void AS $$
+BEGIN
+    INSERT INTO client_credit_ledger AS l
+            (person_id, store_credit_debit, credit_balance)
+        VALUES (person_id_, store_credit_debit_, credit_balance_)
+        ON CONFLICT (person_id) DO UPDATE SET
+            store_credit_debit = l.store_credit_debit + EXCLUDED.store_credit_debit,
+            credit_balance = l.credit_balance + EXCLUDED.credit_balance;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Adds (sign_ = 1) or removes (sign_ = -1) a payment from the ledger of
+-- the given person
+CREATE OR REPLACE FUNCTION add_payment_to_credit_ledger(
+    payment_ payment, person_id_ uuid, sign_ integer) RETURNS void AS $$
+DECLARE
+    method_name_ text;
+BEGIN
+    IF person_id_ IS NULL THEN
+        RETURN;
+    END IF;
+
+    SELECT method_name INTO method_name_
+        FROM payment_method WHERE id = payment_.method_id;
+    IF (method_name_ = 'store_credit' AND payment_.payment_type = 'in' AND
+        payment_.status IN ('pending', 'confirmed')) THEN
+        PERFORM add_to_credit_ledger(
+            person_id_, sign_ * COALESCE(payment_.value, 0), 0);
+    ELSIF method_name_ = 'credit' AND payment_.status = 'paid' THEN
+        IF payment_.payment_type = 'out' THEN
+            PERFORM add_to_credit_ledger(
+                person_id_, 0, sign_ * COALESCE(payment_.paid_value, 0));
+        ELSE
+            PERFORM add_to_credit_ledger(
+                person_id_, 0, -sign_ * COALESCE(payment_.paid_value, 0));
+        END IF;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The oldest due date can't be updated incrementally when a payment stops
+-- being pending, so it is computed again from the pending payments
+CREATE OR REPLACE FUNCTION update_credit_ledger_due_date(
+    person_id_ uuid) RETURNS void AS $$
+BEGIN
+    IF person_id_ IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO client_credit_ledger AS l (person_id, oldest_pending_due_date)
+        SELECT person_id_, MIN(payment.due_date)
+        FROM payment
+        JOIN payment_group ON payment_group.id = payment.group_id
+        WHERE payment_group.payer_id = person_id_ AND
+              payment.payment_type = 'in' AND
+              payment.status = 'pending'
+        ON CONFLICT (person_id) DO UPDATE SET
+            oldest_pending_due_date = EXCLUDED.oldest_pending_due_date;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_credit_ledger() RETURNS trigger AS $$
+DECLARE
+    old_payer_id uuid;
+    new_payer_id uuid;
+    old_pending boolean := FALSE;
+    new_pending boolean := FALSE;
+BEGIN
+    IF (TG_OP = 'UPDATE' AND
+        NEW.payment_type = OLD.payment_type AND
+        NEW.status = OLD.status AND
+        NEW.value IS NOT DISTINCT FROM OLD.value AND
+        NEW.paid_value IS NOT DISTINCT FROM OLD.paid_value AND
+        NEW.due_date IS NOT DISTINCT FROM OLD.due_date AND
+        NEW.method_id IS NOT DISTINCT FROM OLD.method_id AND
+        NEW.group_id IS NOT DISTINCT FROM OLD.group_id) THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT payer_id INTO old_payer_id
+            FROM payment_group WHERE id = OLD.group_id;
+        old_pending := OLD.payment_type = 'in' AND OLD.status = 'pending';
+        PERFORM add_payment_to_credit_ledger(OLD, old_payer_id, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT payer_id INTO new_payer_id
+            FROM payment_group WHERE id = NEW.group_id;
+        new_pending := NEW.payment_type = 'in' AND NEW.status = 'pending';
+        PERFORM add_payment_to_credit_ledger(NEW, new_payer_id, 1);
+    END IF;
+
+    IF old_pending THEN
+        PERFORM update_credit_ledger_due_date(old_payer_id);
+    END IF;
+    IF new_pending AND NOT (old_pending AND
+                            new_payer_id IS NOT DISTINCT FROM old_payer_id) THEN
+        PERFORM update_credit_ledger_due_date(new_payer_id);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER update_credit_ledger_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON payment
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_credit_ledger();
+
+-- Moves the payments of a group to the ledger of its new payer
+CREATE OR REPLACE FUNCTION update_credit_ledger_payer() RETURNS trigger AS $$
+DECLARE
+    payment_ payment;
+BEGIN
+    IF NEW.payer_id IS NOT DISTINCT FROM OLD.payer_id THEN
+        RETURN NULL;
+    END IF;
+
+    FOR payment_ IN SELECT * FROM payment WHERE group_id = NEW.id LOOP
+        PERFORM add_payment_to_credit_ledger(payment_, OLD.payer_id, -1);
+        PERFORM add_payment_to_credit_ledger(payment_, NEW.payer_id, 1);
+    END LOOP;
+    PERFORM update_credit_ledger_due_date(OLD.payer_id);
+    PERFORM update_credit_ledger_due_date(NEW.payer_id);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER update_credit_ledger_payer_trigger
+    AFTER UPDATE ON payment_group
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_credit_ledger_payer();
+
+-- Recreates the ledger from the payments. The payments cannot change
+-- while this is running
+CREATE OR REPLACE FUNCTION rebuild_credit_ledger() RETURNS void AS $$
+BEGIN
+    LOCK TABLE payment, payment_group IN SHARE MODE;
+
+    DELETE FROM client_credit_ledger;
+    INSERT INTO client_credit_ledger
+            (person_id, store_credit_debit, credit_balance,
+             oldest_pending_due_date)
+        SELECT * FROM compute_credit_ledger();
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_credit_ledger();
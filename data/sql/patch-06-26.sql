@@ -0,0 +1,6 @@
+-- Indexes for the queries that summarize the entries of a till when
+-- closing it (see Till.get_day_totals)
+
+CREATE INDEX IF NOT EXISTS till_entry_till_id_idx ON till_entry (till_id);
+CREATE INDEX IF NOT EXISTS credit_card_data_payment_id_idx
+    ON credit_card_data (payment_id);
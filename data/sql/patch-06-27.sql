@@ -0,0 +1,51 @@
+-- Keep the day of the year of the birthday of each individual on
+-- individual.birthday_key (month * 100 + day, e.g. 1225 for december 25),
+-- so the birthday searches can use an index instead of calculating the
+-- next birthday of every individual (see Individual.get_birthday_query)
+
+ALTER TABLE individual ADD COLUMN birthday_key integer;
+
+CREATE OR REPLACE FUNCTION update_birthday_key() RETURNS trigger AS $$
+BEGIN
+    NEW.birthday_key := EXTRACT(MONTH FROM NEW.birth_date) * 100 +
+                        EXTRACT(DAY FROM NEW.birth_date);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER update_birthday_key_trigger
+    BEFORE INSERT OR UPDATE OF birth_date, birthday_key ON individual
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_birthday_key();
+
+-- Filling the new column is not a change of the individuals, so don't
+-- update their transaction entries, which would run update_te once for
+-- every row (or mark all of them as changed on the change feed). The
+-- table has either the update_te rule or the update_te_trigger trigger
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_rules
+               WHERE tablename = 'individual' AND rulename = 'update_te') THEN
+        ALTER TABLE individual DISABLE RULE update_te;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_trigger
+               WHERE tgrelid = 'individual'::regclass AND
+                     tgname = 'update_te_trigger') THEN
+        ALTER TABLE individual DISABLE TRIGGER update_te_trigger;
+    END IF;
+
+    UPDATE individual SET birthday_key = NULL WHERE birth_date IS NOT NULL;
+
+    IF EXISTS (SELECT 1 FROM pg_rules
+               WHERE tablename = 'individual' AND rulename = 'update_te') THEN
+        ALTER TABLE individual ENABLE RULE update_te;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_trigger
+               WHERE tgrelid = 'individual'::regclass AND
+                     tgname = 'update_te_trigger') THEN
+        ALTER TABLE individual ENABLE TRIGGER update_te_trigger;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE INDEX individual_birthday_key_idx ON individual (birthday_key);
@@ -0,0 +1,37 @@
+-- Notify the running instances about changes in the barcodes and codes of
+-- the sellables and in the numbers of the batches, so they can keep their
+-- sellable indexes (see stoqlib.lib.sellableindex) up to date
+
+CREATE OR REPLACE FUNCTION notify_sellable_index_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('sellable_index', TG_TABLE_NAME || ',' || OLD.id::text);
+        RETURN OLD;
+    END IF;
+
+    PERFORM pg_notify('sellable_index', TG_TABLE_NAME || ',' || NEW.id::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sellable_index_notify_trigger
+    AFTER INSERT OR DELETE ON sellable
+    FOR EACH ROW EXECUTE PROCEDURE notify_sellable_index_changed();
+
+CREATE TRIGGER sellable_index_update_notify_trigger
+    AFTER UPDATE ON sellable
+    FOR EACH ROW
+    WHEN (OLD.barcode IS DISTINCT FROM NEW.barcode OR
+          OLD.code IS DISTINCT FROM NEW.code)
+    EXECUTE PROCEDURE notify_sellable_index_changed();
+
+CREATE TRIGGER storable_batch_index_notify_trigger
+    AFTER INSERT OR DELETE ON storable_batch
+    FOR EACH ROW EXECUTE PROCEDURE notify_sellable_index_changed();
+
+CREATE TRIGGER storable_batch_index_update_notify_trigger
+    AFTER UPDATE ON storable_batch
+    FOR EACH ROW
+    WHEN (OLD.batch_number IS DISTINCT FROM NEW.batch_number OR
+          OLD.storable_id IS DISTINCT FROM NEW.storable_id)
+    EXECUTE PROCEDURE notify_sellable_index_changed();
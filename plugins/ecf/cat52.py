@@ -30,6 +30,7 @@ import operator
 from kiwi.datatypes import number
 from stoqdrivers.enum import TaxType
 from stoqlib.lib import latscii
+from stoqlib.lib.fixedwidth import FixedWidthField, FixedWidthLayout
 
 from ecf.ecfdomain import ECFDocumentHistory
 
@@ -42,6 +43,56 @@ def _argtype_name(argtype):
     else:
         return argtype.__name__
 
+
+def _get_formatter(argtype):
+    # Returns the formatter of the fields of the given argtype, to be
+    # compiled in a FixedWidthLayout
+    def get_formatter(length):
+        blank = ' ' * length
+        if argtype == number:
+            # If a value is higher the the maximum allowed,
+            # set it to the maximum allowed value instead.
+            max_value = (10 ** length) - 1
+
+            def format_value(value):
+                if value > max_value:
+                    value = max_value
+
+                str_value = str(value)
+                # Return to int again, so in the formatting we add the correct
+                # numbers of zeros.
+                re_value = int(str_value.replace('.', ''))
+                return '%0*d' % (length, re_value)
+        elif argtype == str:
+            def format_value(value):
+                # Convert to latscii
+                value = codecs.encode(value, 'ascii', 'replacelatscii')
+                if isinstance(value, bytes):
+                    value = ''.join(chr(i) for i in value)
+
+                # Chop strings which are too long
+                return ('%-*s' % (length, value))[:length]
+        elif argtype == datetime.date:
+            def format_value(value):
+                # YYYYMMDD
+                return value.strftime("%Y%m%d")
+        elif argtype == datetime.time:
+            def format_value(value):
+                # HHMM
+                return value.strftime("%H%M%S")
+        elif argtype == bool:
+            def format_value(value):
+                return 'S' if value else 'N'
+        else:
+            raise TypeError
+
+        def format_or_blank(value):
+            if value == "":
+                return blank
+            return format_value(value)
+        return format_or_blank
+    return get_formatter
+
 # See
 # http://www.fazenda.gov.br/confaz/confaz/atos/atos_cotepe/2004/ac017_04.htm
 # for a complete list of this:
@@ -383,14 +434,15 @@ class CATFile(object):
 
         self._registers.sort(key=operator.attrgetter('register_type'))
 
-        data = ''
+        # Write the registers as soon as they are formatted, instead of
+        # keeping the whole file in memory
+        md5sum = md5()
         for register in self._registers:
-            data += register.get_string()
+            line = register.get_string()
+            md5sum.update(line.encode())
+            fp.write(line.encode('latin1'))
 
-        md5sum = md5(data.encode()).hexdigest()
-        ead = "EAD%s\r\n" % md5sum
-
-        fp.write(data.encode('latin1'))
+        ead = "EAD%s\r\n" % md5sum.hexdigest()
         fp.write(ead.encode('latin1'))
         fp.close()
 
@@ -416,16 +468,15 @@ class CATRegister(object):
             if key in sent_args:
                 raise CATError("%s specified two times" % (key, ))
 
-        self._values = {}
+        layout = self._get_layout()
         for (name, length, argtype) in self.register_fields:
             if kwargs[name] == "":
                 pass
             elif not isinstance(kwargs[name], argtype):
                 raise TypeError("argument %s should be of type %s but got %s" % (
                     name, _argtype_name(argtype), type(kwargs[name]).__name__))
-            self._values[name] = self._arg_to_string(kwargs[name], length,
-                                                     argtype)
             setattr(self, name, kwargs[name])
+        self._args = [kwargs[field.name] for field in layout.fields]
 
     #
     # Public API
@@ -435,56 +486,22 @@ class CATRegister(object):
         """
         @returns:
         """
-        values = []
-        for (name, a, b) in self.register_fields:
-            values.append(self._values[name])
-        return '%s%s\r\n' % (self.register_type,
-                             ''.join(values))
+        return self._get_layout().format(self._args)
+
     #
     # Private
     #
 
-    def _arg_to_string(self, value, length, argtype):
-        if value == "":
-            return ' ' * length
-
-        if argtype == number:
-            # If a value is higher the the maximum allowed,
-            # set it to the maximum allowed value instead.
-            max_value = (10 ** length) - 1
-            if value > max_value:
-                value = max_value
-
-            str_value = str(value)
-            # Return to int again, so in the formatting we add the correct
-            # numbers of zeros.
-            re_value = int(str_value.replace('.', ''))
-
-            arg = '%0*d' % (length, re_value)
-        elif argtype == str:
-            # Convert to latscii
-            value = codecs.encode(value, 'ascii', 'replacelatscii')
-            if isinstance(value, bytes):
-                value = ''.join(chr(i) for i in value)
-
-            arg = '%-*s' % (length, value)
-            # Chop strings which are too long
-            if len(arg) > length:
-                arg = arg[:length]
-        elif argtype == datetime.date:
-            # YYYYMMDD
-            arg = value.strftime("%Y%m%d")
-        elif argtype == datetime.time:
-            # HHMM
-            arg = value.strftime("%H%M%S")
-        elif argtype == bool:
-            arg = 'N'
-            if value:
-                arg = 'S'
-        else:
-            raise TypeError
-        assert len(arg) <= length
-        return arg
+    @classmethod
+    def _get_layout(cls):
+        layout = cls.__dict__.get('_layout')
+        if layout is None:
+            layout = FixedWidthLayout(
+                [FixedWidthField(name, length, _get_formatter(argtype))
+                 for (name, length, argtype) in cls.register_fields],
+                prefix=cls.register_type, terminator='\r\n')
+            cls._layout = layout
+        return layout
 
 
 class CATRegisterE00(CATRegister):
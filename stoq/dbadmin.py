@@ -26,6 +26,7 @@
 
 import logging
 import optparse
+import os
 import sys
 
 
@@ -427,6 +428,38 @@ class StoqCommandHandler:
 
         return 0 if retval else 1
 
+    def cmd_te_update_mode(self, options, *mode):
+        """Show or change how the transaction entries are updated
+
+        With "rows", each update of a row also updates its transaction
+        entry. With "transaction", only the first update of the row on
+        each transaction does.
+        """
+        from stoqlib.database.migration import (StoqlibSchemaMigration,
+                                                TE_UPDATE_ROWS,
+                                                TE_UPDATE_TRANSACTION)
+        from stoqlib.database.runtime import new_store
+
+        self._read_config(options, register_station=False,
+                          load_plugins=False)
+        modes = [TE_UPDATE_ROWS, TE_UPDATE_TRANSACTION]
+        if len(mode) > 1 or mode and mode[0] not in modes:
+            raise SystemExit("%s: mode must be one of: %s" % (
+                self.prog_name, ', '.join(modes)))
+
+        from stoqlib.exceptions import DatabaseError
+
+        migration = StoqlibSchemaMigration()
+        with new_store() as store:
+            if mode:
+                try:
+                    migration.set_te_update_mode(store, mode[0])
+                except DatabaseError as e:
+                    raise SystemExit("%s: %s" % (self.prog_name, e))
+            current_mode = migration.get_te_update_mode(store)
+        print('The transaction entries are updated per %s' % (
+            current_mode, ))
+
     def cmd_dump(self, options, output):
         """Create a database dump"""
         self._read_config(options)
@@ -512,6 +545,175 @@ class StoqCommandHandler:
         from stoqlib.lib.sintegragenerator import generate
         generate(filename, start, end)
 
+    def cmd_precompile_templates(self, options):
+        """Compile the report templates, so they are ready to be used"""
+        from stoqlib.lib.template import precompile_templates
+        print('Compiled %d templates' % (precompile_templates(), ))
+
+    def cmd_create_search_indexes(self, options, *columns):
+        """Create the missing indexes used by the searches
+
+        Besides the columns filtered by the searches, other ones can be
+        indexed too, given as table.column
+        """
+        self._read_config(options, register_station=False,
+                          load_plugins=False)
+        from stoqlib.database.runtime import new_store
+        from stoqlib.database.searchindex import (SEARCH_COLUMNS,
+                                                  create_search_indexes)
+
+        search_columns = list(SEARCH_COLUMNS)
+        for column in columns:
+            if column.count('.') != 1:
+                raise SystemExit("%s: invalid column %r, use table.column" % (
+                    self.prog_name, column))
+            search_columns.append(tuple(column.split('.')))
+
+        with new_store() as store:
+            created = create_search_indexes(store, search_columns)
+        for name in created:
+            print('Created %s' % (name, ))
+        print('Created %d search indexes' % (len(created), ))
+
+    def _check_derived_table(self, derived_table):
+        from stoqlib.database.runtime import new_store
+
+        with new_store() as store:
+            divergences = derived_table.check(store)
+            store.retval = False
+        for divergence in divergences:
+            print(derived_table.format_divergence(divergence))
+        if divergences:
+            print('Found %d divergences' % (len(divergences), ))
+        else:
+            print('The %s is consistent' % (derived_table.name, ))
+        return divergences
+
+    def _rebuild_derived_table(self, derived_table):
+        from stoqlib.database.runtime import new_store
+
+        with new_store() as store:
+            derived_table.rebuild(store)
+            divergences = derived_table.check(store)
+            store.retval = not divergences
+        if divergences:
+            print('The %s still diverges after rebuilding it' % (
+                derived_table.name, ))
+            return 1
+        print('The %s was rebuilt' % (derived_table.name, ))
+
+    def cmd_check_stock_summary(self, options):
+        """Check if the stock summary is consistent with the stock items"""
+        self._read_config(options, register_station=False,
+                          load_plugins=False)
+        from stoqlib.lib.stocksummary import STOCK_SUMMARY
+
+        if self._check_derived_table(STOCK_SUMMARY):
+            print('Run rebuild_stock_summary to fix them')
+            return 1
+
+    def cmd_rebuild_stock_summary(self, options):
+        """Rebuild the stock summary from the stock items"""
+        self._read_config(options, register_station=False,
+                          load_plugins=False)
+        from stoqlib.lib.stocksummary import STOCK_SUMMARY
+        return self._rebuild_derived_table(STOCK_SUMMARY)
+
+    def cmd_reconcile_credit_ledger(self, options):
+        """Check the client credit ledger against the payments and
+        rebuild it if they diverge"""
+        self._read_config(options, register_station=False,
+                          load_plugins=False)
+        from stoqlib.lib.creditledger import CREDIT_LEDGER
+
+        if not self._check_derived_table(CREDIT_LEDGER):
+            return
+        if options.check_only:
+            return 1
+        return self._rebuild_derived_table(CREDIT_LEDGER)
+
+    def opt_reconcile_credit_ledger(self, parser, group):
+        group.add_option('', '--check-only',
+                         action='store_true',
+                         default=False,
+                         help="don't rebuild the ledger, only check it",
+                         dest='check_only')
+
+    def cmd_changes(self, options, consumer):
+        """Print the changes on the database not read by a consumer yet
+
+        Each change is printed as a JSON object per line. The changes are
+        read in batches and the cursor of the consumer is stored after each
+        one, so the next time it will continue from there.
+        """
+        self._read_config(options, register_station=False,
+                          load_plugins=False)
+        import json
+        from stoqlib.database.changefeed import (get_changes,
+                                                 get_consumer_cursor,
+                                                 get_tracked_tables,
+                                                 set_consumer_cursor)
+        from stoqlib.database.runtime import new_store
+
+        with new_store() as store:
+            cursor = get_consumer_cursor(store, consumer)
+            tables = options.tables or get_tracked_tables(store)
+            store.retval = False
+
+        while True:
+            with new_store() as store:
+                changes, new_cursor = get_changes(
+                    store, cursor, limit=options.batch_size, tables=tables)
+                for change in changes:
+                    print(json.dumps(dict(
+                        table=change.table, id=change.id,
+                        deleted=change.deleted, data=change.data,
+                        te_time=change.te_time.isoformat(),
+                        txid=change.cursor.txid,
+                        te_id=change.cursor.te_id)))
+                sys.stdout.flush()
+                if new_cursor == cursor or options.keep_cursor:
+                    store.retval = False
+                else:
+                    set_consumer_cursor(store, consumer, new_cursor)
+            if new_cursor == cursor:
+                break
+            cursor = new_cursor
+
+    def opt_changes(self, parser, group):
+        group.add_option('', '--batch-size',
+                         action='store',
+                         type='int',
+                         default=1000,
+                         help='number of changes read on each batch',
+                         dest='batch_size')
+        group.add_option('', '--table',
+                         action='append',
+                         default=[],
+                         help='only print the changes on this table',
+                         dest='tables')
+        group.add_option('', '--keep-cursor',
+                         action='store_true',
+                         default=False,
+                         help="don't store the cursor of the consumer",
+                         dest='keep_cursor')
+
+    def cmd_prune_changes(self, options):
+        """Remove the deleted rows already read by all the change consumers
+
+        The tombstones of the deleted rows are kept until all the
+        consumers of the changes (see the changes command) have read them.
+        This should be run periodically, e.g. from cron.
+        """
+        self._read_config(options, register_station=False,
+                          load_plugins=False)
+        from stoqlib.database.changefeed import prune_tombstones
+        from stoqlib.database.runtime import new_store
+
+        with new_store() as store:
+            removed = prune_tombstones(store)
+        print('%d deleted rows were pruned' % (removed, ))
+
     def cmd_shell(self, options):
         """Drop to a shell for executing SQL queries"""
         self._read_config(options, register_station=False,
@@ -526,11 +728,21 @@ class StoqCommandHandler:
 
     def cmd_import(self, options):
         """Import data into Stoq"""
+        if not options.type or not options.import_filename:
+            print('Usage: stoqdbadmin import -t <type> '
+                  '--import-filename <filename> [--import-filename ...]')
+            return 1
+        for filename in options.import_filename:
+            if not os.path.exists(filename):
+                print('ERROR: %s does not exist' % (filename, ))
+                return 1
         self._read_config(options, register_station=False)
-        from stoqlib.importers import importer
-        importer = importer.get_by_type(options.type)
-        importer.feed_file(options.import_filename)
-        importer.process()
+        from stoqlib.importers.importerrunner import ImporterRunner
+        runner = ImporterRunner(options.type, options.import_filename,
+                                workers=options.workers,
+                                items_per_commit=options.items_per_commit,
+                                resume=options.resume)
+        runner.run()
 
     def opt_import(self, parser, group):
         group.add_option('-t', '--type',
@@ -538,9 +750,25 @@ class StoqCommandHandler:
                          help="Type of file to import",
                          dest="type")
         group.add_option('', '--import-filename',
-                         action="store",
-                         help="Filename to import",
+                         action="append",
+                         help="Filename to import, can be used more than "
+                              "once to import several files in parallel",
                          dest="import_filename")
+        group.add_option('', '--workers',
+                         action="store",
+                         type="int",
+                         help="Number of processes importing files",
+                         dest="workers")
+        group.add_option('', '--items-per-commit',
+                         action="store",
+                         type="int",
+                         help="Number of items imported between commits",
+                         dest="items_per_commit")
+        group.add_option('', '--resume',
+                         action="store_true",
+                         default=False,
+                         help="Resume an interrupted import",
+                         dest="resume")
 
     def cmd_console(self, options):
         """Drop to a Stoq python console"""
@@ -33,7 +33,7 @@ from kiwi.ui.objectlist import Column
 from storm.expr import And
 
 from stoqlib.api import api
-from stoqlib.database.expr import Date
+from stoqlib.database.expr import DateRange
 from stoqlib.domain.events import SaleAvoidCancelEvent, StockOperationTryFiscalCancelEvent
 from stoqlib.domain.invoice import InvoicePrinter
 from stoqlib.domain.sale import Sale, SaleView
@@ -86,15 +86,17 @@ class FilterItem(object):
 
 SALES_FILTERS = {
     'sold': Sale.status == Sale.STATUS_CONFIRMED,
-    'sold-today': And(Date(Sale.open_date) == date.today(),
+    'sold-today': And(DateRange(Sale.open_date, date.today(), date.today()),
                       Sale.status == Sale.STATUS_CONFIRMED),
-    'sold-7days': And(Date(Sale.open_date) <= date.today(),
-                      Date(Sale.open_date) >= date.today() - relativedelta(days=7),
+    'sold-7days': And(DateRange(Sale.open_date,
+                                date.today() - relativedelta(days=7),
+                                date.today()),
                       Sale.status == Sale.STATUS_CONFIRMED),
-    'sold-28days': And(Date(Sale.open_date) <= date.today(),
-                       Date(Sale.open_date) >= date.today() - relativedelta(days=28),
+    'sold-28days': And(DateRange(Sale.open_date,
+                                 date.today() - relativedelta(days=28),
+                                 date.today()),
                        Sale.status == Sale.STATUS_CONFIRMED),
-    'expired-quotes': And(Date(Sale.expire_date) < date.today(),
+    'expired-quotes': And(Sale.expire_date < date.today(),
                           Sale.status == Sale.STATUS_QUOTE),
 }
 
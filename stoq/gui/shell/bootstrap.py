@@ -86,6 +86,7 @@ class ShellBootstrap(object):
         self._register_stock_icons()
         self._setup_domain_slave_mapper()
         self._load_key_bindings()
+        self._precompile_templates()
         self._setup_debug_options()
         self._check_locale()
         self._setup_autoreload()
@@ -388,6 +389,13 @@ class ShellBootstrap(object):
         from stoqlib.gui.utils.keybindings import load_user_keybindings
         load_user_keybindings()
 
+    def _precompile_templates(self):
+        # Compile the report templates that are not on the cache yet on
+        # the background, so the first report does not have to wait for it
+        from stoqlib.lib.template import precompile_templates
+        from stoqlib.lib.threadutils import threadit
+        threadit(precompile_templates)
+
     def _check_locale(self):
         if not self._locale_error:
             return
@@ -216,12 +216,15 @@ class ShellApp(GladeDelegate):
         if self.search_spec is None:  # pragma no cover
             raise NotImplementedError
 
-        model = self.results.get_model()
-        if isinstance(model, LazyObjectModel):
-            model.load_items_from_results(0, model._count)
+        data = None
+        if isinstance(self.results.get_model(), LazyObjectModel):
+            # Let the exporter iterate over the results instead of loading
+            # all of them on the model
+            data = self.search.get_last_results()
 
         sse = SpreadSheetExporter()
         sse.export(object_list=self.results,
+                   data=data,
                    name=self.app_name,
                    filename_prefix=self.app_name)
 
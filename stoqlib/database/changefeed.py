@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+"""A feed of the changes on the domain tables
+
+Every domain table references a |transactionentry|, updated by the
+database every time the row is changed. The entry also stores the id of
+the transaction which last created or changed the row. When the row is
+deleted (together with its entry), a tombstone is created with the table
+and the id the row had, and the id of the deleting transaction.
+
+This module reads the entries and the tombstones ordered by the
+transaction id, returning
+the current state of the changed rows (or a tombstone for the deleted
+ones) in batches. After each batch a :class:`ChangeFeedCursor` is
+returned, which can be used to read the next one, even on another
+process. The consumers can store their cursors using
+:func:`get_consumer_cursor` and :func:`set_consumer_cursor`.
+
+Only the transactions older than the oldest transaction still running are
+read, so a transaction that commits after a batch was read can never have
+its changes behind the cursor of that batch. A row changed again after it
+was read will be returned again, with its new state. Note that this means
+a long-running transaction (e.g. an idle session left open) stalls the
+feed: nothing after it is read until it finishes, and so the tombstones
+can't be removed by :func:`prune_tombstones` either.
+
+The tombstones are kept until all the consumers have read them. Run
+:func:`prune_tombstones` periodically (``stoqdbadmin prune_changes``, e.g.
+from cron) to remove the ones already behind the cursors of all of them.
+"""
+
+import collections
+
+from stoqlib.lib.dateutils import localnow
+
+#: The default number of transaction entries read in each batch
+DEFAULT_BATCH_SIZE = 1000
+
+#: The position on the feed. Changes are read ordered by the id of the
+#: transaction and by the id of the transaction entry
+ChangeFeedCursor = collections.namedtuple(
+    'ChangeFeedCursor', ['txid', 'te_id'])
+
+#: The cursor before all the changes
+START = ChangeFeedCursor(0, 0)
+
+#: A change on a row of *table*. *id* is the id of the row, as text.
+#: *data* is a dict with the columns of the row, or ``None`` if the row
+#: was *deleted*. *cursor* is the position of the change on the feed
+Change = collections.namedtuple(
+    'Change', ['table', 'id', 'deleted', 'data', 'te_time', 'cursor'])
+
+_ENTRIES = u"""
+    (SELECT id, txid, te_time, NULL, NULL
+     FROM transaction_entry
+     WHERE (txid, id) > (?, ?) AND txid < ? AND
+           NOT EXISTS (SELECT 1 FROM change_feed_tombstone
+                       WHERE change_feed_tombstone.te_id = transaction_entry.id)
+     ORDER BY txid, id
+     LIMIT ?)
+    UNION ALL
+    (SELECT te_id, txid, te_time, table_name, row_id
+     FROM change_feed_tombstone
+     WHERE (txid, te_id) > (?, ?) AND txid < ?
+     ORDER BY txid, te_id
+     LIMIT ?)
+    ORDER BY 2, 1
+    LIMIT ?
+"""
+
+_ROWS = u"""
+    SELECT '{table}', t.te_id, t.id::text, row_to_json(t)
+    FROM {table} AS t
+    WHERE t.te_id = ANY(?)
+"""
+
+
+def _get_horizon(store):
+    # All the transactions older than this one are either committed or
+    # aborted, so their changes are final
+    return store.execute(
+        u"SELECT txid_snapshot_xmin(txid_current_snapshot())").get_one()[0]
+
+
+def get_tracked_tables(store):
+    """Returns the tables which have their changes tracked
+
+    :param store: a store
+    :returns: a list with the names of the tables
+    """
+    from stoqlib.domain.system import TransactionEntry
+    return sorted(set(
+        table for (table, column, ref_table, ref_column, u, d)
+        in store.list_references(TransactionEntry.id) if column == u'te_id'))
+
+
+def get_changes(store, cursor=START, limit=DEFAULT_BATCH_SIZE, tables=None):
+    """Returns the changes after a cursor
+
+    :param store: a store
+    :param cursor: the :class:`ChangeFeedCursor` of the last change already
+      read, or :data:`START` to read all of them
+    :param limit: the maximum number of transaction entries to read.
+      Fewer changes than that may be returned, since the entries of the
+      rows that are not on *tables* are skipped
+    :param tables: the tables to read the changes from. Defaults
+      to :func:`get_tracked_tables`
+    :returns: a tuple with a list of :class:`Change` and the cursor to
+      read the next changes from
+    """
+    if tables is None:
+        tables = get_tracked_tables(store)
+    params = (cursor.txid, cursor.te_id, _get_horizon(store), limit)
+    entries = store.execute(_ENTRIES, params * 2 + (limit, )).get_all()
+    if not entries:
+        return [], cursor
+
+    te_ids = [te_id for te_id, txid, te_time, table, id_ in entries
+              if table is None]
+    rows = {}
+    if te_ids and tables:
+        query = u' UNION ALL '.join(_ROWS.format(table=table)
+                                    for table in tables)
+        for table, te_id, id_, data in store.execute(
+                query, [te_ids] * len(tables)):
+            rows[te_id] = (table, id_, data)
+
+    changes = []
+    for te_id, txid, te_time, deleted_table, deleted_id in entries:
+        change_cursor = ChangeFeedCursor(txid, te_id)
+        if deleted_table is not None:
+            if deleted_table in tables:
+                changes.append(Change(deleted_table, deleted_id, True, None,
+                                      te_time, change_cursor))
+            continue
+        row = rows.get(te_id)
+        # The entries of the rows deleted before the deletions were tracked
+        # don't reference any row anymore
+        if row is None:
+            continue
+        table, id_, data = row
+        changes.append(Change(table, id_, False, data, te_time,
+                              change_cursor))
+
+    last_te_id, last_txid = entries[-1][:2]
+    return changes, ChangeFeedCursor(last_txid, last_te_id)
+
+
+def iter_changes(store, cursor=START, batch_size=DEFAULT_BATCH_SIZE,
+                 tables=None):
+    """Iterates over the changes after a cursor, in batches
+
+    The iteration stops when there are no more changes to read.
+
+    :param store: a store
+    :param cursor: the :class:`ChangeFeedCursor` to start reading from
+    :param batch_size: the number of transaction entries read on each batch
+    :param tables: the tables to read the changes from
+    :returns: an iterator of tuples with a list of :class:`Change` and the
+      cursor after them, as returned by :func:`get_changes`
+    """
+    if tables is None:
+        tables = get_tracked_tables(store)
+    while True:
+        changes, new_cursor = get_changes(store, cursor, limit=batch_size,
+                                          tables=tables)
+        if new_cursor == cursor:
+            break
+        yield changes, new_cursor
+        cursor = new_cursor
+
+
+def get_consumer_cursor(store, name):
+    """Returns the cursor stored for a consumer
+
+    :param store: a store
+    :param name: the name of the consumer
+    :returns: the :class:`ChangeFeedCursor` of the consumer, or
+      :data:`START` if it never stored one
+    """
+    from stoqlib.domain.synchronization import ChangeFeedConsumer
+    consumer = store.find(ChangeFeedConsumer, name=name).one()
+    if consumer is None:
+        return START
+    return ChangeFeedCursor(consumer.txid, consumer.te_id)
+
+
+def set_consumer_cursor(store, name, cursor):
+    """Stores the cursor of a consumer
+
+    :param store: a store
+    :param name: the name of the consumer
+    :param cursor: the :class:`ChangeFeedCursor` to store
+    """
+    from stoqlib.domain.synchronization import ChangeFeedConsumer
+    consumer = store.find(ChangeFeedConsumer, name=name).one()
+    if consumer is None:
+        consumer = ChangeFeedConsumer(store=store, name=name)
+    consumer.txid = cursor.txid
+    consumer.te_id = cursor.te_id
+    consumer.updated = localnow()
+
+
+def prune_tombstones(store):
+    """Removes the tombstones already read by all the consumers
+
+    Only the tombstones after the cursor of the consumer which is most
+    behind are kept. If there are no consumers, all of them are removed,
+    since a new consumer starting from :data:`START` doesn't need to know
+    about the rows deleted before it existed.
+
+    The cursors only advance up to the oldest transaction still running
+    (see :func:`get_changes`), so while a long-running transaction is open
+    the tombstones after it are kept, no matter how old they are.
+
+    :param store: a store
+    :returns: the number of tombstones removed
+    """
+    from stoqlib.domain.synchronization import ChangeFeedConsumer
+    consumer = store.find(ChangeFeedConsumer).order_by(
+        ChangeFeedConsumer.txid, ChangeFeedConsumer.te_id).first()
+    if consumer is None:
+        result = store.execute(u"DELETE FROM change_feed_tombstone")
+    else:
+        result = store.execute(
+            u"DELETE FROM change_feed_tombstone WHERE (txid, te_id) <= (?, ?)",
+            (consumer.txid, consumer.te_id))
+    return result.rowcount
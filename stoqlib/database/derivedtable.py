@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+"""Tables derived from other tables
+
+Some values are too slow to be computed from their original tables every
+time they are read, so the database keeps them on a table of their own,
+updated by triggers when the original tables change. Each of those has a
+SQL function which recreates it from the original tables.
+
+A :class:`DerivedTable` describes one of them, so it can be checked
+against the original tables and rebuilt if it diverges from them (for
+instance, if the triggers were disabled for some reason).
+"""
+
+
+class DerivedTable(object):
+    """A set of tables derived from other ones
+
+    Each check query returns the rows of a table which are not equal to the
+    values computed from the original tables, with the *keys* of the row
+    followed by the expected and the current value of each of the
+    *columns*. The current values are ``None`` when the row is missing,
+    and the expected ones when the row should not exist.
+
+    :param name: the name of the derived data, for the users
+    :param divergence_class: a namedtuple with a ``table`` field followed
+      by the fields of the rows returned by the check queries
+    :param keys: the names of the fields identifying a row
+    :param columns: the names of the derived columns. The expected values
+      are on the ``expected_<column>`` fields
+    :param checks: a list of tuples with a table name and the query
+      checking it
+    :param rebuild_function: the name of the SQL function which recreates
+      the tables
+    """
+
+    def __init__(self, name, divergence_class, keys, columns, checks,
+                 rebuild_function):
+        self.name = name
+        self.divergence_class = divergence_class
+        self.keys = keys
+        self.columns = columns
+        self.checks = checks
+        self.rebuild_function = rebuild_function
+
+    def check(self, store):
+        """Checks if the tables are equal to the original ones
+
+        :param store: a store
+        :returns: a list of divergences, empty if the tables are
+          consistent
+        """
+        divergences = []
+        for table, query in self.checks:
+            for row in store.execute(query):
+                divergences.append(self.divergence_class(table, *row))
+        return divergences
+
+    def rebuild(self, store):
+        """Recreates the tables from the original ones
+
+        The rows of the original tables are locked until *store* is
+        committed, so none can be changed meanwhile.
+
+        :param store: a store
+        """
+        store.execute(u"SELECT %s()" % (self.rebuild_function, ))
+
+    def format_divergence(self, divergence):
+        """Describes a divergence returned by :meth:`check`
+
+        :param divergence: the divergence
+        :returns: a string with the row and its values
+        """
+        keys = ', '.join('%s %s' % (key, getattr(divergence, key))
+                         for key in self.keys)
+        values = ', '.join(
+            '%s %s (expected %s)' % (column, getattr(divergence, column),
+                                     getattr(divergence,
+                                             'expected_' + column))
+            for column in self.columns)
+        return '%s: %s: %s' % (divergence.table, keys, values)
@@ -28,9 +28,11 @@ This contains a list of expressions that are unsupported by Storm.
 Most of them are specific to PostgreSQL
 """
 
+import datetime
+
 from storm.expr import (Expr, NamedFunc, PrefixExpr, SuffixExpr, SQL, ComparableExpr,
                         compile as expr_compile, FromExpr, Undef, EXPR, is_safe_token,
-                        BinaryOper, SetExpr)
+                        BinaryOper, SetExpr, And)
 
 
 class Age(NamedFunc):
@@ -225,6 +227,46 @@ class StoqNormalizeString(NamedFunc):
     name = "stoq_normalize_string"
 
 
+class Similarity(NamedFunc):
+    """How similar two strings are, from 0 to 1, based on the number of
+    trigrams they share. Provided by the pg_trgm extension
+    """
+    # http://www.postgresql.org/docs/9.1/static/pgtrgm.html
+    __slots__ = ()
+    name = "similarity"
+
+
+class ToTSVector(NamedFunc):
+    """Converts a text to a tsvector, used by full text search"""
+    # http://www.postgresql.org/docs/9.1/static/textsearch-controls.html
+    __slots__ = ()
+    name = "to_tsvector"
+
+
+class ToTSQuery(NamedFunc):
+    """Converts a text to a tsquery, used by full text search"""
+    __slots__ = ()
+    name = "to_tsquery"
+
+
+class TSRank(NamedFunc):
+    """Ranks a tsvector by how well it matches a tsquery"""
+    __slots__ = ()
+    name = "ts_rank"
+
+
+class TSMatch(BinaryOper):
+    """Checks if a tsvector matches a tsquery"""
+    __slots__ = ()
+    oper = " @@ "
+
+
+class Greatest(NamedFunc):
+    """The largest of the values, ignoring the ones that are NULL"""
+    __slots__ = ()
+    name = "GREATEST"
+
+
 class Case(ComparableExpr):
     """Works like a Python's if-then-else clause.
 
@@ -309,6 +351,41 @@ def compile_between(compile, expr, state):
         expr_compile(expr.end, state))
 
 
+class DateRange(Expr):
+    """Check if a timestamp is on one of the days from start to end
+
+    This is the same as ``DATE(value) BETWEEN start AND end``, but written
+    as ``value >= start AND value < end + 1 day``, which can use an index
+    on value. Any of start and end can be ``None`` and times on them
+    are ignored.
+    """
+    __slots__ = ('value', 'start', 'end')
+
+    def __init__(self, value, start=None, end=None):
+        self.value = value
+        self.start = start
+        self.end = end
+
+
+def _get_day_start(date):
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    return datetime.datetime.combine(date, datetime.time())
+
+
+@expr_compile.when(DateRange)
+def compile_date_range(compile, expr, state):
+    queries = []
+    if expr.start is not None:
+        queries.append(expr.value >= _get_day_start(expr.start))
+    if expr.end is not None:
+        queries.append(expr.value < (_get_day_start(expr.end) +
+                                     datetime.timedelta(days=1)))
+    if not queries:
+        return 'TRUE'
+    return expr_compile(And(*queries), state)
+
+
 class GenerateSeries(FromExpr):
     __slots__ = ('start', 'end', 'step')
 
@@ -332,6 +409,44 @@ def compile_generate_series(compile, expr, state):
     return expr
 
 
+class DeclareCursor(Expr):
+    """Declares a server side cursor for the given select
+
+    The rows can then be retrieved in batches using FETCH, keeping
+    only a batch of rows in memory at a time.
+
+    .. line-block::
+
+        DECLARE <name> NO SCROLL CURSOR FOR <select>
+    """
+    # http://www.postgresql.org/docs/9.1/static/sql-declare.html
+    __slots__ = ('name', 'select')
+
+    def __init__(self, name, select):
+        self.name = name
+        self.select = select
+
+
+@expr_compile.when(DeclareCursor)
+def compile_declare_cursor(compile, expr, state):
+    return 'DECLARE %s NO SCROLL CURSOR FOR %s' % (
+        expr.name, expr_compile(expr.select, state))
+
+
+class Explain(Expr):
+    """Shows the execution plan of a statement"""
+    # http://www.postgresql.org/docs/9.1/static/sql-explain.html
+    __slots__ = ('statement', )
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@expr_compile.when(Explain)
+def compile_explain(compile, expr, state):
+    return 'EXPLAIN %s' % (expr_compile(expr.statement, state), )
+
+
 class UnionAll(SetExpr):
     """Union all the results
 
@@ -37,10 +37,13 @@ import traceback
 
 from kiwi.environ import environ
 
-from stoqlib.database.runtime import get_default_store, new_store
-from stoqlib.database.settings import db_settings, check_extensions
+from stoqlib.database.runtime import (clear_schema_cache, get_default_store,
+                                      new_store)
+from stoqlib.database.settings import (db_settings, check_extensions,
+                                       get_database_version)
 from stoqlib.domain.plugin import InstalledPlugin
 from stoqlib.domain.profile import update_profile_applications
+from stoqlib.domain.system import TransactionEntry
 from stoqlib.exceptions import (DatabaseInconsistency, StoqlibError,
                                 DatabaseError)
 from stoqlib.lib.crashreport import collect_traceback
@@ -54,6 +57,19 @@ log = logging.getLogger(__name__)
 # Used by the wizard
 create_log = logging.getLogger('stoqlib.database.create')
 
+#: The transaction entries are updated by the update_te rules, once for
+#: each updated row
+TE_UPDATE_ROWS = u'rows'
+
+#: The transaction entries are updated by statement triggers, only on the
+#: first time each row is updated on a transaction. Needs PostgreSQL
+#: :data:`TE_UPDATE_TRANSACTION_MIN_VERSION` or newer
+TE_UPDATE_TRANSACTION = u'transaction'
+
+#: The first PostgreSQL version with transition tables on triggers
+#: (``REFERENCING OLD TABLE``), used by :data:`TE_UPDATE_TRANSACTION`
+TE_UPDATE_TRANSACTION_MIN_VERSION = (10, 0)
+
 
 @functools.total_ordering
 class Patch(object):
@@ -139,6 +155,9 @@ class Patch(object):
         else:
             raise AssertionError("Unknown filename: %s" % (self.filename, ))
 
+        # The patch may have changed the references between the tables
+        clear_schema_cache()
+
     def get_version(self):
         """Returns the patch version
         :returns: a tuple with the patch generation and level
@@ -411,25 +430,9 @@ class StoqlibSchemaMigration(SchemaMigration):
 
     def _get_transaction_entry_tables(self, store):
         """Returns a list of all tables that reference transaction_entry"""
-        tables_query = """
-        SELECT DISTINCT src_pg_class.relname AS srctable
-        FROM pg_constraint
-        JOIN pg_class AS src_pg_class ON src_pg_class.oid = pg_constraint.conrelid
-        JOIN pg_class AS ref_pg_class ON ref_pg_class.oid = pg_constraint.confrelid
-        JOIN pg_attribute AS src_pg_attribute ON src_pg_class.oid = src_pg_attribute.attrelid
-        JOIN pg_attribute AS ref_pg_attribute
-            ON ref_pg_class.oid = ref_pg_attribute.attrelid, generate_series(0,10) pos(n)
-        WHERE
-            contype = 'f'
-            AND ref_pg_class.relname = 'transaction_entry'
-            AND ref_pg_attribute.attname = 'id'
-            AND src_pg_attribute.attnum = pg_constraint.conkey[n]
-            AND ref_pg_attribute.attnum = pg_constraint.confkey[n]
-            AND NOT src_pg_attribute.attisdropped
-            AND NOT ref_pg_attribute.attisdropped
-        """
-
-        return [i for (i,) in store.execute(tables_query).get_all()]
+        tables = set(table for (table, column, ref_table, ref_column, u, d)
+                     in store.list_references(TransactionEntry.id))
+        return sorted(tables)
 
     def update(self, plugins=True, backup=True, check_database=True):
         log.info("Upgrading database (plugins=%r, backup=%r)" % (
@@ -528,13 +531,61 @@ class StoqlibSchemaMigration(SchemaMigration):
         It may happen that the developer forgets to add the update_te rule after the table is
         created, leaving a table that will not be properly synchronized.
 
-        This makes sure that all tables have the update_te rule.
+        This makes sure that all tables have the update_te rule (or trigger,
+        depending on :meth:`.get_te_update_mode`) and the delete_te trigger,
+        used by :mod:`stoqlib.database.changefeed`.
         """
+        self.set_te_update_mode(store, self.get_te_update_mode(store))
+
+    def get_te_update_mode(self, store):
+        """Returns how the transaction entries are updated
+
+        :param store: a store
+        :returns: :data:`TE_UPDATE_ROWS` or :data:`TE_UPDATE_TRANSACTION`
+        """
+        has_trigger = store.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_trigger "
+            "               WHERE tgname = 'update_te_trigger')").get_one()[0]
+        return TE_UPDATE_TRANSACTION if has_trigger else TE_UPDATE_ROWS
+
+    def set_te_update_mode(self, store, mode):
+        """Changes how the transaction entries are updated on all tables
+
+        :param store: a store
+        :param mode: :data:`TE_UPDATE_ROWS` or :data:`TE_UPDATE_TRANSACTION`
+        :raises: :exc:`DatabaseError` if the server is too old for *mode*
+        """
+        if (mode == TE_UPDATE_TRANSACTION and
+                get_database_version(store) <
+                TE_UPDATE_TRANSACTION_MIN_VERSION):
+            raise DatabaseError(
+                "The %r transaction entry update mode needs PostgreSQL "
+                "%s or newer" % (mode, '.'.join(
+                    str(v) for v in TE_UPDATE_TRANSACTION_MIN_VERSION)))
+        if mode == TE_UPDATE_ROWS:
+            update_query = """
+            DROP TRIGGER IF EXISTS update_te_trigger ON {table};
+            CREATE OR REPLACE RULE update_te AS ON UPDATE TO {table}
+                DO ALSO SELECT update_te(old.te_id, '{table}');
+            """
+        elif mode == TE_UPDATE_TRANSACTION:
+            update_query = """
+            DROP RULE IF EXISTS update_te ON {table};
+            DROP TRIGGER IF EXISTS update_te_trigger ON {table};
+            CREATE TRIGGER update_te_trigger AFTER UPDATE ON {table}
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE PROCEDURE update_te_statement();
+            """
+        else:
+            raise ValueError("Invalid transaction entry update mode: %r" % (
+                mode, ))
+
         query = """
         ALTER TABLE {table} ALTER COLUMN te_id SET DEFAULT new_te('{table}');
-        CREATE OR REPLACE RULE update_te AS ON UPDATE TO {table}
-            DO ALSO SELECT update_te(old.te_id, '{table}');
-        """
+        DROP TRIGGER IF EXISTS delete_te_trigger ON {table};
+        CREATE TRIGGER delete_te_trigger AFTER DELETE ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE delete_te();
+        """ + update_query
 
         for table in self._get_transaction_entry_tables(store):
             store.execute(query.format(table=table))
@@ -24,24 +24,36 @@
 Kiwi integration for Stoq/Storm
 """
 
+import collections
+import itertools
+import logging
+import os
 import re
 import threading
+import time
 import queue
+import uuid
 
 from gi.repository import GLib, GObject
 from kiwi.python import Settable
 from kiwi.utils import gsignal
 from storm import Undef
 from storm.database import Connection, convert_param_marks
-from storm.expr import compile, And, Or, Like, Not, Alias, State, Lower
+from storm.expr import (compile, And, Or, Like, Not, Alias, State, Lower,
+                        Coalesce, Count, Desc, Eq, Expr, Ne, SQLRaw)
 from storm.tracer import trace
 import psycopg2
 import psycopg2.extensions
 
-from stoqlib.database.expr import Date, StoqNormalizeString
+from stoqlib.database.expr import (DateRange, Greatest, Over, Similarity,
+                                   StoqNormalizeString, ToTSQuery, ToTSVector,
+                                   TSMatch, TSRank)
 from stoqlib.database.interfaces import ISearchFilter
+from stoqlib.database.runtime import StoqlibStore
+from stoqlib.database.searchindex import FULL_TEXT, TS_CONFIG, get_search_mode
 from stoqlib.database.settings import db_settings
-from stoqlib.database.viewable import Viewable
+
+log = logging.getLogger(__name__)
 
 
 class QueryState(object):
@@ -170,6 +182,13 @@ class AsyncResultSet(object):
     that are not defined here will be forwarded to it.
 
     The original resultset can be accessed by :attr:`.resultset`
+
+    If the original resultset was configured with
+    :meth:`stoqlib.database.runtime.StoqlibResultSet.set_fetch_size`, the
+    rows will be fetched from a server side cursor in batches while
+    iterating and :func:`len` will not be available. The cursor is closed
+    when the iteration ends, but :meth:`.close` should be called when
+    it is stopped before that (it can also be used as a context manager).
     """
 
     def __init__(self, resultset, result):
@@ -184,12 +203,37 @@ class AsyncResultSet(object):
         self._result = result
 
     def __iter__(self):
-        for values in self._result:
-            yield self.resultset._load_objects(self._result, values)
+        try:
+            for values in self._result:
+                yield self.resultset._load_objects(self._result, values)
+        finally:
+            self.close()
 
     def __len__(self):
         return self._result.rowcount
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close the server side cursor used by this result set
+
+        Server side cursors are declared WITH HOLD and are kept open on
+        the connection that executed the query until they are closed.
+        This can be called more than once.
+        """
+        if self.resultset._fetch_size is not None:
+            self._result.close()
+
     def __getattr__(self, attr):
         return getattr(self.resultset, attr)
 
@@ -199,28 +243,51 @@ class AsyncQueryOperation(GObject.GObject):
     (STATUS_WAITING,
      STATUS_EXECUTING,
      STATUS_FINISHED,
-     STATUS_CANCELLED) = range(4)
+     STATUS_CANCELLED,
+     STATUS_FAILED) = range(5)
+
+    #: Priorities used to order the operations waiting for a free
+    #: connection. Lower values are executed first.
+    (PRIORITY_INTERACTIVE,
+     PRIORITY_NORMAL,
+     PRIORITY_BACKGROUND) = range(3)
 
     gsignal('finish')
 
-    def __init__(self, store, resultset, expr):
+    def __init__(self, store, resultset, expr, priority=PRIORITY_NORMAL):
         """
         :param store: database store
         :param resultset: resultset that will be used to construct
            the result from.
         :param expr: query expression to execute
+        :param priority: the priority of this operation, one of
+           the PRIORITY_* constants
         """
         GObject.GObject.__init__(self)
 
         self.status = self.STATUS_WAITING
         self.resultset = resultset
         self.expr = expr
+        self.priority = priority
+
+        #: When the operation was scheduled, started and finished
+        #: executing, as returned by :func:`time.monotonic`
+        self.queued_time = None
+        self.start_time = None
+        self.finish_time = None
+
+        #: The database error that made the operation fail, when the
+        #: status is STATUS_FAILED (e.g. the query reached the
+        #: statement_timeout)
+        self.error = None
 
         self._conn = store._connection
         self._async_cursor = None
         self._async_conn = None
         self._statement = None
         self._parameters = None
+        self._cancel_sent = False
+        self._lock = threading.Lock()
 
     #
     #  Public API
@@ -229,17 +296,30 @@ class AsyncQueryOperation(GObject.GObject):
     def execute(self, async_conn):
         """Executes a query within an asyncronous psycopg2 connection
         """
-        if self.status == self.STATUS_CANCELLED:
-            return
+        with self._lock:
+            if self.status == self.STATUS_CANCELLED:
+                return
+            self.status = self.STATUS_EXECUTING
+            self._async_conn = async_conn
 
-        self.status = self.STATUS_EXECUTING
+        self.start_time = time.monotonic()
 
         # Async variant of Connection.execute() in storm/database.py
         state = State()
         statement = compile(self.expr, state)
         stmt = convert_param_marks(statement, "?", "%s")
-        self._async_cursor = async_conn.cursor()
-        self._async_conn = async_conn
+        fetch_size = self.resultset._fetch_size
+        if fetch_size is None:
+            self._async_cursor = async_conn.cursor()
+        else:
+            # A cursor WITH HOLD survives the commit below, allowing the
+            # results to be fetched in batches after this connection
+            # moved on to the next operation
+            self._async_cursor = async_conn.cursor(
+                name='stoq_async_cursor_%s' % (uuid.uuid4().hex, ),
+                withhold=True)
+            self._async_cursor.arraysize = fetch_size
+            self._async_cursor.itersize = fetch_size
 
         # This is postgres specific, see storm/databases/postgres.py
         self._statement = stmt
@@ -247,15 +327,50 @@ class AsyncQueryOperation(GObject.GObject):
 
         trace("connection_raw_execute", self._conn,
               self._async_cursor, self._statement, self._parameters)
-        self._async_cursor.execute(self._statement,
-                                   self._parameters)
+        error = None
+        try:
+            self._async_cursor.execute(self._statement,
+                                       self._parameters)
+            if fetch_size is not None:
+                async_conn.commit()
+        except psycopg2.Error as err:
+            # The query failed or was cancelled on the server, either by
+            # cancel() or because it reached the statement_timeout. The
+            # transaction is aborted, so roll it back to be able to reuse
+            # the connection for the next operation
+            async_conn.rollback()
+            error = err
+        finally:
+            self.finish_time = time.monotonic()
+            # From now on, cancel() should not interrupt the connection
+            # anymore, since it will be used by other operations
+            with self._lock:
+                self._async_conn = None
+                cancel_sent = self._cancel_sent
+
+        if cancel_sent and error is None:
+            self._discard_cancel(async_conn)
+
+        with self._lock:
+            # This can happen if another thread cancelled this while the
+            # cursor was executing. In that case, it is not interested in
+            # the retval anymore
+            if self.status == self.STATUS_CANCELLED:
+                if fetch_size is not None and error is None:
+                    # Nobody will fetch the results of the WITH HOLD
+                    # cursor, so close it to release it on the server
+                    self._async_cursor.close()
+                return
+
+            if error is not None:
+                self.error = error
+                self.status = self.STATUS_FAILED
+            else:
+                self.status = self.STATUS_FINISHED
 
-        # This can happen if another thread cancelled this while the cursor was
-        # executing. In that case, it is not interested in the retval anymore
-        if self.status == self.STATUS_CANCELLED:
+        if error is not None:
+            log.warning("Async operation %r failed: %s", self, error)
             return
-
-        self.status = self.STATUS_FINISHED
         GLib.idle_add(self._on_finish)
 
     def get_result(self):
@@ -276,13 +391,59 @@ class AsyncQueryOperation(GObject.GObject):
         return AsyncResultSet(self.resultset, result)
 
     def cancel(self):
-        """Cancel the operation scheduling"""
-        self.status = self.STATUS_CANCELLED
+        """Cancel the operation
+
+        If the operation is still waiting it will not be executed at all.
+        If it is already executing, the query will be cancelled on
+        the server, releasing its connection to other operations.
+        Operations that already finished or failed are not affected.
+        """
+        with self._lock:
+            if self.status not in [self.STATUS_WAITING,
+                                   self.STATUS_EXECUTING]:
+                return
+
+            self.status = self.STATUS_CANCELLED
+            if self._async_conn is not None:
+                self._cancel_sent = True
+                self._async_conn.cancel()
+
+    def get_wait_time(self):
+        """Get the time this operation waited for a free connection
+
+        :returns: the time in seconds or ``None`` if it was not executed yet
+        """
+        if self.queued_time is None or self.start_time is None:
+            return None
+        return self.start_time - self.queued_time
+
+    def get_execution_time(self):
+        """Get the time this operation took to execute on the server
+
+        :returns: the time in seconds or ``None`` if it was not finished yet
+        """
+        if self.start_time is None or self.finish_time is None:
+            return None
+        return self.finish_time - self.start_time
 
     #
     #  Private
     #
 
+    def _discard_cancel(self, async_conn):
+        # The server handles the cancel requests asynchronously, so one
+        # sent right before the query finished may still be pending. Run
+        # a statement that can be safely interrupted, so that it will not
+        # cancel the query of the next operation using this connection
+        cursor = async_conn.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        except psycopg2.extensions.QueryCanceledError:
+            pass
+        finally:
+            cursor.close()
+        async_conn.rollback()
+
     def _on_finish(self):
         if self.status == self.STATUS_CANCELLED:
             return
@@ -292,33 +453,99 @@ class AsyncQueryOperation(GObject.GObject):
 GObject.type_register(AsyncQueryOperation)
 
 
-class _OperationExecuter(threading.Thread):
+class _OperationWorker(threading.Thread):
+    """A thread executing operations from a queue on its own connection"""
 
-    _SINGLETON = None
-
-    def __init__(self):
-        super(_OperationExecuter, self).__init__()
+    def __init__(self, executer):
+        super(_OperationWorker, self).__init__()
 
+        self._executer = executer
         self._conn = psycopg2.connect(db_settings.get_store_dsn())
-        self._queue = queue.Queue()
+
+    def run(self):
+        queue_ = self._executer._queue
+        while True:
+            priority, seq, operation = queue_.get()
+            try:
+                operation.execute(self._conn)
+            except Exception:
+                log.exception("Error executing async operation %r",
+                              operation)
+                self._conn.rollback()
+            finally:
+                self._executer._update_stats(operation)
+                queue_.task_done()
+
+
+class _OperationExecuter(object):
+    """A pool of connections executing :class:`AsyncQueryOperation`
+
+    The operations are executed by order of priority and, for the same
+    priority, by order of scheduling. The number of connections can be
+    configured by the ``STOQ_ASYNC_QUERY_WORKERS`` environment variable.
+    """
+
+    _SINGLETON = None
+
+    #: The default number of connections used to execute operations
+    default_workers = 2
+
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = int(os.environ.get('STOQ_ASYNC_QUERY_WORKERS',
+                                         self.default_workers))
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._stats_lock = threading.Lock()
+        self._stats = dict(executed=0, cancelled=0, failed=0,
+                           wait_time=0.0, execution_time=0.0)
+        self._workers = [_OperationWorker(self)
+                         for i in range(max(workers, 1))]
 
     @classmethod
     def get_instance(cls):
         if cls._SINGLETON is None:
             cls._SINGLETON = cls()
-            cls._SINGLETON.daemon = True
             cls._SINGLETON.start()
         return cls._SINGLETON
 
-    def run(self):
-        while True:
-            operation = self._queue.get()
-            operation.execute(self._conn)
-            self._queue.task_done()
+    def start(self):
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
 
     def schedule(self, operation):
         assert isinstance(operation, AsyncQueryOperation)
-        self._queue.put(operation)
+        operation.queued_time = time.monotonic()
+        # The counter is used to keep the FIFO order between operations of
+        # the same priority (and to avoid comparing the operations)
+        self._queue.put((operation.priority, next(self._counter), operation))
+
+    def get_stats(self):
+        """Get metrics about the operations executed so far
+
+        :returns: a dict containing the number of operations ``executed``,
+            ``cancelled`` and ``failed``, and the total ``wait_time`` (waiting for
+            a free connection) and ``execution_time`` in seconds
+        """
+        with self._stats_lock:
+            return self._stats.copy()
+
+    def _update_stats(self, operation):
+        wait_time = operation.get_wait_time()
+        execution_time = operation.get_execution_time()
+        with self._stats_lock:
+            if operation.status == AsyncQueryOperation.STATUS_CANCELLED:
+                self._stats['cancelled'] += 1
+            elif operation.status == AsyncQueryOperation.STATUS_FAILED:
+                self._stats['failed'] += 1
+            else:
+                self._stats['executed'] += 1
+            self._stats['wait_time'] += wait_time or 0
+            self._stats['execution_time'] += execution_time or 0
+
+        log.debug("Async operation %r: waited %.3fs, executed in %.3fs",
+                  operation, wait_time or 0, execution_time or 0)
 
 
 class QueryExecuter(object):
@@ -328,23 +555,33 @@ class QueryExecuter(object):
     The query is constructed using storm.
 
     :cvar default_search_limit: The default search limit.
+    :cvar summary_cache_size: How many search summaries should be cached
+    :cvar summary_cache_timeout: For how many seconds a search summary
+      can be used after it was computed
     """
 
+    summary_cache_size = 8
+    summary_cache_timeout = 60
+
     def __init__(self, store=None):
         self._columns = {}
         self._limit = -1
         self.store = store
         self.search_spec = None
         self.order_by = None
+        self._rank_results = False
         self._query_callbacks = []
         self._filter_query_callbacks = {}
         self._query = self._default_query
         self.post_result = None
         self._operation_executer = _OperationExecuter.get_instance()
+        self._summary_cache = collections.OrderedDict()
+        self._summary_cache_lock = threading.Lock()
 
     # Public API
 
-    def search(self, states=None, resultset=None, limit=None):
+    def search(self, states=None, resultset=None, limit=None,
+               fetch_size=None):
         """
         Execute a search.
 
@@ -353,6 +590,9 @@ class QueryExecuter(object):
           .set_search_spec()
         :param states:
         :param limit: use this limit instead of the one defined by set_limit()
+        :param fetch_size: if not ``None``, the results will be streamed
+          from a server side cursor, *fetch_size* rows at a time. See
+          :meth:`stoqlib.database.runtime.StoqlibResultSet.set_fetch_size`
         """
         if resultset is None:
             resultset = self._query(self.store)
@@ -360,21 +600,21 @@ class QueryExecuter(object):
         limit = limit or self._limit
         if limit > 0:
             resultset.config(limit=limit)
+        if fetch_size is not None:
+            resultset.set_fetch_size(fetch_size)
 
-        if callable(self.order_by):
-            order_by = self.order_by()
-        else:
-            order_by = self.order_by
-
+        order_by = self._get_order_by(states)
         if order_by:
-            return resultset.order_by(order_by)
+            return resultset.order_by(*order_by)
         else:
             return resultset
 
-    def search_async(self, states=None, resultset=None, limit=None):
+    def search_async(self, states=None, resultset=None, limit=None,
+                     priority=AsyncQueryOperation.PRIORITY_NORMAL,
+                     fetch_size=None):
         """
         Execute a search asynchronously.
-        This uses a separate psycopg2 connection which is lazily
+        This uses a pool of separate psycopg2 connections which is lazily
         created just before executing the first async query.
         This method returns an operation for which a signal **finish** is
         emitted when the query has finished executing. In that callback,
@@ -402,6 +642,11 @@ class QueryExecuter(object):
 
         :param states:
         :param resultset: a resultset or ``None``
+        :param priority: the priority of the operation, one of the
+          :class:`AsyncQueryOperation` PRIORITY_* constants. Interactive
+          searches should use a higher priority than exports and reports
+        :param fetch_size: if not ``None``, the results will be streamed
+          from a server side cursor, *fetch_size* rows at a time
         :returns: a query operation
         """
         if resultset is None:
@@ -410,9 +655,16 @@ class QueryExecuter(object):
         limit = limit or self._limit
         if limit > 0:
             resultset.config(limit=limit)
+        if fetch_size is not None:
+            resultset.set_fetch_size(fetch_size)
+        # Only the ranked results are ordered here, the others are ordered
+        # by the callers, like the sorted column of the search results
+        if self._get_rank(states) is not None:
+            resultset.order_by(*self._get_order_by(states))
         operation = AsyncQueryOperation(self.store,
                                         resultset,
-                                        resultset._get_select())
+                                        resultset._get_select(),
+                                        priority=priority)
         self._operation_executer.schedule(operation)
         return operation
 
@@ -457,6 +709,19 @@ class QueryExecuter(object):
         """
         self.order_by = order_by
 
+    def set_rank_results(self, rank_results):
+        """
+        Sets if the results should be ordered by how well they match the
+        searched text, best matches first.
+
+        The text filters are ranked by the similarity of their columns
+        with the text. Any order set by :meth:`.set_order_by` is only used
+        to break ties.
+
+        :param rank_results: ``True`` to rank the results
+        """
+        self._rank_results = rank_results
+
     def add_query_callback(self, callback):
         """
         Adds a generic query callback
@@ -496,6 +761,20 @@ class QueryExecuter(object):
         self._query = callback
 
     def get_post_result(self, result):
+        """Gets the summary of a search result
+
+        The summary is computed by the search spec's
+        ``post_search_callback``. It is cached for the filters used by
+        *result*, so sorting it again will not compute the summary again.
+
+        :param result: the result of :meth:`.search`
+        :returns: a Settable with the summary values
+        """
+        key = self._get_summary_key(result)
+        post_result = self._get_cached_summary(key)
+        if post_result is not None:
+            return post_result
+
         descs, query = self.search_spec.post_search_callback(result)
         # This should not be present in the query, since post_search_callback
         # should only use aggregate functions.
@@ -507,20 +786,184 @@ class QueryExecuter(object):
         data = {}
         for desc, value in zip(descs, list(values)):
             data[desc] = value
-        return Settable(**data)
+        post_result = Settable(**data)
+        self._set_cached_summary(key, post_result)
+        return post_result
+
+    def get_page_with_summary(self, result, start, end):
+        """Gets a page of a search result together with its summary
+
+        The summary of the whole result is computed by window aggregates
+        in the same statement that gets the page, instead of running the
+        search again with ``post_search_callback``. That is only possible
+        when the search spec defines a ``get_summary_columns`` classmethod,
+        returning the descriptions and the aggregates of the summary.
+
+        :param result: the result of :meth:`.search`
+        :param start: the index of the first item of the page
+        :param end: the index after the last item of the page
+        :returns: a tuple with the list of items and a Settable with the
+          summary or ``None`` if the summary can't be computed this way
+        """
+        get_summary_columns = getattr(self.search_spec,
+                                      'get_summary_columns', None)
+        if get_summary_columns is None or result._select is not Undef:
+            return None
+
+        key = self._get_summary_key(result)
+        post_result = self._get_cached_summary(key)
+        if post_result is not None:
+            return list(result[start:end]), post_result
+
+        descs, columns = get_summary_columns()
+        rows = result.get_slice_with_columns(
+            start, end, [Over(column) for column in columns])
+        if rows:
+            values = rows[0][1]
+        elif start == 0:
+            # There are no results at all. That is what the aggregates
+            # would return for them
+            values = [0 if isinstance(column, Count) else None
+                      for column in columns]
+        else:
+            # The page is past the end of the results, so there is
+            # nothing to compute the summary from
+            return None
 
-    def get_ordered_result(self, result, attribute):
-        if issubclass(self.search_spec, Viewable):
-            # sorting viewables is not supported with strings, since that
-            # viewables can query more than one search_spec at once, and each
-            # search_spec may have columns with the same name.
-            if isinstance(attribute, str):
-                attribute = getattr(self.search_spec, attribute)
+        post_result = Settable(**dict(zip(descs, values)))
+        self._set_cached_summary(key, post_result)
+        return [item for item, values in rows], post_result
 
-        return result.order_by(attribute)
+    def clear_summary_cache(self):
+        """Clears the summaries cached by :meth:`.get_post_result` and
+        :meth:`.get_page_with_summary`
+        """
+        with self._summary_cache_lock:
+            self._summary_cache.clear()
+
+    def get_ordered_result(self, result, attribute, descending=False,
+                           after=None, backwards=False):
+        """Orders a search result by an attribute of the search spec
+
+        The id of the search spec is used to break ties, so the results
+        are always in the same order and the rows after (or before)
+        another one can be found by its sort key (see
+        :meth:`.get_sort_key`). Paginating the results that way, instead
+        of slicing them with an offset, avoids going through all the
+        rows before the page.
+
+        :param result: the result of :meth:`.search`
+        :param attribute: the attribute to order by
+        :param descending: if the results should be in descending order
+        :param after: the sort key of a row, to get only the rows after
+          it or ``None`` to get all of them
+        :param backwards: if the results should be in the opposite order,
+          so that *after* gets the rows before that row, closest first
+        :returns: a new result set
+        """
+        column, id_column = self._get_sort_columns(attribute)
+        if backwards:
+            descending = not descending
+
+        result = result.copy()
+        if after is not None:
+            # The NULLs are sorted after all the other values
+            condition = self._get_seek_condition(column, id_column, after,
+                                                 greater=not descending)
+            if result._group_by is Undef:
+                result = result.find(condition)
+            else:
+                # The sort column may be an aggregate of the viewable
+                if result._having is not Undef:
+                    condition = And(result._having, condition)
+                result.having(condition)
+
+        if id_column is None:
+            return result.order_by(Desc(column) if descending else column)
+        if descending:
+            return result.order_by(Desc(column), Desc(id_column))
+        return result.order_by(column, id_column)
+
+    def get_sort_key(self, item, attribute):
+        """Gets the sort key of an item, as ordered by
+        :meth:`.get_ordered_result`
+
+        :param item: an item of the results
+        :param attribute: the attribute the results are ordered by
+        :returns: the sort key or ``None`` if the results can't be
+          paginated by it
+        """
+        column, id_column = self._get_sort_columns(attribute)
+        if id_column is None or not isinstance(attribute, str):
+            return None
+        return getattr(item, attribute), item.id
 
     # Private API
 
+    def _get_sort_columns(self, attribute):
+        # Viewables can query more than one table at once, and those may
+        # have columns with the same name, so use the column of the spec
+        column = attribute
+        if isinstance(attribute, str):
+            column = getattr(self.search_spec, attribute, None)
+        if not isinstance(column, Expr):
+            # Not a column, let the database find out what it is
+            return SQLRaw(attribute), None
+
+        id_column = getattr(self.search_spec, 'id', None)
+        if not isinstance(id_column, Expr):
+            return column, None
+        return column, id_column
+
+    def _get_seek_condition(self, column, id_column, key, greater):
+        value, id_ = key
+        if value is None:
+            if greater:
+                return And(Eq(column, None), id_column > id_)
+            return Or(Ne(column, None), id_column < id_)
+
+        # The redundant >= and <= let the database use an index on the
+        # column to find where to start
+        if greater:
+            return Or(And(column >= value,
+                          Or(column > value, id_column > id_)),
+                      Eq(column, None))
+        return And(column <= value, Or(column < value, id_column < id_))
+
+    def _get_summary_key(self, result):
+        # The filters of the result, without its order and slice, which do
+        # not change the summary
+        select = result._get_select()
+        select.order_by = Undef
+        select.limit = Undef
+        select.offset = Undef
+        state = State()
+        statement = compile(select, state)
+        params = tuple(repr(param.get()) for param in state.parameters)
+        return self.search_spec, statement, params
+
+    def _get_cached_summary(self, key):
+        with self._summary_cache_lock:
+            cached = self._summary_cache.get(key)
+            if cached is None:
+                return None
+            timestamp, committed_changes, post_result = cached
+            # Anything committed could be part of the cached summary
+            if (time.time() - timestamp > self.summary_cache_timeout or
+                    committed_changes != StoqlibStore.committed_changes):
+                del self._summary_cache[key]
+                return None
+            return post_result
+
+    def _set_cached_summary(self, key, post_result):
+        with self._summary_cache_lock:
+            self._summary_cache[key] = (time.time(),
+                                        StoqlibStore.committed_changes,
+                                        post_result)
+            self._summary_cache.move_to_end(key)
+            while len(self._summary_cache) > self.summary_cache_size:
+                self._summary_cache.popitem(last=False)
+
     def _default_query(self, store):
         return store.find(self.search_spec)
 
@@ -581,17 +1024,100 @@ class QueryExecuter(object):
 
         return resultset
 
+    def _get_table_field(self, search_spec, column):
+        if isinstance(column, str):
+            table_field = getattr(search_spec, column)
+        else:
+            table_field = column
+
+        if isinstance(table_field, Alias):
+            table_field = table_field.expr
+        return table_field
+
+    def _get_order_by(self, states):
+        if callable(self.order_by):
+            order_by = self.order_by()
+        else:
+            order_by = self.order_by
+
+        if not order_by:
+            order_by = []
+        elif not isinstance(order_by, (list, tuple)):
+            order_by = [order_by]
+
+        # The order set by set_order_by only breaks the ties of the rank
+        rank = self._get_rank(states)
+        if rank is not None:
+            return [Desc(rank)] + list(order_by)
+        return list(order_by)
+
+    def _get_rank(self, states):
+        if not self._rank_results or not states:
+            return None
+
+        ranks = []
+        for state in states:
+            if (not isinstance(state, StringQueryState) or
+                    state.mode not in [StringQueryState.CONTAINS_ALL,
+                                       StringQueryState.CONTAINS_EXACTLY] or
+                    not state.text.strip() or
+                    state.filter not in self._columns):
+                continue
+            columns, use_having = self._columns[state.filter]
+            if use_having:
+                continue
+            for column in columns:
+                table_field = self._get_table_field(self.search_spec, column)
+                ranks.append(self._get_string_rank(state, table_field))
+
+        if not ranks:
+            return None
+        elif len(ranks) == 1:
+            return ranks[0]
+        return Greatest(*ranks)
+
+    def _get_string_rank(self, state, table_field):
+        table_field = self._get_indexed_field(table_field)
+        if get_search_mode(table_field) == FULL_TEXT:
+            words = self._get_full_text_words(state.text)
+            if words:
+                return TSRank(self._get_tsvector(table_field),
+                              self._get_tsquery(words))
+        return Similarity(StoqNormalizeString(table_field),
+                          StoqNormalizeString(state.text.lower()))
+
+    def _get_indexed_field(self, table_field):
+        # A value that is searched for some text is never NULL/empty,
+        # so lets remove the COALESCE(column, '') to be able to use the
+        # column's index
+        if (isinstance(table_field, Coalesce) and
+                len(table_field.args) == 2 and
+                isinstance(table_field.args[1], str) and
+                table_field.args[1] == u''):
+            return table_field.args[0]
+        return table_field
+
+    def _get_full_text_words(self, text):
+        # Words with anything other than letters and numbers (like 0.5)
+        # are split differently by full text search, so they are still
+        # matched with LIKE
+        return [word for word in re.split('[ \n\r]', text)
+                if word and re.match(r'^[^\W_]+$', word)]
+
+    def _get_tsvector(self, table_field):
+        # This must match the full text indexes, see searchindex.py
+        return ToTSVector(TS_CONFIG, StoqNormalizeString(table_field))
+
+    def _get_tsquery(self, words):
+        # Match words starting with the ones searched
+        text = u' & '.join(u'%s:*' % (word.lower(), ) for word in words)
+        return ToTSQuery(TS_CONFIG, StoqNormalizeString(text))
+
     def _construct_state_query(self, search_spec, state, columns):
         queries = []
         for column in columns:
             query = None
-            if isinstance(column, str):
-                table_field = getattr(search_spec, column)
-            else:
-                table_field = column
-
-            if isinstance(table_field, Alias):
-                table_field = table_field.expr
+            table_field = self._get_table_field(search_spec, column)
 
             if isinstance(state, NumberQueryState):
                 query = self._parse_number_state(state, table_field)
@@ -638,13 +1164,24 @@ class QueryExecuter(object):
         if not state.text.strip():
             return
 
+        if state.mode != StringQueryState.NOT_CONTAINS:
+            table_field = self._get_indexed_field(table_field)
+
         def _like(value):
             return Like(StoqNormalizeString(table_field),
                         StoqNormalizeString(u'%%%s%%' % value.lower()),
                         case_sensitive=False)
 
         if state.mode == StringQueryState.CONTAINS_ALL:
-            queries = [_like(word) for word in re.split('[ \n\r]', state.text) if word]
+            words = [word for word in re.split('[ \n\r]', state.text) if word]
+            queries = []
+            if get_search_mode(table_field) == FULL_TEXT:
+                fts_words = self._get_full_text_words(state.text)
+                if fts_words:
+                    queries.append(TSMatch(self._get_tsvector(table_field),
+                                           self._get_tsquery(fts_words)))
+                words = [word for word in words if word not in fts_words]
+            queries.extend(_like(word) for word in words)
             retval = And(*queries)
         elif state.mode == StringQueryState.IDENTICAL_TO:
             retval = Lower(table_field) == state.text.lower()
@@ -660,16 +1197,12 @@ class QueryExecuter(object):
 
     def _parse_date_state(self, state, table_field):
         if state.date:
-            return Date(table_field) == Date(state.date)
+            return DateRange(table_field, state.date, state.date)
 
     def _parse_date_interval_state(self, state, table_field):
-        queries = []
-        if state.start:
-            queries.append(Date(table_field) >= Date(state.start))
-        if state.end:
-            queries.append(Date(table_field) <= Date(state.end))
-        if queries:
-            return And(*queries)
+        if state.start or state.end:
+            return DateRange(table_field, state.start or None,
+                             state.end or None)
 
     def _parse_bool_state(self, state, table_field):
         return table_field == state.value
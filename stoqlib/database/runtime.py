@@ -23,29 +23,34 @@
 ##
 """ Runtime routines for applications"""
 
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 import logging
+import re
 import sys
+import uuid
 import warnings
 import weakref
 import os
 
 from kiwi.component import get_utility, provide_utility
 from storm import Undef
-from storm.expr import SQL, Avg
+from storm.exceptions import FeatureError
+from storm.expr import SQL, Alias, Avg, Count, Select
 from storm.info import get_obj_info
 from storm.store import Store, ResultSet, PENDING_REMOVE, PENDING_ADD
 from storm.tracer import trace
+import psycopg2.extensions
 
 from stoqlib.database.exceptions import InterfaceError, OperationalError
 from stoqlib.database.interfaces import (
     ICurrentBranch,
     ICurrentBranchStation, ICurrentUser)
-from stoqlib.database.expr import is_sql_identifier
+from stoqlib.database.expr import DeclareCursor, Explain, is_sql_identifier
 from stoqlib.database.orm import ORMObject
 from stoqlib.database.properties import Identifier
 from stoqlib.database.settings import db_settings
 from stoqlib.database.viewable import Viewable
+from stoqlib.domain.events import DomainCommittedEvent
 from stoqlib.exceptions import DatabaseError, LoginError
 from stoqlib.lib.decorators import public
 from stoqlib.lib.interfaces import IAppInfo
@@ -63,6 +68,44 @@ _default_store = None
 #: should not be used by anything except autoreload_object()
 _stores = weakref.WeakSet()
 
+#: the schema version and the foreign keys of each database, grouped by the
+#: referenced column. Loaded by StoqlibStore.list_references and cleared by
+#: clear_schema_cache()
+_references = weakref.WeakKeyDictionary()
+
+_SCHEMA_VERSION_QUERY = """
+    SELECT (SELECT MAX(id) FROM system_table),
+           (SELECT array_agg(plugin_name || ':' || plugin_version
+                             ORDER BY plugin_name)
+            FROM installed_plugin)
+    """
+
+_REFERENCES_QUERY = """
+    SELECT DISTINCT
+        src_pg_class.relname AS srctable,
+        src_pg_attribute.attname AS srccol,
+        ref_pg_class.relname AS reftable,
+        ref_pg_attribute.attname AS refcol,
+        pg_constraint.confupdtype,
+        pg_constraint.confdeltype
+    FROM pg_constraint
+    JOIN pg_class AS src_pg_class
+        ON src_pg_class.oid = pg_constraint.conrelid
+    JOIN pg_class AS ref_pg_class
+        ON ref_pg_class.oid = pg_constraint.confrelid
+    JOIN pg_attribute AS src_pg_attribute
+        ON src_pg_class.oid = src_pg_attribute.attrelid
+    JOIN pg_attribute AS ref_pg_attribute
+        ON ref_pg_class.oid = ref_pg_attribute.attrelid, generate_series(0,10) pos(n)
+    WHERE
+        contype = 'f'
+        AND src_pg_attribute.attnum = pg_constraint.conkey[n]
+        AND ref_pg_attribute.attnum = pg_constraint.confkey[n]
+        AND NOT src_pg_attribute.attisdropped
+        AND NOT ref_pg_attribute.attisdropped
+    ORDER BY src_pg_class.relname, src_pg_attribute.attname
+    """
+
 
 def autoreload_object(obj, obj_store=False):
     """Autoreload object in any other existing store.
@@ -89,6 +132,23 @@ def autoreload_object(obj, obj_store=False):
 
 
 class StoqlibResultSet(ResultSet):
+
+    #: The default number of rows fetched at once when using
+    #: a server side cursor. See :meth:`.set_fetch_size`
+    DEFAULT_FETCH_SIZE = 2000
+
+    #: Up to how many results :meth:`.get_estimated_count` counts
+    DEFAULT_EXACT_COUNT = 1000
+
+    _fetch_size = None
+
+    def __iter__(self):
+        if self._fetch_size is None:
+            return super(StoqlibResultSet, self).__iter__()
+
+        return (self._load_objects(result, values)
+                for result, values in self._execute_server_side())
+
     # FIXME: Remove. See bug 4985
     def __bool__(self):
         warnings.warn("use self.is_empty()", DeprecationWarning, stacklevel=2)
@@ -113,6 +173,135 @@ class StoqlibResultSet(ResultSet):
         if viewable.having:
             self.having(viewable.having)
 
+    def set_fetch_size(self, fetch_size=DEFAULT_FETCH_SIZE):
+        """Configures this result set to stream its results
+
+        When iterating over it (or over :meth:`.fast_iter`), the results will
+        be retrieved using a server side cursor, *fetch_size* rows at a time,
+        instead of loading all of them in memory at once. Use this when
+        iterating over very large results, like when exporting them.
+
+        Note that the cursor only lives inside the current transaction,
+        so the store should not be committed or rolled back during
+        the iteration.
+
+        :param fetch_size: the number of rows to fetch from the server
+            at a time or ``None`` to disable the server side cursor
+        :returns: this result set
+        """
+        self._fetch_size = fetch_size
+        return self
+
+    def copy_to_store(self, store):
+        """Gets a copy of this result set which runs on another store
+
+        Useful to iterate over the results on a thread, which must not
+        use the store this result set was created on.
+
+        :param store: the store
+        :returns: the copy of this result set
+        """
+        result = self.copy()
+        result._store = store
+        return result
+
+    def explain(self):
+        """Gets the plan the database will use to execute this result set
+
+        Useful to check if the query can use the indexes of the tables.
+
+        :returns: a list with the lines of the plan
+        """
+        result = self._store._connection.execute(Explain(self._get_select()))
+        return [line for line, in result.get_all()]
+
+    def get_estimated_count(self, exact_limit=DEFAULT_EXACT_COUNT):
+        """Gets the number of results, estimating it when there are many
+
+        Counting all the results of a big search means going through
+        all of them. Instead, they are only counted up to *exact_limit*
+        and, when there are more than that, the number of rows estimated
+        by the query planner is used.
+
+        :param exact_limit: up to how many results should be counted
+        :returns: a tuple with the number of results and ``True`` if it
+          is exact or ``False`` if it is an estimate
+        """
+        select = self[:exact_limit + 1]._get_select()
+        select.order_by = Undef
+        result = self._store._connection.execute(
+            Select(Count(), tables=Alias(select, '_tmp')))
+        count = result.get_one()[0]
+        if count <= exact_limit:
+            return count, True
+
+        # The first line of the plan has the estimate for the whole query
+        match = re.search(r' rows=(\d+) ', self.explain()[0])
+        return max(int(match.group(1)), count), False
+
+    def get_slice_with_columns(self, start, end, columns):
+        """Gets a slice of this result set with some extra columns
+
+        The extra columns are selected by the same statement used to
+        get the objects, which is useful for window functions (see
+        :class:`stoqlib.database.expr.Over`), like when a summary of all
+        the results should be returned together with a page of them.
+
+        :param start: the index of the first result
+        :param end: the index after the last result
+        :param columns: a list of expressions to select
+        :returns: a list of (object, values) tuples, where *values* is a
+          tuple with the values of *columns* for that object
+        """
+        if self._select is not Undef:
+            raise FeatureError("Can't select extra columns of a set "
+                               "expression")
+        select = self[start:end]._get_select()
+        n_columns = len(select.columns)
+        select.columns = list(select.columns) + list(columns)
+        result = self._store._connection.execute(select)
+        return [(self._load_objects(result, values[:n_columns]),
+                 tuple(values[n_columns:]))
+                for values in result.get_all()]
+
+    def _execute_server_side(self):
+        connection = self._store._connection
+        name = 'stoq_cursor_%s' % (uuid.uuid4().hex, )
+        connection.execute(DeclareCursor(name, self._get_select()))
+        try:
+            while True:
+                result = connection.execute(
+                    'FETCH FORWARD %d FROM %s' % (self._fetch_size, name))
+                rows = result.get_all()
+                if not rows:
+                    break
+                for values in rows:
+                    yield result, values
+        except GeneratorExit:
+            # The iteration was stopped before the end
+            self._close_server_side_cursor(connection, name)
+            raise
+        else:
+            self._close_server_side_cursor(connection, name)
+        # On errors, the transaction was aborted and the cursor is closed
+        # when it is rolled back. Do not query anything else here, or
+        # the original error would be replaced by InFailedSqlTransaction
+
+    def _close_server_side_cursor(self, connection, name):
+        raw_connection = connection._raw_connection
+        if (raw_connection is None or
+                raw_connection.get_transaction_status() !=
+                psycopg2.extensions.TRANSACTION_STATUS_INTRANS):
+            # The transaction was aborted or finished, and the cursor
+            # with it
+            return
+
+        # The cursor will not exist anymore if the transaction that
+        # declared it finished while we were iterating over it
+        if connection.execute(SQL("SELECT 1 FROM pg_cursors WHERE name = ?",
+                                  (name, ))).get_one():
+            connection.execute('CLOSE %s' % (name, ))
+
     def _load_viewable(self, values):
         """Converts the result of this result set into an instance of the
         configured viewable.
@@ -186,9 +375,14 @@ class StoqlibResultSet(ResultSet):
                 named_tuples.append(namedtuple(info.cls.__name__,
                                                [i.name for i in info.columns]))
 
+        if self._fetch_size is None:
+            rows = self._store._connection.execute(self._get_select())
+        else:
+            rows = (values for result, values in self._execute_server_side())
+
         is_viewable = hasattr(self, '_viewable')
         # Then interate over the results bypassing storm object creation
-        for values in self._store._connection.execute(self._get_select()):
+        for values in rows:
             value = self._load_fast_object(named_tuples, values)
             if is_viewable:
                 value = self._load_viewable(value)
@@ -229,6 +423,11 @@ class StoqlibStore(Store):
 
     _result_set_factory = StoqlibResultSet
 
+    #: How many commits changing domain objects the stores of this process
+    #: did. Anything computed from the database when this was different
+    #: may be outdated
+    committed_changes = 0
+
     def __init__(self, database=None, cache=None):
         """
         Creates a new store
@@ -243,6 +442,7 @@ class StoqlibStore(Store):
         self._dirties = [[]]
         self.retval = True
         self.obsolete = False
+        self._schema_version = None
 
         if database is None:
             database = get_default_store().get_database()
@@ -359,37 +559,22 @@ class StoqlibStore(Store):
         - update : The ON UPDATE action for the reference. 'a' for 'NO ACTION', 'c'
           for CASCADE
         - delete: The same as update.
+
+        The foreign keys of the whole database are queried only once and
+        cached for its schema version (the patches applied to the database
+        and to its plugins), until :func:`clear_schema_cache` is called.
         """
         table_name = str(column.cls.__storm_table__)
         column_name = str(column.name)
-        query = """
-            SELECT DISTINCT
-                src_pg_class.relname AS srctable,
-                src_pg_attribute.attname AS srccol,
-                ref_pg_class.relname AS reftable,
-                ref_pg_attribute.attname AS refcol,
-                pg_constraint.confupdtype,
-                pg_constraint.confdeltype
-            FROM pg_constraint
-            JOIN pg_class AS src_pg_class
-                ON src_pg_class.oid = pg_constraint.conrelid
-            JOIN pg_class AS ref_pg_class
-                ON ref_pg_class.oid = pg_constraint.confrelid
-            JOIN pg_attribute AS src_pg_attribute
-                ON src_pg_class.oid = src_pg_attribute.attrelid
-            JOIN pg_attribute AS ref_pg_attribute
-                ON ref_pg_class.oid = ref_pg_attribute.attrelid, generate_series(0,10) pos(n)
-            WHERE
-                contype = 'f'
-                AND ref_pg_class.relname = ?
-                AND ref_pg_attribute.attname = ?
-                AND src_pg_attribute.attnum = pg_constraint.conkey[n]
-                AND ref_pg_attribute.attnum = pg_constraint.confkey[n]
-                AND NOT src_pg_attribute.attisdropped
-                AND NOT ref_pg_attribute.attisdropped
-            ORDER BY src_pg_class.relname, src_pg_attribute.attname
-            """
-        return self.execute(query, (table_name, column_name)).get_all()
+        database = self.get_database()
+        schema_version = self._get_schema_version()
+        version, references = _references.get(database, (None, None))
+        if references is None or version != schema_version:
+            references = defaultdict(list)
+            for reference in self.execute(_REFERENCES_QUERY):
+                references[reference[2:4]].append(reference)
+            _references[database] = schema_version, references
+        return list(references.get((table_name, column_name), []))
 
     def quote_query(self, query, args=()):
         """Prepare a query for executing it.
@@ -409,6 +594,28 @@ class StoqlibStore(Store):
             stmt = stmt.decode()
         return stmt
 
+    def copy_from(self, table_name, columns, fp):
+        """Copy rows from a file into a table using COPY FROM STDIN
+
+        This is a lot faster than inserting the rows one by one, but note
+        that rules are not applied to the copied rows. Pending changes are
+        flushed before copying, so the rows can reference objects created
+        in this store.
+
+        :param table_name: the name of the table
+        :param columns: the names of the columns present in the file
+        :param fp: a file object with the rows, in csv format. ``\\N`` is
+            used to represent ``NULL``
+        """
+        self.flush()
+        cursor = self._connection.build_raw_cursor()
+        try:
+            cursor.copy_expert(
+                "COPY %s (%s) FROM STDIN WITH (FORMAT csv, NULL '\\N')" % (
+                    table_name, ', '.join(columns)), fp)
+        finally:
+            cursor.close()
+
     def maybe_remove(self, obj):
         """Maybe remove an object from the database
 
@@ -455,6 +662,12 @@ class StoqlibStore(Store):
         super(StoqlibStore, self).commit()
         trace('transaction_commit', self)
 
+        # The hooks called when flushing can also change objects, so this
+        # must be done after committing
+        changed_classes = set(obj_info.cls_info.cls
+                              for dirties in self._dirties
+                              for obj_info, pending in dirties)
+
         self._savepoints = []
         self._dirties = [[]]
 
@@ -462,6 +675,10 @@ class StoqlibStore(Store):
         for obj in touched_objs:
             autoreload_object(obj)
 
+        if changed_classes:
+            StoqlibStore.committed_changes += 1
+            DomainCommittedEvent.emit(self, changed_classes)
+
         if close:
             self.close()
 
@@ -536,6 +753,10 @@ class StoqlibStore(Store):
         trace('transaction_close', self)
         self._check_obsolete()
 
+        # Do not keep the parameter objects of this store alive
+        from stoqlib.lib.parameters import sysparam
+        sysparam.clear_store_cache(self)
+
         super(StoqlibStore, self).close()
         self.obsolete = True
 
@@ -667,11 +888,28 @@ class StoqlibStore(Store):
         self.execute("SET application_name = '%s - %s - %s'" % (
             (appname.lower(), get_hostname(), os.getpid())))
 
+    def _get_schema_version(self):
+        # Read only once per store, so other processes upgrading the
+        # database are noticed by the stores created after that
+        if self._schema_version is None:
+            patch_id, plugins = self.execute(_SCHEMA_VERSION_QUERY).get_one()
+            self._schema_version = (patch_id, tuple(plugins or ()))
+        return self._schema_version
+
     def _check_obsolete(self):
         if self.obsolete:
             raise InterfaceError("This transaction has already been closed")
 
 
+def clear_schema_cache():
+    """Clears the information about the database schema cached by the stores
+
+    This needs to be called after the schema changes, for instance, when
+    new tables referencing others are created.
+    """
+    _references.clear()
+
+
 def get_default_store():
     """This function returns the default/primary store.
     Notice that this store is considered read-only inside Stoqlib
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+"""Indexes for the text columns filtered by the searches
+
+The text filters of :class:`stoqlib.database.queryexecuter.QueryExecuter`
+compare ``stoq_normalize_string(column)`` with the searched words. Those
+comparisons can only use an index created on the same expression, which
+is what this module creates and maintains.
+
+There are two kinds of indexes:
+
+* :data:`TRIGRAM`: a GIN index using the pg_trgm operators, which
+  accelerates the ``LIKE '%word%'`` comparisons. Used by most columns
+  (names, documents, descriptions, etc).
+* :data:`FULL_TEXT`: a GIN index on a tsvector, used by the columns with
+  long free text (like notes), where the words are matched by their
+  prefixes instead of anywhere inside the text.
+"""
+
+import hashlib
+import logging
+
+from storm.info import get_cls_info
+from storm.properties import PropertyColumn
+
+log = logging.getLogger(__name__)
+
+TRIGRAM = u'trigram'
+FULL_TEXT = u'full-text'
+
+#: The text search configuration used by the full text indexes. The
+#: text is already normalized by stoq_normalize_string, so no language
+#: specific processing is done
+TS_CONFIG = u'simple'
+
+#: The columns with long free text, matched by full text search.
+#: All the other ones are matched by trigrams
+FULL_TEXT_COLUMNS = frozenset([
+    (u'calls', u'message'),
+    (u'person', u'notes'),
+    (u'sellable', u'notes'),
+    (u'work_order', u'defect_detected'),
+    (u'work_order', u'defect_reported'),
+])
+
+#: The columns filtered by the searches, which should be indexed. Note that
+#: the indexes of new columns need to be created by a database patch
+SEARCH_COLUMNS = [
+    (u'bank_account', u'bank_account'),
+    (u'branch', u'acronym'),
+    (u'branch', u'name'),
+    (u'branch_station', u'name'),
+    (u'calls', u'description'),
+    (u'calls', u'message'),
+    (u'cfop_data', u'code'),
+    (u'cfop_data', u'description'),
+    (u'client_category', u'name'),
+    (u'company', u'cnpj'),
+    (u'company', u'fancy_name'),
+    (u'cost_center', u'description'),
+    (u'cost_center', u'name'),
+    (u'credit_check_history', u'identifier'),
+    (u'delivery', u'tracking_code'),
+    (u'employee', u'registry_number'),
+    (u'employee_role', u'name'),
+    (u'event', u'description'),
+    (u'grid_attribute', u'description'),
+    (u'grid_group', u'description'),
+    (u'individual', u'cpf'),
+    (u'individual', u'rg_number'),
+    (u'loan', u'removed_by'),
+    (u'login_user', u'username'),
+    (u'message', u'content'),
+    (u'payment', u'description'),
+    (u'payment', u'payment_number'),
+    (u'person', u'email'),
+    (u'person', u'mobile_number'),
+    (u'person', u'name'),
+    (u'person', u'phone_number'),
+    (u'product_manufacturer', u'name'),
+    (u'product_tax_template', u'name'),
+    (u'production_order', u'description'),
+    (u'sale_token', u'code'),
+    (u'sale_token', u'name'),
+    (u'sellable', u'barcode'),
+    (u'sellable', u'code'),
+    (u'sellable', u'description'),
+    (u'sellable_category', u'description'),
+    (u'sellable_unit', u'description'),
+    (u'stock_decrease', u'reason'),
+    (u'till_entry', u'description'),
+    (u'user_profile', u'name'),
+    (u'work_order', u'description'),
+]
+
+
+def get_search_column(table_field):
+    """Gets the table and column of a table field
+
+    Columns of class aliases (see :class:`storm.info.ClassAlias`) are
+    resolved to the table of the aliased class.
+
+    :param table_field: a column or any other expression
+    :returns: a (table, column) tuple or ``None`` if *table_field* is
+      not a column
+    """
+    if not isinstance(table_field, PropertyColumn):
+        return None
+    cls = get_cls_info(table_field.cls).cls
+    table = getattr(cls, '__storm_table__', None)
+    if not isinstance(table, str):
+        return None
+    return table, table_field.name
+
+
+def get_search_mode(table_field):
+    """Gets how the searched words should be matched for a table field
+
+    :param table_field: a column or any other expression
+    :returns: :data:`FULL_TEXT` or :data:`TRIGRAM`
+    """
+    if get_search_column(table_field) in FULL_TEXT_COLUMNS:
+        return FULL_TEXT
+    return TRIGRAM
+
+
+def get_index_name(table, column):
+    """Gets the name of the search index of a column
+
+    :param table: the name of the table
+    :param column: the name of the column
+    :returns: the name of the index
+    """
+    if (table, column) in FULL_TEXT_COLUMNS:
+        suffix = u'fts'
+    else:
+        suffix = u'trgm'
+    name = u'%s_%s_search_%s_idx' % (table, column, suffix)
+    # Postgres truncates identifiers longer than 63 characters
+    if len(name) > 63:
+        digest = hashlib.md5(name.encode()).hexdigest()[:8]
+        name = u'%s_%s' % (name[:54], digest)
+    return name
+
+
+def get_index_statement(table, column):
+    """Gets the statement which creates the search index of a column
+
+    :param table: the name of the table
+    :param column: the name of the column
+    :returns: a CREATE INDEX statement
+    """
+    normalized = u'stoq_normalize_string(%s)' % (column, )
+    if (table, column) in FULL_TEXT_COLUMNS:
+        expression = u"to_tsvector('%s', %s)" % (TS_CONFIG, normalized)
+    else:
+        expression = u'%s gin_trgm_ops' % (normalized, )
+    return u'CREATE INDEX %s ON %s USING gin (%s)' % (
+        get_index_name(table, column), table, expression)
+
+
+def get_missing_search_indexes(store, columns=None):
+    """Gets the columns whose search indexes were not created yet
+
+    :param store: a store
+    :param columns: a list of (table, column) tuples. Defaults to
+      :data:`SEARCH_COLUMNS`
+    :returns: a list of (table, column) tuples
+    """
+    if columns is None:
+        columns = SEARCH_COLUMNS
+    existing = set(name for name, in store.execute(
+        u"SELECT indexname FROM pg_indexes WHERE schemaname = 'public'"))
+    return [(table, column) for table, column in columns
+            if get_index_name(table, column) not in existing]
+
+
+def create_search_indexes(store, columns=None):
+    """Creates the search indexes which are missing
+
+    Creating an index blocks the writes on its table until it is done,
+    which may take some time on big tables.
+
+    :param store: a store
+    :param columns: a list of (table, column) tuples. Defaults to
+      :data:`SEARCH_COLUMNS`
+    :returns: the names of the created indexes
+    """
+    created = []
+    for table, column in get_missing_search_indexes(store, columns):
+        log.info('Creating search index for %s.%s', table, column)
+        store.execute(get_index_statement(table, column))
+        created.append(get_index_name(table, column))
+    return created
@@ -127,6 +127,36 @@ def _create_empty_database(store, dbname, ifNotExists=False):
     return True
 
 
+def _create_database_from_template(store, dbname, template):
+    for name in [dbname, template]:
+        if not validate_database_name(name):
+            raise ValueError(
+                "Database names can only contain alpha numeric and underscores")
+
+    database = store.get_database()
+    raw_conn = database.raw_connect()
+    cur = raw_conn.cursor()
+    cur.execute('COMMIT')
+    cur.execute('CREATE DATABASE %s TEMPLATE %s' % (dbname, template))
+    cur.close()
+    del cur, raw_conn, database
+
+
+def _rename_database(store, dbname, new_name):
+    for name in [dbname, new_name]:
+        if not validate_database_name(name):
+            raise ValueError(
+                "Database names can only contain alpha numeric and underscores")
+
+    database = store.get_database()
+    raw_conn = database.raw_connect()
+    cur = raw_conn.cursor()
+    cur.execute('COMMIT')
+    cur.execute('ALTER DATABASE %s RENAME TO %s' % (dbname, new_name))
+    cur.close()
+    del cur, raw_conn, database
+
+
 def check_extensions(cursor=None, store=None):
     """
     Check if all required extensions can be installed.
@@ -510,6 +540,37 @@ class DatabaseSettings(object):
         _create_empty_database(super_store, dbname)
         super_store.close()
 
+    def clone_database(self, template, dbname):
+        """Creates a database as a copy of another one.
+
+        If the database already exists, it will be dropped first. Note that
+        there cannot be any connection to the template while it's copied.
+
+        :param template: name of the database to be copied.
+        :param dbname: name of the new database.
+        """
+        log.info("Cloning database %s to %s" % (template, dbname))
+        self.drop_database(dbname)
+        super_store = self.create_super_store()
+        try:
+            _create_database_from_template(super_store, dbname, template)
+        finally:
+            super_store.close()
+
+    def rename_database(self, dbname, new_name):
+        """Renames a database.
+
+        Note that there cannot be any connection to the database.
+
+        :param dbname: name of the database.
+        :param new_name: the new name of the database.
+        """
+        super_store = self.create_super_store()
+        try:
+            _rename_database(super_store, dbname, new_name)
+        finally:
+            super_store.close()
+
     def execute_sql(self, filename, lock_database=False):
         """Inserts raw SQL commands into the database read from a file.
 
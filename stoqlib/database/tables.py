@@ -74,7 +74,8 @@ _tables = [
                 "ClientSalaryHistory",
                 "CreditCheckHistory",
                 "UserBranchAccess"]),
-    ('synchronization', ["BranchSynchronization"]),
+    ('synchronization', ["BranchSynchronization",
+                         "ChangeFeedConsumer"]),
     ('station', ['StationType', "BranchStation"]),
     ('till', ["Till", "TillEntry", 'TillSummary']),
     ('token', ['AccessToken']),
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+import mock
+
+from stoqlib.database.changefeed import (START, ChangeFeedCursor,
+                                         get_changes, get_consumer_cursor,
+                                         get_tracked_tables, iter_changes,
+                                         prune_tombstones,
+                                         set_consumer_cursor)
+from stoqlib.domain.test.domaintest import DomainTest
+
+
+class ChangeFeedTest(DomainTest):
+
+    def setUp(self):
+        super(ChangeFeedTest, self).setUp()
+        # The changes of the test are on the current transaction, which is
+        # still running, so pretend it already finished
+        self.txid = self.store.execute(u"SELECT txid_current()").get_one()[0]
+        patcher = mock.patch('stoqlib.database.changefeed._get_horizon',
+                             return_value=self.txid + 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_cursor_before(self, obj):
+        return ChangeFeedCursor(self.txid, obj.te_id - 1)
+
+    def test_get_tracked_tables(self):
+        tables = get_tracked_tables(self.store)
+        self.assertIn(u'client_category', tables)
+        self.assertIn(u'sale', tables)
+        self.assertNotIn(u'transaction_entry', tables)
+        self.assertNotIn(u'change_feed_consumer', tables)
+
+    def test_get_changes(self):
+        category = self.create_client_category(name=u'Gold')
+        self.store.flush()
+        cursor = self._get_cursor_before(category)
+        tables = [u'client_category']
+
+        changes, new_cursor = get_changes(self.store, cursor, tables=tables)
+        self.assertEqual(len(changes), 1)
+        change = changes[0]
+        self.assertEqual(change.table, u'client_category')
+        self.assertEqual(change.id, str(category.id))
+        self.assertFalse(change.deleted)
+        self.assertEqual(change.data[u'name'], u'Gold')
+        self.assertEqual(change.cursor, (self.txid, category.te_id))
+        self.assertEqual(new_cursor, change.cursor)
+
+        # Nothing changed after the cursor
+        self.assertEqual(get_changes(self.store, new_cursor, tables=tables),
+                         ([], new_cursor))
+
+        category.name = u'Platinum'
+        self.store.flush()
+        changes, new_cursor = get_changes(self.store, cursor, tables=tables)
+        self.assertEqual([c.data[u'name'] for c in changes], [u'Platinum'])
+
+        category_id = category.id
+        self.store.remove(category)
+        self.store.flush()
+        changes, new_cursor = get_changes(self.store, cursor, tables=tables)
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0].table, u'client_category')
+        self.assertEqual(changes[0].id, str(category_id))
+        self.assertTrue(changes[0].deleted)
+        self.assertIsNone(changes[0].data)
+
+        # The tombstone is filtered by the tables too
+        self.assertEqual(
+            get_changes(self.store, cursor, tables=[u'sale'])[0], [])
+
+    def test_get_changes_horizon(self):
+        category = self.create_client_category()
+        self.store.flush()
+        cursor = self._get_cursor_before(category)
+        with mock.patch('stoqlib.database.changefeed._get_horizon',
+                        return_value=self.txid):
+            self.assertEqual(get_changes(self.store, cursor), ([], cursor))
+
+    def test_iter_changes(self):
+        categories = [self.create_client_category(name=u'Category %d' % i)
+                      for i in range(5)]
+        self.store.flush()
+        cursor = self._get_cursor_before(categories[0])
+
+        batches = list(iter_changes(self.store, cursor, batch_size=2,
+                                    tables=[u'client_category']))
+        self.assertEqual([len(changes) for changes, c in batches], [2, 2, 1])
+        self.assertEqual(
+            [change.data[u'name'] for changes, c in batches
+             for change in changes],
+            [u'Category %d' % i for i in range(5)])
+        self.assertEqual([c for changes, c in batches],
+                         [changes[-1].cursor for changes, c in batches])
+
+        # Resuming from the cursor of a batch returns the following ones
+        changes, new_cursor = get_changes(self.store, batches[0][1], limit=10,
+                                          tables=[u'client_category'])
+        self.assertEqual([change.data[u'name'] for change in changes],
+                         [u'Category %d' % i for i in range(2, 5)])
+
+    def test_consumer_cursor(self):
+        self.assertEqual(get_consumer_cursor(self.store, u'warehouse'), START)
+        set_consumer_cursor(self.store, u'warehouse', ChangeFeedCursor(10, 2))
+        set_consumer_cursor(self.store, u'branch', ChangeFeedCursor(1, 1))
+        self.assertEqual(get_consumer_cursor(self.store, u'warehouse'),
+                         (10, 2))
+        set_consumer_cursor(self.store, u'warehouse', ChangeFeedCursor(11, 1))
+        self.assertEqual(get_consumer_cursor(self.store, u'warehouse'),
+                         (11, 1))
+        self.assertEqual(get_consumer_cursor(self.store, u'branch'), (1, 1))
+
+    def _count_tombstones(self):
+        return self.store.execute(
+            u"SELECT COUNT(*) FROM change_feed_tombstone").get_one()[0]
+
+    def test_prune_tombstones(self):
+        self.store.execute(u"DELETE FROM change_feed_consumer")
+        categories = [self.create_client_category() for i in range(3)]
+        self.store.flush()
+        te_ids = [category.te_id for category in categories]
+        for category in categories:
+            self.store.remove(category)
+        self.store.flush()
+        # The tombstones of the other tests are not interesting here
+        self.store.execute(u"DELETE FROM change_feed_tombstone "
+                           u"WHERE NOT te_id = ANY(?)", (te_ids, ))
+        self.assertEqual(self._count_tombstones(), 3)
+
+        # Only the tombstones read by all the consumers are removed
+        set_consumer_cursor(self.store, u'warehouse',
+                            ChangeFeedCursor(self.txid, te_ids[1]))
+        set_consumer_cursor(self.store, u'branch',
+                            ChangeFeedCursor(self.txid, te_ids[0]))
+        self.store.flush()
+        self.assertEqual(prune_tombstones(self.store), 1)
+        self.assertEqual(self._count_tombstones(), 2)
+        self.assertEqual(prune_tombstones(self.store), 0)
+
+        set_consumer_cursor(self.store, u'branch',
+                            ChangeFeedCursor(self.txid, te_ids[2]))
+        self.store.flush()
+        self.assertEqual(prune_tombstones(self.store), 1)
+        self.assertEqual(self._count_tombstones(), 1)
+
+        # Without consumers nobody needs them
+        self.store.execute(u"DELETE FROM change_feed_consumer")
+        self.assertEqual(prune_tombstones(self.store), 1)
+        self.assertEqual(self._count_tombstones(), 0)
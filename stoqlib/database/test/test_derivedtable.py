@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+import collections
+import unittest
+
+import mock
+
+from stoqlib.database.derivedtable import DerivedTable
+
+_Divergence = collections.namedtuple(
+    '_Divergence', ['table', 'id', 'expected_total', 'total'])
+
+
+class TestDerivedTable(unittest.TestCase):
+
+    def setUp(self):
+        self.derived_table = DerivedTable(
+            u'totals', _Divergence, keys=['id'], columns=['total'],
+            checks=[(u'total', u'CHECK TOTAL'),
+                    (u'branch_total', u'CHECK BRANCH TOTAL')],
+            rebuild_function=u'rebuild_totals')
+
+    def test_check(self):
+        rows = {u'CHECK TOTAL': [(1, 10, 7), (2, 5, None)],
+                u'CHECK BRANCH TOTAL': [(3, None, 1)]}
+        store = mock.Mock()
+        store.execute.side_effect = lambda query: rows[query]
+        self.assertEqual(self.derived_table.check(store), [
+            (u'total', 1, 10, 7), (u'total', 2, 5, None),
+            (u'branch_total', 3, None, 1)])
+
+        rows = {u'CHECK TOTAL': [], u'CHECK BRANCH TOTAL': []}
+        self.assertEqual(self.derived_table.check(store), [])
+
+    def test_rebuild(self):
+        store = mock.Mock()
+        self.derived_table.rebuild(store)
+        store.execute.assert_called_once_with(u"SELECT rebuild_totals()")
+
+    def test_format_divergence(self):
+        self.assertEqual(
+            self.derived_table.format_divergence(
+                _Divergence(u'total', 1, 10, None)),
+            'total: id 1: total None (expected 10)')
@@ -28,7 +28,8 @@ import datetime
 
 from storm.expr import Cast, Sum
 
-from stoqlib.database.expr import Case, Between, GenerateSeries, Field, Over
+from stoqlib.database.expr import (Case, Between, DateRange, GenerateSeries,
+                                   Field, Over)
 from stoqlib.domain.event import Event
 from stoqlib.domain.test.domaintest import DomainTest
 
@@ -59,6 +60,31 @@ class ViewableTest(DomainTest):
               event_type=Event.TYPE_SYSTEM, description=u'')
         self.assertEqual(self.store.find(Event, query).count(), 2)
 
+    def test_date_range(self):
+        self.clean_domain([Event])
+
+        for date in [datetime.datetime(2012, 1, 4, 23, 59),
+                     datetime.datetime(2012, 1, 5),
+                     datetime.datetime(2012, 1, 10, 23, 59),
+                     datetime.datetime(2012, 1, 11)]:
+            Event(store=self.store, date=date,
+                  event_type=Event.TYPE_SYSTEM, description=u'')
+
+        a = datetime.date(2012, 1, 5)
+        b = datetime.date(2012, 1, 10)
+        for start, end, count in [(a, b, 2),
+                                  (a, a, 1),
+                                  (b, b, 1),
+                                  (a, None, 3),
+                                  (None, b, 3),
+                                  (None, None, 4),
+                                  # The time is ignored
+                                  (datetime.datetime(2012, 1, 5, 12),
+                                   datetime.datetime(2012, 1, 10, 12), 2)]:
+            query = DateRange(Event.date, start, end)
+            self.assertEqual(self.store.find(Event, query).count(), count,
+                             (start, end))
+
     def test_generate_series_date(self):
         a = datetime.datetime(2012, 1, 1)
         b = datetime.datetime(2012, 4, 1)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+import mock
+
+from stoqlib.database.migration import (StoqlibSchemaMigration,
+                                        TE_UPDATE_ROWS,
+                                        TE_UPDATE_TRANSACTION,
+                                        TE_UPDATE_TRANSACTION_MIN_VERSION)
+from stoqlib.database.settings import get_database_version
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.exceptions import DatabaseError
+
+
+class TestTransactionEntryUpdateMode(DomainTest):
+
+    def _get_te(self, obj):
+        # The ctid changes every time a new version of the row is written
+        return self.store.execute(
+            u"SELECT ctid, txid, sync_status FROM transaction_entry "
+            u"WHERE id = ?", (obj.te_id, )).get_one()
+
+    def _set_te_synced(self, obj):
+        # Pretend the entry was changed and synced on another transaction
+        self.store.execute(
+            u"UPDATE transaction_entry SET txid = 0, sync_status = '1' "
+            u"WHERE id = ?", (obj.te_id, ))
+
+    def _rename(self, obj, name):
+        obj.name = name
+        self.store.flush()
+
+    def test_rows(self):
+        migration = StoqlibSchemaMigration()
+        self.assertEqual(migration.get_te_update_mode(self.store),
+                         TE_UPDATE_ROWS)
+
+        category = self.create_client_category()
+        self.store.flush()
+        self._set_te_synced(category)
+        self._rename(category, u'Gold')
+        ctid, txid, sync_status = self._get_te(category)
+        self.assertNotEqual(txid, 0)
+        self.assertEqual(sync_status, u'0')
+
+        # Every update writes the entry again
+        self._rename(category, u'Platinum')
+        self.assertNotEqual(self._get_te(category)[0], ctid)
+
+    def test_transaction(self):
+        if (get_database_version(self.store) <
+                TE_UPDATE_TRANSACTION_MIN_VERSION):
+            self.skipTest("needs PostgreSQL 10 or newer")
+
+        migration = StoqlibSchemaMigration()
+        migration.set_te_update_mode(self.store, TE_UPDATE_TRANSACTION)
+        self.assertEqual(migration.get_te_update_mode(self.store),
+                         TE_UPDATE_TRANSACTION)
+
+        category = self.create_client_category()
+        self.store.flush()
+        self._set_te_synced(category)
+        self._rename(category, u'Gold')
+        ctid, txid, sync_status = self._get_te(category)
+        self.assertNotEqual(txid, 0)
+        self.assertEqual(sync_status, u'0')
+
+        # The entry was already updated on this transaction
+        self._rename(category, u'Platinum')
+        self.assertEqual(self._get_te(category), (ctid, txid, sync_status))
+
+        # Updating many rows at once updates their entries too
+        categories = [self.create_client_category(name=u'Category %d' % i)
+                      for i in range(3)]
+        self.store.flush()
+        for c in categories:
+            self._set_te_synced(c)
+        self.store.execute(
+            u"UPDATE client_category SET max_discount = 10 "
+            u"WHERE name LIKE 'Category %'")
+        for c in categories:
+            self.assertEqual(self._get_te(c)[1:], (txid, u'0'))
+
+        migration.set_te_update_mode(self.store, TE_UPDATE_ROWS)
+        self.assertEqual(migration.get_te_update_mode(self.store),
+                         TE_UPDATE_ROWS)
+        self._rename(category, u'Gold')
+        self.assertNotEqual(self._get_te(category)[0], ctid)
+
+    def test_invalid_mode(self):
+        migration = StoqlibSchemaMigration()
+        with self.assertRaises(ValueError):
+            migration.set_te_update_mode(self.store, u'statement')
+
+    def test_transaction_old_server(self):
+        migration = StoqlibSchemaMigration()
+        with mock.patch('stoqlib.database.migration.get_database_version',
+                        return_value=(9, 5, 0)):
+            with self.assertRaises(DatabaseError):
+                migration.set_te_update_mode(self.store,
+                                             TE_UPDATE_TRANSACTION)
+        self.assertEqual(migration.get_te_update_mode(self.store),
+                         TE_UPDATE_ROWS)
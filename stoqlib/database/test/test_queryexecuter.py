@@ -23,12 +23,23 @@
 ##
 """ This module tests stoq/database/database.py """
 
+import time
+
 import mock
+from storm.expr import Coalesce, Func, Select
+import psycopg2.extensions
 
 from stoqlib.domain.test.domaintest import DomainTest
-from stoqlib.domain.person import ClientCategory
-from stoqlib.database.queryexecuter import (QueryExecuter,
-                                            StringQueryState)
+from stoqlib.domain.person import ClientCategory, Person
+from stoqlib.domain.product import (ProductSupplierInfo, ProductStockItem,
+                                    Storable, Product, StockTransactionHistory)
+from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.views import ProductFullStockView
+from stoqlib.database.queryexecuter import (AsyncQueryOperation,
+                                            QueryExecuter,
+                                            StringQueryState,
+                                            _OperationExecuter)
+from stoqlib.database.runtime import StoqlibStore
 
 
 class QueryExecuterTest(DomainTest):
@@ -38,6 +49,21 @@ class QueryExecuterTest(DomainTest):
         self.qe.set_search_spec(ClientCategory)
         self.sfilter = mock.Mock()
         self.qe.set_filter_columns(self.sfilter, ['name'])
+        self._executers = []
+
+    def tearDown(self):
+        # Close the connections of the executers created by the tests
+        for executer in self._executers:
+            for worker in executer._workers:
+                worker._conn.close()
+        DomainTest.tearDown(self)
+
+    def _get_executer(self, start=True):
+        executer = _OperationExecuter(workers=1)
+        self._executers.append(executer)
+        if start:
+            executer.start()
+        return executer
 
     def _search_async(self, states):
         op = self.qe.search_async(states)
@@ -100,6 +126,182 @@ class QueryExecuterTest(DomainTest):
         self.assertEqual(self._search_string_not(u'eye').count(), 0)
         self.assertEqual(self._search_string_not(u'moon 120').count(), 1)
 
+    def test_string_query_coalesce(self):
+        self.qe = QueryExecuter(self.store)
+        self.qe.set_search_spec(Person)
+        self.qe.set_filter_columns(self.sfilter,
+                                   [Coalesce(Person.name, u'')])
+        self.create_person(u'Unique Person Name')
+        self.create_person(u'')
+
+        # The coalesce is removed, so the index can be used
+        self.assertEqual(self._search_string_all(u'unique name').count(), 1)
+        self.assertEqual(self._search_string_exactly(u'person n').count(), 1)
+        # But not when it would change the result
+        self.assertEqual(
+            self._search_string_not(u'unique').find(name=u'').count(), 1)
+
+    def test_string_query_full_text(self):
+        self.qe = QueryExecuter(self.store)
+        self.qe.set_search_spec(Person)
+        self.qe.set_filter_columns(self.sfilter, ['notes'])
+        for notes in [u'Ligar amanhã, cliente preferencial',
+                      u'Cliente pediu orçamento de 0.5 litro',
+                      u'Não ligar']:
+            person = self.create_person()
+            person.notes = notes
+
+        self.assertEqual(self._search_string_all(u'ligar').count(), 2)
+        # Words are matched by their prefixes, without accents
+        self.assertEqual(self._search_string_all(u'cliente pref').count(), 1)
+        self.assertEqual(self._search_string_all(u'orcam cli').count(), 1)
+        self.assertEqual(self._search_string_all(u'nao').count(), 1)
+        self.assertEqual(self._search_string_all(u'igar').count(), 0)
+        # Words that are not alphanumeric are still searched with LIKE
+        self.assertEqual(self._search_string_all(u'pediu 0.5').count(), 1)
+        self.assertEqual(self._search_string_exactly(u'igar a').count(), 1)
+
+    def test_rank_results(self):
+        self.create_client_category(u'EYE SUN STONE 120 0.5')
+        self.create_client_category(u'EYE MOON FLARE 110 0.5')
+        self.create_client_category(u'EYE MOON')
+        self.qe.set_order_by(ClientCategory.name)
+
+        self.assertEqual(
+            [c.name for c in self._search_string_all(u'eye')],
+            [u'EYE MOON', u'EYE MOON FLARE 110 0.5', u'EYE SUN STONE 120 0.5'])
+
+        self.qe.set_rank_results(True)
+        self.assertEqual(
+            [c.name for c in self._search_string_all(u'eye sun stone')],
+            [u'EYE SUN STONE 120 0.5'])
+        self.assertEqual(
+            [c.name for c in self._search_string_all(u'eye moon')],
+            [u'EYE MOON', u'EYE MOON FLARE 110 0.5'])
+        self.assertEqual(
+            [c.name for c in self._search_string_all(u'eye stone 0.5')],
+            [u'EYE SUN STONE 120 0.5'])
+        self.assertEqual(
+            [c.name for c in self._search_string_all(u'eye 0.5')],
+            [u'EYE SUN STONE 120 0.5', u'EYE MOON FLARE 110 0.5'])
+
+    def _create_stock_search(self):
+        self.clean_domain([StockTransactionHistory, ProductSupplierInfo,
+                           ProductStockItem, Storable, Product])
+        branch = self.create_branch()
+        for i in range(5):
+            self.create_product(branch=branch, stock=2)
+        self.create_product(branch=branch, stock=10)
+
+        qe = QueryExecuter(self.store)
+        qe.set_search_spec(ProductFullStockView)
+        return qe, qe.search().order_by(ProductFullStockView.stock)
+
+    def test_get_page_with_summary(self):
+        qe, result = self._create_stock_search()
+
+        with mock.patch.object(
+                ProductFullStockView, 'post_search_callback') as post:
+            items, summary = qe.get_page_with_summary(result, 0, 2)
+        self.assertFalse(post.called)
+        self.assertEqual([item.stock for item in items], [2, 2])
+        self.assertEqual((summary.count, summary.sum), (6, 20))
+
+        # The summary is the same for all the pages
+        items, summary = qe.get_page_with_summary(result, 4, 10)
+        self.assertEqual([item.stock for item in items], [2, 10])
+        self.assertEqual((summary.count, summary.sum), (6, 20))
+
+        empty = result.find(Sellable.description == u'Does not exist')
+        items, summary = qe.get_page_with_summary(empty, 0, 2)
+        self.assertEqual(items, [])
+        self.assertEqual((summary.count, summary.sum), (0, None))
+
+        qe.set_search_spec(ClientCategory)
+        self.assertIsNone(qe.get_page_with_summary(
+            self.store.find(ClientCategory), 0, 2))
+
+    def test_summary_cache(self):
+        qe, result = self._create_stock_search()
+        summary = qe.get_post_result(result)
+        self.assertEqual((summary.count, summary.sum), (6, 20))
+
+        with mock.patch.object(
+                ProductFullStockView, 'post_search_callback',
+                wraps=ProductFullStockView.post_search_callback) as post:
+            # Sorting the results again does not change the summary
+            resorted = result.order_by(ProductFullStockView.description)
+            self.assertIs(qe.get_post_result(resorted), summary)
+            items, page_summary = qe.get_page_with_summary(resorted, 0, 2)
+            self.assertIs(page_summary, summary)
+            self.assertEqual(len(items), 2)
+            self.assertFalse(post.called)
+
+            # But filtering does
+            filtered = result.find(Sellable.description == u'Does not exist')
+            self.assertEqual(qe.get_post_result(filtered).count, 0)
+            self.assertEqual(post.call_count, 1)
+
+            # And so does committing something
+            with mock.patch.object(StoqlibStore, 'committed_changes',
+                                   StoqlibStore.committed_changes + 1):
+                self.assertIsNot(qe.get_post_result(result), summary)
+                self.assertEqual(post.call_count, 2)
+                qe.get_post_result(result)
+                self.assertEqual(post.call_count, 2)
+
+                # Summaries older than the timeout are not used
+                with mock.patch('stoqlib.database.queryexecuter.time.time',
+                                return_value=time.time() + 3600):
+                    qe.get_post_result(result)
+                self.assertEqual(post.call_count, 3)
+
+    def test_get_ordered_result(self):
+        categories = [self.create_client_category(name=u'Keyset %d' % i)
+                      for i in range(6)]
+        for category, discount in zip(categories, [5, None, 10, 5, None, 0]):
+            category.max_discount = discount
+        ids = [category.id for category in categories]
+        result = self.store.find(ClientCategory, ClientCategory.id.is_in(ids))
+
+        # The NULLs go after the other values and the id breaks the ties
+        expected = sorted(categories, key=lambda c: (
+            c.max_discount is None, c.max_discount or 0, c.id))
+        for descending in [False, True]:
+            if descending:
+                expected.reverse()
+            ordered = self.qe.get_ordered_result(result, 'max_discount',
+                                                 descending=descending)
+            self.assertEqual(list(ordered), expected)
+
+            for i, category in enumerate(expected):
+                key = self.qe.get_sort_key(category, 'max_discount')
+                self.assertEqual(key, (category.max_discount, category.id))
+                after = self.qe.get_ordered_result(
+                    result, 'max_discount', descending=descending, after=key)
+                self.assertEqual(list(after), expected[i + 1:])
+                before = self.qe.get_ordered_result(
+                    result, 'max_discount', descending=descending, after=key,
+                    backwards=True)
+                self.assertEqual(list(before), expected[:i][::-1])
+
+        # The original result is not changed
+        self.assertEqual(result.count(), 6)
+
+    def test_get_ordered_result_grouped(self):
+        qe, result = self._create_stock_search()
+        ordered = qe.get_ordered_result(result, 'stock')
+        items = list(ordered)
+        self.assertEqual([item.stock for item in items], [2] * 5 + [10])
+
+        # The stock is an aggregate, the rows are found by it anyway
+        key = qe.get_sort_key(items[2], 'stock')
+        after = qe.get_ordered_result(result, 'stock', after=key)
+        self.assertEqual(list(after), items[3:])
+        before = qe.get_ordered_result(result, 'stock', after=key,
+                                       backwards=True)
+        self.assertEqual(list(before), items[:2][::-1])
+
     def test_search_async(self):
         self.assertEqual(self.store.find(ClientCategory).count(), 0)
         try:
@@ -132,6 +334,102 @@ class QueryExecuterTest(DomainTest):
                 len(self._search_string_not_async(u'eye')), 0)
             self.assertEqual(
                 len(self._search_string_not_async(u'moon 120')), 1)
+
+            # The ranked results are in the same order as the ones of search,
+            # including the ties broken by the order set by set_order_by
+            self.qe.set_rank_results(True)
+            self.qe.set_order_by(ClientCategory.name)
+            self.assertEqual(
+                [c.name for c in self._search_string_all_async(u'eye 120')],
+                [c.name for c in self._search_string_all(u'eye 120')])
         finally:
             self.clean_domain([ClientCategory])
             self.store.commit()
+
+    def test_search_async_metrics(self):
+        executer = self.qe._operation_executer
+        stats = executer.get_stats()
+        op = self.qe.search_async()
+        executer._queue.join()
+
+        self.assertEqual(op.status, op.STATUS_FINISHED)
+        self.assertTrue(op.get_wait_time() >= 0)
+        self.assertTrue(op.get_execution_time() >= 0)
+        self.assertEqual(executer.get_stats()['executed'],
+                         stats['executed'] + 1)
+
+    def test_search_async_cancel(self):
+        op = self.qe.search_async()
+        op.cancel()
+        self.qe._operation_executer._queue.join()
+        self.assertEqual(op.status, op.STATUS_CANCELLED)
+
+    def test_search_async_cancel_finished(self):
+        op = self.qe.search_async()
+        self.qe._operation_executer._queue.join()
+        self.assertEqual(op.status, op.STATUS_FINISHED)
+
+        # Cancelling an operation that already finished does nothing
+        op.cancel()
+        self.assertEqual(op.status, op.STATUS_FINISHED)
+        self.assertEqual(list(op.get_result()), [])
+
+    def test_search_async_close(self):
+        executer = self._get_executer()
+        conn = executer._workers[0]._conn
+
+        def count_cursors():
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM pg_cursors")
+            count = cursor.fetchone()[0]
+            conn.rollback()
+            return count
+
+        self.qe = QueryExecuter(self.store)
+        self.qe.set_search_spec(Person)
+        self.qe._operation_executer = executer
+        op = self.qe.search_async(fetch_size=1)
+        executer._queue.join()
+
+        # The WITH HOLD cursor is kept open until the results are closed,
+        # even if they are never iterated
+        with op.get_result():
+            self.assertEqual(count_cursors(), 1)
+        self.assertEqual(count_cursors(), 0)
+
+    def test_search_async_timeout(self):
+        executer = self._get_executer()
+        conn = executer._workers[0]._conn
+        conn.cursor().execute("SET statement_timeout = 10")
+        conn.commit()
+
+        resultset = self.store.find(ClientCategory)
+        op = AsyncQueryOperation(self.store, resultset,
+                                 Select(Func('pg_sleep', 1)))
+        executer.schedule(op)
+        executer._queue.join()
+
+        self.assertEqual(op.status, op.STATUS_FAILED)
+        self.assertIsInstance(op.error,
+                              psycopg2.extensions.QueryCanceledError)
+        self.assertEqual(executer.get_stats()['failed'], 1)
+        self.assertEqual(executer.get_stats()['executed'], 0)
+
+    def test_operation_executer_priority(self):
+        # Do not start the executer so that we can inspect its queue
+        executer = self._get_executer(start=False)
+        resultset = self.store.find(ClientCategory)
+        operations = []
+        for priority in [AsyncQueryOperation.PRIORITY_BACKGROUND,
+                         AsyncQueryOperation.PRIORITY_NORMAL,
+                         AsyncQueryOperation.PRIORITY_INTERACTIVE,
+                         AsyncQueryOperation.PRIORITY_NORMAL]:
+            op = AsyncQueryOperation(self.store, resultset,
+                                     resultset._get_select(),
+                                     priority=priority)
+            executer.schedule(op)
+            operations.append(op)
+
+        scheduled = [executer._queue.get()[2] for i in range(4)]
+        self.assertEqual(scheduled, [operations[2], operations[1],
+                                     operations[3], operations[0]])
@@ -25,11 +25,16 @@
 """Tests for module :class:`stoqlib.database.runtime`"""
 
 import mock
+from storm.expr import SQL
+from storm.store import Store
+import psycopg2
 
 from stoqlib.database.exceptions import InterfaceError
 from stoqlib.database.properties import UnicodeCol
-from stoqlib.database.runtime import new_store, StoqlibStore, autoreload_object
+from stoqlib.database.runtime import (new_store, StoqlibStore, autoreload_object,
+                                      clear_schema_cache)
 from stoqlib.domain.base import Domain
+from stoqlib.domain.events import DomainCommittedEvent
 from stoqlib.domain.person import Person, Client, ClientView
 from stoqlib.domain.test.domaintest import DomainTest
 
@@ -316,6 +321,68 @@ class StoqlibStoreTest(DomainTest):
 
         autoreload_object(obj1)
 
+    def test_domain_committed_event(self):
+        committed = []
+
+        def _on_commit(store, classes):
+            committed.append((store, classes))
+
+        DomainCommittedEvent.connect(_on_commit)
+        committed_changes = StoqlibStore.committed_changes
+        try:
+            obj = WillBeCommitted(store=self.store, test_var=u'AAA')
+            self.store.commit()
+            self.assertEqual(committed, [(self.store, set([WillBeCommitted]))])
+            self.assertEqual(StoqlibStore.committed_changes,
+                             committed_changes + 1)
+
+            # Nothing changed, nothing is emitted
+            self.store.commit()
+            self.assertEqual(len(committed), 1)
+            self.assertEqual(StoqlibStore.committed_changes,
+                             committed_changes + 1)
+
+            obj.test_var = u'BBB'
+            self.store.commit()
+            self.assertEqual(committed[1], (self.store, set([WillBeCommitted])))
+        finally:
+            DomainCommittedEvent.disconnect(_on_commit)
+
+    def test_list_references(self):
+        references = self.store.list_references(Person.id)
+        self.assertIn((u'client', u'person_id', u'person', u'id', u'c', u'a'),
+                      references)
+        self.assertTrue(all(r[2:4] == (u'person', u'id') for r in references))
+
+        # The references are cached, even for other stores
+        store = new_store()
+        try:
+            with mock.patch.object(store, 'execute',
+                                   wraps=store.execute) as execute:
+                self.assertEqual(store.list_references(Person.id),
+                                 references)
+                self.assertEqual(store.list_references(Client.id),
+                                 self.store.list_references(Client.id))
+                # Only the schema version was read
+                self.assertEqual(execute.call_count, 1)
+
+                clear_schema_cache()
+                self.assertEqual(store.list_references(Person.id),
+                                 references)
+                self.assertEqual(execute.call_count, 2)
+
+                # The database was upgraded by someone else
+                with mock.patch.object(store, '_get_schema_version',
+                                       return_value=(-1, ())):
+                    self.assertEqual(store.list_references(Person.id),
+                                     references)
+                self.assertEqual(execute.call_count, 3)
+                self.assertEqual(store.list_references(Person.id),
+                                 references)
+                self.assertEqual(execute.call_count, 4)
+        finally:
+            store.close()
+
     def test_transaction_commit_hook(self):
         # Dummy will only be asserted for creation on the first commit.
         # After that it should pass all assert for nothing made.
@@ -462,3 +529,81 @@ class TestStoqlibResultSet(DomainTest):
         for obj, tpl in zip(results, results.fast_iter()):
             for prop in ['name', 'status', 'cpf']:
                 self.assertEqual(getattr(obj, prop), getattr(tpl, prop))
+
+    def test_get_estimated_count(self):
+        results = self.store.find(Person)
+        count = results.count()
+        # Make sure there are results so the test makes sense
+        assert count > 2
+
+        self.assertEqual(results.get_estimated_count(), (count, True))
+        self.assertEqual(results.get_estimated_count(exact_limit=count),
+                         (count, True))
+
+        # There are more results than what should be counted, so the
+        # planner estimate is used
+        with mock.patch.object(results.__class__, 'explain',
+                               return_value=[u'Seq Scan on person  '
+                                             u'(cost=0.00..1.50 rows=50 '
+                                             u'width=8)']):
+            self.assertEqual(results.get_estimated_count(exact_limit=2),
+                             (50, False))
+        estimate, exact = results.get_estimated_count(exact_limit=2)
+        self.assertGreaterEqual(estimate, 3)
+        self.assertFalse(exact)
+
+    def test_fast_iter_server_side(self):
+        results = self.store.find(Person).order_by(Person.te_id)
+        expected = [(p.id, p.name) for p in results]
+        # Make sure there are results so the test makes sense
+        assert len(expected) > 2
+
+        results = results.set_fetch_size(2)
+        self.assertEqual([(tpl.id, tpl.name) for tpl in results.fast_iter()],
+                         expected)
+
+    def test_iter_server_side(self):
+        results = self.store.find(ClientView).order_by(Client.te_id)
+        expected = [v.id for v in results]
+        # Make sure there are results so the test makes sense
+        assert len(expected) > 2
+
+        results.set_fetch_size(2)
+        self.assertEqual([v.id for v in results], expected)
+        # The cursor should be closed after the iteration
+        self.assertEqual(self.store.execute(
+            "SELECT COUNT(*) FROM pg_cursors").get_one()[0], 0)
+
+    def test_iter_server_side_error(self):
+        store = new_store()
+        try:
+            # The second row fails with a division by zero
+            results = store.find(
+                (Person, SQL('1 / (row_number() OVER () - 2)')))
+            results.set_fetch_size(1)
+            # The original error should not be hidden by the errors of
+            # trying to close the cursor in an aborted transaction
+            with self.assertRaises(psycopg2.DataError):
+                list(results)
+        finally:
+            store.rollback(close=True)
+
+    def test_iter_server_side_interrupted(self):
+        results = self.store.find(Person).set_fetch_size(1)
+        for person in results:
+            break
+        # Closing the generator should also close the cursor
+        self.assertEqual(self.store.execute(
+            "SELECT COUNT(*) FROM pg_cursors").get_one()[0], 0)
+
+    def test_copy_to_store(self):
+        results = self.store.find(ClientView).order_by(Client.te_id)
+        store = new_store()
+        try:
+            copy = results.copy_to_store(store)
+            self.assertEqual([Store.of(view.client) for view in copy],
+                             [store] * results.count())
+            self.assertEqual([view.id for view in copy],
+                             [view.id for view in results])
+        finally:
+            store.close()
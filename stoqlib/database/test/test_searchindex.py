@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+""" This module tests stoq/database/database.py """
+
+from storm.expr import Coalesce
+from storm.info import ClassAlias
+
+from stoqlib.database.searchindex import (FULL_TEXT, TRIGRAM,
+                                          create_search_indexes,
+                                          get_index_name,
+                                          get_index_statement,
+                                          get_missing_search_indexes,
+                                          get_search_column,
+                                          get_search_mode)
+from stoqlib.domain.person import Person
+from stoqlib.domain.test.domaintest import DomainTest
+
+
+class SearchIndexTest(DomainTest):
+    def test_get_search_column(self):
+        self.assertEqual(get_search_column(Person.name), (u'person', u'name'))
+        ClientPerson = ClassAlias(Person, 'client_person')
+        self.assertEqual(get_search_column(ClientPerson.name),
+                         (u'person', u'name'))
+        self.assertIsNone(get_search_column(Coalesce(Person.name, u'')))
+
+    def test_get_search_mode(self):
+        self.assertEqual(get_search_mode(Person.name), TRIGRAM)
+        self.assertEqual(get_search_mode(Person.notes), FULL_TEXT)
+        self.assertEqual(get_search_mode(Coalesce(Person.notes, u'')), TRIGRAM)
+
+    def test_get_index_name(self):
+        self.assertEqual(get_index_name(u'person', u'name'),
+                         u'person_name_search_trgm_idx')
+        self.assertEqual(get_index_name(u'person', u'notes'),
+                         u'person_notes_search_fts_idx')
+        name = get_index_name(u'a_very_long_table_name_' * 2, u'column')
+        self.assertEqual(len(name), 63)
+        self.assertNotEqual(name, get_index_name(u'a_very_long_table_name_' * 2,
+                                                 u'other_column'))
+
+    def test_get_index_statement(self):
+        self.assertEqual(
+            get_index_statement(u'person', u'name'),
+            u'CREATE INDEX person_name_search_trgm_idx ON person USING gin '
+            u'(stoq_normalize_string(name) gin_trgm_ops)')
+        self.assertEqual(
+            get_index_statement(u'person', u'notes'),
+            u'CREATE INDEX person_notes_search_fts_idx ON person USING gin '
+            u"(to_tsvector('simple', stoq_normalize_string(notes)))")
+
+    def test_create_search_indexes(self):
+        # The indexes are created by a database patch
+        self.assertEqual(get_missing_search_indexes(self.store), [])
+        self.assertEqual(create_search_indexes(self.store), [])
+
+        columns = [(u'product', u'part_number')]
+        self.assertEqual(get_missing_search_indexes(self.store, columns),
+                         columns)
+        self.assertEqual(create_search_indexes(self.store, columns),
+                         [u'product_part_number_search_trgm_idx'])
+        self.assertEqual(get_missing_search_indexes(self.store, columns), [])
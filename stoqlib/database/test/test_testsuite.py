@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+import os
+import tempfile
+import unittest
+
+import mock
+
+from stoqlib.database.testsuite import get_template_key
+
+
+class TestTemplateKey(unittest.TestCase):
+    def test_get_template_key(self):
+        key = get_template_key()
+        self.assertEqual(len(key), 12)
+        self.assertEqual(get_template_key(), key)
+        self.assertEqual(get_template_key(extra_plugins=[u'ecf']), key)
+        self.assertNotEqual(get_template_key(extra_plugins=[u'books']), key)
+
+    def test_get_template_key_files(self):
+        with tempfile.NamedTemporaryFile(suffix='.sql', delete=False) as f:
+            f.write(b'CREATE TABLE foo (id integer);')
+        self.addCleanup(os.unlink, f.name)
+
+        with mock.patch('stoqlib.database.testsuite._get_template_files',
+                        return_value=[f.name]):
+            key = get_template_key()
+            with open(f.name, 'ab') as f2:
+                f2.write(b'CREATE TABLE bar (id integer);')
+            self.assertNotEqual(get_template_key(), key)
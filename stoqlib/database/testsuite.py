@@ -30,23 +30,30 @@
 from stoqlib.lib.kiwilibrary import library
 library  # pylint: disable=W0104
 
+import glob
+import hashlib
 import logging
 import os
 
 from kiwi.component import provide_utility, utilities
+from kiwi.environ import environ
 from storm.expr import And
 from storm.tracer import install_tracer, remove_tracer_type
 
+from stoqlib.database import admin
 from stoqlib.database.admin import initialize_system, ensure_admin_user
 from stoqlib.database.interfaces import (
     ICurrentBranch, ICurrentBranchStation, ICurrentUser)
-from stoqlib.database.runtime import new_store, get_default_store
+from stoqlib.database.runtime import (new_store, get_default_store,
+                                      set_default_store)
 from stoqlib.database.settings import db_settings
 from stoqlib.domain.person import Branch, LoginUser, Person, Company
 from stoqlib.domain.station import BranchStation
+from stoqlib import importers
 from stoqlib.importers.stoqlibexamples import create
 from stoqlib.lib.interfaces import IApplicationDescriptions, ISystemNotifier
 from stoqlib.lib.message import DefaultSystemNotifier
+from stoqlib.lib.parameters import sysparam
 from stoqlib.lib.osutils import get_username
 from stoqlib.lib.pluginmanager import get_plugin_manager
 from stoqlib.lib.settings import get_settings
@@ -229,11 +236,14 @@ def provide_utilities(station_name, branch_name=None):
     _provide_domain_slave_mapper()
 
 
+def _get_test_plugins(extra_plugins=None):
+    default_plugins = [u'ecf', u'nfe', u'optical']
+    return sorted(set(default_plugins + (extra_plugins or [])))
+
+
 def _enable_plugins(extra_plugins=None):
     manager = get_plugin_manager()
-    default_plugins = [u'ecf', u'nfe', u'optical']
-    extra_plugins = extra_plugins or []
-    for plugin in set(default_plugins + extra_plugins):
+    for plugin in _get_test_plugins(extra_plugins):
         if not manager.is_installed(plugin):
             # STOQLIB_TEST_QUICK won't let dropdb on testdb run. Just a
             # precaution to avoid trying to install it again
@@ -247,8 +257,131 @@ def _enable_plugins(extra_plugins=None):
             plugin  # pylint: disable=W0104
 
 
+def _get_template_files(extra_plugins=None):
+    filenames = []
+    for resource in [u'sql', u'csv']:
+        filenames.extend(environ.get_resource_filename(u'stoq', resource, name)
+                         for name in environ.get_resource_names(u'stoq',
+                                                                resource))
+
+    manager = get_plugin_manager()
+    for plugin in _get_test_plugins(extra_plugins):
+        desc = manager.get_description_by_name(plugin)
+        if desc is not None:
+            filenames.extend(glob.glob(os.path.join(desc.dirname, u'sql', u'*')))
+
+    # The code creating the database and the example data
+    filenames.append(admin.__file__)
+    filenames.extend(glob.glob(
+        os.path.join(os.path.dirname(importers.__file__), u'*.py')))
+    return sorted(f for f in filenames if os.path.isfile(f))
+
+
+def get_template_key(extra_plugins=None):
+    """Returns a key identifying the contents of the test database
+
+    The key is a hash of the schema, the patches (including the ones of
+    the plugins enabled for the tests) and the example data, so it changes
+    whenever any of them changes.
+
+    :param extra_plugins: the plugins enabled besides the default ones
+    :returns: the key, a short hex string
+    """
+    sha = hashlib.sha1()
+    for plugin in _get_test_plugins(extra_plugins):
+        sha.update(plugin.encode())
+    for filename in _get_template_files(extra_plugins):
+        sha.update(os.path.basename(filename).encode())
+        with open(filename, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()[:12]
+
+
+def _get_template_prefix(dbname):
+    return u'%s_tmpl_' % (dbname, )
+
+
+def _create_template(template, extra_plugins=None):
+    # Build it with another name, so an interrupted build is never used
+    dbname = db_settings.dbname
+    building = template + u'_new'
+    log.info("Creating the test database template %s" % (template, ))
+    db_settings.dbname = building
+    try:
+        initialize_system(testsuite=True, force=True)
+        _enable_plugins(extra_plugins=extra_plugins)
+        ensure_admin_user(u"")
+        create(utilities=True, create_users=True)
+
+        # There cannot be connections to the template when renaming or
+        # copying it
+        set_default_store(None)
+        sysparam.clear_cache()
+        super_store = db_settings.create_super_store()
+        super_store.execute(
+            u"SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+            u"WHERE datname = ? AND pid <> pg_backend_pid()", (building, ))
+        super_store.close()
+        db_settings.rename_database(building, template)
+    finally:
+        db_settings.dbname = dbname
+
+
+def _drop_old_templates(super_store, prefix, template):
+    old_templates = super_store.execute(
+        u"SELECT datname FROM pg_database "
+        u"WHERE left(datname, ?) = ? AND datname <> ?",
+        (len(prefix), prefix, template)).get_all()
+    for (name, ) in old_templates:
+        try:
+            db_settings.drop_database(name)
+        except Exception as e:
+            # Probably still used by another test run
+            log.info("Could not drop the old template %s: %s" % (name, e))
+
+
+def _bootstrap_from_template(address, dbname, port, username, password,
+                             station_name, extra_plugins):
+    if not username:
+        username = get_username()
+    if not dbname:
+        dbname = username + u'_test'
+
+    prefix = _get_template_prefix(dbname)
+    template = prefix + get_template_key(extra_plugins)
+    worker = (os.environ.get('STOQLIB_TEST_WORKER') or
+              os.environ.get('PYTEST_XDIST_WORKER'))
+    test_dbname = u'%s_%s' % (dbname, worker) if worker else dbname
+
+    provide_database_settings(test_dbname, address, port, username, password,
+                              createdb=False)
+
+    super_store = db_settings.create_super_store()
+    # Only one process creates the template, while the other ones wait for it.
+    # Copying it is serialized too, since postgres doesn't allow two
+    # databases being created from the same template at the same time
+    super_store.execute(u"SELECT pg_advisory_lock(hashtext(?))", (prefix, ))
+    try:
+        if not db_settings.database_exists(template):
+            _create_template(template, extra_plugins=extra_plugins)
+            _drop_old_templates(super_store, prefix, template)
+        db_settings.clone_database(template, test_dbname)
+    finally:
+        super_store.execute(u"SELECT pg_advisory_unlock(hashtext(?))",
+                            (prefix, ))
+        super_store.close()
+
+    # The utilities provided while creating the template are from its
+    # database, provide them again using the copy
+    provide_database_settings(test_dbname, address, port, username, password,
+                              createdb=False)
+    provide_utilities(station_name)
+    _enable_plugins(extra_plugins=extra_plugins)
+
+
 def bootstrap_suite(address=None, dbname=None, port=5432, username=None,
-                    password=u"", station_name=None, quick=False, extra_plugins=None):
+                    password=u"", station_name=None, quick=False, extra_plugins=None,
+                    template=False):
     """
     Test.
     :param address:
@@ -258,9 +391,21 @@ def bootstrap_suite(address=None, dbname=None, port=5432, username=None,
     :param password:
     :param station_name:
     :param quick:
+    :param template: if the database should be copied from a template,
+      created only when the schema, the patches or the example data change.
+      Each worker (identified by the ``STOQLIB_TEST_WORKER`` or
+      ``PYTEST_XDIST_WORKER`` environment variables) gets its own copy,
+      named after *dbname* and the worker
     """
     os.environ['STOQ_TESTSUIT_RUNNING'] = '1'
 
+    if template:
+        _bootstrap_from_template(address, dbname, port, username, password,
+                                 station_name, extra_plugins)
+        settings = get_settings()
+        settings.reset()
+        return
+
     # This will only be required when we use uuid.UUID instances
     # for UUIDCol
     #import psycopg2.extras
@@ -373,7 +373,7 @@ class Domain(ORMObject):
 
         This will check if there's any object referencing self
 
-        :param skip: an itarable containing the (table, column) to skip
+        :param skip: an iterable containing the (table, column) to skip
             the check. Use this to avoid false positives when you will
             delete those skipped by hand before self.
         """
@@ -408,6 +408,46 @@ class Domain(ORMObject):
     #  Classmethods
     #
 
+    @classmethod
+    def get_removable_ids(cls, store, ids, skip=None):
+        """Check which objects of this class can be removed from the database
+
+        This does the same check as :meth:`.can_remove`, but for many
+        objects at once, using a single query. It can't be used by the
+        subclasses overriding :meth:`.can_remove`, since their extra
+        checks would not be done.
+
+        :param store: a store
+        :param ids: the ids of the objects to check
+        :param skip: an iterable containing the (table, column) to skip
+            the check, like in :meth:`.can_remove`
+        :returns: a set with the ids that are not referenced by any object
+        :raises: :exc:`TypeError` if this class overrides :meth:`.can_remove`
+        """
+        if cls.can_remove is not Domain.can_remove:
+            raise TypeError(
+                "%s overrides can_remove, check its objects one by one "
+                "instead" % (cls.__name__, ))
+
+        ids = set(ids)
+        skip = skip or set()
+        selects = []
+        for t_name, c_name, ot_name, oc_name, u, d in store.list_references(
+                cls.id):
+            if (t_name, c_name) in skip:
+                continue
+
+            column = Field(t_name, c_name)
+            selects.append(Select(columns=[column], tables=[t_name],
+                                  where=column.is_in(ids), distinct=True))
+
+        if not ids or not selects:
+            return ids
+
+        referenced = set(str(id_) for (id_, ) in
+                         store.execute(UnionAll(*selects)))
+        return set(id_ for id_ in ids if str(id_) not in referenced)
+
     @classmethod
     def get_temporary_identifier(cls, store):
         """Returns a temporary negative identifier
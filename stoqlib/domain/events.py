@@ -57,6 +57,17 @@ class DomainMergeEvent(Event):
         return skip
 
 
+@public(since="4.6.0")
+class DomainCommittedEvent(Event):
+    """
+    This event is emitted after a store is committed
+
+    :param store: the store that was committed
+    :param classes: a set with the classes of the domain objects that were
+      created, updated or removed by the commit
+    """
+
+
 #
 # Product events
 #
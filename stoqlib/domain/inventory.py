@@ -28,13 +28,14 @@
 import collections
 from decimal import Decimal
 
-from storm.expr import And, Eq, Cast, Join, LeftJoin, Or, Coalesce
+from storm.expr import (And, Eq, Cast, Insert, Join, LeftJoin, Ne, Not, Or,
+                        Coalesce, Select)
 from storm.references import Reference, ReferenceSet
 
 from stoqlib.database.properties import (QuantityCol, PriceCol, DateTimeCol,
                                          IntCol, UnicodeCol, IdentifierCol,
                                          IdCol, BoolCol, EnumCol)
-from stoqlib.database.expr import StatementTimestamp
+from stoqlib.database.expr import Case, StatementTimestamp
 from stoqlib.database.viewable import Viewable
 from stoqlib.domain.base import Domain, IdentifiableDomain
 from stoqlib.domain.fiscal import FiscalBookEntry
@@ -369,22 +370,67 @@ class Inventory(IdentifiableDomain):
             raise AssertionError("You can not close an inventory which is "
                                  "already closed!")
 
-        for item in self.inventory_items:
-            if (item.actual_quantity is None or
-                    item.recorded_quantity == item.actual_quantity):
-                continue
-
-            # FIXME: We are setting this here because, when generating a
-            # sintegra file, even if this item wasn't really adjusted (e.g.
-            # adjustment_qty bellow is 0) it needs to be specified and not
-            # setting this would result on self.get_cost returning 0.  Maybe
-            # we should resolve this in another way
-            # We don't call item.adjust since it needs an invoice number
-            item.is_adjusted = True
+        # FIXME: We are setting this here because, when generating a
+        # sintegra file, even if this item wasn't really adjusted (e.g.
+        # adjustment_qty bellow is 0) it needs to be specified and not
+        # setting this would result on self.get_cost returning 0.  Maybe
+        # we should resolve this in another way
+        # We don't call item.adjust since it needs an invoice number
+        self.inventory_items.find(
+            Ne(InventoryItem.actual_quantity, None),
+            InventoryItem.recorded_quantity != InventoryItem.actual_quantity).set(
+                is_adjusted=True)
 
         self.close_date = StatementTimestamp()
         self.status = Inventory.STATUS_CLOSED
 
+    def adjust_items(self, items, user: LoginUser, invoice_number):
+        """Adjusts several items of this inventory at once
+
+        This works just like calling :meth:`InventoryItem.adjust` for
+        each one of the items, but the stock of all of them is changed
+        using batched stock transactions.
+
+        :param items: the |inventoryitems| to adjust
+        :param user: the |loginuser| responsible for the adjustment
+        :param invoice_number: invoice number to register
+        """
+        assert self.is_open()
+        increases = []
+        decreases = []
+        adjusted = []
+        for item in items:
+            assert item.inventory == self
+            assert not item.is_adjusted
+            storable = item.product.storable
+            if storable is None:
+                # Not a storable, register its initial stock instead
+                item.adjust(user, invoice_number)
+                continue
+
+            adjustment_qty = item.actual_quantity - item.recorded_quantity
+            if not adjustment_qty:
+                continue
+            elif adjustment_qty > 0:
+                increases.append((storable, adjustment_qty, item.batch,
+                                  item.id, None))
+            else:
+                decreases.append((storable, abs(adjustment_qty), item.batch,
+                                  item.id))
+            adjusted.append(item)
+
+        Storable.increase_stock_many(
+            self.store, self.branch, increases,
+            StockTransactionHistory.TYPE_INVENTORY_ADJUST, user)
+        Storable.decrease_stock_many(
+            self.store, self.branch, decreases,
+            StockTransactionHistory.TYPE_INVENTORY_ADJUST, user)
+
+        for item in adjusted:
+            item._add_inventory_fiscal_entry(invoice_number)
+        self.store.find(InventoryItem, InventoryItem.id.is_in(
+            [item.id for item in adjusted])).set(is_adjusted=True)
+
     def all_items_counted(self):
         """Checks if all items of this inventory were counted
 
@@ -491,6 +537,13 @@ class Inventory(IdentifiableDomain):
         :returns: a generator of the following objects:
             (Sellable, Product, Storable, StorableBatch, ProductStockItem)
         """
+        tables, query = cls._get_inventory_tables(branch, extra_query)
+        return store.using(*tables).find(
+            (Sellable, Product, Storable, StorableBatch, ProductStockItem),
+            query)
+
+    @classmethod
+    def _get_inventory_tables(cls, branch, extra_query=None):
         # XXX: If we should want all storables to be inclued in the inventory, even if if
         #      never had a ProductStockItem before, than we should inclue this query in the
         #      LeftJoin with ProductStockItem below
@@ -507,9 +560,7 @@ class Inventory(IdentifiableDomain):
                                Or(ProductStockItem.batch_id == StorableBatch.id,
                                   Eq(ProductStockItem.batch_id, None)))),
                   ]
-        return store.using(*tables).find(
-            (Sellable, Product, Storable, StorableBatch, ProductStockItem),
-            query)
+        return tables, query
 
     @classmethod
     def create_inventory(cls, store, branch: Branch, station: BranchStation, responsible,
@@ -525,21 +576,33 @@ class Inventory(IdentifiableDomain):
                         open_date=localnow(),
                         responsible_id=responsible.id)
 
-        for data in cls.get_sellables_for_inventory(store, branch, query):
-            sellable, product, storable, batch, stock_item = data
-            quantity = stock_item and stock_item.quantity or 0
-            if storable.is_batch:
-                # This used to test 'stock_item.quantity > 0' too to avoid
-                # creating inventory items for old batches not used anymore.
-                # We can't do that since that would make it impossible to
-                # adjust a batch that was wrongly set to 0. We need to find a
-                # way to mark the batches as "not used anymore" because they
-                # tend to grow to very large proportions and we are duplicating
-                # everyone here
-                if batch and stock_item:
-                    inventory.add_product(product, quantity, batch=batch)
-            else:
-                inventory.add_product(product, quantity)
+        # The items are created by the database in a single statement, with
+        # the quantities and costs of the moment the inventory was opened.
+        # Note that this does the same as calling add_product for each
+        # result of get_sellables_for_inventory
+        tables, where = cls._get_inventory_tables(branch, query)
+        is_batch = Coalesce(Storable.is_batch, False)
+        # This used to test 'stock_item.quantity > 0' too to avoid creating
+        # inventory items for old batches not used anymore. We can't do that
+        # since that would make it impossible to adjust a batch that was
+        # wrongly set to 0. We need to find a way to mark the batches as "not
+        # used anymore" because they tend to grow to very large proportions
+        # and we are duplicating everyone here
+        where = And(where, Or(Not(is_batch),
+                              And(Ne(StorableBatch.id, None),
+                                  Ne(ProductStockItem.id, None))))
+        columns = [InventoryItem.product_id, InventoryItem.batch_id,
+                   InventoryItem.product_cost, InventoryItem.recorded_quantity,
+                   InventoryItem.reason, InventoryItem.inventory_id]
+        select = Select([Product.id,
+                         Case(is_batch, StorableBatch.id),
+                         Sellable.cost,
+                         Coalesce(ProductStockItem.quantity, 0),
+                         u'',
+                         Cast(inventory.id, 'uuid')],
+                        where=where, tables=tables)
+        store.execute(Insert(collections.OrderedDict.fromkeys(columns),
+                             table=InventoryItem, values=select))
         return inventory
 
 
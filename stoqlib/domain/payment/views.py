@@ -32,7 +32,7 @@ from storm.expr import (And, Count, Join, LeftJoin, Or, Sum, Alias,
                         Select, Cast)
 from storm.info import ClassAlias
 
-from stoqlib.database.expr import Date, Field, ArrayAgg, ArrayToString
+from stoqlib.database.expr import DateRange, Field, ArrayAgg, ArrayToString
 from stoqlib.database.viewable import Viewable
 from stoqlib.domain.account import BankAccount
 from stoqlib.domain.payment.card import (CreditProvider,
@@ -156,6 +156,10 @@ class BasePaymentView(Viewable):
         select = sresults.get_select_expr(Count(1), Sum(cls.value))
         return ('count', 'sum'), select
 
+    @classmethod
+    def get_summary_columns(cls):
+        return ('count', 'sum'), [Count(1), Sum(cls.value)]
+
     def can_change_due_date(self):
         return self.status not in [Payment.STATUS_PAID,
                                    Payment.STATUS_CANCELLED]
@@ -195,10 +199,9 @@ class BasePaymentView(Viewable):
 
         if due_date:
             if isinstance(due_date, tuple):
-                date_query = And(Date(cls.due_date) >= due_date[0],
-                                 Date(cls.due_date) <= due_date[1])
+                date_query = DateRange(cls.due_date, due_date[0], due_date[1])
             else:
-                date_query = Date(cls.due_date) == due_date
+                date_query = DateRange(cls.due_date, due_date, due_date)
 
             query = And(query, date_query)
 
@@ -54,20 +54,23 @@ Then to add a client, you can will do:
 
 # pylint: enable=E1101
 
+import calendar
 import collections
+import datetime
 import hashlib
 import operator
 
+from dateutil.relativedelta import relativedelta
 from kiwi.currency import currency
 from kiwi.datatypes import converter
-from storm.expr import (And, Coalesce, Eq, Join, LeftJoin, Or, Update, Select,
-                        Alias, Sum)
+from storm.expr import (And, Coalesce, Eq, Join, LeftJoin, Ne, Or, Update,
+                        Select, Alias, Sum)
 from storm.info import ClassAlias
 from storm.references import Reference, ReferenceSet
 from zope.interface import implementer
 
-from stoqlib.database.expr import (Age, Case, Concat, Date, DateTrunc, Interval,
-                                   Field, NotIn, StoqNormalizeString)
+from stoqlib.database.expr import (Concat, DateRange, Field, NotIn,
+                                   StoqNormalizeString)
 from stoqlib.database.properties import (BoolCol, DateTimeCol,
                                          IntCol, PercentCol,
                                          PriceCol, EnumCol,
@@ -617,6 +620,10 @@ class Individual(Domain):
     #: when this individual was born
     birth_date = DateTimeCol(default=None)
 
+    #: the day of the year of :obj:`.birth_date`, used to search for
+    #: birthdays. See :meth:`.get_birthday_key`
+    birthday_key = IntCol(default=None)
+
     #: current job
     occupation = UnicodeCol(default=u'')
 
@@ -686,6 +693,10 @@ class Individual(Domain):
         if copy_empty_values:
             other.cpf = u''
 
+    def on_object_changed(self, attr, old_value, value):
+        if attr == 'birth_date':
+            self.birthday_key = self.get_birthday_key(value)
+
     def get_marital_statuses(self):
         return [(self.marital_statuses[i], i)
                 for i in self.marital_statuses.keys()]
@@ -713,6 +724,21 @@ class Individual(Domain):
 
         return raw_document(self.cpf)
 
+    @classmethod
+    def get_birthday_key(cls, date):
+        """Get the birthday key for a date
+
+        The key is the day of the year of the date, calculated as
+        ``month * 100 + day``, and it is kept updated for the
+        :obj:`.birth_date` on :obj:`.birthday_key` by the database.
+
+        :param date: a date or ``None``
+        :returns: the key, or ``None`` if date is ``None``
+        """
+        if date is None:
+            return None
+        return date.month * 100 + date.day
+
     @classmethod
     def get_birthday_query(cls, start, end=None):
         """
@@ -720,24 +746,31 @@ class Individual(Domain):
         callback. This can either be searching for a birthday in a date or
         an interval of dates.
 
+        The query uses the indexed :obj:`.birthday_key`. Intervals ending
+        on the next year (e.g. from december to january) and birthdays on
+        february 29, which are on march 1 on non leap years, are
+        handled too.
+
         :param start: start date
         :param end: for intervals, an end date, use ``None`` for single days
         :returns: the database query
         """
-        start_year = DateTrunc(u'year', Date(start))
-        age_in_year = Age(cls.birth_date, DateTrunc(u'year', cls.birth_date))
-        next_birthday = (
-            start_year + age_in_year +
-            Case(condition=age_in_year < Age(Date(start), start_year),
-                 result=Interval(u"1 year"),
-                 else_=Interval(u"0 year"))
-        )
-
         if end is None:
-            return next_birthday == Date(start)
-        else:
-            return And(next_birthday >= Date(start),
-                       next_birthday <= Date(end))
+            end = start
+        elif end - start >= datetime.timedelta(days=365):
+            # Everyone has a birthday in any interval of one year
+            return Ne(cls.birthday_key, None)
+
+        start_key = cls.get_birthday_key(start)
+        end_key = cls.get_birthday_key(end)
+        if start_key == 301 and not calendar.isleap(start.year):
+            start_key = 229
+
+        if start_key <= end_key:
+            return And(cls.birthday_key >= start_key,
+                       cls.birthday_key <= end_key)
+        return Or(cls.birthday_key >= start_key,
+                  cls.birthday_key <= end_key)
 
 
 @implementer(IActive)
@@ -1098,16 +1131,19 @@ class Client(Domain):
         if max_date:
             return max_date.date()
 
+    def get_credit_ledger(self):
+        """Returns the credit ledger of this client, with the store credit
+        it owes, the balance of its credit account and the due date of its
+        oldest pending payment.
+
+        :returns: a :class:`stoqlib.lib.creditledger.CreditLedger`
+        """
+        from stoqlib.lib.creditledger import get_credit_ledger
+        return get_credit_ledger(self.store, self.person)
+
     @property
     def remaining_store_credit(self):
-        from stoqlib.domain.payment.views import InPaymentView
-        status_query = Or(InPaymentView.status == Payment.STATUS_PENDING,
-                          InPaymentView.status == Payment.STATUS_CONFIRMED)
-        query = And(InPaymentView.person_id == self.person.id,
-                    status_query,
-                    InPaymentView.method_name == u'store_credit')
-
-        debit = self.store.find(InPaymentView, query).sum(InPaymentView.value) or currency('0.0')
+        debit = self.get_credit_ledger().store_credit_debit
         return currency(self.credit_limit - debit)
 
     def get_credit_transactions(self):
@@ -1141,16 +1177,7 @@ class Client(Domain):
         """Returns a client's credit balance.
 
         :returns: The client's credit balance."""
-        transactions = self.get_credit_transactions()
-
-        balance = 0
-        for payment in transactions:
-            if payment.payment_type == payment.TYPE_OUT:
-                balance += payment.paid_value
-            else:
-                balance -= payment.paid_value
-
-        return currency(balance)
+        return self.get_credit_ledger().credit_balance
 
     @property
     def salary(self):
@@ -1184,20 +1211,26 @@ class Client(Domain):
         """
         from stoqlib.domain.payment.views import InPaymentView
 
+        ledger = self.get_credit_ledger()
         if method.method_name in [u'store_credit', u'credit']:
             if method.method_name == u'store_credit':
-                credit_left = self.remaining_store_credit
+                credit_left = currency(self.credit_limit -
+                                       ledger.store_credit_debit)
             else:
-                credit_left = self.credit_account_balance
+                credit_left = ledger.credit_balance
 
             if credit_left < total_amount:
                 raise SellError(_(u'The available credit for this client (%s) '
                                   u'is not enough.') % (
                                 converter.as_string(currency, credit_left)))
 
-        # Client does not have late payments
-        if not InPaymentView.has_late_payments(self.store,
-                                               self.person):
+        # Client does not have late payments. If the oldest pending one is
+        # late, it may still be of an external sale, which doesn't count
+        tolerance = sysparam.get_int('TOLERANCE_FOR_LATE_PAYMENTS')
+        due_date = ledger.oldest_pending_due_date
+        if (due_date is None or
+                due_date >= localtoday() - relativedelta(days=tolerance) or
+                not InPaymentView.has_late_payments(self.store, self.person)):
             return True
 
         param = sysparam.get_int('LATE_PAYMENTS_POLICY')
@@ -2505,10 +2538,9 @@ class CallsView(Viewable):
 
         if date:
             if isinstance(date, tuple):
-                date_query = And(Date(Calls.date) >= date[0],
-                                 Date(Calls.date) <= date[1])
+                date_query = DateRange(Calls.date, date[0], date[1])
             else:
-                date_query = Date(Calls.date) == date
+                date_query = DateRange(Calls.date, date, date)
 
             queries.append(date_query)
 
@@ -85,12 +85,13 @@ stock_items are unique:
 
 import collections
 from decimal import Decimal
+import uuid
 
 from kiwi.currency import currency
 from storm.references import Reference, ReferenceSet
 from storm.exceptions import NotOneError
 from storm.expr import (And, Eq, LeftJoin, Alias, Sum, Coalesce, Select, Join,
-                        Cast, Or, In)
+                        Cast, Or, In, Insert)
 from zope.interface import implementer
 
 from stoqlib.api import api
@@ -113,6 +114,7 @@ from stoqlib.exceptions import StockError
 from stoqlib.lib.dateutils import localnow, localtoday
 from stoqlib.lib.defaults import quantize
 from stoqlib.lib.parameters import sysparam
+from stoqlib.lib.sellableindex import get_sellable_index
 from stoqlib.lib.stringutils import next_value_for
 from stoqlib.lib.translation import stoqlib_gettext, stoqlib_ngettext
 
@@ -1148,6 +1150,28 @@ class ProductHistory(Domain):
             sold_date=TransactionTimestamp(),
             store=store)
 
+    @classmethod
+    def add_sold_items(cls, store, branch, product_sellable_items):
+        """Adds several |saleitems| to the history at once
+
+        This works just like calling :meth:`.add_sold_item` for each
+        item, but all the rows are inserted in a single statement.
+
+        :param store: a store
+        :param branch: the |branch|
+        :param product_sellable_items: the |saleitems| for the
+            sold |products|
+        """
+        rows = [(branch.id, item.sellable_id, item.quantity,
+                 TransactionTimestamp())
+                for item in product_sellable_items]
+        if not rows:
+            return
+        columns = [cls.branch_id, cls.sellable_id, cls.quantity_sold,
+                   cls.sold_date]
+        store.execute(Insert(collections.OrderedDict.fromkeys(columns),
+                             table=cls, values=rows))
+
     @classmethod
     def add_received_item(cls, store, branch, receiving_order_item):
         """
@@ -1429,6 +1453,157 @@ class Storable(Domain):
 
         return stock_item
 
+    @classmethod
+    def decrease_stock_many(cls, store, branch, decreases, type,
+                            user: LoginUser, cost_center=None):
+        """Decrease the stock of several |storables| at once
+
+        This works just like calling :meth:`.decrease_stock` for each
+        decrease, but the stock items are fetched in a single query and
+        all the stock transactions are inserted in a single statement,
+        which makes a big difference when decreasing lots of storables.
+
+        :param store: a store
+        :param branch: a |branch|
+        :param decreases: a list of (storable, quantity, batch, object_id)
+            tuples, one for each decrease
+        :param type: the type of the stock decrease. One of the
+            StockTransactionHistory.types
+        :param cost_center: the |costcenter| to which the stock decreases
+            are related, if any
+        :returns: a list containing the stock item decreased for each
+            element of *decreases*
+        """
+        if branch is None:
+            raise ValueError(u"branch cannot be None")
+        if not decreases:
+            return []
+
+        for storable, quantity, batch, object_id in decreases:
+            if quantity <= 0:
+                raise ValueError(_(u"quantity must be a positive number"))
+            cls.validate_batch(batch, sellable=storable.product.sellable,
+                               storable=storable)
+
+        storable_ids = set(storable.id for storable, q, b, o in decreases)
+        stock_items = cls._get_stock_items_many(store, branch, storable_ids)
+
+        now = localnow()
+        rows = []
+        quantities = {}
+        decreased_items = []
+        for storable, quantity, batch, object_id in decreases:
+            key = (storable.id, batch and batch.id)
+            stock_item = stock_items.get(key)
+            old_quantity = quantities.get(key, stock_item and stock_item.quantity)
+            if stock_item is None or quantity > old_quantity:
+                raise StockError(
+                    _('Quantity to decrease is greater than the available stock.'))
+
+            quantities[key] = old_quantity - quantity
+            decreased_items.append((stock_item, old_quantity, quantities[key]))
+            rows.append((str(uuid.uuid1()), now, branch.id, storable.id,
+                         batch and batch.id, -quantity, stock_item.stock_cost,
+                         user.id, type, object_id))
+
+        cls._insert_stock_transactions(store, rows, stock_items)
+
+        if cost_center is not None:
+            for transaction in store.find(
+                    StockTransactionHistory,
+                    StockTransactionHistory.id.is_in([row[0] for row in rows])):
+                cost_center.add_stock_transaction(transaction)
+
+        for (storable, q, b, o), (stock_item, old_quantity, new_quantity) in zip(
+                decreases, decreased_items):
+            ProductStockUpdateEvent.emit(storable.product, branch, old_quantity,
+                                         new_quantity)
+
+        return [stock_item for stock_item, old, new in decreased_items]
+
+    @classmethod
+    def increase_stock_many(cls, store, branch, increases, type,
+                            user: LoginUser):
+        """Increase the stock of several |storables| at once
+
+        This works just like calling :meth:`.increase_stock` for each
+        increase, but all the stock transactions are inserted in a
+        single statement.
+
+        :param store: a store
+        :param branch: a |branch|
+        :param increases: a list of (storable, quantity, batch, object_id,
+            unit_cost) tuples, one for each increase. unit_cost may be
+            ``None``, like in :meth:`.increase_stock`
+        :param type: the type of the stock increase. One of the
+            StockTransactionHistory.types
+        """
+        if branch is None:
+            raise ValueError(u"branch cannot be None")
+        if not increases:
+            return
+
+        for storable, quantity, batch, object_id, unit_cost in increases:
+            if quantity <= 0:
+                raise ValueError(_(u"quantity must be a positive number"))
+
+        storable_ids = set(increase[0].id for increase in increases)
+        stock_items = cls._get_stock_items_many(store, branch, storable_ids)
+
+        now = localnow()
+        rows = []
+        quantities = {}
+        increased_items = []
+        for storable, quantity, batch, object_id, unit_cost in increases:
+            key = (storable.id, batch and batch.id)
+            stock_item = stock_items.get(key)
+            old_quantity = quantities.get(key, stock_item.quantity if stock_item else 0)
+            quantities[key] = old_quantity + quantity
+            increased_items.append((old_quantity, quantities[key]))
+            rows.append((str(uuid.uuid1()), now, branch.id, storable.id,
+                         batch and batch.id, quantity, unit_cost,
+                         user.id, type, object_id))
+
+        cls._insert_stock_transactions(store, rows, stock_items)
+
+        for increase, (old_quantity, new_quantity) in zip(increases,
+                                                          increased_items):
+            ProductStockUpdateEvent.emit(increase[0].product, branch,
+                                         old_quantity, new_quantity)
+
+    @classmethod
+    def _get_stock_items_many(cls, store, branch, storable_ids):
+        stock_items = {}
+        for stock_item in store.find(
+                ProductStockItem,
+                And(ProductStockItem.branch_id == branch.id,
+                    ProductStockItem.storable_id.is_in(list(storable_ids)))):
+            stock_items[stock_item.storable_id, stock_item.batch_id] = stock_item
+        return stock_items
+
+    @classmethod
+    def _insert_stock_transactions(cls, store, rows, stock_items):
+        columns = [StockTransactionHistory.id, StockTransactionHistory.date,
+                   StockTransactionHistory.branch_id,
+                   StockTransactionHistory.storable_id,
+                   StockTransactionHistory.batch_id,
+                   StockTransactionHistory.quantity,
+                   StockTransactionHistory.unit_cost,
+                   StockTransactionHistory.responsible_id,
+                   StockTransactionHistory.type,
+                   StockTransactionHistory.object_id]
+        # The trigger on stock_transaction_history will update (or create)
+        # the stock items for each inserted row, in the order they were
+        # inserted
+        store.execute(Insert(collections.OrderedDict.fromkeys(columns),
+                             table=StockTransactionHistory, values=rows))
+
+        # Mark the stock items changed by the trigger to be reloaded
+        # on their next access
+        for stock_item in stock_items.values():
+            store.autoreload(stock_item)
+            autoreload_object(stock_item)
+
     def register_initial_stock(self, quantity, branch, unit_cost,
                                user: LoginUser, batch_number=None):
         """Register initial stock, by increasing the amount of this storable,
@@ -1627,6 +1802,19 @@ class StorableBatch(Domain):
                                  batch=self, branch=branch)
         return stock_items.sum(ProductStockItem.quantity) or Decimal(0)
 
+    #
+    #  Domain hooks
+    #
+
+    def on_create(self):
+        get_sellable_index().update_batch(self)
+
+    def on_update(self):
+        get_sellable_index().update_batch(self)
+
+    def on_delete(self):
+        get_sellable_index().remove_batch(self)
+
 
 class StockTransactionHistory(Domain):
     """ This class stores information about all transactions made in the
@@ -36,7 +36,7 @@ from storm.info import ClassAlias
 from storm.references import Reference, ReferenceSet
 from zope.interface import implementer
 
-from stoqlib.database.expr import (Date, Field, NullIf, TransactionTimestamp,
+from stoqlib.database.expr import (DateRange, Field, NullIf, TransactionTimestamp,
                                    ArrayAgg, ArrayToString)
 from stoqlib.database.properties import (DateTimeCol, UnicodeCol,
                                          PriceCol, BoolCol, QuantityCol,
@@ -989,6 +989,10 @@ class PurchaseOrderView(Viewable):
         select = sresults.get_select_expr(Count(1), Sum(cls.total))
         return ('count', 'sum'), select
 
+    @classmethod
+    def get_summary_columns(cls):
+        return ('count', 'sum'), [Count(1), Sum(cls.total)]
+
     #
     # Public API
     #
@@ -1006,10 +1010,9 @@ class PurchaseOrderView(Viewable):
 
         if due_date:
             if isinstance(due_date, tuple):
-                date_query = And(Date(cls.expected_receival_date) >= due_date[0],
-                                 Date(cls.expected_receival_date) <= due_date[1])
+                date_query = DateRange(cls.expected_receival_date, due_date[0], due_date[1])
             else:
-                date_query = Date(cls.expected_receival_date) == due_date
+                date_query = DateRange(cls.expected_receival_date, due_date, due_date)
 
             query = And(query, date_query)
 
@@ -40,7 +40,7 @@ from storm.info import ClassAlias
 from storm.references import Reference, ReferenceSet
 from zope.interface import implementer
 
-from stoqlib.database.expr import (Concat, Date, Distinct, Field, NullIf,
+from stoqlib.database.expr import (Concat, DateRange, Distinct, Field, NullIf,
                                    Round, TransactionTimestamp)
 from stoqlib.database.properties import (UnicodeCol, DateTimeCol, IntCol,
                                          PriceCol, QuantityCol, IdentifierCol,
@@ -315,30 +315,58 @@ class SaleItem(Domain):
     #
 
     def sell(self, user: LoginUser):
-        if not self.sellable.is_available(branch=self.sale.branch):
-            raise SellError(_(u"%s is not available for sale. Try making it "
-                              u"available first and then try again.") % (
-                self.sellable.get_description()))
+        self.sell_items([self], user)
 
-        # This is emitted here instead of inside the if bellow because one can
-        # connect on it and change this item in a way that, if it wasn't going
-        # to decrease stock before, it will after
-        SaleItemBeforeDecreaseStockEvent.emit(self)
+    @classmethod
+    def sell_items(cls, items, user: LoginUser):
+        """Sell some items of a |sale|
 
-        quantity_to_decrease = self.quantity - self.quantity_decreased
-        storable = self.sellable.product_storable
-        if storable and quantity_to_decrease:
-            try:
-                item = storable.decrease_stock(
-                    quantity_to_decrease, self.sale.branch,
-                    StockTransactionHistory.TYPE_SELL, self.id, user,
-                    cost_center=self.sale.cost_center, batch=self.batch)
-            except StockError as err:
-                raise SellError(str(err))
-
-            self.average_cost = item.stock_cost
-        self.quantity_decreased += quantity_to_decrease
-        self.update_tax_values()
+        The same as calling :meth:`.sell` for each one of them, but the stock
+        of all the items is decreased at once, using
+        :meth:`Storable.decrease_stock_many
+        <stoqlib.domain.product.Storable.decrease_stock_many>`
+
+        :param items: a list of |saleitems| of the same |sale|
+        """
+        if not items:
+            return
+
+        sale = items[0].sale
+        decreases = []
+        decreased_items = []
+        for item in items:
+            assert item.sale == sale
+            if not item.sellable.is_available(branch=sale.branch):
+                raise SellError(_(u"%s is not available for sale. Try making it "
+                                  u"available first and then try again.") % (
+                    item.sellable.get_description()))
+
+            # This is emitted here instead of inside the if bellow because one can
+            # connect on it and change this item in a way that, if it wasn't going
+            # to decrease stock before, it will after
+            SaleItemBeforeDecreaseStockEvent.emit(item)
+
+            quantity_to_decrease = item.quantity - item.quantity_decreased
+            storable = item.sellable.product_storable
+            if storable and quantity_to_decrease:
+                decreases.append((storable, quantity_to_decrease,
+                                  item.batch, item.id))
+                decreased_items.append(item)
+
+        try:
+            stock_items = Storable.decrease_stock_many(
+                sale.store, sale.branch, decreases,
+                StockTransactionHistory.TYPE_SELL, user,
+                cost_center=sale.cost_center)
+        except StockError as err:
+            raise SellError(str(err))
+
+        for item, stock_item in zip(decreased_items, stock_items):
+            item.average_cost = stock_item.stock_cost
+
+        for item in items:
+            item.quantity_decreased = item.quantity
+            item.update_tax_values()
 
     def cancel(self, user: LoginUser):
         # This is emitted here instead of inside the if bellow because one can
@@ -685,10 +713,10 @@ class Delivery(Domain):
 
     @property
     def service_item(self):
-        delivery = sysparam.get_object(self.store, 'DELIVERY_SERVICE').sellable
+        delivery_service_id = sysparam.get_object_id('DELIVERY_SERVICE')
         operation = self.invoice.operation
         for item in operation.get_items():
-            if item.sellable == delivery:
+            if item.sellable.id == delivery_service_id:
                 return item
 
     @property
@@ -1283,11 +1311,13 @@ class Sale(IdentifiableDomain):
         assert self.can_confirm()
         assert self.branch
 
-        for item in self.get_items():
+        items = self._get_items_for_confirm()
+        for item in items:
             self.validate_batch(item.batch, sellable=item.sellable)
-            if item.sellable.product:
-                ProductHistory.add_sold_item(self.store, self.branch, item)
-            item.sell(user)
+        ProductHistory.add_sold_items(
+            self.store, self.branch,
+            [item for item in items if item.sellable.product])
+        SaleItem.sell_items(items, user)
 
         self.total_amount = self.get_total_sale_amount()
 
@@ -2032,6 +2062,20 @@ class Sale(IdentifiableDomain):
 
         SaleStatusChangedEvent.emit(self, old_status, user)
 
+    def _get_items_for_confirm(self):
+        # Load the items together with their sellables, products, storables
+        # and batches, so that confirming them will not need to query
+        # those for each item
+        tables = [SaleItem,
+                  Join(Sellable, Sellable.id == SaleItem.sellable_id),
+                  LeftJoin(Product, Product.id == Sellable.id),
+                  LeftJoin(Storable, Storable.id == Product.id),
+                  LeftJoin(StorableBatch, StorableBatch.id == SaleItem.batch_id)]
+        results = self.store.using(*tables).find(
+            (SaleItem, Sellable, Product, Storable, StorableBatch),
+            SaleItem.sale_id == self.id).order_by(SaleItem.te_id)
+        return [item for item, sellable, product, storable, batch in results]
+
     def _get_percentage_value(self, percentage):
         if not percentage:
             return currency(0)
@@ -2555,6 +2599,11 @@ class SaleView(Viewable):
                                           Sum(cls._net_total))
         return ('count', 'sum', 'net_sum'), select
 
+    @classmethod
+    def get_summary_columns(cls):
+        return (('count', 'sum', 'net_sum'),
+                [Count(1), Sum(cls._total), Sum(cls._net_total)])
+
     #
     # Class methods
     #
@@ -2861,10 +2910,9 @@ class SalesPersonSalesView(Viewable):
     def find_by_date(cls, store, date):
         if date:
             if isinstance(date, tuple):
-                date_query = And(Date(Sale.confirm_date) >= date[0],
-                                 Date(Sale.confirm_date) <= date[1])
+                date_query = DateRange(Sale.confirm_date, date[0], date[1])
             else:
-                date_query = Date(Sale.confirm_date) == date
+                date_query = DateRange(Sale.confirm_date, date, date)
 
             results = store.find(cls, date_query)
         else:
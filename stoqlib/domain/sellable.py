@@ -57,6 +57,7 @@ from stoqlib.exceptions import SellableError, TaxError
 from stoqlib.lib.defaults import quantize
 from stoqlib.lib.dateutils import localnow
 from stoqlib.lib.parameters import sysparam
+from stoqlib.lib.sellableindex import get_sellable_index
 from stoqlib.lib.translation import stoqlib_gettext
 from stoqlib.lib.validators import is_date_in_interval
 
@@ -924,10 +925,17 @@ class Sellable(Domain):
     # Domain hooks
     #
 
+    def on_create(self):
+        get_sellable_index().update_sellable(self)
+
     def on_update(self):
+        get_sellable_index().update_sellable(self)
         obj = self.product or self.service
         obj.on_update()
 
+    def on_delete(self):
+        get_sellable_index().remove_sellable(self)
+
     def on_object_changed(self, attr, old_value, value):
         if attr == 'cost':
             self.cost_last_updated = localnow()
@@ -22,7 +22,7 @@
 ## Author(s): Stoq Team <stoq-devel@async.com.br>
 ##
 ##
-""" BranchSynchronization domain class """
+""" BranchSynchronization and ChangeFeedConsumer domain classes """
 
 # pylint: enable=E1101
 
@@ -56,3 +56,27 @@ class BranchSynchronization(ORMObject):
 
     #: policy used to update the branch
     policy = UnicodeCol(allow_none=False)
+
+
+class ChangeFeedConsumer(ORMObject):
+    """A consumer of the :mod:`change feed <stoqlib.database.changefeed>`
+
+    Stores the cursor of the last change read by the consumer, so it
+    can resume reading from there.
+    """
+
+    __storm_table__ = 'change_feed_consumer'
+
+    id = IntCol(primary=True, default=AutoReload)
+
+    #: the name identifying the consumer
+    name = UnicodeCol(allow_none=False)
+
+    #: the transaction id of the cursor
+    txid = IntCol(allow_none=False, default=0)
+
+    #: the transaction entry id of the cursor
+    te_id = IntCol(allow_none=False, default=0)
+
+    #: last time the cursor was updated
+    updated = DateTimeCol()
@@ -81,3 +81,6 @@ class TransactionEntry(ORMObject):
 
     #: For use of the sync conector
     te_server = DateTimeCol()
+
+    #: The id of the last transaction that changed the object
+    txid = IntCol(default=AutoReload)
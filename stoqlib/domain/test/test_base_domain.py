@@ -33,8 +33,9 @@ from storm.references import Reference
 
 from stoqlib.database.properties import (IntCol, UnicodeCol, BoolCol, IdCol,
                                          IdentifierCol)
-from stoqlib.database.runtime import new_store
+from stoqlib.database.runtime import clear_schema_cache, new_store
 from stoqlib.domain.base import Domain
+from stoqlib.domain.sellable import Sellable
 
 from stoqlib.domain.test.domaintest import DomainTest
 
@@ -88,6 +89,8 @@ class TestSelect(DomainTest):
         """
         cls.store.execute(RECREATE_SQL)
         cls.store.commit()
+        # The references to ding may have been cached before it was created
+        clear_schema_cache()
 
     def test_select_one(self):
         self.assertEqual(self.store.find(Ding).one(), None)
@@ -276,6 +279,33 @@ class TestSelect(DomainTest):
         self.assertTrue(ding.can_remove(skip=[('dong', 'ding_id'),
                                               ('dung', 'ding_id')]))
 
+    def test_get_removable_ids(self):
+        ding1 = Ding(store=self.store)
+        ding2 = Ding(store=self.store)
+        ding3 = Ding(store=self.store)
+        ids = [ding1.id, ding2.id, ding3.id]
+        self.assertEqual(Ding.get_removable_ids(self.store, ids), set(ids))
+        self.assertEqual(Ding.get_removable_ids(self.store, []), set())
+
+        Dung(store=self.store, ding=ding1)
+        Dong(store=self.store, ding=ding2)
+        self.assertEqual(Ding.get_removable_ids(self.store, ids),
+                         set([ding3.id]))
+        self.assertEqual(
+            Ding.get_removable_ids(self.store, ids,
+                                   skip=[('dung', 'ding_id')]),
+            set([ding1.id, ding3.id]))
+        self.assertEqual(
+            Ding.get_removable_ids(self.store, ids,
+                                   skip=[('dong', 'ding_id'),
+                                         ('dung', 'ding_id')]),
+            set(ids))
+
+    def test_get_removable_ids_can_remove_overridden(self):
+        # Sellable.can_remove does more checks than the references
+        with self.assertRaises(TypeError):
+            Sellable.get_removable_ids(self.store, [])
+
     def test_get_temporary_identifier(self):
         # When there is no object yet, it should return -1
         self.clean_domain([Dung])
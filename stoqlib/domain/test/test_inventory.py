@@ -90,6 +90,13 @@ class TestInventory(DomainTest):
                          set([storable1.product,
                               storable3.product,
                               storable4.product]))
+        self.assertEqual(
+            set((i.product, i.batch, i.recorded_quantity, i.product_cost)
+                for i in items),
+            set([(storable1.product, None, 10, storable1.product.sellable.cost),
+                 (storable3.product, batch1, 3, storable3.product.sellable.cost),
+                 (storable4.product, batch2, 0, storable4.product.sellable.cost)]))
+        self.assertEqual(set(i.is_adjusted for i in items), set([False]))
 
         # Use this examples to also test get_inventory_data
         data = list(inventory.get_inventory_data())
@@ -243,6 +250,42 @@ class TestInventory(DomainTest):
         inventory.cancel()
         self.assertRaises(AssertionError, inventory.close)
 
+    def test_adjust_items(self):
+        inventory = self.create_inventory()
+        branch = inventory.branch
+        increased = self.create_inventory_item(inventory=inventory)
+        increased.actual_quantity = increased.recorded_quantity + 2
+        decreased = self.create_inventory_item(inventory=inventory)
+        decreased.actual_quantity = decreased.recorded_quantity - 3
+        unchanged = self.create_inventory_item(inventory=inventory)
+        unchanged.actual_quantity = unchanged.recorded_quantity
+        product = self.create_product(storable=False)
+        product.manage_stock = False
+        without_stock = self.create_inventory_item(inventory=inventory,
+                                                   product=product)
+        without_stock.actual_quantity = 4
+
+        inventory.adjust_items([increased, decreased, unchanged, without_stock],
+                               self.current_user, invoice_number=13)
+
+        self.assertEqual(increased.product.storable.get_balance_for_branch(branch), 7)
+        self.assertEqual(decreased.product.storable.get_balance_for_branch(branch), 2)
+        self.assertEqual(unchanged.product.storable.get_balance_for_branch(branch), 5)
+        self.assertEqual(
+            without_stock.product.storable.get_balance_for_branch(branch), 4)
+        self.assertEqual(
+            [increased.is_adjusted, decreased.is_adjusted,
+             unchanged.is_adjusted, without_stock.is_adjusted],
+            [True, True, False, True])
+        self.assertEqual(
+            set(sth.object_id for sth in self.store.find(
+                StockTransactionHistory,
+                type=StockTransactionHistory.TYPE_INVENTORY_ADJUST)),
+            set([increased.id, decreased.id]))
+        self.assertEqual(
+            self.store.find(FiscalBookEntry,
+                            entry_type=FiscalBookEntry.TYPE_INVENTORY).count(), 2)
+
     def test_all_items_counted(self):
         inventory = self.create_inventory()
         item1 = self.create_inventory_item(inventory)
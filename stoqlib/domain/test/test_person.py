@@ -30,7 +30,7 @@ from dateutil.relativedelta import relativedelta
 from kiwi.currency import currency
 import mock
 from storm.exceptions import NotOneError, IntegrityError
-from storm.expr import And
+from storm.expr import And, Update
 from storm.store import AutoReload
 from storm.tracer import BaseStatementTracer, install_tracer, remove_tracer_type
 
@@ -382,6 +382,52 @@ class TestIndividual(_PersonFacetTest, DomainTest):
         self.assertTrue(client3.person.individual in individuals)
         self.assertTrue(client4.person.individual in individuals)
 
+    def test_birthday_key(self):
+        individual = self.create_individual()
+        self.assertIsNone(individual.birthday_key)
+        individual.birth_date = localdate(1972, 10, 15)
+        self.assertEqual(individual.birthday_key, 1015)
+
+        # The database keeps the key updated too
+        self.store.execute(Update({Individual.birth_date: localdate(1980, 1, 2)},
+                                  Individual.id == individual.id, Individual))
+        self.store.invalidate(individual)
+        self.assertEqual(individual.birthday_key, 102)
+        individual.birth_date = None
+        self.store.flush()
+        self.store.invalidate(individual)
+        self.assertIsNone(individual.birthday_key)
+
+    def test_get_birthday_query_keys(self):
+        births = [localdate(1972, 1, 2), localdate(1989, 2, 28),
+                  localdate(2000, 2, 29), localdate(2001, 3, 1),
+                  localdate(2005, 12, 30)]
+        individuals = []
+        for birth_date in births:
+            individual = self.create_individual()
+            individual.birth_date = birth_date
+            individuals.append(individual)
+
+        def find(start, end=None):
+            query = Individual.get_birthday_query(start, end)
+            found = set(self.store.find(Individual, query)) & set(individuals)
+            return set(births[individuals.index(i)] for i in found)
+
+        self.assertEqual(find(localdate(2010, 1, 2)), set([births[0]]))
+        # Leap years have their own february 29, on the other ones the
+        # birthdays are on march 1
+        self.assertEqual(find(localdate(2012, 2, 29)), set([births[2]]))
+        self.assertEqual(find(localdate(2012, 3, 1)), set([births[3]]))
+        self.assertEqual(find(localdate(2010, 3, 1)),
+                         set([births[2], births[3]]))
+        self.assertEqual(find(localdate(2010, 2, 1), localdate(2010, 2, 28)),
+                         set([births[1]]))
+        # From one year to the next one
+        self.assertEqual(find(localdate(2010, 12, 25), localdate(2011, 1, 5)),
+                         set([births[0], births[4]]))
+        self.assertEqual(find(localdate(2010, 6, 1), localdate(2011, 6, 1)),
+                         set(births))
+
     def test_get_raw_cpf(self):
         individual = self.create_individual()
         individual.cpf = u'262'
@@ -919,6 +919,20 @@ class TestProductHistory(DomainTest):
         self.assertEqual(prod_hist.quantity_sold,
                          sale_item.quantity)
 
+    def test_add_sold_items(self):
+        branch = self.create_branch()
+        sale_items = [self.create_sale_item(quantity=quantity)
+                      for quantity in [2, 3]]
+        ProductHistory.add_sold_items(self.store, branch, sale_items)
+        ProductHistory.add_sold_items(self.store, branch, [])
+
+        for sale_item in sale_items:
+            prod_hist = self.store.find(ProductHistory,
+                                        sellable=sale_item.sellable).one()
+            self.assertEqual(prod_hist.branch, branch)
+            self.assertEqual(prod_hist.quantity_sold, sale_item.quantity)
+            self.assertIsNotNone(prod_hist.sold_date)
+
     def test_add_transfered_quantity(self):
         qty = 10
 
@@ -1373,6 +1387,84 @@ class TestStorable(DomainTest):
 
         self.assertFalse(cost_center.get_stock_transaction_entries().is_empty())
 
+    def test_decrease_stock_many(self):
+        branch = self.current_branch
+        storable1 = self.create_storable(branch=branch, stock=10, unit_cost=5)
+        storable2, batch = self.create_storable(branch=branch, stock=5,
+                                                unit_cost=3, is_batch=True)
+        cost_center = self.create_cost_center()
+
+        decreases = [(storable1, 2, None, None),
+                     (storable2, 1, batch, None),
+                     (storable1, 3, None, None)]
+        stock_items = Storable.decrease_stock_many(
+            self.store, branch, decreases, StockTransactionHistory.TYPE_SELL,
+            self.current_user, cost_center=cost_center)
+
+        self.assertEqual(stock_items,
+                         [storable1.get_stock_item(branch, None),
+                          storable2.get_stock_item(branch, batch),
+                          storable1.get_stock_item(branch, None)])
+        self.assertEqual(storable1.get_balance_for_branch(branch), 5)
+        self.assertEqual(storable2.get_balance_for_branch(branch), 4)
+        self.assertEqual(stock_items[0].stock_cost, 5)
+        self.assertEqual(stock_items[1].stock_cost, 3)
+        self.assertEqual(
+            sorted(sth.quantity for sth in self.store.find(
+                StockTransactionHistory,
+                type=StockTransactionHistory.TYPE_SELL)),
+            [-3, -2, -1])
+        self.assertEqual(
+            cost_center.get_stock_transaction_entries().count(), 3)
+
+        # The sum of the decreases is greater than the available stock
+        with self.assertRaises(StockError):
+            Storable.decrease_stock_many(
+                self.store, branch, [(storable1, 3, None, None),
+                                     (storable1, 3, None, None)],
+                StockTransactionHistory.TYPE_SELL, self.current_user)
+        self.assertEqual(storable1.get_balance_for_branch(branch), 5)
+
+        with self.assertRaises(ValueError):
+            Storable.decrease_stock_many(
+                self.store, branch, [(storable1, 0, None, None)],
+                StockTransactionHistory.TYPE_SELL, self.current_user)
+
+        self.assertEqual(
+            Storable.decrease_stock_many(
+                self.store, branch, [], StockTransactionHistory.TYPE_SELL,
+                self.current_user), [])
+
+    def test_increase_stock_many(self):
+        branch = self.current_branch
+        storable1 = self.create_storable(branch=branch, stock=10, unit_cost=5)
+        storable2 = self.create_storable(is_batch=True)
+        batch = self.create_storable_batch(storable2)
+        self.assertIsNone(storable2.get_stock_item(branch, batch))
+
+        increases = [(storable1, 2, None, None, None),
+                     (storable2, 1, batch, None, 3),
+                     (storable1, 3, None, None, None)]
+        Storable.increase_stock_many(
+            self.store, branch, increases,
+            StockTransactionHistory.TYPE_INVENTORY_ADJUST, self.current_user)
+
+        self.assertEqual(storable1.get_balance_for_branch(branch), 15)
+        self.assertEqual(storable2.get_balance_for_branch(branch), 1)
+        self.assertEqual(storable1.get_stock_item(branch, None).stock_cost, 5)
+        self.assertEqual(storable2.get_stock_item(branch, batch).stock_cost, 3)
+        self.assertEqual(
+            sorted(sth.quantity for sth in self.store.find(
+                StockTransactionHistory,
+                type=StockTransactionHistory.TYPE_INVENTORY_ADJUST)),
+            [1, 2, 3])
+
+        with self.assertRaises(ValueError):
+            Storable.increase_stock_many(
+                self.store, branch, [(storable1, 0, None, None, None)],
+                StockTransactionHistory.TYPE_INVENTORY_ADJUST,
+                self.current_user)
+
     def test_update_stock_cost(self):
         stock_item = self.create_product_stock_item(quantity=10, stock_cost=50)
         self.assertEqual(stock_item.quantity, 10)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+"""Checks that the main search views can use the indexes when filtered"""
+
+import datetime
+
+import mock
+
+from stoqlib.database.queryexecuter import (DateIntervalQueryState,
+                                            DateQueryState, QueryExecuter,
+                                            StringQueryState)
+from stoqlib.domain.payment.views import InPaymentView, OutPaymentView
+from stoqlib.domain.person import CallsView, ClientView, SupplierView
+from stoqlib.domain.purchase import PurchaseOrderView
+from stoqlib.domain.sale import SaleView
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.domain.workorder import WorkOrderView
+
+
+class QueryPlanTest(DomainTest):
+    def setUp(self):
+        super(QueryPlanTest, self).setUp()
+        # The tables on the test database are too small for the planner to
+        # choose an index by itself, so make it use them whenever it can.
+        # This is reverted when the store is rolled back
+        self.store.execute(u'SET LOCAL enable_seqscan = off')
+
+    def _search(self, search_spec, column, state_class, *args):
+        search_filter = mock.Mock()
+        executer = QueryExecuter(self.store)
+        executer.set_search_spec(search_spec)
+        executer.set_filter_columns(search_filter, [column])
+        return executer.search([state_class(search_filter, *args)])
+
+    def assertUsesIndex(self, resultset, index_name):
+        plan = u'\n'.join(resultset.explain())
+        self.assertIn(u'Index', plan)
+        self.assertIn(index_name, plan, plan)
+
+    def test_date_state(self):
+        today = datetime.date.today()
+        for search_spec, column, index_name in [
+                (SaleView, SaleView.open_date, u'sale_open_date_idx'),
+                (InPaymentView, InPaymentView.due_date, u'payment_due_date_idx'),
+                (CallsView, CallsView.date, u'calls_date_idx')]:
+            resultset = self._search(search_spec, column, DateQueryState,
+                                     today)
+            self.assertUsesIndex(resultset, index_name)
+
+    def test_date_interval_state(self):
+        start = datetime.date(2012, 1, 1)
+        end = datetime.date(2012, 1, 31)
+        for search_spec, column, index_name in [
+                (SaleView, SaleView.confirm_date, u'sale_confirm_date_idx'),
+                (InPaymentView, InPaymentView.due_date, u'payment_due_date_idx'),
+                (OutPaymentView, OutPaymentView.open_date,
+                 u'payment_open_date_idx'),
+                (PurchaseOrderView, PurchaseOrderView.open_date,
+                 u'purchase_order_open_date_idx'),
+                (WorkOrderView, WorkOrderView.open_date,
+                 u'work_order_open_date_idx')]:
+            resultset = self._search(search_spec, column,
+                                     DateIntervalQueryState, start, end)
+            self.assertUsesIndex(resultset, index_name)
+
+            # Only one of the dates
+            resultset = self._search(search_spec, column,
+                                     DateIntervalQueryState, start, None)
+            self.assertUsesIndex(resultset, index_name)
+
+    def test_string_state(self):
+        for search_spec, column, index_name in [
+                (ClientView, ClientView.name, u'person_name_search_trgm_idx'),
+                (SupplierView, SupplierView.cnpj,
+                 u'company_cnpj_search_trgm_idx')]:
+            resultset = self._search(search_spec, column, StringQueryState,
+                                     u'silva')
+            self.assertUsesIndex(resultset, index_name)
+
+    def test_find_by_date(self):
+        today = datetime.date.today()
+        self.assertUsesIndex(InPaymentView.find_pending(self.store, today),
+                             u'payment_due_date_idx')
+        self.assertUsesIndex(
+            PurchaseOrderView.find_confirmed(self.store, (today, today)),
+            u'purchase_order_expected_receival_date_idx')
@@ -366,6 +366,29 @@ class TestSale(DomainTest):
         with self.assertRaisesRegex(SellError, expected):
             sale.order(self.current_user)
 
+    def test_confirm_multiple_items(self):
+        sale = self.create_sale()
+        sellable1 = self.add_product(sale, quantity=2)
+        sellable2 = self.add_product(sale, quantity=3)
+        # The same sellable twice, the stock should be decreased for both
+        sale.add_sellable(sellable1, quantity=4)
+        service = self.create_service()
+        sale.add_sellable(service.sellable)
+        sale.order(self.current_user)
+        self.add_payments(sale, u'money')
+
+        sale.confirm(self.current_user)
+        self.assertEqual(sale.status, Sale.STATUS_CONFIRMED)
+        storable1 = sellable1.product_storable
+        storable2 = sellable2.product_storable
+        self.assertEqual(storable1.get_balance_for_branch(sale.branch), 94)
+        self.assertEqual(storable2.get_balance_for_branch(sale.branch), 97)
+        for item in sale.get_items():
+            self.assertEqual(item.quantity_decreased, item.quantity)
+        self.assertEqual(
+            self.store.find(StockTransactionHistory,
+                            type=StockTransactionHistory.TYPE_SELL).count(), 3)
+
     def test_confirm_with_sale_token(self):
         token = self.create_sale_token(code=u'Token')
         sale = self.create_sale(sale_token=token)
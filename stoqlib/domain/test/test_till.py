@@ -178,6 +178,50 @@ class TestTill(DomainTest):
         till.add_credit_entry(currency(5), u"")
         self.assertEqual(till.get_debits_total(), old - 10)
 
+    def test_get_day_totals(self):
+        till = Till(store=self.store,
+                    branch=self.current_branch,
+                    station=self.create_station())
+        till.open_till(self.current_user)
+        till.initial_cash_amount = 20
+
+        till.add_credit_entry(currency(10), u"")
+        till.add_debit_entry(currency(5), u"")
+        inpayment = self._create_inpayment()
+        till.add_entry(inpayment)
+        outpayment = self._create_outpayment()
+        till.add_entry(outpayment)
+        card_payment = self.create_card_payment(provider_id=u'VISA',
+                                                payment_value=30)
+        till.add_entry(card_payment)
+
+        totals = till.get_day_totals()
+        self.assertEqual(totals.balance, till.get_balance())
+        self.assertEqual(totals.balance, 20 + 10 - 5 + 10 - 10 + 30)
+        self.assertEqual(totals.cash_amount, till.get_cash_amount())
+        self.assertEqual(totals.cash_amount, 25)
+        self.assertEqual(totals.credits_total, till.get_credits_total())
+        self.assertEqual(totals.debits_total, till.get_debits_total())
+
+        money = PaymentMethod.get_by_name(self.store, u'money')
+        bill = PaymentMethod.get_by_name(self.store, u'bill')
+        card_data = card_payment.card_data
+        self.assertEqual(
+            set(totals.methods),
+            set([(money.id, None, None, False, 10, -5),
+                 (bill.id, None, None, True, 10, -10),
+                 (card_payment.method.id, card_data.provider.id,
+                  card_data.card_type, True, 30, None)]))
+
+        summary = till.get_day_summary()
+        self.assertEqual(
+            set((s.method, s.provider, s.card_type, s.system_value)
+                for s in summary),
+            set([(money, None, None, 5),
+                 (bill, None, None, 0),
+                 (card_payment.method, card_data.provider,
+                  card_data.card_type, 30)]))
+
     def test_till_open_yesterday(self):
         yesterday = localnow() - datetime.timedelta(1)
 
@@ -48,6 +48,7 @@ from stoqlib.domain.views import ProductComponentView
 from stoqlib.domain.views import ProductFullStockView
 from stoqlib.domain.views import ProductFullStockItemView
 from stoqlib.domain.views import ProductFullStockItemSupplierView
+from stoqlib.domain.views import ProductWithStockBranchView
 from stoqlib.domain.views import QuotationView
 from stoqlib.domain.views import SellableCategoryView
 from stoqlib.domain.views import SellableFullStockView
@@ -505,6 +506,26 @@ class TestProductFullStockView(DomainTest):
         self.assertEqual(viewable.get_parent(), parent_viewable)
 
 
+class TestProductWithStockBranchView(DomainTest):
+    def test_branch_without_stock_item(self):
+        branch = self.create_branch()
+        other_branch = self.create_branch()
+        product = self.create_product()
+        storable = self.create_storable(product, branch, stock=5)
+        storable.decrease_stock(5, branch,
+                                StockTransactionHistory.TYPE_MANUAL_ADJUST,
+                                object_id=None, user=self.current_user)
+
+        # The product is listed on the branch where it has a stock item,
+        # even without stock, but not on the branch where it never had one
+        views = self.store.find(ProductWithStockBranchView,
+                                ProductWithStockBranchView.id == product.id)
+        self.assertEqual([(view.branch_id, view.stock) for view in views],
+                         [(branch.id, 0)])
+        self.assertTrue(views.find(branch_id=branch.id).one())
+        self.assertIsNone(views.find(branch_id=other_branch.id).one())
+
+
 class TestProductComponentView(DomainTest):
     def test_sellable(self):
         pc1 = self.create_product_component()
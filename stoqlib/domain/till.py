@@ -28,13 +28,14 @@
 
 import collections
 import logging
+import uuid
 
 from kiwi.currency import currency
-from storm.expr import And, Eq, Join, LeftJoin, Or
+from storm.expr import And, Coalesce, Eq, Insert, Join, LeftJoin, Ne, Or, Sum
 from storm.info import ClassAlias
 from storm.references import Reference, ReferenceSet
 
-from stoqlib.database.expr import Date, TransactionTimestamp
+from stoqlib.database.expr import Case, Date, TransactionTimestamp
 from stoqlib.database.properties import (PriceCol, DateTimeCol, UnicodeCol,
                                          IdentifierCol, IdCol, EnumCol)
 from stoqlib.database.viewable import Viewable
@@ -55,6 +56,19 @@ _ = stoqlib_gettext
 
 log = logging.getLogger(__name__)
 
+#: The entries of a |till| grouped by payment method, card provider and
+#: card type. Entries without a payment are counted as money and have
+#: ``has_payment`` set to ``False``. credits and debits are ``None`` if
+#: there are no entries with positive or negative values.
+TillMethodTotal = collections.namedtuple(
+    'TillMethodTotal',
+    ['method_id', 'provider_id', 'card_type', 'has_payment', 'credits', 'debits'])
+
+#: The totals of a |till|, see :meth:`Till.get_day_totals`
+TillDayTotals = collections.namedtuple(
+    'TillDayTotals',
+    ['methods', 'balance', 'cash_amount', 'credits_total', 'debits_total'])
+
 #
 # Domain Classes
 #
@@ -210,7 +224,7 @@ class Till(IdentifiableDomain):
             # Make sure that the till has not been opened today
             today = localtoday().date()
             if not self.store.find(Till,
-                                   And(Date(Till.opening_date) >= today,
+                                   And(Till.opening_date >= today,
                                        Till.station_id == self.station.id)).is_empty():
                 raise TillError(_("A till has already been opened today"))
 
@@ -241,12 +255,13 @@ class Till(IdentifiableDomain):
         if self.status == Till.STATUS_CLOSED:
             raise TillError(_("Till is already closed"))
 
-        if self.get_balance() < 0:
+        balance = self.get_balance()
+        if balance < 0:
             raise ValueError(_("Till balance is negative, but this should not "
                                "happen. Contact Stoq Team if you need "
                                "assistance"))
 
-        self.final_cash_amount = self.get_balance()
+        self.final_cash_amount = balance
         self.closing_date = TransactionTimestamp()
         self.status = Till.STATUS_CLOSED
         self.observations = observations
@@ -365,6 +380,43 @@ class Till(IdentifiableDomain):
                            TillEntry.till_id == self.id))
         return currency(results.sum(TillEntry.value) or 0)
 
+    def get_day_totals(self):
+        """Get the totals of the entries of this till
+
+        All the totals are calculated by a single query, grouping the
+        entries by their payment methods, card providers and card types.
+
+        :returns: a :class:`TillDayTotals`, with the |till| totals and
+            a list of :class:`TillMethodTotal` on ``methods``
+        """
+        store = self.store
+        money = PaymentMethod.get_by_name(store, u'money')
+        method_id = Coalesce(Payment.method_id, money.id)
+        has_payment = Ne(TillEntry.payment_id, None)
+        tables = [TillEntry,
+                  LeftJoin(Payment, Payment.id == TillEntry.payment_id),
+                  LeftJoin(CreditCardData, CreditCardData.payment_id == Payment.id)]
+        results = store.using(*tables).find(
+            (method_id, CreditCardData.provider_id, CreditCardData.card_type,
+             has_payment,
+             Sum(Case(TillEntry.value > 0, TillEntry.value)),
+             Sum(Case(TillEntry.value < 0, TillEntry.value))),
+            TillEntry.till_id == self.id)
+        results = results.group_by(method_id, CreditCardData.provider_id,
+                                   CreditCardData.card_type, has_payment)
+
+        methods = [TillMethodTotal(*row) for row in results]
+        credits_total = sum(m.credits or 0 for m in methods)
+        debits_total = sum(m.debits or 0 for m in methods)
+        cash_total = sum((m.credits or 0) + (m.debits or 0)
+                         for m in methods if m.method_id == money.id)
+        return TillDayTotals(
+            methods=methods,
+            balance=currency(self.initial_cash_amount + credits_total + debits_total),
+            cash_amount=currency(self.initial_cash_amount + cash_total),
+            credits_total=currency(credits_total),
+            debits_total=currency(debits_total))
+
     # FIXME: Rename to create_day_summary
     def get_day_summary(self):
         """Get the summary of this till for closing.
@@ -373,28 +425,27 @@ class Till(IdentifiableDomain):
         will save the values all payment methods used.
         """
         money_method = PaymentMethod.get_by_name(self.store, u'money')
-        day_history = {}
+        day_history = collections.OrderedDict()
         # Keys are (method, provider, card_type), provider and card_type may be None if
         # payment was not with card
-        day_history[(money_method, None, None)] = 0
+        day_history[(money_method.id, None, None)] = 0
 
-        for entry in self.get_entries():
-            provider = card_type = None
-            payment = entry.payment
-            method = payment.method if payment else money_method
-            if payment and payment.card_data:
-                provider = payment.card_data.provider
-                card_type = payment.card_data.card_type
-
-            key = (method, provider, card_type)
+        for total in self.get_day_totals().methods:
+            key = (total.method_id, total.provider_id, total.card_type)
             day_history.setdefault(key, 0)
-            day_history[key] += entry.value
-
-        summary = []
-        for (method, provider, card_type), value in day_history.items():
-            summary.append(TillSummary(till=self, method=method, provider=provider,
-                                       card_type=card_type, system_value=value))
-        return summary
+            day_history[key] += (total.credits or 0) + (total.debits or 0)
+
+        rows = [(str(uuid.uuid1()), self.id, method_id, provider_id, card_type, value)
+                for (method_id, provider_id, card_type), value in day_history.items()]
+        columns = [TillSummary.id, TillSummary.till_id, TillSummary.method_id,
+                   TillSummary.provider_id, TillSummary.card_type,
+                   TillSummary.system_value]
+        self.store.execute(Insert(collections.OrderedDict.fromkeys(columns),
+                                  table=TillSummary, values=rows))
+
+        summaries = dict((summary.id, summary) for summary in self.store.find(
+            TillSummary, TillSummary.id.is_in([row[0] for row in rows])))
+        return [summaries[row[0]] for row in rows]
 
     #
     # Private
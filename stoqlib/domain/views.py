@@ -26,7 +26,7 @@
 
 from kiwi.currency import currency
 from storm.expr import (And, Coalesce, Eq, Join, LeftJoin, Or, Sum, Select,
-                        Alias, Count, Cast, Ne, JoinExpr)
+                        Alias, Count, Cast, Ne, JoinExpr, Table, Exists)
 from storm.info import ClassAlias
 
 from stoqlib.database.expr import (Case, Distinct, Field, NullIf,
@@ -62,31 +62,48 @@ from stoqlib.domain.sellable import (Sellable, SellableUnit,
 from stoqlib.domain.stockdecrease import (StockDecrease, StockDecreaseItem)
 from stoqlib.domain.workorder import WorkOrder, WorkOrderItem
 from stoqlib.lib.decorators import cached_property
+from stoqlib.lib.stocksummary import BRANCH_SUMMARY_TABLE, SUMMARY_TABLE
 from stoqlib.lib.defaults import DECIMAL_PRECISION
 
-# This subselect will be used to filter by branch, so it should include all
+# This summary will be used to filter by branch, so it includes all
 # possible (branch, storable) combinations so that all storables appear in the
-# results
-_StockBranchSummary = Alias(Select(
-    columns=[Alias(Storable.id, 'storable_id'),
-             Alias(Branch.id, 'branch_id'),
-             Alias(Sum(ProductStockItem.quantity), 'stock'),
-             Alias(Sum(ProductStockItem.quantity
-                       * ProductStockItem.stock_cost),
-                   'total_stock_cost')],
-    tables=[Storable,
-            # This is equivalent to a cross join
-            Join(Branch, And(True)),
-            LeftJoin(ProductStockItem, And(ProductStockItem.branch_id == Branch.id,
-                                           ProductStockItem.storable_id == Storable.id))],
-    group_by=[Storable.id, Branch.id]), '_stock_summary')
-
+# results. See stoqlib.lib.stocksummary
+_StockBranchSummary = Alias(Table(BRANCH_SUMMARY_TABLE), '_stock_summary')
+
+# The stock of the storables on all branches and on a single branch. They
+# share the alias so the same columns can be used with both of them
+_ProductStockSummary = Alias(Table(SUMMARY_TABLE), '_product_stock')
+_ProductStockBranchSummary = Alias(Table(BRANCH_SUMMARY_TABLE),
+                                   '_product_stock')
+
+
+def _join_stock_branch_summary(tables, branch=None):
+    # Replaces the stock summary join on tables with the one of the stock
+    # on each branch, or only on the given branch
+    query = Field('_product_stock', 'storable_id') == Storable.id
+    if branch is not None:
+        query = And(query, Field('_product_stock', 'branch_id') == branch.id)
+
+    tables = tables[:]
+    for i, table in enumerate(tables):
+        if not isinstance(table, JoinExpr):
+            continue
+        if (table.right is _ProductStockSummary or
+                table.right is _ProductStockBranchSummary):
+            tables[i] = LeftJoin(_ProductStockBranchSummary, query)
+            return tables
+    raise AssertionError("Did not find the stock summary join")
+
+
+# The sale started before the end of today and ends today or later.
+# Comparing the dates directly avoids calling DATE() for every sellable
+_today = Date(StatementTimestamp())
 _price_search = Case(
-    condition=Or(And(Date(StatementTimestamp()) >= Date(Sellable.on_sale_start_date),
-                     Date(StatementTimestamp()) <= Date(Sellable.on_sale_end_date)),
+    condition=Or(And(Sellable.on_sale_start_date < _today + 1,
+                     Sellable.on_sale_end_date >= _today),
                  And(Eq(Sellable.on_sale_start_date, None),
-                     Date(StatementTimestamp()) <= Date(Sellable.on_sale_end_date)),
-                 And(Date(StatementTimestamp()) >= Date(Sellable.on_sale_start_date),
+                     Sellable.on_sale_end_date >= _today),
+                 And(Sellable.on_sale_start_date < _today + 1,
                      Eq(Sellable.on_sale_end_date, None))),
     result=Sellable.on_sale_price,
     else_=Sellable.base_price)
@@ -151,16 +168,16 @@ class ProductFullStockView(Viewable):
     category_description = SellableCategory.description
     unit = SellableUnit.description
 
-    # Aggregates
-    total_stock_cost = Coalesce(Sum(ProductStockItem.quantity *
-                                    ProductStockItem.stock_cost), 0)
-    stock = Coalesce(Sum(ProductStockItem.quantity), 0)
+    # Stock summary
+    total_stock_cost = Coalesce(Field('_product_stock', 'total_stock_cost'), 0)
+    stock = Coalesce(Field('_product_stock', 'stock'), 0)
 
     tables = [
         Sellable,
         Join(Product, Product.id == Sellable.id),
         LeftJoin(Storable, Storable.id == Product.id),
-        LeftJoin(ProductStockItem, ProductStockItem.storable_id == Storable.id),
+        LeftJoin(_ProductStockSummary,
+                 Field('_product_stock', 'storable_id') == Storable.id),
         LeftJoin(SellableTaxConstant,
                  SellableTaxConstant.id == Sellable.tax_constant_id),
         LeftJoin(SellableCategory, SellableCategory.id == Sellable.category_id),
@@ -173,7 +190,8 @@ class ProductFullStockView(Viewable):
 
     clause = Sellable.status != Sellable.STATUS_CLOSED
     group_by = [id, product_id, storable_id, category_description,
-                manufacturer, tax_description, unit, image_id]
+                manufacturer, tax_description, unit, image_id,
+                stock, total_stock_cost]
 
     __hash__ = Viewable.__hash__
 
@@ -197,30 +215,24 @@ class ProductFullStockView(Viewable):
             tables=[Alias(expr, '_sub')])
         return ('count', 'sum'), select
 
+    @classmethod
+    def get_summary_columns(cls):
+        # The view is grouped by the sellable, so each row is a product
+        # and the sum is done over the aggregated stock of each one
+        return ('count', 'sum'), [Count(1), Sum(cls.stock)]
+
     @classmethod
     def find_by_branch(cls, store, branch):
         if branch is None:
             return store.find(cls)
 
-        # Highjack the class being queried, since we need to add the branch
-        # on the ProductStockItem join to filter it.
+        # Highjack the class being queried, since we need to join the
+        # stock summary of the branch instead of the one of all branches.
         # Make sure to create it only once or else Viewable would fail to
         # compare both objects as their class would be different.
         hv = cls.highjacked.get(branch.id, None)
         if hv is None:
-            tables = cls.tables[:]
-            for i, table in enumerate(tables):
-                if not isinstance(table, JoinExpr):
-                    continue
-                if table.right is ProductStockItem:
-                    tables[i] = LeftJoin(
-                        ProductStockItem,
-                        And(ProductStockItem.storable_id == Storable.id,
-                            ProductStockItem.branch_id == branch.id))
-                    break
-            else:  # pragma nocoverage
-                raise AssertionError("Did not find ProductStockItem join")
-
+            tables = _join_stock_branch_summary(cls.tables, branch)
             hv = type(
                 "Highjacked%s" % (cls.__name__, ),
                 (cls, ),
@@ -322,13 +334,22 @@ class ProductWithStockBranchView(ProductFullStockView):
     filter, otherwise, the results may be duplicated (once for each branch in
     the database)
     """
-    branch_id = ProductStockItem.branch_id
+    branch_id = Field('_product_stock', 'branch_id')
     minimum_quantity = Storable.minimum_quantity
     maximum_quantity = Storable.maximum_quantity
 
+    tables = _join_stock_branch_summary(ProductFullStockView.tables)
+
+    # The summary has a row for every branch, but only the branches where
+    # the product has a stock item should be listed
     clause = And(ProductFullStockView.clause,
                  Eq(Product.is_grid, False),
-                 Eq(Product.is_package, False))
+                 Eq(Product.is_package, False),
+                 Exists(Select(ProductStockItem.id,
+                               tables=[ProductStockItem],
+                               where=And(
+                                   ProductStockItem.storable_id == Storable.id,
+                                   ProductStockItem.branch_id == branch_id))))
 
     group_by = ProductFullStockView.group_by[:]
     group_by.append(branch_id)
@@ -1479,6 +1479,10 @@ class WorkOrderView(Viewable):
         select = sresults.get_select_expr(Count(1), Sum(cls.total))
         return ('count', 'sum'), select
 
+    @classmethod
+    def get_summary_columns(cls):
+        return ('count', 'sum'), [Count(1), Sum(cls.total)]
+
     @classmethod
     def find_by_current_branch(cls, store, branch):
         return store.find(cls, WorkOrder.current_branch_id == branch.id)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+"""Streaming CSV exporter"""
+
+import csv
+import datetime
+import io
+
+from stoqlib.exporters.exporter import Exporter
+
+
+class CSVExporter(Exporter):
+    """Exports rows to a CSV file, writing them as they are added"""
+
+    suffix = '.csv'
+    mime_type = 'text/csv'
+
+    def __init__(self, name=None):
+        Exporter.__init__(self, name=name)
+        self._text = io.TextIOWrapper(self._fp, encoding='utf-8', newline='')
+        self._writer = csv.writer(self._text)
+
+    #
+    # Exporter
+    #
+
+    def convert_value(self, value):
+        value = Exporter.convert_value(self, value)
+        if isinstance(value, datetime.datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(value, datetime.date):
+            return value.strftime('%Y-%m-%d')
+        return value
+
+    def write_header(self, headers):
+        self._writer.writerow(headers)
+
+    def write_row(self, row):
+        self._writer.writerow([self.convert_value(v) for v in row])
+
+    def finish(self):
+        # Do not close the wrapper, that would close the file as well
+        self._text.flush()
+        self._text.detach()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+"""Base class for streaming exporters"""
+
+import os
+import tempfile
+
+from stoqlib.database.runtime import StoqlibResultSet
+from stoqlib.lib.translation import stoqlib_gettext
+
+_ = stoqlib_gettext
+
+
+class Exporter(object):
+    """Base class for exporters which write the rows as they are added
+
+    Instead of keeping the whole document in memory, the rows are written
+    to a temporary file as soon as they are added, so exporting lots of
+    rows (for instance, directly from a result set) uses a constant amount
+    of memory.
+
+    Nothing here uses gtk, so the rows can be written from a thread other
+    than the main one. Use :meth:`.set_progress_callback` to follow the
+    progress and :meth:`.cancel` to stop it.
+
+    :cvar suffix: the suffix of the exported file
+    :cvar mime_type: the mime type of the exported file
+    :cvar progress_interval: how many rows are written between calls
+      to the progress callback
+    """
+
+    suffix = None
+    mime_type = None
+    progress_interval = 500
+
+    def __init__(self, name=None):
+        self.name = name or _('Stoq sheet')
+        self._headers = None
+        self._column_types = None
+        self._progress_callback = None
+        self._cancelled = False
+
+        fd, self._filename = tempfile.mkstemp(prefix='Stoq-',
+                                              suffix=self.suffix)
+        self._fp = os.fdopen(fd, 'wb')
+
+    #
+    # Public API
+    #
+
+    def set_column_headers(self, headers):
+        self._headers = headers
+
+    def set_column_types(self, column_types):
+        self._column_types = column_types
+
+    def set_progress_callback(self, callback):
+        """Sets a callback to be called while the rows are written
+
+        :param callback: a callable receiving the number of rows already
+          written and the total number of rows, which may be ``None``
+          if it is unknown
+        """
+        self._progress_callback = callback
+
+    def cancel(self):
+        """Cancels the export, no more rows will be written
+
+        This can be called from another thread.
+        """
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def add_cells(self, cells, filter_description=None, total=None):
+        """Writes the cells
+
+        :param cells: an iterable of rows, each one a list of values
+        :param filter_description: a description of how the cells
+          were filtered, if any
+        :param total: the total number of rows, if known
+        """
+        self.start(filter_description)
+        if self._headers:
+            self.write_header(self._headers)
+
+        n_rows = 0
+        for row in cells:
+            if self._cancelled:
+                break
+            self.write_row(row)
+            n_rows += 1
+            if (self._progress_callback is not None and
+                    n_rows % self.progress_interval == 0):
+                self._progress_callback(n_rows, total)
+
+        if self._progress_callback is not None:
+            self._progress_callback(n_rows, total)
+
+    def add_from_object_list(self, objectlist, data=None,
+                             filter_description=None):
+        """Writes the visible columns of an objectlist
+
+        :param objectlist: the objectlist
+        :param data: the objects to write, instead of the ones in
+          the objectlist. A result set will be iterated directly, without
+          loading all its objects in memory
+        :param filter_description: a description of how the objects
+          were filtered, if any
+        """
+        columns = objectlist.get_visible_columns()
+        self.set_column_types([c.data_type for c in columns])
+        self.set_column_headers([
+            getattr(c, 'long_title', None) or c.title for c in columns])
+
+        if data is None:
+            data = objectlist
+        if isinstance(data, StoqlibResultSet):
+            total = data.count()
+        else:
+            total = len(data)
+
+        attributes = [c.attribute for c in columns]
+        cells = ([getattr(item, attr, None) for attr in attributes]
+                 for item in data)
+        self.add_cells(cells, filter_description=filter_description,
+                       total=total)
+
+    def save(self, prefix=''):
+        """Finishes the file
+
+        :param prefix: a prefix for the name of the file
+        :returns: the file, opened for reading
+        """
+        self.finish()
+        self._fp.close()
+
+        if prefix:
+            prefix = 'Stoq-%s-' % (prefix, )
+        else:
+            prefix = 'Stoq-'
+        fd, filename = tempfile.mkstemp(prefix=prefix, suffix=self.suffix)
+        os.close(fd)
+        os.replace(self._filename, filename)
+        return open(filename, 'rb')
+
+    def convert_value(self, value):
+        """Converts a value to something that can be written
+
+        :param value: the value
+        :returns: the converted value
+        """
+        if value is None:
+            return ''
+        if isinstance(value, bytes):
+            return value.decode()
+        return value
+
+    #
+    # Override in subclasses
+    #
+
+    def start(self, filter_description):
+        """Called before writing the rows
+
+        :param filter_description: the description of the filter,
+          may be ``None``
+        """
+
+    def write_header(self, headers):
+        """Writes the column headers
+
+        :param headers: a list with the headers
+        """
+        raise NotImplementedError
+
+    def write_row(self, row):
+        """Writes a row
+
+        :param row: a list with the values of the row
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        """Called when saving, after all the rows were written"""
@@ -48,10 +48,14 @@ def write_app_description(sheet, row, filter_description=None):
     sheet.row(row).height = 1000
 
 
-def write_app_hyperlink(sheet, row):
+def get_app_hyperlink():
+    """Returns the url and the label of the hyperlink to Stoq's website"""
     url = u"http://www.stoq.com.br/"
-    formula = xlwt.Formula(u'HYPERLINK("%s";"%s - %s")' % (
-        url, _(u"Stoq Retail Management"), url))
+    return url, u"%s - %s" % (_(u"Stoq Retail Management"), url)
+
+
+def write_app_hyperlink(sheet, row):
+    formula = xlwt.Formula(u'HYPERLINK("%s";"%s")' % get_app_hyperlink())
 
     style = xlwt.easyxf(
         "font: height 250;"
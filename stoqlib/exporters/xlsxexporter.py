@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+"""Streaming XLSX exporter"""
+
+import datetime
+import decimal
+import re
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+from kiwi.currency import currency
+
+from stoqlib.exporters.exporter import Exporter
+from stoqlib.exporters.xlsutils import (get_app_hyperlink,
+                                        get_date_format,
+                                        get_number_format)
+
+# The indexes of the cell formats in styles.xml
+_STYLE_GENERAL = 0
+_STYLE_HEADER = 1
+_STYLE_DATE = 2
+_STYLE_NUMBER = 3
+_STYLE_DESCRIPTION = 4
+
+_EPOCH = datetime.datetime(1899, 12, 30)
+
+# Characters not allowed in xml documents
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Characters not allowed in sheet names
+_INVALID_SHEET_NAME_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+_CONTENT_TYPES = """\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels"
+    ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml"
+    ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/styles.xml"
+    ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+%(sheets)s
+</Types>"""
+
+_CONTENT_TYPE_SHEET = """\
+<Override PartName="/xl/worksheets/sheet%d.xml"
+    ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>"""
+
+_RELS = """\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1"
+    Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+    Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets>%(sheets)s</sheets>
+</workbook>"""
+
+_WORKBOOK_SHEET = """<sheet name=%s sheetId="%d" r:id="rId%d"/>"""
+
+_WORKBOOK_RELS = """\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+%(sheets)s
+<Relationship Id="rId%(styles_id)d"
+    Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+    Target="styles.xml"/>
+</Relationships>"""
+
+_WORKBOOK_RELS_SHEET = """\
+<Relationship Id="rId%d"
+    Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
+    Target="worksheets/sheet%d.xml"/>"""
+
+_STYLES = """\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<numFmts count="2">
+<numFmt numFmtId="164" formatCode=%(date_format)s/>
+<numFmt numFmtId="165" formatCode=%(number_format)s/>
+</numFmts>
+<fonts count="3">
+<font><sz val="10"/><name val="Arial"/></font>
+<font><b/><sz val="10"/><name val="Arial"/></font>
+<font><sz val="12"/><name val="Arial"/></font>
+</fonts>
+<fills count="2">
+<fill><patternFill patternType="none"/></fill>
+<fill><patternFill patternType="gray125"/></fill>
+</fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="5">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>
+<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="0" fontId="2" fillId="0" borderId="0" xfId="0"
+    applyFont="1" applyAlignment="1"><alignment horizontal="center" vertical="center"/></xf>
+</cellXfs>
+</styleSheet>"""
+
+_SHEET_START = """\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<sheetData>"""
+
+
+def _get_column_name(index):
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(ord('A') + remainder) + name
+    return name
+
+
+class XLSXExporter(Exporter):
+    """Exports rows to a XLSX file, writing them as they are added
+
+    When a sheet reaches :attr:`.max_rows`, a new one is started, with the
+    column headers repeated on it.
+    """
+
+    suffix = '.xlsx'
+    mime_type = ('application/vnd.openxmlformats-officedocument.'
+                 'spreadsheetml.sheet')
+
+    #: The maximum number of rows in a sheet supported by the format
+    max_rows = 1048576
+
+    #: How many rows are written to the file at once
+    write_interval = 100
+
+    def __init__(self, name=None, max_rows=None):
+        """
+        :param name: the name of the sheet
+        :param max_rows: the maximum number of rows in each sheet,
+          defaults to :attr:`.max_rows`
+        """
+        Exporter.__init__(self, name=name)
+        if max_rows is not None:
+            self.max_rows = max_rows
+
+        self._zip = zipfile.ZipFile(self._fp, 'w', zipfile.ZIP_DEFLATED)
+        self._sheet_names = []
+        self._sheet = None
+        self._row = 0
+        self._pending = []
+        self._merged_cells = []
+        self._styles = None
+        self._columns = [_get_column_name(i) for i in range(16)]
+
+    #
+    # Exporter
+    #
+
+    def set_column_types(self, column_types):
+        Exporter.set_column_types(self, column_types)
+
+        styles = []
+        for column_type in column_types:
+            if column_type in (datetime.datetime, datetime.date):
+                style = _STYLE_DATE
+            elif column_type in [int, float, currency]:
+                style = _STYLE_NUMBER
+            else:
+                style = _STYLE_GENERAL
+            styles.append(style)
+        self._styles = styles
+
+    def start(self, filter_description):
+        self._start_sheet()
+
+        self._row += 1
+        cells = []
+        if filter_description:
+            cells.append(self._get_cell('A1', filter_description,
+                                        _STYLE_DESCRIPTION))
+            self._merged_cells.append('A1:C1')
+        url, text = get_app_hyperlink()
+        cells.append('<c r="D1" s="%d" t="str"><f>%s</f><v>%s</v></c>' % (
+            _STYLE_DESCRIPTION, escape('HYPERLINK("%s","%s")' % (url, text)),
+            escape(text)))
+        self._merged_cells.append('D1:P1')
+        self._write_row(cells, height=50)
+
+    def write_header(self, headers):
+        self._row += 1
+        self._write_row([
+            self._get_cell(self._get_ref(i), header, _STYLE_HEADER)
+            for i, header in enumerate(headers)])
+
+    def write_row(self, row):
+        if self._row >= self.max_rows:
+            self._finish_sheet()
+            self._start_sheet()
+            if self._headers:
+                self.write_header(self._headers)
+
+        styles = self._styles or [_STYLE_GENERAL] * len(row)
+        if len(row) > len(styles):
+            raise ValueError(row, len(styles))
+        self._row += 1
+        self._write_row([self._get_cell(self._get_ref(i), value, styles[i])
+                         for i, value in enumerate(row)])
+
+    def finish(self):
+        self._finish_sheet()
+
+        n_sheets = len(self._sheet_names)
+        sheets = range(1, n_sheets + 1)
+        self._zip.writestr('[Content_Types].xml', _CONTENT_TYPES % dict(
+            sheets='\n'.join(_CONTENT_TYPE_SHEET % i for i in sheets)))
+        self._zip.writestr('_rels/.rels', _RELS)
+        self._zip.writestr('xl/workbook.xml', _WORKBOOK % dict(
+            sheets=''.join(_WORKBOOK_SHEET % (quoteattr(name), i, i)
+                           for i, name in zip(sheets, self._sheet_names))))
+        self._zip.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS % dict(
+            sheets='\n'.join(_WORKBOOK_RELS_SHEET % (i, i) for i in sheets),
+            styles_id=n_sheets + 1))
+        self._zip.writestr('xl/styles.xml', _STYLES % dict(
+            date_format=quoteattr(get_date_format()),
+            number_format=quoteattr(get_number_format())))
+        self._zip.close()
+
+    #
+    # Private
+    #
+
+    def _get_sheet_name(self):
+        name = _INVALID_SHEET_NAME_CHARS.sub('', self.name)
+        n_sheet = len(self._sheet_names) + 1
+        if n_sheet > 1:
+            suffix = ' (%d)' % (n_sheet, )
+            return name[:31 - len(suffix)] + suffix
+        return name[:31]
+
+    def _start_sheet(self):
+        self._sheet_names.append(self._get_sheet_name())
+        self._sheet = self._zip.open(
+            'xl/worksheets/sheet%d.xml' % (len(self._sheet_names), ), 'w')
+        self._sheet.write(_SHEET_START.encode())
+        self._row = 0
+        self._merged_cells = []
+
+    def _finish_sheet(self):
+        self._flush()
+        end = ['</sheetData>']
+        if self._merged_cells:
+            end.append('<mergeCells count="%d">%s</mergeCells>' % (
+                len(self._merged_cells),
+                ''.join('<mergeCell ref="%s"/>' % (ref, )
+                        for ref in self._merged_cells)))
+        end.append('</worksheet>')
+        self._sheet.write(''.join(end).encode())
+        self._sheet.close()
+        self._sheet = None
+
+    def _flush(self):
+        if self._pending:
+            self._sheet.write(''.join(self._pending).encode())
+            self._pending = []
+
+    def _write_row(self, cells, height=None):
+        if height:
+            row = '<row r="%d" ht="%d" customHeight="1">%s</row>' % (
+                self._row, height, ''.join(cells))
+        else:
+            row = '<row r="%d">%s</row>' % (self._row, ''.join(cells))
+        self._pending.append(row)
+        if len(self._pending) >= self.write_interval:
+            self._flush()
+
+    def _get_ref(self, i):
+        while i >= len(self._columns):
+            self._columns.append(_get_column_name(len(self._columns)))
+        return '%s%d' % (self._columns[i], self._row)
+
+    def _get_cell(self, ref, value, style):
+        value = self.convert_value(value)
+        if value == '':
+            return ''
+
+        if isinstance(value, bool):
+            return '<c r="%s" s="%d" t="b"><v>%d</v></c>' % (ref, style, value)
+        elif isinstance(value, (int, float, decimal.Decimal)):
+            return '<c r="%s" s="%d"><v>%s</v></c>' % (ref, style, value)
+        elif isinstance(value, datetime.date):
+            if not isinstance(value, datetime.datetime):
+                value = datetime.datetime(value.year, value.month, value.day)
+            delta = value.replace(tzinfo=None) - _EPOCH
+            serial = delta.days + delta.seconds / 86400.0
+            return '<c r="%s" s="%d"><v>%s</v></c>' % (ref, style, serial)
+
+        value = _INVALID_XML_CHARS.sub('', str(value))
+        return ('<c r="%s" s="%d" t="inlineStr"><is>'
+                '<t xml:space="preserve">%s</t></is></c>' % (
+                    ref, style, escape(value)))
@@ -25,7 +25,7 @@
 
 from storm.expr import And, Eq, Or
 
-from stoqlib.database.expr import Date
+from stoqlib.database.expr import Date, DateRange
 from stoqlib.gui.dialogs.daterangedialog import DateRangeDialog
 from stoqlib.gui.utils.printing import print_report
 from stoqlib.lib.message import info
@@ -140,9 +140,9 @@ class PaymentFlowDay(object):
         """
         from stoqlib.domain.payment.payment import Payment
         date = self.history_date
-        query = And(Or(Date(Payment.due_date) == date,
-                       Date(Payment.paid_date) == date,
-                       Date(Payment.cancel_date) == date),
+        query = And(Or(DateRange(Payment.due_date, date, date),
+                       DateRange(Payment.paid_date, date, date),
+                       DateRange(Payment.cancel_date, date, date)),
                     Or(Eq(Payment.paid_value, None),
                        Payment.value != Payment.paid_value,
                        Eq(Payment.paid_date, None),
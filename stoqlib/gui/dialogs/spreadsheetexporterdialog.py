@@ -28,8 +28,11 @@ from gi.repository import Gtk, Gio
 
 from stoqlib.api import api
 
-from stoqlib.exporters.xlsexporter import XLSExporter
+from stoqlib.database.runtime import StoqlibResultSet
+from stoqlib.exporters.xlsxexporter import XLSXExporter
+from stoqlib.gui.dialogs.progressdialog import ProgressDialog
 from stoqlib.lib.message import yesno
+from stoqlib.lib.threadutils import schedule_in_main_thread, threadit
 from stoqlib.lib.translation import stoqlib_gettext
 
 _ = stoqlib_gettext
@@ -42,14 +45,17 @@ class SpreadSheetExporter:
 
     def export(self, object_list, name, filename_prefix, data=None,
                filter_description=None):
-        xls = XLSExporter(name)
-        xls.add_from_object_list(object_list, data,
-                                 filter_description=filter_description)
-        temporary = xls.save(filename_prefix)
-        self.export_temporary(temporary)
-
-    def export_temporary(self, temporary):
-        mime_type = 'application/vnd.ms-excel'
+        exporter = XLSXExporter(name)
+        temporary = self._run_exporter(exporter, object_list, filename_prefix,
+                                       data, filter_description)
+        if temporary is None:
+            return
+        self.export_temporary(temporary, mime_type=exporter.mime_type,
+                              suffix=exporter.suffix)
+
+    def export_temporary(self, temporary,
+                         mime_type='application/vnd.ms-excel',
+                         suffix='.xls'):
         app_info = Gio.app_info_get_default_for_type(mime_type, False)
         if app_info:
             action = api.user_settings.get('spreadsheet-action')
@@ -65,7 +71,65 @@ class SpreadSheetExporter:
             temporary.close()
             self._open_application(mime_type, temporary.name)
         elif action == 'save':
-            self._save(temporary)
+            self._save(temporary, suffix)
+
+    def _run_exporter(self, exporter, object_list, filename_prefix, data,
+                      filter_description):
+        if not isinstance(data, StoqlibResultSet):
+            # The objects are already loaded, but reading their attributes
+            # may still use their store, which belongs to this thread
+            exporter.add_from_object_list(
+                object_list, data, filter_description=filter_description)
+            return exporter.save(filename_prefix)
+
+        # The results are loaded and written on a thread, so the interface
+        # can show the progress and the user can cancel exports that are
+        # taking too long
+        dialog = ProgressDialog(_('Exporting...'), pulse=False)
+        dialog.connect('cancel', lambda d: exporter.cancel())
+        exporter.set_progress_callback(
+            lambda n_rows, total: schedule_in_main_thread(
+                self._update_progress, dialog, n_rows, total))
+
+        result = {}
+
+        def export():
+            # Stores are not thread safe, so the results are loaded
+            # using a store owned by this thread
+            store = api.new_store()
+            try:
+                exporter.add_from_object_list(
+                    object_list, data.copy_to_store(store),
+                    filter_description=filter_description)
+                result['temporary'] = exporter.save(filename_prefix)
+            except Exception as e:
+                result['error'] = e
+            finally:
+                store.rollback(close=True)
+
+        dialog.start(wait=500)
+        thread = threadit(export)
+        while thread.is_alive():
+            while Gtk.events_pending():
+                Gtk.main_iteration_do(False)
+            thread.join(0.05)
+        dialog.stop()
+
+        if 'error' in result:
+            raise result['error']
+        if exporter.is_cancelled():
+            result['temporary'].close()
+            return None
+        return result['temporary']
+
+    def _update_progress(self, dialog, n_rows, total):
+        if total:
+            dialog.progressbar.set_fraction(min(float(n_rows) / total, 1.0))
+            dialog.set_text(_('%d of %d rows') % (n_rows, total))
+        else:
+            dialog.progressbar.pulse()
+            dialog.set_text(_('%d rows') % (n_rows, ))
+        return False
 
     def _ask(self, app_info):
         # FIXME: What if the user presses esc? Esc will return False
@@ -84,7 +148,7 @@ class SpreadSheetExporter:
         gfile = Gio.File.new_for_path(filename)
         app_info.launch([gfile])
 
-    def _save(self, temp):
+    def _save(self, temp, ext):
         chooser = Gtk.FileChooserDialog(
             _("Export Spreadsheet..."), None,
             Gtk.FileChooserAction.SAVE,
@@ -94,7 +158,7 @@ class SpreadSheetExporter:
 
         xls_filter = Gtk.FileFilter()
         xls_filter.set_name(_('Excel Files'))
-        xls_filter.add_pattern('*.xls')
+        xls_filter.add_pattern('*' + ext)
         chooser.add_filter(xls_filter)
 
         response = chooser.run()
@@ -105,7 +169,6 @@ class SpreadSheetExporter:
             return
 
         filename = chooser.get_filename()
-        ext = '.xls'
 
         chooser.destroy()
 
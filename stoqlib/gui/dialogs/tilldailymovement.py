@@ -32,7 +32,7 @@ from kiwi.ui.objectlist import Column, SummaryLabel
 from storm.expr import And, Eq
 
 from stoqlib.api import api
-from stoqlib.database.expr import Date
+from stoqlib.database.expr import DateRange
 from stoqlib.domain.payment.card import CreditCardData
 from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.payment.dailymovement import (DailyInPaymentView,
@@ -412,8 +412,7 @@ class TillDailyMovementDialog(BaseEditor):
 
     def _get_query(self, date_attr, branch_attr):
         daterange = self.get_daterange()
-        query = [Date(date_attr) >= Date(daterange[0]),
-                 Date(date_attr) <= Date(daterange[1])]
+        query = [DateRange(date_attr, daterange[0], daterange[1])]
 
         branch = self.model.branch
         if branch is not None:
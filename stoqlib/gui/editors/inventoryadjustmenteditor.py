@@ -172,12 +172,13 @@ class InventoryAdjustmentEditor(BaseEditor):
         self._run_adjustment_dialog(selected)
 
     def on_adjust_all_button__clicked(self, button):
-        for item in self.inventory_items:
-            if item.is_adjusted:
-                continue
+        items = [item for item in self.inventory_items if not item.is_adjusted]
+        for item in items:
             item.actual_quantity = item.counted_quantity
             item.reason = _(u'Automatic adjustment')
-            item.adjust(api.get_current_user(self.store), self.model.invoice_number)
+        self.model.adjust_items(items, api.get_current_user(self.store),
+                                self.model.invoice_number)
+        for item in items:
             self.inventory_items.update(item)
 
     def on_inventory_items__row_activated(self, objectlist, item):
@@ -38,6 +38,7 @@ from stoqlib.domain.account import AccountTransaction
 from stoqlib.domain.events import (TillOpenEvent, TillCloseEvent,
                                    TillAddTillEntryEvent,
                                    TillAddCashEvent, TillRemoveCashEvent)
+from stoqlib.domain.payment.method import PaymentMethod
 from stoqlib.domain.person import Employee
 from stoqlib.domain.till import Till
 from stoqlib.exceptions import DeviceError, TillError
@@ -244,18 +245,20 @@ class TillClosingEditor(BaseEditor):
         day_history = {}
         day_history[_(u'Initial Amount')] = self.till.initial_cash_amount
 
-        for entry in self.till.get_entries():
-            payment = entry.payment
-            if payment is not None:
-                desc = payment.method.get_description()
+        for total in self.till.get_day_totals().methods:
+            if total.has_payment:
+                method = self.store.get(PaymentMethod, total.method_id)
+                values = [(method.get_description(), total.credits),
+                          (method.get_description(), total.debits)]
             else:
-                if entry.value > 0:
-                    desc = _(u'Cash In')
-                else:
-                    desc = _(u'Cash Out')
-
-            day_history.setdefault(desc, 0)
-            day_history[desc] += entry.value
+                values = [(_(u'Cash In'), total.credits),
+                          (_(u'Cash Out'), total.debits)]
+
+            for desc, value in values:
+                if value is None:
+                    continue
+                day_history.setdefault(desc, 0)
+                day_history[desc] += value
 
         for description, value in day_history.items():
             yield Settable(description=description, system_value=value, user_value=0)
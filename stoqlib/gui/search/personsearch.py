@@ -129,6 +129,7 @@ class SupplierSearch(BasePersonSearch):
     search_label = _('Suppliers Matching:')
     text_field_columns = [SupplierView.name, SupplierView.phone_number,
                           SupplierView.cnpj]
+    rank_results = True
 
     def __init__(self, store, **kwargs):
         self.company_doc_l10n = api.get_l10n_field('company_document')
@@ -170,6 +171,7 @@ class ClientSearch(BasePersonSearch):
     text_field_columns = [ClientView.name, ClientView.cpf, ClientView.rg_number,
                           ClientView.phone_number, ClientView.mobile_number,
                           ClientView.fancy_name, ClientView.email]
+    rank_results = True
 
     def __init__(self, store, birth_date=None, **kwargs):
         self._birth_date = birth_date
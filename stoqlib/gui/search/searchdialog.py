@@ -31,6 +31,7 @@ from kiwi.utils import gsignal
 
 from stoqlib.api import api
 from stoqlib.database.queryexecuter import DateQueryState, DateIntervalQueryState
+from stoqlib.database.runtime import StoqlibResultSet
 from stoqlib.domain.person import Individual
 from stoqlib.enums import SearchFilterPosition
 from stoqlib.gui.base.dialogs import BasicDialog
@@ -133,6 +134,10 @@ class SearchDialog(BasicDialog):
     #: default entry
     text_field_columns = None
 
+    #: If the results should be ordered by how well they match the text
+    #: typed in the default entry, best matches first
+    rank_results = False
+
     #: If defined, this should be a column from some table that refrences a
     #: branch, and a filter will be added for this column
     branch_filter_column = None
@@ -261,6 +266,8 @@ class SearchDialog(BasicDialog):
         """
         if self.text_field_columns is not None:
             self.set_text_field_columns(self.text_field_columns)
+        if self.rank_results:
+            self.search.get_query_executer().set_rank_results(True)
 
         if self.branch_filter_column is not None:
             self.branch_filter = self.create_branch_filter(
@@ -507,7 +514,9 @@ class SearchDialog(BasicDialog):
             # when exporting the results.
             executer = self.search.get_query_executer()
             states = [(sf.get_state()) for sf in self.search.get_search_filters()]
-            data = executer.search(states, limit=-1)
+            data = executer.search(
+                states, limit=-1,
+                fetch_size=StoqlibResultSet.DEFAULT_FETCH_SIZE)
         else:
             # The results are already unlimited, let the exporter get the data
             # from the objectlist
@@ -22,6 +22,8 @@
 ## Author(s): Stoq Team <stoq-devel@async.com.br>
 #
 
+import bisect
+
 from gi.repository import Gtk, GObject, GLib
 from pygtkcompat.generictreemodel import GenericTreeModel
 
@@ -64,6 +66,14 @@ class LazyObjectModel(GenericTreeModel, Gtk.TreeSortable):
 
     __gtype_name__ = 'LazyObjectModel'
 
+    #: How many rows are fetched from the database at once. The rows are
+    #: fetched in pages of this size, aligned to it
+    PAGE_SIZE = 100
+
+    #: How many pages should be fetched ahead, in the direction the list
+    #: is being scrolled
+    PREFETCH_PAGES = 1
+
     def __init__(self, objectlist, result, executer, initial_count):
         """
         :param objectlist: a ObjectList
@@ -75,10 +85,14 @@ class LazyObjectModel(GenericTreeModel, Gtk.TreeSortable):
         old_model = objectlist.get_model()
         self._objectlist = objectlist
         self._count = 0
+        self._count_is_exact = False
         self._executer = executer
         self._initial_count = initial_count
         self._iters = []
+        self._keys = []
+        self._last_page = 0
         self._orig_result = result
+        self._pages = []
         self._post_result = None
         self._result = None
         self._values = []
@@ -89,19 +103,185 @@ class LazyObjectModel(GenericTreeModel, Gtk.TreeSortable):
             self._sort_column_id = 0
         super(LazyObjectModel, self).__init__()
         self.props.leak_references = False
-        self._load_result_set(result)
-
-    def _load_result_set(self, result):
-        self._post_result = self._executer.get_post_result(result)
-        if self._post_result is not None:
+        self._load_result_set()
+
+    def _load_result_set(self):
+        resorting = self._result is not None
+        self._result = self._get_ordered_result()
+        self._last_page = 0
+        self._pages = []
+
+        # Try to get the first pages and the summary with a single query
+        n_pages = max(1, -(-self._initial_count // self.PAGE_SIZE))
+        page = self._executer.get_page_with_summary(
+            self._result, 0, n_pages * self.PAGE_SIZE)
+        if page is not None:
+            items, self._post_result = page
             count = self._post_result.count
+            exact = True
+        elif resorting:
+            # Sorting the results again does not change how many they are
+            items = None
+            count = self._count
+            exact = self._count_is_exact
         else:
-            count = result.count()
+            # Don't wait for all the results to be counted, the summary
+            # is only computed if someone asks for it
+            items = None
+            count, exact = self._orig_result.get_estimated_count()
+
         self._count = count
+        self._count_is_exact = exact
         self._iters = list(range(0, count))
-        self._result = result
+        self._keys = [None] * count
         self._values = [empty_marker] * count
-        self.load_items_from_results(0, self._initial_count)
+        if items is not None:
+            self._set_items(0, items[:count])
+            self._set_pages_loaded(
+                0, min(n_pages, -(-count // self.PAGE_SIZE)) - 1)
+        else:
+            self.load_items_from_results(0, self._initial_count)
+
+    def _get_sort_attribute(self):
+        column = self._objectlist.get_columns()[self._sort_column_id]
+        if hasattr(column, 'search_attribute'):
+            # Even if it's defined, it could be None
+            return column.search_attribute or column.attribute
+        return column.attribute
+
+    def _get_ordered_result(self, after=None, backwards=False):
+        return self._executer.get_ordered_result(
+            self._orig_result, self._get_sort_attribute(),
+            descending=self._sort_order == Gtk.SortType.DESCENDING,
+            after=after, backwards=backwards)
+
+    def _set_items(self, start, items):
+        has_loaded = False
+        attribute = self._get_sort_attribute()
+        for i, item in enumerate(items, start):
+            if self._values[i] is not empty_marker:
+                continue
+            has_loaded = True
+            self._values[i] = item
+            self._keys[i] = self._executer.get_sort_key(item, attribute)
+            path = (i, )
+            titer = self.create_tree_iter(i)
+            # We are bypassing ObjectList to insert items in the model, but
+            # ObjectList depends on knowing where the model is present for a few
+            # actions. Let it know about this new item
+            self._objectlist.set_instance_iter(item, titer)
+            self.row_changed(path, titer)
+
+        return has_loaded
+
+    def _set_count(self, count, exact):
+        self._count_is_exact = exact
+        if count != self._count:
+            treeview = self._objectlist.get_treeview()
+            if treeview.get_model() is self:
+                self._resize_detached(treeview, count)
+            else:
+                self._resize(count)
+
+        last_page = (count - 1) // self.PAGE_SIZE
+        self._pages = [page for page in self._pages if page <= last_page]
+
+    def _resize(self, count):
+        del self._iters[count:]
+        del self._keys[count:]
+        del self._values[count:]
+        self._iters.extend(range(self._count, count))
+        self._keys.extend([None] * (count - self._count))
+        self._values.extend([empty_marker] * (count - self._count))
+        self._count = count
+
+    def _resize_detached(self, treeview, count):
+        # Emitting row-inserted/row-deleted for each row makes the treeview
+        # update itself once per row, so the model is detached while it is
+        # resized instead, keeping the selection and the scroll position
+        selection = treeview.get_selection()
+        paths = selection.get_selected_rows()[1]
+        vadjustment = treeview.get_vadjustment()
+        value = vadjustment.get_value()
+        on_changed = self._objectlist._on_selection__changed
+        selection.handler_block_by_func(on_changed)
+        try:
+            treeview.set_model(None)
+            self._resize(count)
+            treeview.set_model(self)
+            kept = [path for path in paths if path[0] < count]
+            for path in kept:
+                selection.select_path(path)
+        finally:
+            selection.handler_unblock_by_func(on_changed)
+        vadjustment.set_value(value)
+        if len(kept) != len(paths):
+            self._objectlist.update_selection()
+
+    def _is_page_loaded(self, page):
+        i = bisect.bisect_left(self._pages, page)
+        return i < len(self._pages) and self._pages[i] == page
+
+    def _set_pages_loaded(self, first, last):
+        for page in range(first, last + 1):
+            if not self._is_page_loaded(page):
+                bisect.insort(self._pages, page)
+
+    def _get_anchor(self, start, end):
+        # The rows can be skipped from the beginning of the results, from
+        # their end, if we know where it is, or from the closest rows
+        # already loaded before or after them. The closest one is used
+        anchors = [(start, None, False)]
+        if self._count_is_exact:
+            anchors.append((self._count - end, None, True))
+
+        i = bisect.bisect_left(self._pages, start // self.PAGE_SIZE)
+        if i > 0:
+            row = min((self._pages[i - 1] + 1) * self.PAGE_SIZE,
+                      self._count) - 1
+            if self._keys[row] is not None:
+                anchors.append((start - row - 1, self._keys[row], False))
+        if i < len(self._pages):
+            row = self._pages[i] * self.PAGE_SIZE
+            if self._keys[row] is not None:
+                anchors.append((row - end, self._keys[row], True))
+
+        return min(anchors, key=lambda anchor: anchor[0])
+
+    def _load_pages(self, first, last):
+        start = first * self.PAGE_SIZE
+        end = min((last + 1) * self.PAGE_SIZE, self._count)
+        n_rows = end - start
+        offset, key, backwards = self._get_anchor(start, end)
+        result = self._get_ordered_result(after=key, backwards=backwards)
+
+        if backwards:
+            items = list(result[offset:offset + n_rows])
+            items.reverse()
+            has_loaded = self._set_items(end - len(items), items)
+            if len(items) == n_rows:
+                self._set_pages_loaded(first, last)
+            return has_loaded
+
+        # Get an extra row, to know if there are more after these
+        items = list(result[offset:offset + n_rows + 1])
+        if len(items) > n_rows:
+            if not self._count_is_exact and end == self._count:
+                # The count was underestimated, make room for another page
+                self._set_count(self._count + self.PAGE_SIZE, False)
+            items = items[:n_rows]
+        elif items or start == 0:
+            # These are the last results
+            self._set_count(start + len(items), True)
+        else:
+            # The count was overestimated, there are no results here
+            self._set_count(*self._orig_result.get_estimated_count(
+                exact_limit=start))
+            return False
+
+        has_loaded = self._set_items(start, items)
+        self._set_pages_loaded(first, last)
+        return has_loaded
 
     # GtkTreeModel
 
@@ -205,7 +385,7 @@ class LazyObjectModel(GenericTreeModel, Gtk.TreeSortable):
             not changed_order):
             return
 
-        self._load_result_set(self._result)
+        self._load_result_set()
         self.sort_column_changed()
 
     # FIXME: If we set this to do_set_sort_func it segfaults. Why?
@@ -233,61 +413,54 @@ class LazyObjectModel(GenericTreeModel, Gtk.TreeSortable):
     def load_items_from_results(self, start, end):
         """
         Fetchs rows from the database and displays in the model
+
+        The rows are fetched a page at a time, starting from the closest
+        rows already loaded, and the next pages in the direction the list
+        is being scrolled are fetched as well.
+
         :param start: index of the first row to load
         :param end: index of the last row to load
+        :returns: ``True`` if any row was loaded
         """
         end = min(end, self._count)
-        load_total = end - start
-
-        # Avoid loading items already loaded
-        for i in range(start, end):
-            if self._values[i] is empty_marker:
-                break
-            # Partial loading
-            start = i
-        else:
-            return
-
-        # If we moved the start value in the for above, also move the end value
-        end = min(start + load_total, self._count)
+        if start >= end:
+            return False
 
-        column = self._objectlist.get_columns()[self._sort_column_id]
-        if hasattr(column, 'search_attribute'):
-            # Even if it's defined, it could be None
-            order_attr = column.search_attribute or column.attribute
+        first = start // self.PAGE_SIZE
+        last = (end - 1) // self.PAGE_SIZE
+        if first < self._last_page:
+            first = max(first - self.PREFETCH_PAGES, 0)
         else:
-            order_attr = column.attribute
-        self._result = self._executer.get_ordered_result(self._orig_result,
-                                                         order_attr)
-
-        if self._sort_order == Gtk.SortType.DESCENDING:
-            # Results should be reversed, so we need to invert the start and
-            # end values, and use the end of the list as a reference.
-            # This should be as easy as reversed(self._results[-end:-start])
-            # but storm does not support this.
-            start_ = self._count - end
-            end_ = self._count - start
-            results = reversed(list(self._result[start_:end_]))
-        else:
-            results = list(self._result[start:end])
-
-        has_loaded = False
-        for i, item in enumerate(results, start):
-            if self._values[i] is not empty_marker:
+            last = min(last + self.PREFETCH_PAGES,
+                       (self._count - 1) // self.PAGE_SIZE)
+        self._last_page = start // self.PAGE_SIZE
+
+        # Group the pages not loaded yet, to fetch each group at once
+        groups = []
+        for page in range(first, last + 1):
+            if self._is_page_loaded(page):
                 continue
-            has_loaded = True
-            self._values[i] = item
-            path = (i, )
-            titer = self.create_tree_iter(i)
-            # We are bypassing ObjectList to insert items in the model, but
-            # ObjectList depends on knowing where the model is present for a few
-            # actions. Let it know about this new item
-            self._objectlist.set_instance_iter(item, titer)
-            self.row_changed(path, titer)
+            if groups and groups[-1][1] == page - 1:
+                groups[-1][1] = page
+            else:
+                groups.append([page, page])
 
+        has_loaded = False
+        for first, last in groups:
+            # Loading a page can show that there are less results than
+            # what was estimated
+            if first * self.PAGE_SIZE >= self._count:
+                break
+            last = min(last, (self._count - 1) // self.PAGE_SIZE)
+            if self._load_pages(first, last):
+                has_loaded = True
         return has_loaded
 
     def get_post_data(self):
+        if self._post_result is None:
+            self._post_result = self._executer.get_post_result(
+                self._orig_result)
+            self._set_count(self._post_result.count, True)
         return self._post_result
 
 
@@ -31,7 +31,7 @@ from kiwi.utils import gsignal
 
 from stoqlib.api import api
 from stoqlib.database.expr import Position, StoqNormalizeString
-from stoqlib.database.queryexecuter import QueryExecuter
+from stoqlib.database.queryexecuter import AsyncQueryOperation, QueryExecuter
 from stoqlib.domain.person import (Client, ClientView, Supplier, SupplierView,
                                    Person, PersonAddressView, Individual)
 from stoqlib.domain.sale import SaleToken, SaleTokenView
@@ -468,7 +468,9 @@ class QueryEntryGadget(object):
         resultset = self._executer.search([state])
         if self._search_clause:
             resultset = resultset.find(self._search_clause)
-        return self._executer.search_async(resultset=resultset, limit=10)
+        return self._executer.search_async(
+            resultset=resultset, limit=10,
+            priority=AsyncQueryOperation.PRIORITY_INTERACTIVE)
 
     def _dispatch(self, value):
         self._source_id = None
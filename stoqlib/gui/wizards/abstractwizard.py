@@ -39,13 +39,12 @@ from kiwi.datatypes import ValidationError
 from kiwi.ui.objectlist import SummaryLabel
 from kiwi.utils import gsignal
 from kiwi.python import Settable
-from storm.expr import And, Lower
 
 from stoqlib.api import api
 from stoqlib.domain.sellable import Sellable
 from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.payment.group import PaymentGroup
-from stoqlib.domain.product import Product, StorableBatch
+from stoqlib.domain.product import Product
 from stoqlib.domain.sale import SaleItem
 from stoqlib.domain.workorder import WorkOrderItem
 from stoqlib.domain.service import ServiceView
@@ -69,6 +68,8 @@ from stoqlib.lib.dateutils import localtoday
 from stoqlib.lib.defaults import QUANTITY_PRECISION, MAX_INT
 from stoqlib.lib.message import warning
 from stoqlib.lib.parameters import sysparam
+from stoqlib.lib.sellableindex import (find_sellable_and_batch,
+                                       start_sellable_index)
 from stoqlib.lib.translation import stoqlib_gettext
 
 
@@ -590,6 +591,7 @@ class SellableItemSlave(BaseEditorSlave):
     #  Private
     #
     def _setup_widgets(self):
+        start_sellable_index()
         self._update_product_labels_visibility(False)
         cost_digits = sysparam.get_int('COST_PRECISION_DIGITS')
         self.quantity.set_sensitive(False)
@@ -669,35 +671,8 @@ class SellableItemSlave(BaseEditorSlave):
           ``None`` if nothing was found.
         """
         viewable, default_query = self.get_sellable_view_query()
-
-        # FIXME: Put this logic for getting the sellable based on
-        # barcode/code/batch_number on domain. Note that something very
-        # simular is done on POS app
-
-        # First try barcode, then code since there might be a product
-        # with a code equal to another product's barcode
-        for attr in [viewable.barcode, viewable.code]:
-            query = Lower(attr) == text.lower()
-            if default_query:
-                query = And(query, default_query)
-
-            result = self.store.find(viewable, query).one()
-            if result:
-                return result.sellable, None
-
-        # if none of the above worked, try to find by batch number
-        query = Lower(StorableBatch.batch_number) == text.lower()
-        batch = self.store.find(StorableBatch, query).one()
-        if batch:
-            sellable = batch.storable.product.sellable
-            query = viewable.id == sellable.id
-            if default_query:
-                query = And(query, default_query)
-            # Make sure batch's sellable is in the view
-            if not self.store.find(viewable, query).is_empty():
-                return sellable, batch
-
-        return None, None
+        return find_sellable_and_batch(self.store, text, viewable=viewable,
+                                       query=default_query)
 
     def _get_sellable_and_batch(self):
         """This method always read the barcode and searches de database.
@@ -25,10 +25,10 @@
 
 from stoqlib.domain.address import Address, CityLocation
 from stoqlib.domain.person import Client, Individual, Person
-from stoqlib.importers.csvimporter import CSVImporter
+from stoqlib.importers.copyimporter import CopyImporter
 
 
-class ClientImporter(CSVImporter):
+class ClientImporter(CopyImporter):
     fields = ['name',
               'phone_number',
               'mobile_number',
@@ -42,31 +42,41 @@ class ClientImporter(CSVImporter):
               'streetnumber',
               'district']
 
+    def __init__(self):
+        super(ClientImporter, self).__init__()
+        self.persons = self.add_batch(
+            Person, ['name', 'phone_number', 'mobile_number'])
+        self.individuals = self.add_batch(
+            Individual, ['person_id', 'cpf', 'rg_number'])
+        self.addresses = self.add_batch(
+            Address, ['is_main_address', 'person_id', 'city_location_id',
+                      'street', 'streetnumber', 'district'])
+        self.clients = self.add_batch(Client, ['person_id'])
+
     def process_one(self, data, fields, store):
-        person = Person(
-            store=store,
+        person_id = self.persons.add(
             name=data.name,
             phone_number=data.phone_number,
             mobile_number=data.mobile_number)
 
-        Individual(person=person,
-                   store=store,
-                   cpf=data.cpf,
-                   rg_number=data.rg)
+        self.individuals.add(person_id=person_id,
+                             cpf=data.cpf,
+                             rg_number=data.rg)
 
-        ctloc = CityLocation.get_or_create(store=store,
-                                           city=data.city,
-                                           state=data.state,
-                                           country=data.country)
+        ctloc = self.get_cached(
+            (CityLocation, data.city, data.state, data.country),
+            lambda: CityLocation.get_or_create(store=store,
+                                               city=data.city,
+                                               state=data.state,
+                                               country=data.country))
         streetnumber = data.streetnumber and int(data.streetnumber) or None
-        Address(
+        self.addresses.add(
             is_main_address=True,
-            person=person,
-            city_location=ctloc,
-            store=store,
+            person_id=person_id,
+            city_location_id=ctloc.id,
             street=data.street,
             streetnumber=streetnumber,
             district=data.district
         )
 
-        Client(person=person, store=store)
+        self.clients.add(person_id=person_id)
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source
+##
+## This program is free software; you can redistribute it and/or
+## modify it under the terms of the GNU Lesser General Public License
+## as published by the Free Software Foundation; either version 2
+## of the License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+##
+
+"""
+Bulk CSV import classes, using COPY to insert the rows
+"""
+
+import csv
+import datetime
+import io
+import logging
+import time
+import uuid
+
+from storm.info import get_cls_info
+
+from stoqlib.database.runtime import new_store
+from stoqlib.importers.csvimporter import CSVImporter
+from stoqlib.importers.importer import create_log
+
+log = logging.getLogger(__name__)
+
+
+class CopyBatch(object):
+    """Rows of a domain class waiting to be inserted in the database
+
+    When flushed, the rows are copied into a temporary staging table
+    using ``COPY FROM STDIN`` and then inserted into the domain table
+    with a single ``INSERT ... SELECT``, which fills the columns that
+    were not copied (like ``te_id``) with their database defaults.
+
+    Note that the domain objects are never created, so hooks like
+    :meth:`Domain.on_create <stoqlib.domain.base.Domain.on_create>`
+    will not be called for the rows imported this way.
+    """
+
+    #: How ``NULL`` is represented in the copied data
+    null = '\\N'
+
+    def __init__(self, domain_class, columns):
+        """
+        :param domain_class: the domain class of the rows
+        :param columns: the names of the columns which will be
+          given when adding the rows
+        """
+        self.domain_class = domain_class
+        self.table_name = domain_class.__storm_table__
+        self.staging_table_name = '_import_%s' % (self.table_name, )
+        self.columns = ['id'] + [c for c in columns if c != 'id']
+        self.rows = []
+
+        cls_columns = get_cls_info(domain_class).columns
+        invalid = set(self.columns) - set(c.name for c in cls_columns)
+        if invalid:
+            raise ValueError("Invalid columns for %s: %s" % (
+                self.table_name, ', '.join(sorted(invalid))))
+
+        # Columns that are not given but have a default value on the domain
+        # class. Those defaults are not in the database, they would be set
+        # by the domain object when creating it.
+        self._default_columns = []
+        for column in cls_columns:
+            if column.name in self.columns:
+                continue
+            if column.variable_factory().is_defined():
+                self._default_columns.append(column)
+
+    def __len__(self):
+        return len(self.rows)
+
+    #
+    # Public API
+    #
+
+    def add(self, **values):
+        """Add a row to the batch
+
+        :param values: the values for the columns of the row. Columns not
+          given will be ``NULL``
+        :returns: the id of the new row, generated if not given
+        """
+        values.setdefault('id', str(uuid.uuid1()))
+        row = [values.pop(column, None) for column in self.columns]
+        if values:
+            raise ValueError("Invalid columns for %s: %s" % (
+                self.table_name, ', '.join(sorted(values))))
+        self.rows.append(row)
+        return row[0]
+
+    def flush(self, store):
+        """Insert the rows of this batch into the database
+
+        :param store: a store
+        :returns: the number of rows inserted
+        """
+        n_rows = len(self.rows)
+        if not n_rows:
+            return 0
+
+        defaults = [column.variable_factory().get(to_db=True)
+                    for column in self._default_columns]
+        columns = self.columns + [c.name for c in self._default_columns]
+
+        fp = io.StringIO()
+        writer = csv.writer(fp)
+        for position, row in enumerate(self.rows):
+            writer.writerow([self._format(value)
+                             for value in row + defaults] + [position])
+        fp.seek(0)
+        self.rows = []
+
+        store.execute("""
+            CREATE TEMPORARY TABLE IF NOT EXISTS %(staging)s ON COMMIT DROP
+                AS SELECT %(columns)s, 0 AS position FROM %(table)s
+                WITH NO DATA""" % dict(staging=self.staging_table_name,
+                                       columns=', '.join(columns),
+                                       table=self.table_name))
+        store.copy_from(self.staging_table_name, columns + ['position'], fp)
+        store.execute("""
+            INSERT INTO %(table)s (%(columns)s)
+                SELECT %(columns)s FROM %(staging)s ORDER BY position;
+            TRUNCATE %(staging)s""" % dict(staging=self.staging_table_name,
+                                           columns=', '.join(columns),
+                                           table=self.table_name))
+        return n_rows
+
+    #
+    # Private
+    #
+
+    def _format(self, value):
+        if value is None:
+            return self.null
+        elif isinstance(value, bool):
+            return 't' if value else 'f'
+        return value
+
+
+class CopyImporter(CSVImporter):
+    """A CSV importer which inserts the rows in batches, using COPY
+
+    The file is read one row at a time, instead of being read to the memory
+    at once. :meth:`.process_one` should add the rows to the batches
+    created with :meth:`.add_batch` instead of creating domain objects, and
+    lookup the objects it references using :meth:`.get_or_create`, which
+    will only query the database once for each object.
+
+    Each time :attr:`.batch_size` rows are processed, the batches are
+    flushed, in the order they were added.
+
+    :cvar batch_size: how many rows are processed before flushing the
+      batches to the database
+    """
+
+    batch_size = 5000
+
+    def __init__(self, dry=False):
+        # The progress is reported for each flush, not for each line
+        CSVImporter.__init__(self, lines=-1, dry=dry)
+        self._batches = []
+
+    #
+    # Public API
+    #
+
+    def feed(self, fp, filename='<stdin>'):
+        self.fp = fp
+        self.filename = filename
+        self.lineno = 1
+
+    def get_n_items(self):
+        if not self.fp.seekable():
+            return 0
+        position = self.fp.tell()
+        n_items = sum(1 for item in csv.reader(self.fp, dialect=self.dialect))
+        self.fp.seek(position)
+        return n_items
+
+    def set_items_per_commit(self, items):
+        # The rows are committed every time the batches are flushed
+        if items > 0:
+            self.batch_size = items
+
+    def process(self, store=None, checkpoint=None):
+        n_items = self.get_n_items()
+        log.info('Importing %d items' % (n_items, ))
+        create_log.info('ITEMS:%d' % (n_items, ))
+        t1 = time.time()
+
+        imported_items = 0
+        pending_items = 0
+        if not store:
+            store = new_store()
+        self.before_start(store)
+        offset = 0
+        if checkpoint is not None and checkpoint.offset:
+            offset = checkpoint.offset
+            self.restore_checkpoint_key(checkpoint.last_key)
+            log.info('Resuming from line %d' % (offset + 1, ))
+        for item in csv.reader(self.fp, dialect=self.dialect):
+            if self.lineno <= offset:
+                self.lineno += 1
+                continue
+            if self.process_row(store, item):
+                imported_items += 1
+                pending_items += 1
+            if pending_items >= self.batch_size:
+                self.flush_batches(store)
+                pending_items = 0
+                if not self.dry:
+                    store.commit()
+                    if checkpoint is not None:
+                        checkpoint.save(self.lineno - 1,
+                                        self.get_checkpoint_key())
+                self._report_progress(imported_items, time.time() - t1)
+
+        self.flush_batches(store)
+        self._report_progress(imported_items, time.time() - t1)
+        if not self.dry:
+            store.commit(close=True)
+            store = new_store()
+
+        self.when_done(store)
+
+        if not self.dry:
+            store.commit(close=True)
+            if checkpoint is not None:
+                checkpoint.remove()
+
+        t2 = time.time()
+        log.info('%s Imported %d entries in %2.2f sec' % (
+            datetime.datetime.now().strftime('%H:%M:%S'), imported_items,
+            t2 - t1))
+        create_log.info('IMPORTED-ITEMS:%d' % (imported_items, ))
+        return imported_items
+
+    def add_batch(self, domain_class, columns):
+        """Add a batch of rows to be inserted
+
+        The batches are flushed in the order they were added, so the
+        batches should be added after the ones they reference.
+
+        :param domain_class: the domain class of the rows
+        :param columns: the names of the columns of the rows
+        :returns: a :class:`CopyBatch`
+        """
+        batch = CopyBatch(domain_class, columns)
+        self._batches.append(batch)
+        return batch
+
+    def flush_batches(self, store):
+        """Insert the rows of all the batches into the database
+
+        :param store: a store
+        """
+        for batch in self._batches:
+            batch.flush(store)
+
+    def get_or_create(self, domain_class, store, **attributes):
+        """Get or create a domain object, caching it in memory
+
+        This will only query the database the first time an object with
+        the given attributes is requested.
+
+        :param domain_class: the domain class
+        :param store: a store
+        :param attributes: the attributes of the object
+        :returns: the object
+        """
+        key = (domain_class, tuple(sorted(attributes.items())))
+        obj = self._lookups.get(key)
+        if obj is None:
+            obj = store.find(domain_class, **attributes).one()
+            if obj is None:
+                obj = domain_class(store=store, **attributes)
+            self._lookups[key] = obj
+        return obj
+
+    #
+    # Private
+    #
+
+    def _report_progress(self, imported_items, elapsed):
+        create_log.info('ITEM:%d' % (self.lineno - 1, ))
+        log.info('%s Imported %d entries (%d rows/sec)' % (
+            datetime.datetime.now().strftime('%H:%M:%S'), imported_items,
+            imported_items / elapsed if elapsed else 0))
@@ -69,6 +69,7 @@ class CSVImporter(Importer):
         """
         Importer.__init__(self, items=lines, dry=dry)
         self.lines = lines
+        self._lookups = {}
 
     #
     # Public API
@@ -85,8 +86,16 @@ class CSVImporter(Importer):
         return len(self.rows)
 
     def process_item(self, store, item_no):
+        self.lineno = item_no + 1
+        return self.process_row(store, self.rows[item_no])
+
+    def process_row(self, store, item):
+        """Processes a parsed row of the csv file
+        :param store: a store
+        :param item: a list with the values of the row
+        :returns: ``True`` if the row was imported, ``False`` if not
+        """
         t = time.time()
-        item = self.rows[item_no]
         if not item or item[0].startswith('%'):
             self.lineno += 1
             return False
@@ -140,6 +149,25 @@ class CSVImporter(Importer):
                             for field_id in field.split('|')]
         return field_values
 
+    def get_cached(self, key, create):
+        """Get a value from the in memory lookup cache
+
+        This is useful to avoid querying the same objects for each row.
+        :param key: the key of the value
+        :param create: a callable which will be called to create
+          the value the first time it is requested
+        :returns: the value
+        """
+        try:
+            return self._lookups[key]
+        except KeyError:
+            value = self._lookups[key] = create()
+            return value
+
+    def clear_cached(self):
+        """Clears the in memory lookup cache"""
+        self._lookups.clear()
+
     #
     # Override this in a subclass
     #
@@ -24,7 +24,9 @@
 ##
 
 import datetime
+import json
 import logging
+import os
 import time
 
 from kiwi.python import namedAny
@@ -52,6 +54,76 @@ _available_importers = {
 }
 
 
+class ImportCheckpoint(object):
+    """The progress of an import, used to resume it if it's interrupted
+
+    It is saved to a file every time the importer commits, with the number
+    of items already processed (the offset) and the key of the last
+    committed item, as returned by :meth:`Importer.get_checkpoint_key`.
+    """
+
+    def __init__(self, path, filename):
+        """
+        :param path: the path of the file where the checkpoint is saved
+        :param filename: the name of the file being imported
+        """
+        self.path = path
+        self.filename = filename
+        self.offset = 0
+        self.last_key = None
+
+    @classmethod
+    def get_path(cls, filename):
+        """Get the default checkpoint path for an imported file
+
+        :param filename: the name of the file being imported
+        """
+        return filename + '.checkpoint'
+
+    @classmethod
+    def load(cls, path, filename):
+        """Load a checkpoint, if it exists
+
+        :param path: the path of the file where the checkpoint is saved
+        :param filename: the name of the file being imported
+        :returns: the checkpoint, which will start from the beginning
+          of the file if it didn't exist
+        """
+        checkpoint = cls(path, filename)
+        if not os.path.exists(path):
+            return checkpoint
+
+        with open(path) as fp:
+            data = json.load(fp)
+        if data['filename'] != filename:
+            raise ValueError(u"Checkpoint %s is for %s, not %s" % (
+                path, data['filename'], filename))
+        checkpoint.offset = data['offset']
+        checkpoint.last_key = data['last_key']
+        return checkpoint
+
+    def save(self, offset, last_key=None):
+        """Saves the checkpoint
+
+        :param offset: the number of items already committed
+        :param last_key: the key of the last committed item
+        """
+        self.offset = offset
+        self.last_key = last_key
+        # Write to a temporary file first, so a crash while writing it will
+        # not lose the previous checkpoint
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump(dict(filename=self.filename, offset=offset,
+                           last_key=last_key), fp)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """Removes the checkpoint, after the import is finished"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
 class Importer(object):
     """Class to assist the process of importing csv files.
 
@@ -64,6 +136,7 @@ class Importer(object):
         :param dry: see :class:`set_dry`
         """
         self.items = items
+        self.items_per_commit = items
         self.dry = dry
 
     def feed_file(self, filename):
@@ -79,7 +152,7 @@ class Importer(object):
         before committing
         :param items: number of items or
         """
-        self.n_items = items
+        self.items_per_commit = items
 
     def set_dry(self, dry):
         """Tells the CSVImporter to run in dry mode, eg without committing
@@ -88,8 +161,15 @@ class Importer(object):
         """
         self.dry = dry
 
-    def process(self, store=None):
-        """Do the main logic, create stores, import items etc"""
+    def process(self, store=None, checkpoint=None):
+        """Do the main logic, create stores, import items etc
+
+        :param store: a store, or ``None`` to create a new one
+        :param checkpoint: an :class:`ImportCheckpoint`. If given, the items
+          before its offset will be skipped and it will be saved after
+          each commit.
+        :returns: the number of imported items
+        """
         n_items = self.get_n_items()
         log.info('Importing %d items' % (n_items, ))
         create_log.info('ITEMS:%d' % (n_items, ))
@@ -99,13 +179,20 @@ class Importer(object):
         if not store:
             store = new_store()
         self.before_start(store)
-        for i in range(n_items):
+        start = 0
+        if checkpoint is not None and checkpoint.offset:
+            start = checkpoint.offset
+            self.restore_checkpoint_key(checkpoint.last_key)
+            log.info('Resuming from item %d' % (start, ))
+        for i in range(start, n_items):
             if self.process_item(store, i):
                 create_log.info('ITEM:%d' % (i + 1, ))
                 imported_items += 1
-            if not self.dry and i + 1 % 100 == 0:
-                store.commit(close=True)
-                store = new_store()
+            if (not self.dry and self.items_per_commit != -1 and
+                    (i + 1) % self.items_per_commit == 0):
+                store.commit()
+                if checkpoint is not None:
+                    checkpoint.save(i + 1, self.get_checkpoint_key())
 
         if not self.dry:
             store.commit(close=True)
@@ -115,12 +202,15 @@ class Importer(object):
 
         if not self.dry:
             store.commit(close=True)
+            if checkpoint is not None:
+                checkpoint.remove()
 
         t2 = time.time()
         log.info('%s Imported %d entries in %2.2f sec' % (
             datetime.datetime.now().strftime('%H:%M:%S'), n_items,
             t2 - t1))
         create_log.info('IMPORTED-ITEMS:%d' % (imported_items, ))
+        return imported_items
 
     def feed(self, fp, filename='<stdin>'):
         """Feeds csv data from an iterable
@@ -152,6 +242,25 @@ class Importer(object):
         before committing.
         """
 
+    def get_checkpoint_key(self):
+        """The key of the last processed item, saved in the checkpoints.
+        This must be something that can be serialized to json
+        """
+        return None
+
+    def restore_checkpoint_key(self, last_key):
+        """This is called before resuming an import from a checkpoint
+        :param last_key: the key of the last committed item, as returned
+          by :meth:`.get_checkpoint_key`
+        """
+
+    def set_key_offset(self, offset):
+        """Offsets the keys generated by this importer, like sequential
+        codes, so several files can be imported at the same time without
+        generating the same keys.
+        :param offset: the number of keys reserved before this importer
+        """
+
 
 def get_by_type(importer_type):
     """Gets an importers class, instantiates it returns it
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source
+##
+## This program is free software; you can redistribute it and/or
+## modify it under the terms of the GNU Lesser General Public License
+## as published by the Free Software Foundation; either version 2
+## of the License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+##
+
+"""
+Runs importers for several files in parallel, using a process pool
+"""
+
+import collections
+import logging
+import multiprocessing
+import os
+import time
+
+from stoqlib.database.runtime import set_default_store
+from stoqlib.database.settings import db_settings
+from stoqlib.importers.importer import ImportCheckpoint, get_by_type
+
+log = logging.getLogger(__name__)
+
+#: The result of importing a file
+ImportResult = collections.namedtuple(
+    'ImportResult', ['filename', 'worker', 'imported_items', 'elapsed'])
+
+#: The database settings copied to the workers
+_SETTINGS = ['rdbms', 'address', 'port', 'dbname', 'username', 'password']
+
+
+def _init_worker(settings):
+    # The workers are spawned, not forked, so they don't share anything
+    # with the parent process (which may have threads running, like the
+    # parameter listener) and need to connect to the database again
+    for name, value in settings.items():
+        setattr(db_settings, name, value)
+    set_default_store(db_settings.create_store())
+
+
+def _count_lines(filename):
+    with open(filename, 'rb') as fp:
+        return sum(1 for line in fp)
+
+
+def _import_file(task):
+    importer_type, filename, key_offset, items_per_commit, resume = task
+    importer = get_by_type(importer_type)
+    importer.set_key_offset(key_offset)
+    if items_per_commit is not None:
+        importer.set_items_per_commit(items_per_commit)
+
+    path = ImportCheckpoint.get_path(filename)
+    if resume:
+        checkpoint = ImportCheckpoint.load(path, filename)
+    else:
+        checkpoint = ImportCheckpoint(path, filename)
+
+    importer.feed_file(filename)
+    t1 = time.time()
+    imported_items = importer.process(checkpoint=checkpoint)
+    return ImportResult(filename=filename, worker=os.getpid(),
+                        imported_items=imported_items,
+                        elapsed=time.time() - t1)
+
+
+class ImporterRunner(object):
+    """Imports several files of the same type, in parallel
+
+    Each file is imported by one worker process. The files must be
+    independent of each other, since the order they will be imported in
+    is undefined. The keys generated by the importers are offset by the
+    number of lines of the files before them (see
+    :meth:`Importer.set_key_offset <stoqlib.importers.importer.Importer.set_key_offset>`),
+    so the files don't generate the same keys.
+
+    Every time an importer commits, a checkpoint is saved next to the file
+    (see :class:`ImportCheckpoint <stoqlib.importers.importer.ImportCheckpoint>`),
+    so an interrupted import can be resumed by running it again with
+    *resume* set. The checkpoints are removed when the files are completely
+    imported.
+    """
+
+    def __init__(self, importer_type, filenames, workers=None,
+                 items_per_commit=None, resume=False):
+        """
+        :param importer_type: the type of the importer, see
+          :func:`get_by_type <stoqlib.importers.importer.get_by_type>`
+        :param filenames: a list of files to import
+        :param workers: the number of worker processes, defaults to the
+          number of cpus, but not more than the number of files
+        :param items_per_commit: how many items are imported between commits,
+          ``None`` to use the importer's default
+        :param resume: if the import should be resumed from the saved
+          checkpoints, if any
+        """
+        self.importer_type = importer_type
+        self.filenames = filenames
+        self.workers = min(workers or multiprocessing.cpu_count(),
+                           len(filenames))
+        self.items_per_commit = items_per_commit
+        self.resume = resume
+
+    #
+    # Public API
+    #
+
+    def run(self):
+        """Import all the files
+
+        :returns: a list of :class:`ImportResult`, one for each file
+        """
+        # Each file gets its own range of keys, so the files being imported
+        # at the same time will not generate the same keys (e.g. the product
+        # codes). A file has at most one item per line.
+        tasks = []
+        key_offset = 0
+        for filename in self.filenames:
+            tasks.append((self.importer_type, filename, key_offset,
+                          self.items_per_commit, self.resume))
+            key_offset += _count_lines(filename)
+
+        # Avoid the overhead of the pool if there's only one worker
+        if self.workers <= 1:
+            results = []
+            for task in tasks:
+                results.append(_import_file(task))
+                self._log_result(results[-1])
+            return results
+
+        results = []
+        t1 = time.time()
+        settings = dict((name, getattr(db_settings, name))
+                        for name in _SETTINGS)
+        context = multiprocessing.get_context('spawn')
+        pool = context.Pool(self.workers, initializer=_init_worker,
+                            initargs=(settings, ))
+        try:
+            for result in pool.imap_unordered(_import_file, tasks):
+                results.append(result)
+                self._log_result(result)
+        finally:
+            pool.close()
+            pool.join()
+
+        elapsed = time.time() - t1
+        imported_items = sum(r.imported_items for r in results)
+        log.info('Imported %d items from %d files in %2.2f sec '
+                 '(%d items/sec)' % (imported_items, len(results), elapsed,
+                                     imported_items / elapsed if elapsed else 0))
+        return results
+
+    #
+    # Private
+    #
+
+    def _log_result(self, result):
+        log.info('Worker %d imported %d items from %s in %2.2f sec '
+                 '(%d items/sec)' % (
+                     result.worker, result.imported_items, result.filename,
+                     result.elapsed,
+                     result.imported_items / result.elapsed if result.elapsed else 0))
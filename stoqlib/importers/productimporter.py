@@ -37,11 +37,11 @@ from stoqlib.domain.taxes import (ProductIcmsTemplate,
                                   ProductPisTemplate,
                                   ProductCofinsTemplate,
                                   ProductTaxTemplate)
-from stoqlib.importers.csvimporter import CSVImporter
+from stoqlib.importers.copyimporter import CopyImporter
 from stoqlib.lib.parameters import sysparam
 
 
-class ProductImporter(CSVImporter):
+class ProductImporter(CopyImporter):
     fields = ['base_category',
               'barcode',
               'category',
@@ -66,58 +66,74 @@ class ProductImporter(CSVImporter):
         if not suppliers.count():
             raise ValueError(u'You must have at least one suppliers on your '
                              u'database at this point.')
-        self.supplier = suppliers[0]
+        self.supplier_id = suppliers[0].id
 
         self.units = {}
         for unit in default_store.find(SellableUnit):
-            self.units[unit.description] = unit
+            self.units[unit.description] = unit.id
 
         self.tax_constant_id = sysparam.get_object_id(
             'DEFAULT_PRODUCT_TAX_CONSTANT')
         self._code = 1
 
-    def _get_or_create(self, table, store, **attributes):
-        obj = store.find(table, **attributes).one()
-        if obj is None:
-            obj = table(store=store, **attributes)
-        return obj
+        self.sellables = self.add_batch(
+            Sellable, ['cost', 'category_id', 'description', 'base_price',
+                       'commission', 'barcode', 'code', 'unit_id',
+                       'tax_constant_id'])
+        self.products = self.add_batch(
+            Product, ['ncm', 'icms_template_id', 'pis_template_id',
+                      'cofins_template_id'])
+        self.supplier_infos = self.add_batch(
+            ProductSupplierInfo, ['supplier_id', 'is_main_supplier',
+                                  'base_cost', 'product_id'])
+        self.storables = self.add_batch(Storable, [])
+
+    def get_checkpoint_key(self):
+        # The code of the last imported product
+        return self._code - 1
+
+    def restore_checkpoint_key(self, last_key):
+        self._code = last_key + 1
+
+    def set_key_offset(self, offset):
+        self._code = offset + 1
 
     def _maybe_create_taxes(self, store):
-        icms_template = self._get_or_create(ProductTaxTemplate,
-                                            store,
-                                            name=u'icms',
-                                            tax_type=ProductTaxTemplate.TYPE_ICMS)
-        pis_template = self._get_or_create(ProductTaxTemplate,
+        icms_template = self.get_or_create(ProductTaxTemplate,
                                            store,
-                                           name=u'pis',
-                                           tax_type=ProductTaxTemplate.TYPE_PIS)
-        cofins_template = self._get_or_create(ProductTaxTemplate,
-                                              store,
-                                              name=u'cofins',
-                                              tax_type=ProductTaxTemplate.TYPE_COFINS)
+                                           name=u'icms',
+                                           tax_type=ProductTaxTemplate.TYPE_ICMS)
+        pis_template = self.get_or_create(ProductTaxTemplate,
+                                          store,
+                                          name=u'pis',
+                                          tax_type=ProductTaxTemplate.TYPE_PIS)
+        cofins_template = self.get_or_create(ProductTaxTemplate,
+                                             store,
+                                             name=u'cofins',
+                                             tax_type=ProductTaxTemplate.TYPE_COFINS)
 
         taxes = {}
-        taxes['icms'] = self._get_or_create(ProductIcmsTemplate,
-                                            store,
-                                            product_tax_template=icms_template,
-                                            csosn=102,
-                                            orig=2)
-        taxes['pis'] = self._get_or_create(ProductPisTemplate,
-                                           store=store,
-                                           product_tax_template=pis_template,
-                                           cst=99,
-                                           calculo=ProductPisTemplate.CALC_PERCENTAGE,
-                                           p_pis=10)
-        taxes['cofins'] = self._get_or_create(ProductCofinsTemplate,
-                                              store=store,
-                                              product_tax_template=cofins_template,
-                                              cst=99,
-                                              calculo=ProductPisTemplate.CALC_PERCENTAGE,
-                                              p_cofins=10)
+        taxes['icms'] = self.get_or_create(ProductIcmsTemplate,
+                                           store,
+                                           product_tax_template=icms_template,
+                                           csosn=102,
+                                           orig=2)
+        taxes['pis'] = self.get_or_create(ProductPisTemplate,
+                                          store=store,
+                                          product_tax_template=pis_template,
+                                          cst=99,
+                                          calculo=ProductPisTemplate.CALC_PERCENTAGE,
+                                          p_pis=10)
+        taxes['cofins'] = self.get_or_create(ProductCofinsTemplate,
+                                             store=store,
+                                             product_tax_template=cofins_template,
+                                             cst=99,
+                                             calculo=ProductPisTemplate.CALC_PERCENTAGE,
+                                             p_cofins=10)
         return taxes
 
     def process_one(self, data, fields, store):
-        base_category = self._get_or_create(
+        base_category = self.get_or_create(
             SellableCategory, store,
             suggested_markup=Decimal(data.markup),
             salesperson_commission=Decimal(data.commission),
@@ -125,43 +141,46 @@ class ProductImporter(CSVImporter):
             description=data.base_category)
 
         # create a commission source
-        self._get_or_create(
+        self.get_or_create(
             CommissionSource, store,
             direct_value=Decimal(data.commission),
             installments_value=Decimal(data.commission2),
             category=base_category)
 
-        category = self._get_or_create(
+        category = self.get_or_create(
             SellableCategory, store,
             description=data.category,
             suggested_markup=Decimal(data.markup2),
             category=base_category)
 
-        sellable = Sellable(store=store,
-                            cost=Decimal(data.cost),
-                            category=category,
-                            description=data.description,
-                            price=Decimal(data.price))
-        sellable.barcode = data.barcode
-        sellable.code = u'%02d' % self._code
-        self._code += 1
+        unit_id = None
         if u'unit' in fields:
             if not data.unit in self.units:
                 raise ValueError(u"invalid unit: %s" % data.unit)
-            sellable.unit = store.fetch(self.units[data.unit])
-        sellable.tax_constant_id = self.tax_constant_id
-
-        product = Product(store=store, sellable=sellable, ncm=data.ncm)
+            unit_id = self.units[data.unit]
+
+        sellable_id = self.sellables.add(
+            cost=Decimal(data.cost),
+            category_id=category.id,
+            description=data.description,
+            base_price=Decimal(data.price),
+            commission=category.get_commission(),
+            barcode=data.barcode,
+            code=u'%02d' % self._code,
+            unit_id=unit_id,
+            tax_constant_id=self.tax_constant_id)
+        self._code += 1
 
         taxes = self._maybe_create_taxes(store)
-        product.set_icms_template(taxes['icms'])
-        product.set_pis_template(taxes['pis'])
-        product.set_cofins_template(taxes['cofins'])
-
-        supplier = store.fetch(self.supplier)
-        ProductSupplierInfo(store=store,
-                            supplier=supplier,
-                            is_main_supplier=True,
-                            base_cost=Decimal(data.cost),
-                            product=product)
-        Storable(product=product, store=store)
+        product_id = self.products.add(
+            id=sellable_id,
+            ncm=data.ncm,
+            icms_template_id=taxes['icms'].id,
+            pis_template_id=taxes['pis'].id,
+            cofins_template_id=taxes['cofins'].id)
+
+        self.supplier_infos.add(supplier_id=self.supplier_id,
+                                is_main_supplier=True,
+                                base_cost=Decimal(data.cost),
+                                product_id=product_id)
+        self.storables.add(id=product_id)
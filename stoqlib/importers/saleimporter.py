@@ -46,26 +46,39 @@ class SaleImporter(CSVImporter):
               'open_date',
               'due_date']
 
-    def process_one(self, data, fields, store):
-        person = store.find(Person, name=data.branch_name).one()
-        if person is None or person.branch is None:
-            raise ValueError(u"%s is not a valid branch" % (
-                data.branch_name, ))
-        branch = person.branch
-        station = store.find(BranchStation).any()
-        user = store.find(LoginUser).any()
+    def before_start(self, store):
+        # The objects referenced by the sales are cached, so they are
+        # only queried once for the whole file
+        self.clear_cached()
+
+    def _get_person(self, store, name, attr, error_msg):
+        person = self.get_cached(
+            (Person, name), lambda: store.find(Person, name=name).one())
+        if person is None or getattr(person, attr) is None:
+            raise ValueError(error_msg % (name, ))
+        return getattr(person, attr)
 
-        person = store.find(Person, name=data.client_name).one()
-        if person is None or person.client is None:
-            raise ValueError(u"%s is not a valid client" % (
-                data.client_name, ))
-        client = person.client
+    def _get_products(self, store, product_list):
+        products = self.get_cached(
+            Product,
+            lambda: list(store.find(Product).order_by(Product.te_id)))
+        if product_list == '*':
+            return products
+        return [products[int(product_id) - 1]
+                for product_id in product_list.split('|')]
 
-        person = store.find(Person, name=data.salesperson_name).one()
-        if person is None or person.sales_person is None:
-            raise ValueError(u"%s is not a valid sales person" % (
-                data.salesperson_name, ))
-        salesperson = person.sales_person
+    def process_one(self, data, fields, store):
+        branch = self._get_person(store, data.branch_name, 'branch',
+                                  u"%s is not a valid branch")
+        station = self.get_cached(
+            BranchStation, lambda: store.find(BranchStation).any())
+        user = self.get_cached(
+            LoginUser, lambda: store.find(LoginUser).any())
+        client = self._get_person(store, data.client_name, 'client',
+                                  u"%s is not a valid client")
+        salesperson = self._get_person(store, data.salesperson_name,
+                                       'sales_person',
+                                       u"%s is not a valid sales person")
         group = PaymentGroup(store=store)
         sale = Sale(client=client,
                     open_date=self.parse_date(data.open_date),
@@ -78,12 +91,14 @@ class SaleImporter(CSVImporter):
                     store=store)
 
         total_price = 0
-        for product in self.parse_multi(Product, data.product_list, store):
+        for product in self._get_products(store, data.product_list):
             sale.add_sellable(product.sellable)
             total_price += product.sellable.price
 
         sale.order(user)
-        method = PaymentMethod.get_by_name(store, data.payment_method)
+        method = self.get_cached(
+            (PaymentMethod, data.payment_method),
+            lambda: PaymentMethod.get_by_name(store, data.payment_method))
         method.create_payment(branch, station, Payment.TYPE_IN, group, total_price,
                               due_date=self.parse_date(data.due_date))
         sale.confirm(user)
@@ -25,6 +25,7 @@ from decimal import Decimal
 from kiwi.python import strip_accents
 
 from stoqlib.lib.dateutils import localnow
+from stoqlib.lib.fixedwidth import FixedWidthField, FixedWidthLayout
 
 
 class Field(object):
@@ -97,18 +98,44 @@ class Field(object):
         if self.name not in ['cnab', '_']:
             assert value is not None, self.name
 
+        value = self.get_formatter(self.size)(value)
+        assert len(value) == self.size, (self.name, value, len(value), self.size)
+        return value
+
+    def get_formatter(self, size):
+        """Get a function that formats the values of this field
+
+        This is used to compile the :class:`FixedWidthLayout
+        <stoqlib.lib.fixedwidth.FixedWidthLayout>` of the records.
+
+        :param size: the length of the field
+        :returns: a function receiving a value and returning its string
+          representation
+        """
         if self.type is str:
-            value = strip_accents(str(value or '')).ljust(self.size)[:self.size]
+            def format_value(value):
+                value = str(value or '')
+                # strip_accents is slow and does nothing for ascii strings
+                if not value.isascii():
+                    value = strip_accents(value)
+                return value.ljust(size)[:size]
         elif self.type is int:
-            value = str(value or 0).rjust(self.size, '0')
-            assert len(value) == self.size, (self.name, value, len(value), self.size)
+            def format_value(value):
+                return str(value or 0).rjust(size, '0')
         elif self.type is Decimal:
-            value = value or 0
-            value = str(int(value * (10 ** self.decimals)))
-            value = str(value).rjust(self.size, '0')
-            assert len(value) == self.size, (value, len(value), self.size)
+            factor = 10 ** self.decimals
 
-        return value or ''
+            def format_value(value):
+                return str(int((value or 0) * factor)).rjust(size, '0')
+        else:
+            def format_value(value):
+                return value or ''
+
+        if self.name in ('cnab', '_'):
+            # cnab fields are always None, so they are always the same
+            constant = format_value(None)
+            return lambda value: constant
+        return format_value
 
 
 class Record(object):
@@ -128,34 +155,65 @@ class Record(object):
     replace_fields = {}
 
     def __init__(self, **kwargs):
+        layout, names, defaults, field_map = self.get_layout()
+        self._values = [None] * len(names)
+        for key, value in kwargs.items():
+            pos = field_map[key]
+            if pos is not None:
+                self._values[pos] = value
+
+    @classmethod
+    def get_layout(cls):
+        """Get the compiled layout of this record
+
+        The fields of the record are only compiled once, when the first
+        record of this class is created.
+
+        :returns: a tuple with the :class:`FixedWidthLayout
+          <stoqlib.lib.fixedwidth.FixedWidthLayout>`, the field names
+          (``None`` for the cnab fields), the default values and a dict
+          mapping the names to the positions of the fields
+        """
+        compiled = cls.__dict__.get('_compiled')
+        if compiled is not None:
+            return compiled
+
         # Build a new private fields list based on fields and replace fields to
         # avoid the class fields definition being overwriten by the replace
         # fields bellow
-        self._fields = []
+        fields = []
         field_map = {}
-        for field in self.fields:
+        for field in cls.fields:
             field = field.copy()
-            field.set_record(self)
             field_map[field.name] = field
-            self._fields.append(field)
+            fields.append(field)
 
         # Replace fields
-        for key, new_values in self.replace_fields.items():
-            pos = self._fields.index(field_map[key])
-            self._fields.pop(pos)
+        for key, new_values in cls.replace_fields.items():
+            pos = fields.index(field_map[key])
+            fields.pop(pos)
             for field in reversed(new_values):
                 field = field.copy()
-                field.set_record(self)
-                self._fields.insert(pos, field)
+                fields.insert(pos, field)
                 field_map[field.name] = field
 
         # Validate the size
-        size = sum(field.size for field in self._fields)
-        assert size == self.size, (self, size)
-
-        for key, value in kwargs.items():
-            field = field_map[key]
-            field.set_value(value)
+        size = sum(field.size for field in fields)
+        assert size == cls.size, (cls, size)
+
+        layout = FixedWidthLayout(
+            [FixedWidthField(field.name, field.size, field.get_formatter)
+             for field in fields], size=cls.size)
+        names = [None if field.name in ('cnab', '_') else field.name
+                 for field in fields]
+        defaults = [field.default_value for field in fields]
+        # The replaced fields are still in field_map, but their values are
+        # never used. They are mapped to None
+        indexes = dict((id(field), i) for i, field in enumerate(fields))
+        positions = dict((name, indexes.get(id(field)))
+                         for name, field in field_map.items())
+        cls._compiled = (layout, names, defaults, positions)
+        return cls._compiled
 
     def get_value(self, name):
         """Gets a value for a given field name
@@ -176,9 +234,19 @@ class Record(object):
         self.cnab = cnab
 
     def as_string(self):
-        value = ''.join(f.as_string() for f in self._fields)
-        assert len(value) == self.size, (len(value), self.size)
-        return value
+        layout, names, defaults, field_map = self.get_layout()
+        values = []
+        for name, default, value in zip(names, defaults, self._values):
+            # The order that the value is feched is: the value passed to
+            # the constructor, the value of the record (or of its cnab) and
+            # then the default value. cnab fields are always None.
+            if value is None and name is not None:
+                value = self.get_value(name)
+                if value is None:
+                    value = default
+                assert value is not None, name
+            values.append(value)
+        return layout.format(values)
 
 
 class Cnab(object):
@@ -231,5 +299,14 @@ class Cnab(object):
         # Cnab requires an extra \r\n at the last line
         return '\r\n'.join(r.as_string() for r in self.records) + '\r\n'
 
+    def write(self, fp):
+        """Writes the records of this cnab to a file, one at a time
+
+        :param fp: file object, anything implementing write(data)
+        """
+        for record in self.records:
+            fp.write(record.as_string())
+            fp.write('\r\n')
+
     def __repr__(self):  # pragma no cover
         return '<{} records={}>'.format(self.__class__.__name__, len(self.records))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source
+##
+## This program is free software; you can redistribute it and/or
+## modify it under the terms of the GNU Lesser General Public License
+## as published by the Free Software Foundation; either version 2
+## of the License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+"""The credit ledger of the clients
+
+A client may buy on store credit up to its credit limit, as long as it
+has no late payments, and may use the credit it has on its credit
+account (money the store owes it, e.g. from returned sales). Summing
+the payments of the client for each of those checks gets slower the more
+payments it has, so ``client_credit_ledger`` keeps, for each payer:
+
+* ``store_credit_debit``, the value of the store credit payments not paid
+  yet (pending or confirmed).
+* ``credit_balance``, the paid out minus the paid in credit payments.
+* ``oldest_pending_due_date``, the due date of the oldest pending payment,
+  to know if it has late payments.
+
+It is updated by triggers on the payments and the payment groups, and a
+person without a row has no credit at all. Use :func:`get_credit_ledger`
+to read it, and :data:`CREDIT_LEDGER` to check it against the payments or
+rebuild it.
+"""
+
+import collections
+
+from kiwi.currency import currency
+
+from stoqlib.database.derivedtable import DerivedTable
+
+#: The table with the ledger of each payer
+LEDGER_TABLE = u'client_credit_ledger'
+
+#: The ledger of a person
+CreditLedger = collections.namedtuple(
+    'CreditLedger',
+    ['store_credit_debit', 'credit_balance', 'oldest_pending_due_date'])
+
+#: A row of the ledger that is not equal to the payments. The expected
+#: values are the ones computed from the payments and the others the ones
+#: in the ledger (``None`` when the row is missing)
+CreditLedgerDivergence = collections.namedtuple(
+    'CreditLedgerDivergence',
+    ['table', 'person_id', 'expected_store_credit_debit', 'store_credit_debit',
+     'expected_credit_balance', 'credit_balance',
+     'expected_oldest_pending_due_date', 'oldest_pending_due_date'])
+
+_CHECK_LEDGER = u"""
+    SELECT COALESCE(expected.person_id, ledger.person_id),
+           expected.store_credit_debit, ledger.store_credit_debit,
+           expected.credit_balance, ledger.credit_balance,
+           expected.oldest_pending_due_date, ledger.oldest_pending_due_date
+    FROM compute_credit_ledger() AS expected
+    FULL OUTER JOIN client_credit_ledger AS ledger
+        ON ledger.person_id = expected.person_id
+    WHERE COALESCE(expected.store_credit_debit, 0) <>
+              COALESCE(ledger.store_credit_debit, 0) OR
+          COALESCE(expected.credit_balance, 0) <>
+              COALESCE(ledger.credit_balance, 0) OR
+          expected.oldest_pending_due_date IS DISTINCT FROM
+              ledger.oldest_pending_due_date
+"""
+
+
+def get_credit_ledger(store, person):
+    """Gets the credit ledger of a person
+
+    :param store: a store
+    :param person: a |person|
+    :returns: a :class:`CreditLedger`
+    """
+    row = store.execute(
+        u"SELECT store_credit_debit, credit_balance, oldest_pending_due_date "
+        u"FROM client_credit_ledger WHERE person_id = ?",
+        (person.id, )).get_one()
+    if row is None:
+        return CreditLedger(currency(0), currency(0), None)
+    store_credit_debit, credit_balance, oldest_pending_due_date = row
+    return CreditLedger(currency(store_credit_debit), currency(credit_balance),
+                        oldest_pending_due_date)
+
+
+#: The ledger of the payers, see
+#: :class:`stoqlib.database.derivedtable.DerivedTable`. The persons
+#: without a row on the ledger are considered to have no credit, so
+#: only the ones with payments need to have one
+CREDIT_LEDGER = DerivedTable(
+    u'credit ledger', CreditLedgerDivergence,
+    keys=['person_id'],
+    columns=['store_credit_debit', 'credit_balance',
+             'oldest_pending_due_date'],
+    checks=[(LEDGER_TABLE, _CHECK_LEDGER)],
+    rebuild_function=u'rebuild_credit_ledger')
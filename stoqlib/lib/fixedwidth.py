@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+"""Fixed width records
+
+The CNAB, Sintegra and CAT52 files are made of lines with fields of fixed
+widths. A :class:`FixedWidthLayout` is compiled once for each kind of
+line, binding a formatter to each one of its fields, and is then used to
+format all the lines of that kind::
+
+    >>> layout = FixedWidthLayout(
+    ...     [FixedWidthField('code', 5, lambda width: lambda v: '%0*d' % (width, v)),
+    ...      FixedWidthField('name', 6, lambda width: lambda v: v.ljust(width)[:width])],
+    ...     size=12, terminator='\\r\\n')
+    >>> layout.format([42, 'Stoq'])
+    '00042Stoq   \\r\\n'
+"""
+
+import collections
+
+#: A field of a :class:`FixedWidthLayout`. formatter is called with the
+#: width of the field when the layout is compiled, and must return a
+#: callable that receives the value of the field and returns its text,
+#: with exactly width characters.
+FixedWidthField = collections.namedtuple('FixedWidthField',
+                                         ['name', 'width', 'formatter'])
+
+
+class FixedWidthLayout(object):
+    """The compiled layout of a fixed width line
+
+    :param fields: the :class:`FixedWidthField` of the line, in order
+    :param size: the width of the line, not counting the prefix and the
+      terminator. The space left after the fields is filled with *fill*.
+      If ``None``, the line is as wide as its fields
+    :param prefix: a text added before the fields, like a register type
+    :param terminator: a text added after the line, like a line break
+    :param fill: the character used to fill the line up to *size*. Use
+      bytes for all the texts (and formatters) to create binary lines
+    :raises: :exc:`ValueError` if the fields are wider than *size*
+    """
+
+    def __init__(self, fields, size=None, prefix='', terminator='', fill=' '):
+        self.fields = list(fields)
+        width = sum(field.width for field in self.fields)
+        if size is None:
+            size = width
+        if width > size:
+            raise ValueError("There are fields with a total width of %d, "
+                             "but only %d is allowed" % (width, size))
+
+        self.size = size
+        self._formatters = [field.formatter(field.width) for field in self.fields]
+        self._join = fill[:0].join
+        self._prefix = prefix
+        self._suffix = fill * (size - width) + terminator
+        self._length = len(prefix) + len(self._suffix) + width
+
+    #
+    # Public API
+    #
+
+    def format(self, values):
+        """Formats a line
+
+        :param values: the values of the fields, in the same order
+        :returns: the formatted line
+        :raises: :exc:`ValueError` if a field was formatted with a wrong
+          width
+        """
+        parts = [self._prefix]
+        parts.extend([formatter(value) for formatter, value
+                      in zip(self._formatters, values)])
+        parts.append(self._suffix)
+        line = self._join(parts)
+        if len(line) != self._length:
+            self._check_widths(parts[1:-1])
+        return line
+
+    def write(self, fp, rows):
+        """Formats lines, writing them to a file as soon as they are ready
+
+        :param fp: file object, anything implementing write(data)
+        :param rows: an iterable with the values of each line
+        """
+        format_ = self.format
+        for values in rows:
+            fp.write(format_(values))
+
+    #
+    # Private
+    #
+
+    def _check_widths(self, texts):
+        for field, text in zip(self.fields, texts):
+            if len(text) != field.width:
+                raise ValueError("Field %s should have %d characters, but "
+                                 "got %r" % (field.name, field.width, text))
+        raise ValueError("Expected values for %d fields" % (len(self.fields), ))
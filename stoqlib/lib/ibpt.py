@@ -103,12 +103,13 @@ class IBPTGenerator(object):
         sellable = item.sellable
         product = sellable.product
         service = sellable.service
-        delivery = sysparam.get_object(item.store, 'DELIVERY_SERVICE').sellable
+        # Services share their ids with their sellables
+        delivery_id = sysparam.get_object_id('DELIVERY_SERVICE')
         if product:
             code = product.ncm or ''
             ex_tipi = self._format_ex(product.ex_tipi)
         else:
-            if not self.include_services or sellable == delivery:
+            if not self.include_services or sellable.id == delivery_id:
                 return
 
             code = '%04d' % int(service.service_list_item_code.replace('.', ''))
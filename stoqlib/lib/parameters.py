@@ -27,12 +27,18 @@ import collections
 from decimal import Decimal
 from uuid import uuid4
 import logging
+import select
+import threading
 
 from kiwi.datatypes import ValidationError
 from kiwi.python import namedAny
+import psycopg2
+import psycopg2.extensions
+from storm.store import Store
 from stoqdrivers.enum import TaxType
 
 from stoqlib.database.runtime import get_default_store
+from stoqlib.database.settings import db_settings
 from stoqlib.domain.parameter import ParameterData
 from stoqlib.enums import (LatePaymentPolicy, ReturnPolicy,
                            ChangeSalespersonPolicy)
@@ -1086,6 +1092,91 @@ _details = [
 ]
 
 
+class _ParameterListener(threading.Thread):
+    """Listens for parameter changes notified by the database
+
+    A trigger on parameter_data notifies the name of the parameters changed
+    by a transaction when it is committed (see patch-06-19.sql). This
+    will fetch only the new values of those parameters and update them
+    in the cache.
+
+    If the connection is lost, this will keep trying to connect again.
+    The notifications sent while disconnected are lost, so all the
+    parameters are reloaded after connecting.
+    """
+
+    channel = 'parameter_data'
+
+    #: How long to wait for notifications before checking again
+    timeout = 5
+
+    #: How long to wait before connecting again after an error
+    reconnect_interval = 10
+
+    def __init__(self, parameter_access):
+        super(_ParameterListener, self).__init__()
+
+        self.daemon = True
+        self._parameter_access = parameter_access
+        self._conn = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self._connect()
+                # Anything changed before LISTEN was executed was not
+                # notified to us, so we can't trust the cache anymore
+                self._parameter_access.clear_cache()
+                self._listen()
+            except Exception:
+                log.exception("Error listening for parameter changes, "
+                              "connecting again in %d seconds",
+                              self.reconnect_interval)
+            finally:
+                self._close()
+            self._stopped.wait(self.reconnect_interval)
+
+    def stop(self):
+        """Stop listening for changes"""
+        self._stopped.set()
+
+    def _connect(self):
+        self._conn = psycopg2.connect(db_settings.get_store_dsn())
+        self._conn.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        self._conn.cursor().execute('LISTEN %s' % (self.channel, ))
+
+    def _close(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.close()
+        except psycopg2.Error:
+            pass
+        self._conn = None
+
+    def _listen(self):
+        cursor = self._conn.cursor()
+        while not self._stopped.is_set():
+            if select.select([self._conn], [], [], self.timeout) == ([], [], []):
+                continue
+
+            self._conn.poll()
+            param_names = set()
+            while self._conn.notifies:
+                param_names.add(self._conn.notifies.pop(0).payload)
+
+            for param_name in param_names:
+                cursor.execute(
+                    "SELECT field_value FROM parameter_data "
+                    "WHERE field_name = %s", (param_name, ))
+                row = cursor.fetchone()
+                log.info("Parameter %s changed", param_name)
+                self._parameter_access.update_cached_value(
+                    param_name, row[0] if row else None, removed=row is None)
+
+
 class ParameterAccess(object):
     """
     API for accessing and updating system parameters
@@ -1098,15 +1189,25 @@ class ParameterAccess(object):
             self.register_param(detail)
 
         self._values_cache = None
+        # Mapping of objects already resolved by get_object for each
+        # store, id(store) -> {name -> object}. The objects reference their
+        # store, so the stores are removed from here when they are closed
+        # (see clear_store_cache)
+        self._objects_cache = {}
+        self._listener = None
 
     # Lazy Mapping of database raw database values, name -> database value
     @property
     def _values(self):
-        if self._values_cache is None:
-            self._values_cache = dict(
+        # The listener may clear the cache from another thread, so only
+        # read it once
+        values = self._values_cache
+        if values is None:
+            values = dict(
                 (p.field_name, p.field_value)
                 for p in get_default_store().find(ParameterData))
-        return self._values_cache
+            self._values_cache = values
+        return values
 
     def _create_default_values(self, store):
         """Create default values for parameters that take objects"""
@@ -1260,6 +1361,50 @@ class ParameterAccess(object):
     def clear_cache(self):
         """Clears the internal cache so it can be rebuilt on next access"""
         self._values_cache = None
+        self._objects_cache.clear()
+
+    def clear_store_cache(self, store):
+        """Clears the objects cached for a store
+
+        This is called when the store is closed, since its objects will
+        not be used anymore.
+
+        :param store: a database store
+        """
+        self._objects_cache.pop(id(store), None)
+
+    def update_cached_value(self, param_name, value, removed=False):
+        """Update the value of a parameter in the cache
+
+        This is used when other processes change a parameter, to avoid
+        having to reload all of the parameters from the database.
+
+        :param param_name: the parameter name
+        :param value: the new database value of the parameter
+        :param removed: if the parameter was removed from the database
+        """
+        values = self._values_cache
+        if values is None:
+            # Nothing loaded yet, the value will be fetched on the next access
+            return
+
+        if removed:
+            values.pop(param_name, None)
+        else:
+            values[param_name] = value
+
+    def start_listening(self):
+        """Start listening for parameters changed by other processes
+
+        Once started, the values changed (and committed) by any other
+        process connected to the database will be updated in the cache,
+        so there is no need to call :meth:`.clear_cache` to see them.
+        """
+        if self._listener is not None:
+            return
+
+        self._listener = _ParameterListener(self)
+        self._listener.start()
 
     def ensure_system_parameters(self, store, update=False):
         """
@@ -1298,11 +1443,23 @@ class ParameterAccess(object):
             except ValueError:
                 return expected_type(detail.initial)
         elif isinstance(expected_type, str):
-            field_type = detail.get_parameter_type()
-            return store.get(field_type, str(value))
+            return self._get_object(store, param_name,
+                                    detail.get_parameter_type(), str(value))
 
         return value
 
+    def _get_object(self, store, param_name, field_type, obj_id):
+        # The objects are cached for each store since store.get() would
+        # query the database again after a commit or a rollback.
+        objects = self._objects_cache.setdefault(id(store), {})
+        obj = objects.get(param_name)
+        # Make sure the value did not change and that the object was not
+        # removed from the store by a rollback since we cached it
+        if obj is None or obj.id != obj_id or Store.of(obj) is not store:
+            obj = store.get(field_type, obj_id)
+            objects[param_name] = obj
+        return obj
+
     def set_bool(self, store, param_name, value):
         """
         Updates a database bool value for a given parameter.
@@ -1418,8 +1575,9 @@ class ParameterAccess(object):
         """
         Fetches an object from the database.
 
-        ..note..:: This has to query the database to build an object and
-                   it is slower than other getters, avoid it if you can.
+        ..note..:: This has to query the database to build an object the
+                   first time it is fetched in a store and it is slower than
+                   other getters, avoid it if you can.
 
         :param store: a database store
         :param param_name: the parameter name
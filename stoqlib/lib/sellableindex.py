@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source
+##
+## This program is free software; you can redistribute it and/or
+## modify it under the terms of the GNU Lesser General Public License
+## as published by the Free Software Foundation; either version 2
+## of the License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+"""An in-memory index of the sellables by barcode, code and batch number
+
+Looking for a sellable when scanning a barcode used to need up to three
+queries, one for each of the attributes it can match. The index knows
+which sellable (or batch) has the scanned text, so only that one needs
+to be fetched.
+
+The index is shared by the whole process. :func:`start_sellable_index`
+(called when an application that scans barcodes starts) loads it once on
+a thread, which then keeps it up to date with the changes notified by the
+database, made by this or any other station. The domain hooks also update
+it, so the changes made on this station are seen before they are
+committed. The index can still be outdated for a moment, so
+:func:`find_sellable_and_batch` verifies every match against the database
+and falls back to querying it when nothing is found.
+"""
+
+import collections
+import logging
+import select
+import threading
+
+import psycopg2
+import psycopg2.extensions
+from storm.expr import And, In, Lower
+
+from stoqlib.database.settings import db_settings
+
+log = logging.getLogger(__name__)
+
+_index = None
+_index_lock = threading.Lock()
+_listener = None
+
+
+class SellableIndex(object):
+    """Maps barcodes, codes and batch numbers to sellables
+
+    The keys are case insensitive and every key can map to more than one
+    object, since the database does not enforce uniqueness on them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self._clear()
+
+    def _clear(self):
+        self._barcodes = collections.defaultdict(set)
+        self._codes = collections.defaultdict(set)
+        # batch_number -> set of (batch_id, sellable_id)
+        self._batch_numbers = collections.defaultdict(set)
+        # The current keys of the objects, used to update them
+        self._sellable_keys = {}
+        self._batch_keys = {}
+
+    #
+    #  Public API
+    #
+
+    def load(self, store):
+        """Loads all the sellables and batches from the database
+
+        :param store: a store
+        """
+        from stoqlib.domain.product import StorableBatch
+        from stoqlib.domain.sellable import Sellable
+
+        sellables = list(store.find(
+            (Sellable.id, Sellable.barcode, Sellable.code)))
+        batches = list(store.find(
+            (StorableBatch.id, StorableBatch.batch_number,
+             StorableBatch.storable_id)))
+        self.load_rows(sellables, batches)
+
+    def load_rows(self, sellables, batches):
+        """Loads the index from the rows of the sellables and batches
+
+        :param sellables: a list of (id, barcode, code) tuples, with
+          all the sellables
+        :param batches: a list of (id, batch_number, storable_id) tuples,
+          with all the batches
+        """
+        with self._lock:
+            self._clear()
+            for sellable_id, barcode, code in sellables:
+                self._set_sellable(sellable_id, barcode, code)
+            for batch_id, batch_number, sellable_id in batches:
+                self._set_batch(batch_id, batch_number, sellable_id)
+            self.loaded = True
+
+    def update_rows(self, sellables=None, batches=None,
+                    removed_sellables=None, removed_batches=None):
+        """Updates the index with the rows of the changed sellables and batches
+
+        :param sellables: a list of (id, barcode, code) tuples
+        :param batches: a list of (id, batch_number, storable_id) tuples
+        :param removed_sellables: the ids of the removed sellables
+        :param removed_batches: the ids of the removed batches
+        """
+        if not self.loaded:
+            return
+        with self._lock:
+            for sellable_id in removed_sellables or []:
+                self._remove_sellable(sellable_id)
+            for batch_id in removed_batches or []:
+                self._remove_batch(batch_id)
+            for sellable_id, barcode, code in sellables or []:
+                self._remove_sellable(sellable_id)
+                self._set_sellable(sellable_id, barcode, code)
+            for batch_id, batch_number, sellable_id in batches or []:
+                self._remove_batch(batch_id)
+                self._set_batch(batch_id, batch_number, sellable_id)
+
+    def update_sellable(self, sellable):
+        if not self.loaded:
+            # It will be up to date when it gets loaded
+            return
+        with self._lock:
+            self._remove_sellable(sellable.id)
+            self._set_sellable(sellable.id, sellable.barcode, sellable.code)
+
+    def remove_sellable(self, sellable):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove_sellable(sellable.id)
+
+    def update_batch(self, batch):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove_batch(batch.id)
+            # The storable, product and sellable share the same id
+            self._set_batch(batch.id, batch.batch_number, batch.storable_id)
+
+    def remove_batch(self, batch):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove_batch(batch.id)
+
+    def get_by_barcode(self, text):
+        """:returns: a set with the ids of the sellables with the barcode"""
+        return set(self._barcodes.get(text.lower(), ()))
+
+    def get_by_code(self, text):
+        """:returns: a set with the ids of the sellables with the code"""
+        return set(self._codes.get(text.lower(), ()))
+
+    def get_by_batch_number(self, text):
+        """:returns: a set of (batch_id, sellable_id) with the batch number"""
+        return set(self._batch_numbers.get(text.lower(), ()))
+
+    #
+    #  Private
+    #
+
+    def _set_sellable(self, sellable_id, barcode, code):
+        barcode = (barcode or u'').lower()
+        code = (code or u'').lower()
+        if barcode:
+            self._barcodes[barcode].add(sellable_id)
+        if code:
+            self._codes[code].add(sellable_id)
+        self._sellable_keys[sellable_id] = (barcode, code)
+
+    def _remove_sellable(self, sellable_id):
+        barcode, code = self._sellable_keys.pop(sellable_id, (u'', u''))
+        self._discard(self._barcodes, barcode, sellable_id)
+        self._discard(self._codes, code, sellable_id)
+
+    def _set_batch(self, batch_id, batch_number, sellable_id):
+        batch_number = (batch_number or u'').lower()
+        if batch_number:
+            self._batch_numbers[batch_number].add((batch_id, sellable_id))
+        self._batch_keys[batch_id] = (batch_number, sellable_id)
+
+    def _remove_batch(self, batch_id):
+        batch_number, sellable_id = self._batch_keys.pop(batch_id, (u'', None))
+        self._discard(self._batch_numbers, batch_number,
+                      (batch_id, sellable_id))
+
+    def _discard(self, mapping, key, value):
+        values = mapping.get(key)
+        if values is None:
+            return
+        values.discard(value)
+        if not values:
+            del mapping[key]
+
+
+class _SellableIndexListener(threading.Thread):
+    """Keeps the sellable index up to date with the database
+
+    Triggers on sellable and storable_batch notify the ids of the rows
+    whose barcode, code or batch number changed, when their transaction
+    is committed (see patch-06-28.sql). This will fetch only those rows
+    and update them in the index.
+
+    If the connection is lost, this will keep trying to connect again.
+    The notifications sent while disconnected are lost, so the index is
+    loaded again after connecting.
+    """
+
+    channel = 'sellable_index'
+
+    #: How long to wait for notifications before checking again
+    timeout = 5
+
+    #: How long to wait before connecting again after an error
+    reconnect_interval = 10
+
+    def __init__(self, index):
+        super(_SellableIndexListener, self).__init__()
+
+        self.daemon = True
+        self._index = index
+        self._conn = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self._connect()
+                # Anything changed before LISTEN was executed was not
+                # notified to us, so we can't trust the index anymore
+                self._load()
+                self._listen()
+            except Exception:
+                log.exception("Error listening for sellable changes, "
+                              "connecting again in %d seconds",
+                              self.reconnect_interval)
+            finally:
+                self._close()
+            self._stopped.wait(self.reconnect_interval)
+
+    def stop(self):
+        """Stop listening for changes"""
+        self._stopped.set()
+
+    def _connect(self):
+        self._conn = psycopg2.connect(db_settings.get_store_dsn())
+        self._conn.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        self._conn.cursor().execute('LISTEN %s' % (self.channel, ))
+
+    def _close(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.close()
+        except psycopg2.Error:
+            pass
+        self._conn = None
+
+    def _load(self):
+        self._index.load_rows(self._fetch_sellables(),
+                              self._fetch_batches())
+        log.info("Sellable index loaded")
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            if select.select([self._conn], [], [], self.timeout) == ([], [], []):
+                continue
+
+            self._conn.poll()
+            changed = collections.defaultdict(set)
+            while self._conn.notifies:
+                table, row_id = self._conn.notifies.pop(0).payload.split(',')
+                changed[table].add(row_id)
+
+            sellable_ids = changed['sellable']
+            batch_ids = changed['storable_batch']
+            sellables = self._fetch_sellables(sellable_ids)
+            batches = self._fetch_batches(batch_ids)
+            # The rows not found were removed
+            self._index.update_rows(
+                sellables, batches,
+                removed_sellables=sellable_ids - set(r[0] for r in sellables),
+                removed_batches=batch_ids - set(r[0] for r in batches))
+
+    def _fetch_sellables(self, ids=None):
+        return self._fetch(
+            "SELECT id, barcode, code FROM sellable", ids)
+
+    def _fetch_batches(self, ids=None):
+        return self._fetch(
+            "SELECT id, batch_number, storable_id FROM storable_batch", ids)
+
+    def _fetch(self, query, ids):
+        if ids is None:
+            params = ()
+        elif not ids:
+            return []
+        else:
+            query += " WHERE id = ANY(%s::uuid[])"
+            params = (list(ids), )
+        cursor = self._conn.cursor()
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+def get_sellable_index():
+    """Returns the sellable index shared by the process
+
+    :returns: a :class:`SellableIndex`, which may not be loaded yet
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SellableIndex()
+        return _index
+
+
+def start_sellable_index():
+    """Starts loading the sellable index and keeping it up to date
+
+    The index is loaded on a thread, which then keeps listening for the
+    changes made on the database. Calling this again does nothing, the
+    index is only loaded again when that thread loses its connection,
+    since the changes made meanwhile were not seen by it.
+    """
+    global _listener
+    with _index_lock:
+        if _listener is not None:
+            return
+        _listener = _SellableIndexListener(get_sellable_index())
+    _listener.start()
+
+
+def find_sellable_and_batch(store, text, viewable=None, query=None):
+    """Finds a sellable by its barcode, code or batch number
+
+    The barcode is tried first, then the code, since there might be a
+    product with a code equal to another product's barcode. All
+    comparisons are case insensitive.
+
+    :param store: a store
+    :param text: the barcode, code or batch number
+    :param viewable: the viewable (or domain class) the sellable must be
+      in. Its id must be the sellable's id. Defaults to |sellable|
+    :param query: a query the viewable must match, if any
+    :returns: a tuple with the |sellable| and the |storablebatch| (when it
+      was found by the batch number) or ``(None, None)``
+    """
+    from stoqlib.domain.product import StorableBatch
+    from stoqlib.domain.sellable import Sellable
+
+    if viewable is None:
+        viewable = Sellable
+    index = get_sellable_index()
+    text = text.lower()
+
+    def find_one(*clauses):
+        if query is not None:
+            clauses += (query, )
+        result = store.find(viewable, And(*clauses)).one()
+        if result is None or isinstance(result, Sellable):
+            return result
+        return result.sellable
+
+    def find_batch(batch):
+        # Make sure the batch's sellable matches the query
+        if batch is None:
+            return None, None
+        sellable = find_one(viewable.id == batch.storable_id)
+        if sellable is None:
+            return None, None
+        return sellable, batch
+
+    if index.loaded:
+        for attr, ids in [(viewable.barcode, index.get_by_barcode(text)),
+                          (viewable.code, index.get_by_code(text))]:
+            if not ids:
+                continue
+            # The index could be outdated, so check the attribute too
+            sellable = find_one(In(viewable.id, list(ids)), Lower(attr) == text)
+            if sellable is not None:
+                return sellable, None
+
+        batch_ids = [batch_id for batch_id, sellable_id
+                     in index.get_by_batch_number(text)]
+        if batch_ids:
+            batch = store.find(StorableBatch, And(
+                In(StorableBatch.id, batch_ids),
+                Lower(StorableBatch.batch_number) == text)).one()
+            sellable, batch = find_batch(batch)
+            if sellable is not None:
+                return sellable, batch
+
+    # Not on the index, it could have been created by another station
+    for attr in [viewable.barcode, viewable.code]:
+        sellable = find_one(Lower(attr) == text)
+        if sellable is not None:
+            return sellable, None
+
+    batch = store.find(StorableBatch,
+                       Lower(StorableBatch.batch_number) == text).one()
+    return find_batch(batch)
@@ -26,6 +26,7 @@ import datetime
 from decimal import Decimal
 
 from stoqlib.lib import latscii
+from stoqlib.lib.fixedwidth import FixedWidthField, FixedWidthLayout
 latscii.register_codec()
 
 _number_type = (int, Decimal)
@@ -38,6 +39,41 @@ def argtype_name(argtype):
         return argtype.__name__
 
 
+def _get_formatter(argtype):
+    # Returns the formatter of the fields of the given argtype, to be
+    # compiled in a FixedWidthLayout
+    def get_formatter(length):
+        blank = b' ' * length
+        if argtype == _number_type:
+            # If a value is higher the the maximum allowed,
+            # set it to the maximum allowed value instead.
+            max_value = (10 ** length) - 1
+
+            def format_value(value):
+                if value is None:
+                    return blank
+                if value > max_value:
+                    value = max_value
+                return b'%0*d' % (length, value)
+        elif argtype == bytes:
+            def format_value(value):
+                if value is None:
+                    return blank
+                # Chop strings which are too long
+                return (b'%-*s' % (length, value))[:length]
+        elif argtype == str:
+            def format_value(value):
+                if value is None:
+                    return blank
+                # Convert to latscii and chop strings which are too long
+                value = value.encode('ascii', 'replacelatscii')
+                return (b'%-*s' % (length, value))[:length]
+        else:
+            raise AssertionError
+        return format_value
+    return get_formatter
+
+
 class SintegraError(Exception):
     pass
 
@@ -314,8 +350,7 @@ class SintegraRegister(object):
             if key in sent_args:
                 raise SintegraError("%s specified two times" % (key, ))
 
-        total = 0
-        self._values = {}
+        layout = self._get_layout()
         for (name, length, argtype), arg in zip(self.sintegra_fields, args):
             if arg is None:
                 pass
@@ -323,18 +358,9 @@ class SintegraRegister(object):
                 fmt = "argument %s should be of type %s but got %s"
                 raise TypeError(fmt % (name, argtype_name(argtype),
                                        type(arg).__name__))
-            self._values[name] = self._arg_to_string(arg, length, argtype)
             setattr(self, name, arg)
-            total += length
-
-        if total > 124:
-            raise TypeError(
-                "There are items with a total length of %d in %s, "
-                "but only 124 is allowed" % (total, self.__class__.__name__))
-        elif total < 124:
-            self.padding = 124 - total
-        else:
-            self.padding = 0
+        self._args = args
+        self.padding = layout.size - sum(field.width for field in layout.fields)
 
     #
     # Public API
@@ -345,46 +371,29 @@ class SintegraRegister(object):
         Gets a string for all sintegra fields.
         :returns: sintegra fields as string.
         """
-        values = []
-        for (name, _, _) in self.sintegra_fields:
-            values.append(self._values[name])
-        if self.padding:
-            values.append(b' ' * self.padding)
-        return b'%02d%s\r\n' % (self.sintegra_number,
-                                b''.join(values))
+        return self._get_layout().format(self._args)
 
     # Private
 
-    def _arg_to_string(self, value, length, argtype):
-        if value is None:
-            return b' ' * length
-
-        if argtype == _number_type:
-            # If a value is higher the the maximum allowed,
-            # set it to the maximum allowed value instead.
-            max_value = (10 ** length) - 1
-            if value > max_value:
-                value = max_value
-            arg = b'%0*d' % (length, value)
-        elif argtype == bytes:
-            arg = b'%-*s' % (length, value)
-            # Chop strings which are too long
-            if len(arg) > length:
-                arg = arg[:length]
-        elif argtype == str:
-            # Convert to latscii
-            value = value.encode('ascii', 'replacelatscii')
-
-            arg = b'%-*s' % (length, value)
-            # Chop strings which are too long
-            if len(arg) > length:
-                arg = arg[:length]
-        else:
-            raise AssertionError
-
-        assert len(arg) <= length, (repr(arg), length)
-
-        return arg
+    @classmethod
+    def _get_layout(cls):
+        layout = cls.__dict__.get('_layout')
+        if layout is not None:
+            return layout
+
+        try:
+            layout = FixedWidthLayout(
+                [FixedWidthField(name, length, _get_formatter(argtype))
+                 for (name, length, argtype) in cls.sintegra_fields],
+                size=124, prefix=b'%02d' % (cls.sintegra_number, ),
+                terminator=b'\r\n', fill=b' ')
+        except ValueError:
+            total = sum(length for (name, length, argtype) in cls.sintegra_fields)
+            raise TypeError(
+                "There are items with a total length of %d in %s, "
+                "but only 124 is allowed" % (total, cls.__name__))
+        cls._layout = layout
+        return layout
 
 
 class SintegraRegister10(SintegraRegister):
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source
+##
+## This program is free software; you can redistribute it and/or
+## modify it under the terms of the GNU Lesser General Public License
+## as published by the Free Software Foundation; either version 2
+## of the License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+"""The summary of the stock of the storables
+
+The stock of a storable is kept by :class:`ProductStockItem
+<stoqlib.domain.product.ProductStockItem>`, one for each branch and batch.
+Summing them every time the stock of the products is listed is slow, so
+the database keeps two summaries of them, updated by triggers when the
+stock items change:
+
+* :data:`BRANCH_SUMMARY_TABLE`, with the stock of every storable on every
+  branch, even the ones that never had stock there.
+* :data:`SUMMARY_TABLE`, with the stock of every storable on all branches.
+
+Both have the ``stock`` and the ``total_stock_cost`` (the sum of the
+quantity times the stock cost of the stock items) columns.
+
+:data:`STOCK_SUMMARY` checks the summaries against the stock items and
+rebuilds them.
+"""
+
+import collections
+
+from stoqlib.database.derivedtable import DerivedTable
+
+#: The table with the stock of each storable on each branch
+BRANCH_SUMMARY_TABLE = u'product_stock_branch_summary'
+
+#: The table with the stock of each storable on all branches
+SUMMARY_TABLE = u'product_stock_summary'
+
+#: A row of a summary that is not equal to the stock items. *branch_id* is
+#: ``None`` for the rows of :data:`SUMMARY_TABLE`. The expected values are
+#: the ones computed from the stock items and the others the ones in the
+#: summary (``None`` when the row is missing)
+StockSummaryDivergence = collections.namedtuple(
+    'StockSummaryDivergence',
+    ['table', 'storable_id', 'branch_id', 'expected_stock', 'stock',
+     'expected_total_stock_cost', 'total_stock_cost'])
+
+_CHECK_BRANCH_SUMMARY = u"""
+    SELECT COALESCE(expected.storable_id, summary.storable_id),
+           COALESCE(expected.branch_id, summary.branch_id),
+           expected.stock, summary.stock,
+           expected.total_stock_cost, summary.total_stock_cost
+    FROM (
+        SELECT storable.id AS storable_id, branch.id AS branch_id,
+               COALESCE(SUM(product_stock_item.quantity), 0) AS stock,
+               COALESCE(SUM(product_stock_item.quantity *
+                            COALESCE(product_stock_item.stock_cost, 0)),
+                        0) AS total_stock_cost
+        FROM storable
+        CROSS JOIN branch
+        LEFT JOIN product_stock_item
+            ON product_stock_item.storable_id = storable.id AND
+               product_stock_item.branch_id = branch.id
+        GROUP BY storable.id, branch.id) AS expected
+    FULL OUTER JOIN product_stock_branch_summary AS summary
+        ON summary.storable_id = expected.storable_id AND
+           summary.branch_id = expected.branch_id
+    WHERE expected.stock IS DISTINCT FROM summary.stock OR
+          expected.total_stock_cost IS DISTINCT FROM summary.total_stock_cost
+"""
+
+_CHECK_SUMMARY = u"""
+    SELECT COALESCE(expected.storable_id, summary.storable_id), NULL,
+           expected.stock, summary.stock,
+           expected.total_stock_cost, summary.total_stock_cost
+    FROM (
+        SELECT storable.id AS storable_id,
+               COALESCE(SUM(product_stock_item.quantity), 0) AS stock,
+               COALESCE(SUM(product_stock_item.quantity *
+                            COALESCE(product_stock_item.stock_cost, 0)),
+                        0) AS total_stock_cost
+        FROM storable
+        LEFT JOIN product_stock_item
+            ON product_stock_item.storable_id = storable.id
+        GROUP BY storable.id) AS expected
+    FULL OUTER JOIN product_stock_summary AS summary
+        ON summary.storable_id = expected.storable_id
+    WHERE expected.stock IS DISTINCT FROM summary.stock OR
+          expected.total_stock_cost IS DISTINCT FROM summary.total_stock_cost
+"""
+
+
+#: The summaries of the stock items, see
+#: :class:`stoqlib.database.derivedtable.DerivedTable`
+STOCK_SUMMARY = DerivedTable(
+    u'stock summary', StockSummaryDivergence,
+    keys=['storable_id', 'branch_id'],
+    columns=['stock', 'total_stock_cost'],
+    checks=[(BRANCH_SUMMARY_TABLE, _CHECK_BRANCH_SUMMARY),
+            (SUMMARY_TABLE, _CHECK_SUMMARY)],
+    rebuild_function=u'rebuild_stock_summary')
@@ -23,10 +23,83 @@
 ##
 """ Templating """
 
+import hashlib
+import logging
+import os
+import threading
+
 from kiwi.environ import environ
+from mako.exceptions import MakoException
 from mako.lookup import TemplateLookup
 from mako.template import Template
 
+import stoq
+from stoqlib.lib.osutils import get_application_dir
+
+log = logging.getLogger(__name__)
+
+_lookup = None
+_lookup_lock = threading.Lock()
+
+
+def _get_module_directory(directory):
+    # Different installations (e.g. a checkout and a package) share the
+    # same application directory, so the compiled modules of each one
+    # are kept apart. Upgrades may install templates older than the
+    # compiled modules, so each version gets its own directory too.
+    key = hashlib.md5(
+        (directory + stoq.version).encode()).hexdigest()[:8]
+    return os.path.join(get_application_dir(), 'templates', key)
+
+
+def get_template_lookup():
+    """Returns the template lookup used by :func:`render_template`
+
+    The lookup is created only once per process. The compiled templates
+    are kept in memory and also saved as python modules in the application
+    directory, so they are not compiled again on the next run. Mako
+    compares the modification time of the template with the one of the
+    module and compiles it again if it was changed.
+
+    :returns: a :class:`mako.lookup.TemplateLookup`
+    """
+    global _lookup
+    with _lookup_lock:
+        if _lookup is None:
+            directory = environ.get_resource_filename('stoq', 'template')
+            _lookup = TemplateLookup(
+                directories=[directory],
+                module_directory=_get_module_directory(directory),
+                output_encoding='utf8', input_encoding='utf8',
+                default_filters=['h'])
+        return _lookup
+
+
+def precompile_templates():
+    """Compiles all the templates, saving them on the module directory
+
+    This is meant to be called at startup or install time, so the
+    first report rendered does not have to wait for its templates
+    to be compiled.
+
+    :returns: the number of templates compiled
+    """
+    lookup = get_template_lookup()
+    n_templates = 0
+    for directory in lookup.directories:
+        for root, dirs, files in os.walk(directory):
+            for filename in files:
+                if not filename.endswith(('.html', '.css')):
+                    continue
+                uri = os.path.relpath(os.path.join(root, filename), directory)
+                try:
+                    lookup.get_template(uri.replace(os.sep, '/'))
+                except MakoException as e:
+                    log.warning('Could not compile template %s: %s' % (uri, e))
+                    continue
+                n_templates += 1
+    return n_templates
+
 
 def render_template(filename, **ns):
     """Renders a template giving a filename and a keyword dictionary
@@ -34,11 +107,7 @@ def render_template(filename, **ns):
     @kwargs: keyword arguments to send to the template
     @return: the rendered template
     """
-    directories = environ.get_resource_filename('stoq', 'template')
-    lookup = TemplateLookup(directories=directories,
-                            output_encoding='utf8', input_encoding='utf8',
-                            default_filters=['h'])
-    tmpl = lookup.get_template(filename)
+    tmpl = get_template_lookup().get_template(filename)
 
     return tmpl.render(**ns).decode()
 
@@ -24,6 +24,7 @@
 
 import datetime
 from decimal import Decimal
+import io
 import mock
 import os
 
@@ -260,6 +261,15 @@ class TestCnab(DomainTest):
         cnab.add_record(FooRecord, foo=3)
         self.assertEqual(cnab.as_string(), '00003\r\n')
 
+    def test_write(self):
+        cnab = FebrabanCnab(self.branch, self.bank, self.info)
+        cnab.add_record(FooRecord, foo=3)
+        cnab.add_record(FooRecord, foo=4)
+        fp = io.StringIO()
+        cnab.write(fp)
+        self.assertEqual(fp.getvalue(), '00003\r\n00004\r\n')
+        self.assertEqual(fp.getvalue(), cnab.as_string())
+
 
 class CnabTestMixin(object):
     cnab_class = BBCnab
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+from decimal import Decimal
+from io import StringIO
+import os
+import shutil
+import tempfile
+
+import mock
+
+from stoqlib.domain.person import Client, Person
+from stoqlib.domain.product import Product, Storable
+from stoqlib.domain.sellable import Sellable, SellableCategory
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.importers.clientimporter import ClientImporter
+from stoqlib.importers.copyimporter import CopyBatch
+from stoqlib.importers.importer import ImportCheckpoint
+from stoqlib.importers.importerrunner import ImporterRunner, ImportResult
+from stoqlib.importers.productimporter import ProductImporter
+
+
+PRODUCT_DATA = u"""\
+% base_category, barcode, category, description, price,
+% cost, commission, commission2, markup, markup2, ncm [, unit]
+Copy Shirts,1234567890123,Copy Polo,Copy Polo Shirt,50,20,15,28,36,15,61046300
+Copy Shirts,1234567890124,Copy Polo,Copy Polo Shirt XL,60,25,15,28,36,15,61046300
+Copy Shoes,1234567890125,Copy Sandals,Copy Sandal,30,10,5,10,20,10,64029990
+"""
+
+CLIENT_DATA = u"""\
+% name, phone_number, mobile_number, email, rg, cpf,
+% city, country, state, street, streetnumber, district,
+Copy Client 1,1234-5678,9876-5432,c1@stoq.com.br,1.234.567,111.111.111-11,\
+Curitiba,Brazil,PR,Rua XV de Novembro,342,Centro
+Copy Client 2,1234-5679,,c2@stoq.com.br,,222.222.222-22,\
+Curitiba,Brazil,PR,Rua XV de Novembro,,Centro
+"""
+
+
+class CopyImporterTest(DomainTest):
+
+    def test_import_products(self):
+        importer = ProductImporter()
+        # Force more than one flush
+        importer.batch_size = 2
+        importer.feed(StringIO(PRODUCT_DATA))
+        importer.set_dry(True)
+        importer.process(self.store)
+
+        sellables = list(self.store.find(
+            Sellable, Sellable.description.startswith(u'Copy ')).order_by(
+                Sellable.te_id))
+        self.assertEqual([s.description for s in sellables],
+                         [u'Copy Polo Shirt', u'Copy Polo Shirt XL',
+                          u'Copy Sandal'])
+        self.assertEqual(sellables[0].barcode, u'1234567890123')
+        self.assertEqual(sellables[0].base_price, 50)
+        self.assertEqual(sellables[0].price, 50)
+        self.assertEqual(sellables[0].cost, 20)
+        self.assertEqual(sellables[0].commission, 15)
+        self.assertEqual(sellables[0].status, Sellable.STATUS_AVAILABLE)
+        self.assertIsNotNone(sellables[0].te_id)
+
+        # The categories are created only once
+        self.assertEqual(self.store.find(
+            SellableCategory, description=u'Copy Polo').count(), 1)
+        self.assertEqual(sellables[0].category, sellables[1].category)
+        self.assertEqual(sellables[0].category.category.description,
+                         u'Copy Shirts')
+
+        for sellable in sellables:
+            product = self.store.get(Product, sellable.id)
+            self.assertEqual(product.sellable, sellable)
+            self.assertIsNotNone(self.store.get(Storable, sellable.id))
+            self.assertEqual(product.suppliers.count(), 1)
+            self.assertEqual(product.get_main_supplier_info().base_cost,
+                             sellable.cost)
+            self.assertIsNotNone(product.get_icms_template(self.current_branch))
+        self.assertEqual(product.ncm, u'64029990')
+
+    def test_import_clients(self):
+        importer = ClientImporter()
+        importer.feed(StringIO(CLIENT_DATA))
+        importer.set_dry(True)
+        importer.process(self.store)
+
+        person = self.store.find(Person, name=u'Copy Client 1').one()
+        self.assertEqual(person.phone_number, u'1234-5678')
+        self.assertEqual(person.individual.cpf, u'111.111.111-11')
+        self.assertEqual(person.address.street, u'Rua XV de Novembro')
+        self.assertEqual(person.address.streetnumber, 342)
+        self.assertEqual(person.client.status, Client.STATUS_SOLVENT)
+
+        person = self.store.find(Person, name=u'Copy Client 2').one()
+        self.assertEqual(person.mobile_number, u'')
+        self.assertIsNone(person.address.streetnumber)
+        self.assertEqual(person.address.city_location,
+                         self.store.find(Person, name=u'Copy Client 1').one(
+                         ).address.city_location)
+
+    def test_import_products_resume(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'products.csv.checkpoint')
+        # The 2 comment lines and the first product were already imported
+        ImportCheckpoint(path, 'products.csv').save(3, 1)
+
+        importer = ProductImporter()
+        importer.batch_size = 1
+        importer.feed(StringIO(PRODUCT_DATA))
+        checkpoint = ImportCheckpoint.load(path, 'products.csv')
+        self.assertEqual(checkpoint.offset, 3)
+        with mock.patch.object(self.store, 'commit') as commit:
+            with mock.patch('stoqlib.importers.copyimporter.new_store'):
+                self.assertEqual(
+                    importer.process(self.store, checkpoint=checkpoint), 2)
+
+        # One commit for each row, plus the final one
+        self.assertEqual(commit.call_count, 3)
+        self.assertFalse(os.path.exists(path))
+        sellables = self.store.find(
+            Sellable, Sellable.description.startswith(u'Copy ')).order_by(
+                Sellable.te_id)
+        self.assertEqual([(s.description, s.code) for s in sellables],
+                         [(u'Copy Polo Shirt XL', u'02'),
+                          (u'Copy Sandal', u'03')])
+
+    def test_import_products_key_offset(self):
+        importer = ProductImporter()
+        importer.set_key_offset(10)
+        importer.feed(StringIO(PRODUCT_DATA))
+        importer.set_dry(True)
+        importer.process(self.store)
+
+        sellables = self.store.find(
+            Sellable, Sellable.description.startswith(u'Copy ')).order_by(
+                Sellable.te_id)
+        self.assertEqual([s.code for s in sellables], [u'11', u'12', u'13'])
+
+    def test_runner_key_offsets(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filenames = []
+        for name, n_lines in [('a.csv', 5), ('b.csv', 3), ('c.csv', 1)]:
+            filenames.append(os.path.join(tmpdir, name))
+            with open(filenames[-1], 'w') as fp:
+                fp.write(u'line\n' * n_lines)
+
+        runner = ImporterRunner('product.csv', filenames, workers=1)
+        with mock.patch('stoqlib.importers.importerrunner._import_file') as import_file:
+            import_file.side_effect = lambda task: ImportResult(
+                filename=task[1], worker=0, imported_items=0, elapsed=0)
+            runner.run()
+
+        # Each file gets a range of keys after the lines of the previous ones
+        self.assertEqual([call[0][0][1:3] for call in import_file.call_args_list],
+                         [(filenames[0], 0), (filenames[1], 5),
+                          (filenames[2], 8)])
+
+    def test_checkpoint(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'checkpoint')
+
+        checkpoint = ImportCheckpoint.load(path, 'clients.csv')
+        self.assertEqual(checkpoint.offset, 0)
+        self.assertIsNone(checkpoint.last_key)
+
+        checkpoint.save(100, u'foo')
+        checkpoint = ImportCheckpoint.load(path, 'clients.csv')
+        self.assertEqual(checkpoint.offset, 100)
+        self.assertEqual(checkpoint.last_key, u'foo')
+
+        with self.assertRaisesRegex(ValueError, 'is for clients.csv'):
+            ImportCheckpoint.load(path, 'products.csv')
+
+        checkpoint.remove()
+        self.assertFalse(os.path.exists(path))
+
+    def test_batch_invalid_column(self):
+        # price is a property, the column is base_price
+        with self.assertRaisesRegex(ValueError,
+                                    'Invalid columns for sellable: price'):
+            CopyBatch(Sellable, ['description', 'price'])
+
+        batch = CopyBatch(Sellable, ['description'])
+        with self.assertRaisesRegex(ValueError, 'Invalid columns for sellable'):
+            batch.add(description=u'Foo', price=Decimal(10))
+        self.assertEqual(len(batch), 0)
+        batch.add(description=u'Foo')
+        self.assertEqual(len(batch), 1)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+import datetime
+
+from stoqlib.domain.payment.method import PaymentMethod
+from stoqlib.domain.payment.payment import Payment
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.lib.creditledger import (CREDIT_LEDGER, LEDGER_TABLE,
+                                      get_credit_ledger)
+from stoqlib.lib.dateutils import localtoday
+
+
+class TestCreditLedger(DomainTest):
+
+    def _create_payment(self, client, method_name, payment_type, value,
+                        due_date=None):
+        method = PaymentMethod.get_by_name(self.store, method_name)
+        payment = self.create_payment(
+            payment_type=payment_type, value=value, method=method,
+            date=due_date,
+            group=self.create_payment_group(payer=client.person))
+        payment.set_pending()
+        return payment
+
+    def test_ledger(self):
+        client = self.create_client()
+        self.assertEqual(get_credit_ledger(self.store, client.person),
+                         (0, 0, None))
+
+        today = localtoday()
+        store_credit = self._create_payment(
+            client, u'store_credit', Payment.TYPE_IN, 100,
+            due_date=today - datetime.timedelta(days=10))
+        self._create_payment(client, u'store_credit', Payment.TYPE_IN, 30,
+                             due_date=today)
+        self.assertEqual(get_credit_ledger(self.store, client.person),
+                         (130, 0, today - datetime.timedelta(days=10)))
+
+        # Paying the store credit frees it, and the oldest pending payment
+        # is now the other one
+        store_credit.pay()
+        self.assertEqual(get_credit_ledger(self.store, client.person),
+                         (30, 0, today))
+
+        credit = self._create_payment(client, u'credit', Payment.TYPE_OUT, 50)
+        credit.pay()
+        self._create_payment(client, u'credit', Payment.TYPE_IN, 20).pay()
+        self.assertEqual(get_credit_ledger(self.store, client.person),
+                         (30, 30, today))
+        self.assertEqual(client.credit_account_balance, 30)
+
+        # Changing the payer moves the payments to its ledger
+        other_client = self.create_client()
+        credit.group.payer = other_client.person
+        self.assertEqual(get_credit_ledger(self.store, client.person),
+                         (30, -20, today))
+        self.assertEqual(get_credit_ledger(self.store, other_client.person),
+                         (0, 50, None))
+
+        credit.status = Payment.STATUS_CANCELLED
+        self.assertEqual(get_credit_ledger(self.store, other_client.person),
+                         (0, 0, None))
+
+        self.assertEqual(CREDIT_LEDGER.check(self.store), [])
+
+    def test_check_and_rebuild(self):
+        client = self.create_client()
+        self._create_payment(client, u'store_credit', Payment.TYPE_IN, 100)
+        self.assertEqual(CREDIT_LEDGER.check(self.store), [])
+
+        self.store.execute(
+            u"UPDATE %s SET store_credit_debit = 7 WHERE person_id = ?" % (
+                LEDGER_TABLE, ), (client.person.id, ))
+        divergences = CREDIT_LEDGER.check(self.store)
+        self.assertEqual(
+            [(d.table, d.person_id, d.expected_store_credit_debit,
+              d.store_credit_debit) for d in divergences],
+            [(LEDGER_TABLE, client.person.id, 100, 7)])
+
+        CREDIT_LEDGER.rebuild(self.store)
+        self.assertEqual(CREDIT_LEDGER.check(self.store), [])
+        self.assertEqual(
+            get_credit_ledger(self.store, client.person).store_credit_debit,
+            100)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+__tests__ = 'stoqlib.lib.fixedwidth'
+
+import io
+import unittest
+
+from stoqlib.lib.fixedwidth import FixedWidthField, FixedWidthLayout
+
+
+def _number(width):
+    return lambda value: '%0*d' % (width, value)
+
+
+def _text(width):
+    return lambda value: value.ljust(width)[:width]
+
+
+class TestFixedWidthLayout(unittest.TestCase):
+    def test_format(self):
+        layout = FixedWidthLayout([FixedWidthField('code', 3, _number),
+                                   FixedWidthField('name', 4, _text)])
+        self.assertEqual(layout.size, 7)
+        self.assertEqual(layout.format([1, 'ab']), '001ab  ')
+        self.assertEqual(layout.format([12, 'abcdef']), '012abcd')
+
+    def test_format_padding(self):
+        layout = FixedWidthLayout([FixedWidthField('code', 3, _number)],
+                                  size=6, prefix='E01', terminator='\r\n')
+        self.assertEqual(layout.format([7]), 'E01007   \r\n')
+
+    def test_format_bytes(self):
+        layout = FixedWidthLayout(
+            [FixedWidthField('code', 2, lambda width: lambda v: b'%0*d' % (width, v))],
+            size=4, prefix=b'10', terminator=b'\r\n', fill=b' ')
+        self.assertEqual(layout.format([5]), b'1005  \r\n')
+
+    def test_formatter_compiled_once(self):
+        widths = []
+
+        def formatter(width):
+            widths.append(width)
+            return _number(width)
+
+        layout = FixedWidthLayout([FixedWidthField('a', 2, formatter),
+                                   FixedWidthField('b', 3, formatter)])
+        layout.format([1, 2])
+        layout.format([3, 4])
+        self.assertEqual(widths, [2, 3])
+
+    def test_too_wide(self):
+        with self.assertRaisesRegex(ValueError, 'total width of 7, but only 6'):
+            FixedWidthLayout([FixedWidthField('code', 3, _number),
+                              FixedWidthField('name', 4, _text)], size=6)
+
+    def test_wrong_width(self):
+        layout = FixedWidthLayout([FixedWidthField('code', 3, _number),
+                                   FixedWidthField('name', 4, _text)])
+        with self.assertRaisesRegex(ValueError,
+                                    "Field code should have 3 characters, "
+                                    "but got '1234'"):
+            layout.format([1234, 'ab'])
+        with self.assertRaisesRegex(ValueError, 'Expected values for 2 fields'):
+            layout.format([1])
+
+    def test_write(self):
+        layout = FixedWidthLayout([FixedWidthField('code', 3, _number)],
+                                  terminator='\r\n')
+        fp = io.StringIO()
+        layout.write(fp, [[1], [2]])
+        self.assertEqual(fp.getvalue(), '001\r\n002\r\n')
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+from io import StringIO
+
+import mock
+
+from stoqlib.domain.account import AccountTransaction
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.importers.gnucashimporter import GnuCashXMLImporter
+
+
+GNUCASH_DATA = u"""\
+<gnc-v2
+     xmlns:gnc="http://www.gnucash.org/XML/gnc"
+     xmlns:act="http://www.gnucash.org/XML/act"
+     xmlns:trn="http://www.gnucash.org/XML/trn"
+     xmlns:ts="http://www.gnucash.org/XML/ts"
+     xmlns:split="http://www.gnucash.org/XML/split">
+<gnc:book version="2.0.0">
+<gnc:account version="2.0.0">
+  <act:name>Root Account</act:name>
+  <act:id type="guid">root</act:id>
+  <act:type>ROOT</act:type>
+</gnc:account>
+<gnc:account version="2.0.0">
+  <act:name>GnuCash Bank</act:name>
+  <act:id type="guid">bank</act:id>
+  <act:type>BANK</act:type>
+  <act:parent type="guid">root</act:parent>
+</gnc:account>
+<gnc:account version="2.0.0">
+  <act:name>GnuCash Income</act:name>
+  <act:id type="guid">income</act:id>
+  <act:type>INCOME</act:type>
+  <act:parent type="guid">root</act:parent>
+</gnc:account>
+<gnc:transaction version="2.0.0">
+  <trn:id type="guid">salary</trn:id>
+  <trn:num>42</trn:num>
+  <trn:date-posted>
+    <ts:date>2012-01-10 00:00:00 -0200</ts:date>
+  </trn:date-posted>
+  <trn:description>GnuCash Salary</trn:description>
+  <trn:splits>
+    <trn:split>
+      <split:value>15000/100</split:value>
+      <split:account type="guid">bank</split:account>
+    </trn:split>
+    <trn:split>
+      <split:value>-15000/100</split:value>
+      <split:account type="guid">income</split:account>
+    </trn:split>
+  </trn:splits>
+</gnc:transaction>
+</gnc:book>
+</gnc-v2>
+"""
+
+
+class GnuCashImporterTest(DomainTest):
+
+    def test_import(self):
+        importer = GnuCashXMLImporter()
+        importer.feed(StringIO(GNUCASH_DATA))
+        importer.set_items_per_commit(2)
+        with mock.patch.object(self.store, 'commit') as commit:
+            with mock.patch('stoqlib.importers.importer.new_store',
+                            return_value=self.store):
+                self.assertEqual(importer.process(self.store), 4)
+
+        # One commit for every 2 items, plus the final ones
+        self.assertEqual(commit.call_count, 4)
+        transaction = self.store.find(AccountTransaction,
+                                      description=u'GnuCash Salary').one()
+        self.assertEqual(transaction.value, 150)
+        self.assertEqual(transaction.code, u'42')
+        self.assertEqual(transaction.account.description, u'GnuCash Bank')
+        self.assertEqual(transaction.source_account.description,
+                         u'GnuCash Income')
@@ -25,7 +25,11 @@
 
 from decimal import Decimal
 
-from stoqlib.lib.parameters import sysparam
+import mock
+import psycopg2
+
+from stoqlib.database.runtime import new_store
+from stoqlib.lib.parameters import sysparam, _ParameterListener
 from stoqlib.domain.address import CityLocation
 from stoqlib.domain.person import (Branch, Client, Company, Employee,
                                    EmployeeRole, Individual, LoginUser,
@@ -222,3 +226,72 @@ class TestParameter(DomainTest):
     def test_default_label_columns(self):
         param = self.sparam.get_string('LABEL_COLUMNS')
         self.assertEqual(param, 'code,barcode,description,price')
+
+    def test_get_object_cache(self):
+        account = self.sparam.get_object(self.store, 'SALES_ACCOUNT')
+        # Even after the store is invalidated (like on a commit), the
+        # object should not be fetched again
+        self.store.invalidate()
+        with mock.patch.object(self.store, 'get') as get:
+            self.assertIs(self.sparam.get_object(self.store, 'SALES_ACCOUNT'),
+                          account)
+            self.assertEqual(get.call_count, 0)
+
+        # But it should be fetched again when the parameter changes
+        new_account = self.create_account()
+        self.sparam.set_object(self.store, 'SALES_ACCOUNT', new_account)
+        try:
+            self.assertIs(self.sparam.get_object(self.store, 'SALES_ACCOUNT'),
+                          new_account)
+        finally:
+            self.sparam.set_object(self.store, 'SALES_ACCOUNT', account)
+
+    def test_update_cached_value(self):
+        old_value = self.sparam.get_string('LABEL_COLUMNS')
+        try:
+            self.sparam.update_cached_value('LABEL_COLUMNS', u'code,price')
+            self.assertEqual(self.sparam.get_string('LABEL_COLUMNS'),
+                             u'code,price')
+
+            # The initial value will be used when the parameter is removed
+            self.sparam.update_cached_value('LABEL_COLUMNS', None,
+                                            removed=True)
+            self.assertEqual(self.sparam.get_string('LABEL_COLUMNS'),
+                             'code,barcode,description,price')
+        finally:
+            self.sparam.update_cached_value('LABEL_COLUMNS', old_value)
+
+    def test_clear_store_cache(self):
+        store = new_store()
+        try:
+            self.sparam.get_object(store, 'SALES_ACCOUNT')
+            self.assertIn(id(store), self.sparam._objects_cache)
+        finally:
+            store.rollback(close=True)
+
+        # The cached objects reference the store, so they should not be
+        # kept after it is closed
+        self.assertNotIn(id(store), self.sparam._objects_cache)
+
+    def test_listener_reconnect(self):
+        listener = _ParameterListener(self.sparam)
+        listener.reconnect_interval = 0
+
+        calls = []
+
+        def listen():
+            calls.append(listener._conn)
+            if len(calls) == 1:
+                raise psycopg2.OperationalError('server closed the connection')
+            listener.stop()
+
+        with mock.patch.object(listener, '_listen', listen):
+            with mock.patch.object(self.sparam, 'clear_cache') as clear_cache:
+                listener.run()
+
+        # It should connect again after the error, and reload everything
+        # each time it connects since notifications could have been lost
+        self.assertEqual(len(calls), 2)
+        self.assertIsNot(calls[0], calls[1])
+        self.assertEqual(clear_cache.call_count, 2)
+        self.assertIs(listener._conn, None)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+import mock
+import psycopg2
+
+from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.lib import sellableindex
+from stoqlib.lib.sellableindex import (SellableIndex, find_sellable_and_batch,
+                                       get_sellable_index,
+                                       _SellableIndexListener)
+
+
+class TestSellableIndex(DomainTest):
+
+    def setUp(self):
+        super(TestSellableIndex, self).setUp()
+        # Do not use the index shared with other tests
+        patcher = mock.patch.object(sellableindex, '_index', SellableIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.sellable = self.create_sellable(code=u'Code1')
+        self.sellable.barcode = u'7891234567895'
+        self.batch = self.create_storable_batch(
+            storable=self.create_storable(product=self.sellable.product,
+                                          is_batch=True),
+            batch_number=u'Batch1')
+        self.store.flush()
+
+    def test_load(self):
+        index = get_sellable_index()
+        self.assertFalse(index.loaded)
+        # Not loaded, the hooks don't update it
+        self.assertEqual(index.get_by_code(u'code1'), set())
+
+        index.load(self.store)
+        self.assertTrue(index.loaded)
+        self.assertEqual(index.get_by_barcode(u'7891234567895'),
+                         {self.sellable.id})
+        self.assertEqual(index.get_by_code(u'CODE1'), {self.sellable.id})
+        self.assertEqual(index.get_by_batch_number(u'batch1'),
+                         {(self.batch.id, self.sellable.id)})
+
+    def test_domain_hooks(self):
+        index = get_sellable_index()
+        index.load(self.store)
+
+        self.sellable.code = u'Code2'
+        self.batch.batch_number = u'Batch2'
+        self.store.flush()
+        self.assertEqual(index.get_by_code(u'code1'), set())
+        self.assertEqual(index.get_by_code(u'code2'), {self.sellable.id})
+        self.assertEqual(index.get_by_batch_number(u'batch1'), set())
+        self.assertEqual(index.get_by_batch_number(u'batch2'),
+                         {(self.batch.id, self.sellable.id)})
+
+        sellable = self.create_sellable(code=u'Code3')
+        self.store.flush()
+        self.assertEqual(index.get_by_code(u'code3'), {sellable.id})
+
+        batch_id = self.batch.id
+        self.store.remove(self.batch)
+        self.store.flush()
+        self.assertEqual(index.get_by_batch_number(u'batch2'), set())
+        self.assertNotIn(batch_id, index._batch_keys)
+
+    def test_update_rows(self):
+        index = get_sellable_index()
+        # Not loaded, there is nothing to update
+        index.update_rows(sellables=[(self.sellable.id, None, u'Code2')])
+        self.assertEqual(index.get_by_code(u'code2'), set())
+
+        index.load(self.store)
+        index.update_rows(sellables=[(self.sellable.id, None, u'Code2')],
+                          removed_batches=[self.batch.id])
+        self.assertEqual(index.get_by_code(u'code1'), set())
+        self.assertEqual(index.get_by_code(u'code2'), {self.sellable.id})
+        self.assertEqual(index.get_by_barcode(u'7891234567895'), set())
+        self.assertEqual(index.get_by_batch_number(u'batch1'), set())
+
+    def test_listener_notifications(self):
+        index = get_sellable_index()
+        index.load(self.store)
+        listener = _SellableIndexListener(index)
+        listener._conn = mock.Mock()
+        listener._conn.notifies = [
+            mock.Mock(payload='sellable,%s' % (self.sellable.id, )),
+            mock.Mock(payload='storable_batch,%s' % (self.batch.id, ))]
+        # Process the notifications only once
+        listener._conn.poll.side_effect = listener.stop
+
+        with mock.patch('stoqlib.lib.sellableindex.select.select',
+                        return_value=([listener._conn], [], [])):
+            with mock.patch.object(listener, '_fetch_sellables',
+                                   return_value=[(self.sellable.id, None,
+                                                  u'Code2')]):
+                # The batch was removed
+                with mock.patch.object(listener, '_fetch_batches',
+                                       return_value=[]) as fetch_batches:
+                    listener._listen()
+
+        fetch_batches.assert_called_once_with({self.batch.id})
+        self.assertEqual(index.get_by_code(u'code1'), set())
+        self.assertEqual(index.get_by_code(u'code2'), {self.sellable.id})
+        self.assertEqual(index.get_by_batch_number(u'batch1'), set())
+
+    def test_listener_fetch(self):
+        listener = _SellableIndexListener(get_sellable_index())
+        listener._connect()
+        try:
+            rows = listener._fetch_sellables()
+            ids = [row[0] for row in rows[:2]]
+            self.assertEqual(set(listener._fetch_sellables(ids)),
+                             set(rows[:2]))
+            self.assertEqual(listener._fetch_batches([]), [])
+        finally:
+            listener._close()
+
+    def test_listener_reconnect(self):
+        listener = _SellableIndexListener(get_sellable_index())
+        listener.reconnect_interval = 0
+
+        calls = []
+
+        def listen():
+            calls.append(listener._conn)
+            if len(calls) == 1:
+                raise psycopg2.OperationalError('server closed the connection')
+            listener.stop()
+
+        with mock.patch.object(listener, '_listen', listen):
+            with mock.patch.object(listener, '_load') as load:
+                listener.run()
+
+        # It should connect again after the error, and load the index
+        # each time it connects since notifications could have been lost
+        self.assertEqual(len(calls), 2)
+        self.assertIsNot(calls[0], calls[1])
+        self.assertEqual(load.call_count, 2)
+        self.assertIs(listener._conn, None)
+
+    def test_find_sellable_and_batch(self):
+        for load in [False, True]:
+            if load:
+                get_sellable_index().load(self.store)
+            self.assertEqual(
+                find_sellable_and_batch(self.store, u'7891234567895'),
+                (self.sellable, None))
+            self.assertEqual(find_sellable_and_batch(self.store, u'CODE1'),
+                             (self.sellable, None))
+            self.assertEqual(find_sellable_and_batch(self.store, u'batch1'),
+                             (self.sellable, self.batch))
+            self.assertEqual(find_sellable_and_batch(self.store, u'Unknown'),
+                             (None, None))
+
+    def test_find_sellable_and_batch_query(self):
+        get_sellable_index().load(self.store)
+        query = Sellable.status == Sellable.STATUS_AVAILABLE
+        self.sellable.status = Sellable.STATUS_CLOSED
+        self.assertEqual(
+            find_sellable_and_batch(self.store, u'code1', query=query),
+            (None, None))
+        self.assertEqual(
+            find_sellable_and_batch(self.store, u'batch1', query=query),
+            (None, None))
+
+    def test_find_sellable_and_batch_outdated(self):
+        index = get_sellable_index()
+        index.load(self.store)
+        # Simulate changes made on another station, which are not
+        # seen by the index
+        index.remove_sellable(self.sellable)
+        index._set_sellable(self.sellable.id, None, u'Other')
+        self.assertEqual(find_sellable_and_batch(self.store, u'code1'),
+                         (self.sellable, None))
+        self.assertEqual(find_sellable_and_batch(self.store, u'other'),
+                         (None, None))
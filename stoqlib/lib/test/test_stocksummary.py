@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+from decimal import Decimal
+
+from stoqlib.domain.product import StockTransactionHistory
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.domain.views import ProductFullStockView
+from stoqlib.lib.stocksummary import (BRANCH_SUMMARY_TABLE, STOCK_SUMMARY,
+                                      SUMMARY_TABLE)
+
+
+class TestStockSummary(DomainTest):
+
+    def _get_summary(self, storable, branch=None):
+        if branch is None:
+            return self.store.execute(
+                u"SELECT stock, total_stock_cost FROM %s "
+                u"WHERE storable_id = ?" % (SUMMARY_TABLE, ),
+                (storable.id, )).get_one()
+        return self.store.execute(
+            u"SELECT stock, total_stock_cost FROM %s "
+            u"WHERE storable_id = ? AND branch_id = ?" % (
+                BRANCH_SUMMARY_TABLE, ),
+            (storable.id, branch.id)).get_one()
+
+    def test_summary(self):
+        branch = self.create_branch()
+        other_branch = self.create_branch()
+        storable = self.create_storable()
+
+        # Created with the storable, for all the branches
+        self.assertEqual(self._get_summary(storable), (0, 0))
+        self.assertEqual(self._get_summary(storable, branch), (0, 0))
+        self.assertEqual(self._get_summary(storable, other_branch), (0, 0))
+
+        storable.increase_stock(10, branch,
+                                StockTransactionHistory.TYPE_INITIAL,
+                                None, self.current_user, unit_cost=2)
+        storable.increase_stock(10, branch,
+                                StockTransactionHistory.TYPE_INITIAL,
+                                None, self.current_user, unit_cost=4)
+        storable.increase_stock(5, other_branch,
+                                StockTransactionHistory.TYPE_INITIAL,
+                                None, self.current_user, unit_cost=1)
+        storable.decrease_stock(4, branch,
+                                StockTransactionHistory.TYPE_STOCK_DECREASE,
+                                None, self.current_user)
+        self.store.flush()
+
+        # The stock cost on branch is the average cost, 3
+        self.assertEqual(self._get_summary(storable, branch), (16, 48))
+        self.assertEqual(self._get_summary(storable, other_branch), (5, 5))
+        self.assertEqual(self._get_summary(storable), (21, 53))
+
+        storable.update_stock_cost(Decimal('2.5'), branch, self.current_user)
+        self.store.flush()
+        self.assertEqual(self._get_summary(storable, branch), (16, 40))
+        self.assertEqual(self._get_summary(storable), (21, 45))
+
+        view = self.store.find(ProductFullStockView, id=storable.id).one()
+        self.assertEqual(view.stock, 21)
+        self.assertEqual(view.total_stock_cost, 45)
+        view = ProductFullStockView.find_by_branch(
+            self.store, other_branch).find(id=storable.id).one()
+        self.assertEqual(view.stock, 5)
+        self.assertEqual(view.total_stock_cost, 5)
+
+        self.assertEqual(STOCK_SUMMARY.check(self.store), [])
+
+    def test_check_and_rebuild(self):
+        branch = self.create_branch()
+        storable = self.create_storable(branch=branch, stock=10,
+                                         unit_cost=10)
+        self.assertEqual(STOCK_SUMMARY.check(self.store), [])
+
+        self.store.execute(
+            u"UPDATE %s SET stock = 7 WHERE storable_id = ?" % (
+                SUMMARY_TABLE, ), (storable.id, ))
+        self.store.execute(
+            u"DELETE FROM %s WHERE storable_id = ? AND branch_id = ?" % (
+                BRANCH_SUMMARY_TABLE, ), (storable.id, branch.id))
+
+        divergences = STOCK_SUMMARY.check(self.store)
+        self.assertEqual(
+            sorted((d.table, d.expected_stock, d.stock)
+                   for d in divergences),
+            [(BRANCH_SUMMARY_TABLE, 10, None), (SUMMARY_TABLE, 10, 7)])
+
+        STOCK_SUMMARY.rebuild(self.store)
+        self.assertEqual(STOCK_SUMMARY.check(self.store), [])
+        self.assertEqual(self._get_summary(storable, branch), (10, 100))
+        self.assertEqual(self._get_summary(storable), (10, 100))
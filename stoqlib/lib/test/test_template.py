@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from stoqlib.lib import template
+
+
+class TestTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._tmpdir)
+        patcher = mock.patch('stoqlib.lib.template.get_application_dir',
+                             return_value=self._tmpdir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Do not use the lookup created by other tests
+        template._lookup = None
+        self.addCleanup(setattr, template, '_lookup', None)
+
+    def test_get_template_lookup(self):
+        lookup = template.get_template_lookup()
+        self.assertIs(template.get_template_lookup(), lookup)
+        self.assertTrue(lookup.module_directory.startswith(self._tmpdir))
+
+    def test_precompile_templates(self):
+        n_templates = template.precompile_templates()
+        self.assertTrue(n_templates > 0)
+
+        module_directory = template.get_template_lookup().module_directory
+        modules = []
+        for root, dirs, files in os.walk(module_directory):
+            modules.extend(f for f in files if f.endswith('.py'))
+        self.assertEqual(len(modules), n_templates)
+
+        # A new lookup uses the modules compiled by the previous one
+        template._lookup = None
+        with mock.patch('mako.template._compile_module_file') as compile_:
+            template.get_template_lookup().get_template('objectlist.html')
+        self.assertEqual(compile_.call_count, 0)
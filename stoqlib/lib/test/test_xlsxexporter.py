@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2012 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+
+import datetime
+import os
+import zipfile
+
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.exporters.csvexporter import CSVExporter
+from stoqlib.exporters.xlsxexporter import XLSXExporter
+
+from kiwi.ui.objectlist import ObjectList, Column
+
+
+class Fruit:
+    def __init__(self, name, price, date=None):
+        self.name = name
+        self.price = price
+        self.date = date
+
+
+def _get_fruits():
+    fruits = ObjectList([Column('name', data_type=str),
+                         Column('price', data_type=int),
+                         Column('date', data_type=datetime.date)])
+
+    for name, price in [('Apple', 4),
+                        ('Pineapple', 2),
+                        ('Kiwi', 8),
+                        ('Banana & Co', 3),
+                        ('Melon', 5)]:
+        fruits.append(Fruit(name, price, datetime.date(2012, 1, 1)))
+    return fruits
+
+
+class XLSXExporterTest(DomainTest):
+    def _save(self, exporter):
+        temp_file = exporter.save()
+        self.addCleanup(os.unlink, temp_file.name)
+        self.addCleanup(temp_file.close)
+        return temp_file
+
+    def test_export_from_object_list(self):
+        progress = []
+        exporter = XLSXExporter(u'Fruits')
+        exporter.progress_interval = 2
+        exporter.set_progress_callback(
+            lambda n_rows, total: progress.append((n_rows, total)))
+        exporter.add_from_object_list(_get_fruits(),
+                                      filter_description=u'All fruits')
+        temp_file = self._save(exporter)
+        self.assertTrue(temp_file.name.endswith('.xlsx'))
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+
+        with zipfile.ZipFile(temp_file) as zf:
+            self.assertEqual(
+                sorted(zf.namelist()),
+                ['[Content_Types].xml', '_rels/.rels', 'xl/_rels/workbook.xml.rels',
+                 'xl/styles.xml', 'xl/workbook.xml', 'xl/worksheets/sheet1.xml'])
+            self.assertIn(b'name="Fruits"', zf.read('xl/workbook.xml'))
+            sheet = zf.read('xl/worksheets/sheet1.xml').decode()
+
+        self.assertIn(u'All fruits', sheet)
+        self.assertIn(u'HYPERLINK(', sheet)
+        self.assertIn(u'<t xml:space="preserve">Banana &amp; Co</t>', sheet)
+        # The price is a number and the date a serial date
+        self.assertIn(u'<c r="B3" s="3"><v>4</v></c>', sheet)
+        self.assertIn(u'<c r="C3" s="2"><v>40909.0</v></c>', sheet)
+        self.assertIn(u'<mergeCell ref="A1:C1"/>', sheet)
+
+    def test_export_split_sheets(self):
+        exporter = XLSXExporter(u'Fruits', max_rows=3)
+        exporter.add_from_object_list(_get_fruits())
+        temp_file = self._save(exporter)
+
+        with zipfile.ZipFile(temp_file) as zf:
+            workbook = zf.read('xl/workbook.xml').decode()
+            sheets = [zf.read('xl/worksheets/sheet%d.xml' % i).decode()
+                      for i in range(1, 4)]
+
+        self.assertIn(u'name="Fruits"', workbook)
+        self.assertIn(u'name="Fruits (2)"', workbook)
+        self.assertIn(u'name="Fruits (3)"', workbook)
+        # The first sheet has the description, the headers and 1 row.
+        # The other ones repeat the headers, followed by 2 rows
+        for sheet in sheets:
+            self.assertEqual(sheet.count(u'<row '), 3)
+        for sheet in sheets[1:]:
+            self.assertIn(u'<c r="A1" s="1" t="inlineStr"><is>'
+                          u'<t xml:space="preserve">Name</t></is></c>', sheet)
+
+    def test_cancel(self):
+        exporter = XLSXExporter()
+        exporter.progress_interval = 1
+        exporter.set_progress_callback(
+            lambda n_rows, total: exporter.cancel())
+        exporter.add_from_object_list(_get_fruits())
+        temp_file = self._save(exporter)
+
+        with zipfile.ZipFile(temp_file) as zf:
+            sheet = zf.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn(u'Apple', sheet)
+        self.assertNotIn(u'Kiwi', sheet)
+
+
+class CSVExporterTest(DomainTest):
+    def test_export_from_object_list(self):
+        exporter = CSVExporter()
+        exporter.add_from_object_list(_get_fruits(),
+                                      filter_description=u'All fruits')
+        temp_file = exporter.save(u'fruits')
+        try:
+            self.assertTrue(temp_file.name.endswith('.csv'))
+            self.assertEqual(temp_file.read().decode().splitlines(),
+                             [u'Name,Price,Date',
+                              u'Apple,4,2012-01-01',
+                              u'Pineapple,2,2012-01-01',
+                              u'Kiwi,8,2012-01-01',
+                              u'Banana & Co,3,2012-01-01',
+                              u'Melon,5,2012-01-01'])
+        finally:
+            temp_file.close()
+            os.unlink(temp_file.name)
@@ -22,15 +22,24 @@
 ## Author(s): Stoq Team <stoq-devel@async.com.br>
 ##
 
+import calendar
+import collections
+import concurrent.futures
 import datetime
 import json
+import threading
+import time
 
 from stoqlib.api import api
+from stoqlib.domain.events import DomainCommittedEvent
+from stoqlib.domain.payment.group import PaymentGroup
+from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.payment.views import InPaymentView, OutPaymentView
-from stoqlib.domain.person import ClientCallsView
-from stoqlib.domain.purchase import PurchaseOrderView
+from stoqlib.domain.person import (Calls, Client, ClientCallsView, Individual,
+                                   Person)
+from stoqlib.domain.purchase import PurchaseOrder, PurchaseOrderView
 from stoqlib.domain.views import ClientWithSalesView
-from stoqlib.domain.workorder import WorkOrderView
+from stoqlib.domain.workorder import WorkOrder, WorkOrderView
 from stoqlib.lib.translation import stoqlib_gettext, stoqlib_ngettext
 
 _ = stoqlib_gettext
@@ -49,32 +58,120 @@ def _color_to_rgb(c, alpha):
 
 
 class CalendarEvents(object):
+    """The events shown on the calendar
+
+    The responses are cached by the requested range and filters. The cache
+    is cleared when objects that can change the events are committed and,
+    since the events can also be changed by other stations, the responses
+    expire after :attr:`.cache_timeout` seconds.
+    """
+
+    #: The domain classes that, when changed, clear the cache
+    watched_classes = frozenset([Calls, Client, Individual, Payment,
+                                 PaymentGroup, Person, PurchaseOrder,
+                                 WorkOrder])
+
+    #: How many seconds a response is kept on the cache
+    cache_timeout = 60
+
+    #: How many responses are kept on the cache
+    cache_size = 32
+
+    def __init__(self):
+        # The events sent by the calendar and the methods collecting them.
+        # Each one runs on its own thread, using its own store.
+        self._collectors = collections.OrderedDict([
+            ('in_payments', self._collect_inpayments),
+            ('out_payments', self._collect_outpayments),
+            ('purchase_orders', self._collect_purchase_orders),
+            ('client_calls', self._collect_client_calls),
+            ('client_birthdays', self._collect_client_birthdays),
+            ('work_orders', self._collect_work_orders),
+        ])
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(self._collectors))
+        self._cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+        DomainCommittedEvent.connect(self._on_DomainCommittedEvent)
+
+        # The current branch does not change while stoq is running, so
+        # there is no need to get it again on each request
+        store = api.new_store()
+        try:
+            branch = api.get_current_branch(store)
+            self._branch_id = branch and branch.id
+        finally:
+            store.close()
 
     def render_GET(self, resource):
         start = datetime.date.fromtimestamp(float(resource.args['start'][0]))
         end = datetime.date.fromtimestamp(float(resource.args['end'][0]))
-
-        store = api.new_store()
-        day_events = {}
-        if resource.args.get('in_payments', [''])[0] == 'true':
-            self._collect_inpayments(start, end, day_events, store)
-        if resource.args.get('out_payments', [''])[0] == 'true':
-            self._collect_outpayments(start, end, day_events, store)
-        if resource.args.get('purchase_orders', [''])[0] == 'true':
-            self._collect_purchase_orders(start, end, day_events, store)
-        if resource.args.get('client_calls', [''])[0] == 'true':
-            self._collect_client_calls(start, end, day_events, store)
-        if resource.args.get('client_birthdays', [''])[0] == 'true':
-            self._collect_client_birthdays(start, end, day_events, store)
-        if resource.args.get('work_orders', [''])[0] == 'true':
-            self._collect_work_orders(start, end, day_events, store)
-
+        names = [name for name in self._collectors
+                 if resource.args.get(name, [''])[0] == 'true']
         # When grouping, events of the same type will be shown as only one, to
         # save space.
         group = resource.args.get('group', [''])[0] == 'true'
-        events = self._summarize_events(day_events, group)
-        store.close()
-        return json.dumps(events)
+
+        # The events before today are marked as late
+        key = (start, end, tuple(names), group, self._branch_id,
+               datetime.date.today())
+        response = self._get_cached(key)
+        if response is None:
+            day_events = self._collect_events(names, start, end)
+            events = self._summarize_events(day_events, group)
+            response = json.dumps(events)
+            self._set_cached(key, response)
+        return response
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    #
+    #   Private
+    #
+
+    def _get_cached(self, key):
+        with self._cache_lock:
+            value = self._cache.get(key)
+            if value is None:
+                return None
+            timestamp, response = value
+            if time.time() - timestamp > self.cache_timeout:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return response
+
+    def _set_cached(self, key, response):
+        with self._cache_lock:
+            self._cache[key] = (time.time(), response)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _collect_events(self, names, start, end):
+        futures = [self._executor.submit(self._run_collector,
+                                         self._collectors[name], start, end)
+                   for name in names]
+
+        # Merge the events in the same order they would be collected if
+        # the collectors ran one after the other
+        day_events = {}
+        for future in futures:
+            for date, events in future.result().items():
+                for section, section_events in events.items():
+                    for event in section_events:
+                        self._append_event(day_events, date, section, event)
+        return day_events
+
+    def _run_collector(self, collect, start, end):
+        day_events = {}
+        store = api.new_store()
+        try:
+            collect(start, end, day_events, store)
+        finally:
+            store.close()
+        return day_events
 
     @classmethod
     def _append_event(cls, events, date, section, event):
@@ -84,6 +181,14 @@ class CalendarEvents(object):
                  client_calls=[], client_birthdays=[], work_orders=[]))
         d[section].append(event)
 
+    #
+    #   Callbacks
+    #
+
+    def _on_DomainCommittedEvent(self, store, classes):
+        if not classes.isdisjoint(self.watched_classes):
+            self.clear_cache()
+
     #
     #   Database Quering
     #
@@ -128,7 +233,11 @@ class CalendarEvents(object):
     def _create_client_birthday(self, client_view, year):
         date = client_view.birth_date.date()
         age = year - date.year
-        date = date.replace(year=year)
+        if (date.month, date.day) == (2, 29) and not calendar.isleap(year):
+            # The birthday is on march 1 when the year is not a leap year
+            date = datetime.date(year, 3, 1)
+        else:
+            date = date.replace(year=year)
         title = _("{client}'s birthday: {age} years").format(
             client=client_view.name, age=age)
 
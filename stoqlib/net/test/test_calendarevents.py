@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+import datetime
+import json
+import time
+
+import mock
+
+from stoqlib.api import api
+from stoqlib.domain.events import DomainCommittedEvent
+from stoqlib.domain.payment.payment import Payment
+from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.lib.dateutils import localdatetime
+from stoqlib.net.calendarevents import CalendarEvents
+
+
+class _Request(object):
+    def __init__(self, start, end, **args):
+        self.args = dict((name, [value]) for name, value in args.items())
+        self.args['start'] = [str(time.mktime(start.timetuple()))]
+        self.args['end'] = [str(time.mktime(end.timetuple()))]
+
+
+class TestCalendarEvents(DomainTest):
+
+    def setUp(self):
+        super(TestCalendarEvents, self).setUp()
+        self.events = CalendarEvents()
+        self.addCleanup(DomainCommittedEvent.disconnect,
+                        self.events._on_DomainCommittedEvent)
+        self.addCleanup(self.events._executor.shutdown)
+
+    def _create_payment(self, payment_type, date):
+        payment = self.create_payment(payment_type=payment_type, date=date)
+        payment.set_pending()
+        return payment
+
+    def _render(self, **args):
+        # The collectors run on other threads, each one on a new store.
+        # Only one collector is used at a time here, so they can share
+        # the test store.
+        with mock.patch('stoqlib.net.calendarevents.api.new_store') as new_store:
+            new_store.return_value = self.store
+            with mock.patch.object(self.store, 'close'):
+                return self.events.render_GET(_Request(
+                    datetime.date(2011, 1, 1), datetime.date(2011, 2, 1),
+                    **args))
+
+    def test_render_GET(self):
+        payment = self._create_payment(Payment.TYPE_IN,
+                                       localdatetime(2011, 1, 10))
+        response = json.loads(self._render(in_payments='true'))
+
+        events = [event for event in response
+                  if event['id'] == str(payment.id)]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['type'], 'in-payment')
+        self.assertEqual(events[0]['start'], '2011-01-10')
+        self.assertEqual(events[0]['className'], 'receivable late')
+
+        # Only the requested events are collected
+        response = json.loads(self._render(out_payments='true'))
+        self.assertNotIn(str(payment.id), [event['id'] for event in response])
+
+    def test_render_GET_branch(self):
+        branch = api.get_current_branch(self.store)
+        self.assertEqual(self.events._branch_id, branch.id)
+
+        # The branch was already resolved, so no store is needed when
+        # there are no events to collect
+        with mock.patch('stoqlib.net.calendarevents.api.new_store') as new_store:
+            self.assertEqual(self.events.render_GET(_Request(
+                datetime.date(2011, 1, 1), datetime.date(2011, 2, 1))), '[]')
+        self.assertFalse(new_store.called)
+
+    def test_render_GET_cache(self):
+        first = self._create_payment(Payment.TYPE_OUT,
+                                     localdatetime(2011, 1, 10))
+        response = self._render(out_payments='true')
+        self.assertIn(str(first.id), response)
+
+        # The cached response is returned, even though there is a new payment
+        second = self._create_payment(Payment.TYPE_OUT,
+                                      localdatetime(2011, 1, 11))
+        self.assertEqual(self._render(out_payments='true'), response)
+
+        # Committing other classes does not clear the cache
+        DomainCommittedEvent.emit(self.store, set([Sellable]))
+        self.assertEqual(self._render(out_payments='true'), response)
+
+        DomainCommittedEvent.emit(self.store, set([Payment]))
+        self.assertIn(str(second.id), self._render(out_payments='true'))
+
+    def test_cache_timeout(self):
+        key = ('key', )
+        with mock.patch('stoqlib.net.calendarevents.time.time') as time_:
+            time_.return_value = 1000
+            self.events._set_cached(key, u'response')
+            time_.return_value = 1000 + self.events.cache_timeout
+            self.assertEqual(self.events._get_cached(key), u'response')
+            time_.return_value = 1001 + self.events.cache_timeout
+            self.assertIsNone(self.events._get_cached(key))
+        self.assertEqual(len(self.events._cache), 0)
+
+    def test_cache_size(self):
+        self.events.cache_size = 2
+        self.events._set_cached(1, u'one')
+        self.events._set_cached(2, u'two')
+        # Using an entry makes it the most recent one
+        self.assertEqual(self.events._get_cached(1), u'one')
+        self.events._set_cached(3, u'three')
+        self.assertIsNone(self.events._get_cached(2))
+        self.assertEqual(self.events._get_cached(1), u'one')
+        self.assertEqual(self.events._get_cached(3), u'three')
+
+    def test_collect_payments(self):
+        in_payment = self._create_payment(Payment.TYPE_IN,
+                                          localdatetime(2011, 1, 10))
+        out_payment = self._create_payment(Payment.TYPE_OUT,
+                                           localdatetime(2011, 1, 20))
+        start = datetime.date(2011, 1, 1)
+        end = datetime.date(2011, 2, 1)
+
+        day_events = {}
+        self.events._collect_inpayments(start, end, day_events, self.store)
+        self.events._collect_outpayments(start, end, day_events, self.store)
+
+        self.assertIn(str(in_payment.id),
+                      [event['id'] for event in
+                       day_events[datetime.date(2011, 1, 10)]['receivable']])
+        self.assertIn(str(out_payment.id),
+                      [event['id'] for event in
+                       day_events[datetime.date(2011, 1, 20)]['payable']])
+
+    def test_collect_client_calls(self):
+        client = self.create_client()
+        call = self.create_call(person=client.person)
+
+        day_events = {}
+        self.events._collect_client_calls(
+            datetime.date(2011, 1, 1), datetime.date(2011, 1, 2),
+            day_events, self.store)
+        events = day_events[datetime.date(2011, 1, 1)]['client_calls']
+        self.assertIn(str(call.id), [event['id'] for event in events])
+
+    def test_collect_events(self):
+        def collect(section):
+            def _collect(start, end, day_events, store):
+                self.events._append_event(day_events, start, section,
+                                          dict(title=section))
+            return _collect
+
+        self.events._collectors['in_payments'] = collect('receivable')
+        self.events._collectors['out_payments'] = collect('payable')
+        with mock.patch('stoqlib.net.calendarevents.api.new_store'):
+            day_events = self.events._collect_events(
+                ['out_payments', 'in_payments'],
+                datetime.date(2011, 1, 1), datetime.date(2011, 1, 2))
+
+        events = day_events[datetime.date(2011, 1, 1)]
+        self.assertEqual(events['receivable'], [dict(title='receivable')])
+        self.assertEqual(events['payable'], [dict(title='payable')])
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+import hashlib
+import io
+import unittest
+
+import mock
+
+from stoqlib.net.webserver import _RequestHandler
+
+
+class _Resource(object):
+    response = u'{"events": []}'
+
+    def render_GET(self, request):
+        return self.response
+
+
+class TestRequestHandler(unittest.TestCase):
+
+    def _get(self, path, headers=None):
+        # Avoid BaseRequestHandler.__init__, which would handle a request
+        # from a real socket
+        handler = _RequestHandler.__new__(_RequestHandler)
+        handler.path = path
+        handler.headers = headers or {}
+        handler.wfile = io.BytesIO()
+        handler.send_response = mock.Mock()
+        handler.send_header = mock.Mock()
+        handler.send_error = mock.Mock()
+        handler.end_headers = mock.Mock()
+        with mock.patch.dict('stoqlib.net.webserver.resources',
+                             {'/resource': _Resource()}, clear=True):
+            handler.do_GET()
+        headers = dict(call[0] for call in handler.send_header.call_args_list)
+        return handler, headers
+
+    def test_get(self):
+        handler, headers = self._get('/resource?start=1')
+        handler.send_response.assert_called_once_with(200)
+        etag = '"%s"' % (hashlib.md5(_Resource.response.encode()).hexdigest(), )
+        self.assertEqual(headers['ETag'], etag)
+        self.assertEqual(headers['Cache-Control'], 'no-cache')
+        self.assertEqual(handler.wfile.getvalue(), _Resource.response.encode())
+
+    def test_get_not_modified(self):
+        handler, headers = self._get('/resource')
+        etag = headers['ETag']
+
+        handler, headers = self._get(
+            '/resource', headers={'If-None-Match': '"other", %s' % (etag, )})
+        handler.send_response.assert_called_once_with(304)
+        self.assertEqual(headers['ETag'], etag)
+        self.assertEqual(handler.wfile.getvalue(), b'')
+
+        # A different response gets a new etag
+        with mock.patch.object(_Resource, 'response', u'[]'):
+            handler, headers = self._get(
+                '/resource', headers={'If-None-Match': etag})
+        handler.send_response.assert_called_once_with(200)
+        self.assertNotEqual(headers['ETag'], etag)
+        self.assertEqual(handler.wfile.getvalue(), b'[]')
+
+    def test_get_not_found(self):
+        handler, headers = self._get('/other')
+        handler.send_error.assert_called_once_with(404, "Resource not found")
@@ -22,8 +22,10 @@
 ## Author(s): Stoq Team <stoq-devel@async.com.br>
 ##
 
+import hashlib
 import http.server
 import os
+import socketserver
 import urllib.parse
 
 from kiwi.environ import environ
@@ -58,14 +60,31 @@ class _RequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_error(404, "Resource not found")
             return
 
+        data = response.encode()
+        etag = '"%s"' % (hashlib.md5(data).hexdigest(), )
+        if etag in self._get_if_none_match():
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
         self.send_response(200)
         # TODO: Right now we only have one resource, and it is returning
         # a json as the content. In the future we may want to support
         # other kinds of content types
         self.send_header('Content-Type', 'application/json')
-        self.send_header('Content-Length', str(len(response)))
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        # Make the browser revalidate the response every time
+        self.send_header('Cache-Control', 'no-cache')
         self.end_headers()
-        self.wfile.write(response.encode())
+        self.wfile.write(data)
+
+    def _get_if_none_match(self):
+        value = self.headers.get('If-None-Match')
+        if not value:
+            return []
+        return [etag.strip() for etag in value.split(',')]
 
     #
     #  SimpleHTTPServer.SimpleHTTPRequestHandler
@@ -85,6 +104,12 @@ class _RequestHandler(http.server.SimpleHTTPRequestHandler):
         pass
 
 
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    # Handle each request on its own thread, so a slow request does not
+    # block the others
+    daemon_threads = True
+
+
 def run_server(port):
-    server = http.server.HTTPServer(('localhost', port), _RequestHandler)
+    server = _Server(('localhost', port), _RequestHandler)
     server.serve_forever()
@@ -20,14 +20,18 @@
 ## Author(s): Stoq Team <stoq-devel@async.com.br>
 ##
 
+import collections
+import multiprocessing
 import os
 import platform
+import shutil
+import tempfile
 
 from gi.repository import GdkPixbuf
 from kiwi.accessor import kgetattr
 from kiwi.environ import environ
 
-from stoqlib.database.runtime import get_default_store
+from stoqlib.database.runtime import get_default_store, StoqlibResultSet
 from stoqlib.lib.template import render_template
 from stoqlib.lib.translation import stoqlib_gettext, stoqlib_ngettext
 from stoqlib.lib.formatters import (get_formatted_price, get_formatted_cost,
@@ -36,11 +40,76 @@ from stoqlib.lib.formatters import (get_formatted_price, get_formatted_cost,
 from stoqlib.reporting.utils import get_logo_data
 _ = stoqlib_gettext
 
+#: A part of the rows of a :class:`TableReport`, rendered as a separate
+#: document. The summary row and anything after the table are only
+#: rendered on the last chunk.
+ReportChunk = collections.namedtuple('ReportChunk', ['rows', 'first', 'last'])
+
+
+def _get_template_dir():
+    template_dir = environ.get_resource_filename('stoq', 'template')
+    if platform.system() == 'Windows':
+        # FIXME: Figure out why this is breaking
+        # On windows, weasyprint is eating the last directory of the path
+        template_dir = os.path.join(template_dir, 'foobar')
+    return template_dir
+
+
+def _render_chunk(task):
+    import weasyprint
+
+    html_filename, template_dir, filename = task
+    document = weasyprint.HTML(filename=html_filename, encoding='utf-8',
+                               base_url=template_dir).render(
+        stylesheets=[weasyprint.CSS(string='')])
+    document.write_pdf(filename)
+    return filename, len(document.pages)
+
+
+def _merge_chunks(chunks, output):
+    import cairo
+    from gi.repository import Gio, Poppler
+
+    n_pages = sum(chunk_pages for filename, chunk_pages in chunks)
+    # The same as the page margins on base.css, converted to points
+    margin = 15 * 72 / 25.4
+
+    surface = cairo.PDFSurface(output, 1, 1)
+    cr = cairo.Context(surface)
+    page_no = 0
+    for filename, chunk_pages in chunks:
+        # Only one chunk is opened at a time
+        document = Poppler.Document.new_from_file(
+            Gio.File.new_for_path(filename).get_uri(), None)
+        for i in range(document.get_n_pages()):
+            page = document.get_page(i)
+            width, height = page.get_size()
+            surface.set_size(width, height)
+            cr.save()
+            page.render_for_printing(cr)
+            cr.restore()
+
+            # The chunks do not know how many pages there are before them
+            # or in total, so the page numbers are drawn here, where the
+            # bottom-right margin label would be
+            page_no += 1
+            label = u"%s %d %s %d" % (_("Page"), page_no, _("of"), n_pages)
+            cr.select_font_face('serif')
+            cr.set_font_size(12)
+            extents = cr.text_extents(label)
+            cr.move_to(width - margin - extents[4],
+                       height - (margin - extents[3]) / 2)
+            cr.show_text(label)
+            cr.show_page()
+    surface.finish()
+
 
 class HTMLReport(object):
     template_filename = None
     title = ''
     complete_header = True
+    #: The :class:`ReportChunk` being rendered, if any
+    chunk = None
 
     def __init__(self, filename):
         self.filename = filename
@@ -82,13 +151,8 @@ class HTMLReport(object):
     def render(self, stylesheet=None):
         import weasyprint
 
-        template_dir = environ.get_resource_filename('stoq', 'template')
-        if platform.system() == 'Windows':
-            # FIXME: Figure out why this is breaking
-            # On windows, weasyprint is eating the last directory of the path
-            template_dir = os.path.join(template_dir, 'foobar')
         html = weasyprint.HTML(string=self.get_html(),
-                               base_url=template_dir)
+                               base_url=_get_template_dir())
 
         return html.render(stylesheets=[weasyprint.CSS(string=stylesheet)])
 
@@ -140,6 +204,10 @@ class TableReport(HTMLReport):
     #:
     template_filename = "objectlist.html"
 
+    #: How many rows each chunk has when the report is saved in chunks,
+    #: see :meth:`.save`
+    chunk_size = 1000
+
     def __init__(self, filename, data, title=None, blocked_records=0,
                  status_name=None, filter_strings=None, status=None):
         self.title = title or self.title
@@ -159,7 +227,13 @@ class TableReport(HTMLReport):
         """ This method build the report title based on the arguments sent
         by SearchBar to its class constructor.
         """
-        rows = len(self.data)
+        if isinstance(self.data, StoqlibResultSet):
+            # Avoid loading all the results in memory when they are going to
+            # be streamed from the database (see set_fetch_size)
+            rows = self.data.count()
+        else:
+            rows = len(self.data)
+        self.rows = rows
         total_rows = rows + self.blocked_records
         item = stoqlib_ngettext(self.main_object_name[0],
                                 self.main_object_name[1], total_rows)
@@ -178,7 +252,86 @@ class TableReport(HTMLReport):
                 notes.append(filter_string)
         self.notes = notes
 
+    def save(self, workers=None):
+        """Saves the report as a pdf
+
+        Reports with more than twice :attr:`.chunk_size` rows are split
+        in chunks, which are rendered in parallel and merged afterwards.
+        The table headers are repeated on every page, the summary row
+        is only on the last one and the pages are numbered as if they
+        were rendered together. A chunk always starts on a new page.
+
+        Each chunk is written to a temporary file as soon as its rows are
+        formatted, so only the rows of one chunk are kept in memory.
+
+        :param workers: the number of processes rendering the chunks,
+          defaults to the number of cpus
+        """
+        if self.rows <= self.chunk_size * 2:
+            HTMLReport.save(self)
+            return
+
+        workers = min(workers or multiprocessing.cpu_count(),
+                      (self.rows + self.chunk_size - 1) // self.chunk_size)
+        pool = None
+        if workers > 1:
+            # Forking a process with other threads running (e.g. the ones of
+            # the interface) could leave locks held by them locked forever
+            # on the workers, so they are started from scratch instead
+            context = multiprocessing.get_context('spawn')
+            pool = context.Pool(workers)
+        template_dir = _get_template_dir()
+        tmpdir = tempfile.mkdtemp(prefix='stoqlib-reporting')
+        try:
+            results = []
+            # The rows are formatted and the summaries accumulated here,
+            # only the layout is done by the workers
+            for i, chunk in enumerate(self._iter_chunks()):
+                self.chunk = chunk
+                html_filename = os.path.join(tmpdir, '%d.html' % (i, ))
+                with open(html_filename, 'w', encoding='utf-8') as fp:
+                    fp.write(self.get_html())
+                self.chunk = None
+
+                task = (html_filename, template_dir,
+                        os.path.join(tmpdir, '%d.pdf' % (i, )))
+                if pool is None:
+                    results.append(_render_chunk(task))
+                else:
+                    results.append(pool.apply_async(_render_chunk, (task, )))
+
+            if pool is not None:
+                results = [result.get() for result in results]
+            # The pages are only numbered after all the chunks are rendered,
+            # since the number of pages is not known before that
+            _merge_chunks(results, self.filename)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            self.chunk = None
+            shutil.rmtree(tmpdir)
+
+    def _iter_chunks(self):
+        # A chunk is only known to be the last one after all the rows
+        # were read, so it is only returned after the next row is read
+        rows = []
+        first = True
+        for row in self.get_data():
+            if len(rows) == self.chunk_size:
+                yield ReportChunk(rows=rows, first=first, last=False)
+                rows = []
+                first = False
+            rows.append(row)
+        yield ReportChunk(rows=rows, first=first, last=True)
+
     def get_data(self):
+        if self.chunk is not None:
+            # The rows were already accumulated when creating the chunks
+            for row in self.chunk.rows:
+                yield row
+            return
+
         self.reset()
         for obj in self.data:
             self.accumulate(obj)
@@ -656,3 +656,55 @@ class TestReport(ReportTest):
 
         self._diff_expected(WorkOrdersReport, 'workorders-report',
                             search.results, list(search.results))
+
+    @mock.patch('stoqlib.reporting.report._merge_chunks')
+    @mock.patch('stoqlib.reporting.report._render_chunk')
+    def test_table_report_save_in_chunks(self, render_chunk, merge_chunks):
+        from stoqlib.reporting.report import TableReport
+
+        class _Report(TableReport):
+            title = u'Chunked report'
+            chunk_size = 2
+
+            def get_columns(self):
+                return [dict(title=u'Value', align='right')]
+
+            def accumulate(self, row):
+                self.total += row
+
+            def reset(self):
+                self.total = 0
+
+            def get_row(self, obj):
+                return [str(obj)]
+
+            def get_summary_row(self):
+                return [u'Total: %d' % self.total]
+
+        htmls = []
+
+        def render(task):
+            # The html of each chunk is written to a file before rendering it
+            with open(task[0], encoding='utf-8') as fp:
+                htmls.append(fp.read())
+            return task[2], 1
+
+        render_chunk.side_effect = render
+        report = _Report('report.pdf', [1, 2, 3, 4, 5])
+        report.save(workers=1)
+
+        tasks = [call[0][0] for call in render_chunk.call_args_list]
+        self.assertEqual(len(tasks), 3)
+        merge_chunks.assert_called_once_with([(t[2], 1) for t in tasks],
+                                             'report.pdf')
+
+        # Only the first chunk has the header, and only the last one
+        # has the summary of all the rows
+        self.assertIn(u'<header>', htmls[0])
+        self.assertNotIn(u'<header>', htmls[1])
+        self.assertNotIn(u'Total:', htmls[1])
+        self.assertIn(u'Total: 15', htmls[2])
+        for html in htmls:
+            self.assertNotIn(u'counter(pages)', html)
+        self.assertIn(u'<td>3</td>', htmls[1])
+        self.assertIsNone(report.chunk)
@@ -198,6 +198,7 @@ class Stoq(Plugin):
         password = os.environ.get('STOQLIB_TEST_PASSWORD')
         port = int(os.environ.get('STOQLIB_TEST_PORT') or 0)
         quick = os.environ.get('STOQLIB_TEST_QUICK', None) is not None
+        template = os.environ.get('STOQLIB_TEST_TEMPLATE', None) is not None
 
         config = os.path.join(
             os.path.dirname(stoqlib.__file__), 'tests', 'config.py')
@@ -205,7 +206,8 @@ class Stoq(Plugin):
             exec(compile(open(config).read(), config, 'exec'), globals(), locals())
 
         bootstrap_suite(address=hostname, dbname=dbname, port=port,
-                        username=username, password=password, quick=quick)
+                        username=username, password=password, quick=quick,
+                        template=template)
 
 
 # The doctests plugin in nosetests 1.1.2 doesn't have --doctest-options,
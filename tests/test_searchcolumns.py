@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+##  Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+import ast
+import glob
+import os
+import unittest
+
+from kiwi.python import namedAny
+
+from stoqlib.database.searchindex import SEARCH_COLUMNS, get_search_column
+
+import stoq
+
+# The modules defining the search dialogs. The columns are read from the
+# sources so the dialogs (and gtk) don't need to be imported. The plugins
+# are not listed since their tables only exist when they are installed
+_SEARCH_SOURCES = [
+    'stoq/gui/*.py',
+    'stoqlib/gui/dialogs/*.py',
+    'stoqlib/gui/search/*.py',
+    'stoqlib/gui/wizards/*.py',
+]
+
+
+def _get_imported_names(tree):
+    names = {}
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.level == 0:
+            for alias in node.names:
+                names[alias.asname or alias.name] = '%s.%s' % (node.module,
+                                                              alias.name)
+    return names
+
+
+def _get_class_attributes(klass):
+    attributes = {}
+    for node in klass.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1 and
+                isinstance(node.targets[0], ast.Name)):
+            attributes[node.targets[0].id] = node.value
+    return attributes
+
+
+def _get_text_field_columns(klass, attributes):
+    """Yields the lists of columns a search class registers
+
+    Both the ``text_field_columns`` attribute and the lists passed to
+    ``set_text_field_columns`` inside the class' methods are returned.
+    """
+    value = attributes.get('text_field_columns')
+    if isinstance(value, ast.List):
+        yield value.elts
+    for node in ast.walk(klass):
+        if (isinstance(node, ast.Call) and
+                isinstance(node.func, ast.Attribute) and
+                node.func.attr == 'set_text_field_columns' and
+                node.args and isinstance(node.args[0], ast.List)):
+            yield node.args[0].elts
+
+
+def _resolve(node, names):
+    if isinstance(node, ast.Name) and node.id in names:
+        return namedAny(names[node.id])
+    if isinstance(node, ast.Attribute):
+        obj = _resolve(node.value, names)
+        if obj is not None:
+            return getattr(obj, node.attr)
+    return None
+
+
+def _get_search_spec(klass, classes, names):
+    # Follow the bases defined in the same module until one of them
+    # defines the search_spec
+    while klass is not None:
+        attributes = _get_class_attributes(klass)
+        if 'search_spec' in attributes:
+            return _resolve(attributes['search_spec'], names)
+        bases = [classes.get(base.id) for base in klass.bases
+                 if isinstance(base, ast.Name)]
+        klass = bases[0] if bases else None
+    return None
+
+
+def _introspect_search_columns():
+    """Yields the text columns filtered by the searches
+
+    :returns: a generator of (filename, class name, table field) tuples
+    """
+    basedir = os.path.dirname(os.path.dirname(stoq.__file__))
+    for pattern in _SEARCH_SOURCES:
+        for filename in sorted(glob.glob(os.path.join(basedir, pattern))):
+            with open(filename) as f:
+                tree = ast.parse(f.read(), filename)
+            names = _get_imported_names(tree)
+            classes = dict((node.name, node) for node in tree.body
+                           if isinstance(node, ast.ClassDef))
+            for klass in classes.values():
+                attributes = _get_class_attributes(klass)
+                for columns in _get_text_field_columns(klass, attributes):
+                    for column in columns:
+                        if (isinstance(column, ast.Constant) and
+                                isinstance(column.value, str)):
+                            # The search spec of some searches is only
+                            # known at runtime, skip their columns
+                            spec = _get_search_spec(klass, classes, names)
+                            if spec is None:
+                                continue
+                            table_field = getattr(spec, column.value)
+                        else:
+                            table_field = _resolve(column, names)
+                        yield filename, klass.name, table_field
+
+
+class SearchColumnsTest(unittest.TestCase):
+    def test_search_columns(self):
+        missing = set()
+        for filename, class_name, table_field in _introspect_search_columns():
+            column = get_search_column(table_field)
+            # Expressions (like the identifier_str casts) can't be indexed
+            if column is None or column in SEARCH_COLUMNS:
+                continue
+            missing.add('%s.%s (%s: %s)' % (column + (
+                os.path.basename(filename), class_name)))
+
+        if missing:
+            self.fail("Columns filtered by the searches without a search "
+                      "index: %s\nPlease add them to "
+                      "stoqlib.database.searchindex.SEARCH_COLUMNS and "
+                      "create their indexes in a database patch" % (
+                          ', '.join(sorted(missing)), ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+# Helpers shared by the tools/benchmark-* scripts. They run from the tools
+# directory, so they can import this module directly:
+#
+#   from benchmarkutils import get_example_creator
+
+
+def get_example_creator(store):
+    """Returns an ExampleCreator for a benchmark
+
+    Unlike on the tests, the current user, branch and station of the
+    creator are the ones set up by bootstrap_suite.
+
+    :param store: the store the objects are created on
+    :returns: a :class:`stoqlib.domain.exampledata.ExampleCreator`
+    """
+    from stoqlib.api import api
+    from stoqlib.domain.exampledata import ExampleCreator
+
+    class _Creator(ExampleCreator):
+        current_user = property(lambda self: api.get_current_user(self.store))
+        current_branch = property(
+            lambda self: api.get_current_branch(self.store))
+        current_station = property(
+            lambda self: api.get_current_station(self.store))
+
+    creator = _Creator()
+    creator.set_store(store)
+    return creator